@@ -1,9 +1,19 @@
 from findface_multi.findface_multi import FindfaceConnection, FindfaceMulti, FindfaceException
 from NIST3.functions_mitra_toolkit import *
+from acervo_fotos import obter_acervo
+from nist_builder import NistBuilder, GravadorNist
 import os
 import json
+import queue
+import threading
+import time
+import traceback
+import argparse
 import requests
+from collections import Counter
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from requests.adapters import HTTPAdapter
 from concurrent.futures import ThreadPoolExecutor
 
 
@@ -11,124 +21,356 @@ FINDFACE_URL = os.environ["FINDFACE_URL"]
 FINDFACE_USER = os.environ["FINDFACE_USER"]
 FINDFACE_PASSWORD = os.environ["FINDFACE_PASSWORD"]
 
+DATA_CRIACAO_PADRAO = "2020-01-01T00:00:0.000000Z"
+MAX_CONEXOES = 32
+
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+def obter_sessao() -> requests.Session:
+    """
+    Sessão HTTP compartilhada para o download das fotos, com pool de conexões keep-alive.
+    """
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=MAX_CONEXOES, pool_maxsize=MAX_CONEXOES, max_retries=3)
+            sessao.mount('http://', adaptador)
+            sessao.mount('https://', adaptador)
+            sessao.verify = False
+            _sessao = sessao
+        return _sessao
+
 
 def obter_caminho_arquivo_nist(card, nome_lista):
 
-    backup_dir = Path(__file__).parent / f"backup_nists"    
+    backup_dir = Path(__file__).parent / f"backup_nists"
     prefixo = nome_lista.lower().replace('/', '_')
     filepath = backup_dir / f"{nome_lista.lower()}/{prefixo}_{card['id']}.nst"
 
     return filepath
 
 
-def gera_nist(card: dict, faces_bin: bytes, nome_lista: str) -> None:
+def formata_data_nascimento_card(data_nascimento):
+    if not data_nascimento:
+        return None
+    if 'T' in data_nascimento:
+        data_nascimento = data_nascimento.split('T')[0]
+    return formata_data_nascimento(data_nascimento, r"%Y%m%d")
 
-    nome = formata_nome(card["name"])
-    rg = formata_documento(card["meta"]["documento"])
-    cpf = validate_cpf(card["meta"]["cpf"])
 
-    new_nist = NIST()
-    new_nist.add_Type01()
-    new_nist.add_Type02()
-    
-    if card["meta"]["data_nascimento"]:
-        if 'T' in card["meta"]["data_nascimento"]:
-            data_nascimento = card["meta"]["data_nascimento"].split('T')[0]
-        else:
-            data_nascimento = card["meta"]["data_nascimento"]
-            
-        data_nascimento_formatada = formata_data_nascimento(data_nascimento, r"%Y%m%d")
-        new_nist.set_field('2.035', data_nascimento_formatada, idc=0)  # Data de nascimento
-
-    new_nist.set_field('1.008', nome_lista, idc=0)  # Base de Origem
-    new_nist.set_field('2.030', nome, idc=0)  # Nome    
-    # new_nist.set_field('2.037', 'Smyrna/GA', idc=0)  # Cidade de nascimento
-    new_nist.set_field('2.038', formata_nacionalidade(card["meta"]["nacionalidade"]), idc=0)  # País de nascimento
-    # new_nist.set_field('2.039', '2', idc=0)  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
-    new_nist.set_field('2.201', formata_nome(card["meta"]["pai"]), idc=0)  # Pai
-    new_nist.set_field('2.202', formata_nome(card["meta"]["mae"]), idc=0)  # Mae
-    new_nist.set_field('2.211', rg, idc=0)  # Identidade
-    new_nist.set_field('2.212', cpf, idc=0),  # CPF
-    # new_nist.set_field('2.213', '', idc=0)  # Titulo de eleitor
-    # new_nist.set_field('2.214', '', idc=0)  # CNH
-    # new_nist.set_field('2.224', 'JULIA ROBERTS')  # Nome social
-
-    # Faces
-    new_nist.add_ntype(10)
-    for index, face in enumerate(faces_bin, start=1):
-        new_nist.set_field('10.999', face, idc=index)
+_builders = {}
+_builders_lock = threading.Lock()
 
 
-    filepath = obter_caminho_arquivo_nist(card=card, nome_lista=nome_lista)
-        
-    # Cria o diretório e seus pais, se necessário
-    os.makedirs(Path(filepath).parent, exist_ok=True)
+def obter_builder(nome_lista: str) -> NistBuilder:
+    """
+    NistBuilder dos cards da lista (o cache dos formatadores é compartilhado entre os cards).
+    """
+    with _builders_lock:
+        if nome_lista not in _builders:
+            _builders[nome_lista] = NistBuilder(
+                campos=[
+                    ('2.030', 'name', formata_nome),  # Nome
+                    ('2.035', 'data_nascimento', formata_data_nascimento_card),  # Data de nascimento
+                    # ('2.037', ...),  # Cidade de nascimento
+                    ('2.038', 'nacionalidade', formata_nacionalidade),  # País de nascimento
+                    # ('2.039', ...),  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
+                    ('2.201', 'pai', formata_nome),  # Pai
+                    ('2.202', 'mae', formata_nome),  # Mae
+                    ('2.211', 'documento', formata_documento),  # Identidade
+                    ('2.212', 'cpf', validate_cpf),  # CPF
+                    # ('2.213', ...),  # Titulo de eleitor
+                    # ('2.214', ...),  # CNH
+                    # ('2.224', ...),  # Nome social
+                ],
+                fixos={'1.008': nome_lista},  # Base de Origem
+                face='faces',
+            )
+        return _builders[nome_lista]
 
-    new_nist.write(filepath)
 
-    print(f"Arquivo criado: {filepath}.")
+def monta_nist(card: dict, faces_bin: list, nome_lista: str):
+    return obter_builder(nome_lista).construir_um({'name': card["name"], **card["meta"], 'faces': faces_bin})
 
 
-def backup_card(findface: FindfaceMulti, card: dict, nome_lista: str) -> None:
-    
-    # Verifica se o arquivo já existe no destino. Se existir, sai da função
-    caminho_arquivo_nist = obter_caminho_arquivo_nist(card=card, nome_lista=lista)
-    if os.path.exists(caminho_arquivo_nist):
-        print(f"Arquivo já existe.", caminho_arquivo_nist)
-        return    
+def gera_nist(card: dict, faces_bin: list, nome_lista: str) -> None:
 
-    face_objects = findface.get_face_objects(card=card["id"])
-    faces_bin = []
-    for face_object in face_objects["results"]:
-        response = requests.get(face_object["source_photo"], verify=False)
-        if response.status_code == 200:
-            faces_bin.append(response.content)
+    new_nist = monta_nist(card, faces_bin, nome_lista)
 
-    gera_nist(card, faces_bin=faces_bin, nome_lista=lista)
+    filepath = obter_caminho_arquivo_nist(card=card, nome_lista=nome_lista)
 
+    # Grava em um arquivo temporário e renomeia: um NIST interrompido no meio nunca fica com o nome final
+    GravadorNist.gravar_agora(new_nist, filepath)
 
-if __name__ == '__main__':
+    print(f"Arquivo criado: {filepath}.")
 
-    with FindfaceConnection(base_url=FINDFACE_URL, username=FINDFACE_USER, password=FINDFACE_PASSWORD, uuid="backup_nist_ff2.py") as ffcon:
-        findface = FindfaceMulti(findface_connection=ffcon)
 
-        listas = ["PF/GCAP-RR"]
-        
-        for lista in listas:
+def baixar_foto(url: str) -> bytes | None:
+    response = obter_sessao().get(url, timeout=60)
+    if response.status_code == 200:
+        return response.content
+    return None
 
-            prefixo_lista = lista.replace('/','_')
-            arquivo_conf_lista = prefixo_lista.lower() + '.txt'
 
-            # Seta a data de criação do último card lido da lista
-            data_criacao = "2020-01-01T00:00:0.000000Z"  # Data default
-            if os.path.exists(arquivo_conf_lista):
-                with open(arquivo_conf_lista) as f:
-                    # data_criacao = f.read().splitlines()[0]
-                    data_criacao = f.read()
+def baixar_fotos_card(findface: FindfaceMulti, card: dict, executor_fotos: ThreadPoolExecutor) -> list:
+    """
+    Busca os face objects do card e baixa as fotos em paralelo, mantendo a ordem dos face objects.
+    Fotos já presentes no acervo local não são baixadas novamente.
+    """
+    acervo = obter_acervo(FINDFACE_URL)
+    face_objects = findface.get_face_objects(card=card["id"])
+    futuros = [
+        executor_fotos.submit(acervo.obter_ou_baixar, face_object["id"], face_object["source_photo"], baixar_foto)
+        for face_object in face_objects["results"]
+    ]
+    return [foto for foto in (futuro.result() for futuro in futuros) if foto is not None]
+
 
-            for i in range(9000000):  # Loop virtualmente infinito para poder limitar o número de retornos a cada loop
+def backup_card(findface: FindfaceMulti, card: dict, nome_lista: str, executor_fotos: ThreadPoolExecutor | None = None) -> None:
 
-                # print("data criação", data_criacao)
+    # Verifica se o arquivo já existe no destino. Se existir, sai da função
+    caminho_arquivo_nist = obter_caminho_arquivo_nist(card=card, nome_lista=nome_lista)
+    if os.path.exists(caminho_arquivo_nist):
+        print(f"Arquivo já existe.", caminho_arquivo_nist)
+        return
+
+    if executor_fotos is None:
+        with ThreadPoolExecutor(max_workers=4) as executor_fotos:
+            faces_bin = baixar_fotos_card(findface, card, executor_fotos)
+    else:
+        faces_bin = baixar_fotos_card(findface, card, executor_fotos)
+
+    gera_nist(card, faces_bin=faces_bin, nome_lista=nome_lista)
+
+
+class CheckpointDataCriacao:
+    """
+    Guarda a data de criação do último card da lista cujo backup foi concluído.
+
+    Os cards terminam fora de ordem; a data gravada é sempre a do último card de uma sequência
+    contínua de cards concluídos (na ordem de created_date). Um card com falha segura o checkpoint,
+    e ele e os seguintes são revistos na próxima execução (os NISTs já gravados são pulados).
+    """
+
+    def __init__(self, caminho: str | Path, intervalo: float = 5.0):
+        self.caminho = Path(caminho)
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._datas = {}
+        self._concluidos = set()
+        self._proximo_registro = 0
+        self._proximo_pendente = 0
+        self._data_gravada = None
+        self._ultima_gravacao = 0.0
+        self.data = self.ler()
+
+    def ler(self) -> str:
+        if self.caminho.exists():
+            with self.caminho.open() as f:
+                data = f.read().strip()
+            if data:
+                return data
+        return DATA_CRIACAO_PADRAO
+
+    def registrar(self, data_criacao: str) -> int:
+        """
+        Registra um card na ordem em que foi lido e retorna seu número de sequência.
+        """
+        with self._lock:
+            sequencia = self._proximo_registro
+            self._datas[sequencia] = data_criacao
+            self._proximo_registro += 1
+            return sequencia
+
+    def concluir(self, sequencia: int) -> None:
+        with self._lock:
+            self._concluidos.add(sequencia)
+            while self._proximo_pendente in self._concluidos:
+                self._concluidos.remove(self._proximo_pendente)
+                self.data = self._datas.pop(self._proximo_pendente)
+                self._proximo_pendente += 1
+
+            if time.monotonic() - self._ultima_gravacao >= self.intervalo:
+                self._gravar()
+
+    def gravar(self) -> None:
+        with self._lock:
+            self._gravar()
+
+    def _gravar(self) -> None:
+        if self.data == self._data_gravada:
+            return
+        temporario = self.caminho.with_name(self.caminho.name + '.tmp')
+        with temporario.open('w') as wf:
+            wf.write(self.data)
+            wf.flush()
+            os.fsync(wf.fileno())
+        os.replace(temporario, self.caminho)
+        self._data_gravada = self.data
+        self._ultima_gravacao = time.monotonic()
+
+
+def paginas_cards(findface: FindfaceMulti, id_lista: int, data_criacao: str, limite: int = 100):
+    """
+    Gera as páginas de cards da lista em ordem de created_date, seguindo o cursor (next_page) da API.
+    """
+    parametros = dict(watch_lists=[id_lista], created_date_gt=data_criacao, has_face_objects=True, ordering='created_date', limit=limite)
+    cards = findface.get_human_cards(**parametros)
+
+    while cards["results"]:
+        yield cards["results"]
+
+        if "next_page" in cards:
+            if not cards["next_page"]:
+                break
+            cursor = parse_qs(urlparse(cards["next_page"]).query).get('page')
+            if not cursor:
+                break
+            cards = findface.get_human_cards(page=cursor[0], **parametros)
+        else:
+            # API sem cursor: continua a partir da data de criação do último card lido
+            parametros['created_date_gt'] = cards["results"][-1]["created_date"]
+            cards = findface.get_human_cards(**parametros)
+
+
+def paginas_com_prefetch(paginas, prefetch: int = 2):
+    """
+    Lê as páginas em uma thread separada, mantendo até `prefetch` páginas prontas na fila.
+    """
+    fila = queue.Queue(maxsize=max(1, prefetch))
+    fim = object()
+    parar = threading.Event()
+
+    def produtor():
+        try:
+            for pagina in paginas:
+                while not parar.is_set():
+                    try:
+                        fila.put(pagina, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if parar.is_set():
+                    return
+            fila.put(fim)
+        except BaseException as e:
+            fila.put(e)
+
+    thread = threading.Thread(target=produtor, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        parar.set()
+
+
+def backup_lista(findface: FindfaceMulti, lista: str, cards_simultaneos: int = 16, fotos_simultaneas: int = 32,
+                 gravadores: int = 4, prefetch: int = 2, limite: int = 100) -> dict:
+    """
+    Faz o backup em NIST de todos os cards da lista criados após o último checkpoint.
+
+    - As páginas de cards são lidas pelo cursor, com prefetch, enquanto as anteriores são processadas.
+    - Cada card busca seus face objects e baixa as fotos em paralelo pela sessão compartilhada.
+    - Os NISTs são montados pelo NistBuilder e gravados por um pool de gravadores separado.
+    - O checkpoint (created_date) é gravado atomicamente, sem depender do fim de cada página.
+
+    Retorna:
+    - dict: Métricas (cards, gravados, existentes, falhas, segundos).
+    """
+    inicio = time.monotonic()
+    metricas = Counter()
+    metricas_lock = threading.Lock()
+
+    prefixo_lista = lista.replace('/','_')
+    arquivo_conf_lista = prefixo_lista.lower() + '.txt'
+    checkpoint = CheckpointDataCriacao(arquivo_conf_lista)
+
+    id_lista = findface.get_watch_list_id_by_name(lista)
+    print(f"[backup_nists_ff2] {lista}: backup a partir de {checkpoint.data}.")
+
+    def contar(chave):
+        with metricas_lock:
+            metricas[chave] += 1
+
+    executor_cards = ThreadPoolExecutor(max_workers=cards_simultaneos)
+    executor_fotos = ThreadPoolExecutor(max_workers=fotos_simultaneas)
+    gravador = GravadorNist(gravadores)
+    # Limita os cards em andamento (e as fotos em memória) enquanto o cursor segue lendo páginas
+    em_andamento = threading.BoundedSemaphore(cards_simultaneos * 4)
+
+    def finalizar(sequencia, chave):
+        contar(chave)
+        if chave != 'falhas':
+            checkpoint.concluir(sequencia)
+        em_andamento.release()
+
+    def gravado(futuro, card, sequencia):
+        try:
+            print(f"Arquivo criado: {futuro.result()}.")
+            finalizar(sequencia, 'gravados')
+        except Exception:
+            print(f"[backup_nists_ff2] Erro ao gravar o card {card['id']}:\n{traceback.format_exc()}")
+            finalizar(sequencia, 'falhas')
+
+    def baixar(card, sequencia):
+        try:
+            faces_bin = baixar_fotos_card(findface, card, executor_fotos)
+            new_nist = monta_nist(card, faces_bin, lista)
+        except Exception:
+            print(f"[backup_nists_ff2] Erro ao baixar ou montar o card {card['id']}:\n{traceback.format_exc()}")
+            finalizar(sequencia, 'falhas')
+            return
+        futuro = gravador.gravar(new_nist, obter_caminho_arquivo_nist(card=card, nome_lista=lista))
+        futuro.add_done_callback(lambda futuro: gravado(futuro, card, sequencia))
+
+    try:
+        for cards in paginas_com_prefetch(paginas_cards(findface, id_lista, checkpoint.data, limite), prefetch):
+            for card in cards:
+                metricas['cards'] += 1
+                sequencia = checkpoint.registrar(card["created_date"])
+                em_andamento.acquire()
+
+                if os.path.exists(obter_caminho_arquivo_nist(card=card, nome_lista=lista)):
+                    finalizar(sequencia, 'existentes')
+                    continue
+
+                executor_cards.submit(baixar, card, sequencia)
+    finally:
+        # A ordem importa: os cards ainda enfileiram fotos e gravações
+        executor_cards.shutdown(wait=True)
+        executor_fotos.shutdown(wait=True)
+        gravador.encerrar()
+        checkpoint.gravar()
+
+    metricas['segundos'] = round(time.monotonic() - inicio, 1)
+    taxa = metricas['cards'] / metricas['segundos'] if metricas['segundos'] else 0
+    print(f"[backup_nists_ff2] {lista}: {metricas['cards']} cards ({metricas['gravados']} gravados, "
+          f"{metricas['existentes']} já existentes, {metricas['falhas']} falhas) em {metricas['segundos']}s "
+          f"({taxa:.1f} cards/s). Checkpoint: {checkpoint.data}.")
+    return dict(metricas)
 
-                id_lista = findface.get_watch_list_id_by_name(lista)
 
-                cards = findface.get_human_cards(watch_lists=[id_lista], created_date_gt=data_criacao, has_face_objects=True, ordering='created_date', limit=100)
+if __name__ == '__main__':
 
-                if cards["results"]:
-                    # Atualiza da data de criação do último card lido
-                    data_criacao = cards["results"][-1]["created_date"]
+    parser = argparse.ArgumentParser(description="Backup em NIST dos cards das listas do FindFace.")
+    parser.add_argument('listas', nargs='*', default=["PF/GCAP-RR"])
+    parser.add_argument('--cards-simultaneos', type=int, default=16)
+    parser.add_argument('--fotos-simultaneas', type=int, default=32)
+    parser.add_argument('--gravadores', type=int, default=4)
+    parser.add_argument('--prefetch', type=int, default=2, help="Páginas de cards lidas antecipadamente.")
+    args = parser.parse_args()
 
-                    # Execução em paralelo para todos os cards
-                    with ThreadPoolExecutor() as executor:
-                        # Submete todas as tarefas de uma vez
-                        futures = [executor.submit(backup_card, findface, card, lista) for card in cards["results"]]
-                        
-                        # Aguarda a conclusão de todas as tarefas
-                        for future in futures:
-                            future.result()  # Bloqueia até que cada tarefa seja concluída
+    with FindfaceConnection(base_url=FINDFACE_URL, username=FINDFACE_USER, password=FINDFACE_PASSWORD, uuid="backup_nist_ff2.py") as ffcon:
+        findface = FindfaceMulti(findface_connection=ffcon)
 
-                    # Após a conclusão de todas as tarefas, escreve no arquivo
-                    with open(arquivo_conf_lista, 'w') as wf:
-                        wf.write(data_criacao)
-                else:
-                    break
+        for lista in args.listas:
+            backup_lista(findface, lista, args.cards_simultaneos, args.fotos_simultaneas, args.gravadores, args.prefetch)
@@ -1,16 +1,42 @@
 import os
+import threading
+import time
 import requests
 import yaml
+from collections import Counter
 from typing import Dict, Any
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from NIST import NIST
 from NIST3.functions_mitra_toolkit import formata_data_nascimento, formata_documento, formata_nome, formata_sexo
 import mylogger
+from nist_builder import NistBuilder, GravadorNist
 
 # Logger
 logger = mylogger.configurar_logger('canaime.log')
 
+# IDs em andamento simultaneamente por base (sobrescrito por JANELA no config.yaml)
+JANELA_PADRAO = 8
+# Tentativas por ID antes de desistir (sobrescrito por TENTATIVAS no config.yaml)
+TENTATIVAS_PADRAO = 3
+
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+def obter_sessao() -> requests.Session:
+    # Sessão compartilhada por todas as bases, com pool de conexões keep-alive
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=64)
+            sessao.mount('http://', adaptador)
+            sessao.mount('https://', adaptador)
+            _sessao = sessao
+        return _sessao
+
 
 def ler_configuracao_yaml(caminho_arquivo: str) -> Dict[str, Any]:
     if not isinstance(caminho_arquivo, str):
@@ -54,50 +80,118 @@ def fazer_requisicao(token: str, usuario: str, senha: str, pagina: int, id: int)
     url = 'http://canaime.com.br/mitrarr/index.php'
     data = {'token': token, 'usuario': usuario, 'senha': senha, 'pagina': pagina, 'id': id}
 
-    response = requests.post(url, data=data)
+    response = obter_sessao().post(url, data=data, timeout=60)
     response.raise_for_status()
     return response.json()
 
 
 def download_imagem(url_foto: str) -> bytes:
-    response = requests.get(url_foto)
+    response = obter_sessao().get(url_foto, timeout=60)
     response.raise_for_status()
     return response.content
 
 
-def gera_nist_canaime(dados_pessoa: dict, foto: bytes, base_nome: str, caminho_destino: str) -> None:
-    new_nist = NIST()
-    new_nist.add_Type01()
-    new_nist.add_Type02()
-
-    nome = formata_nome(dados_pessoa.get('nome'))
-    nascimento = formata_data_nascimento(dados_pessoa.get('dn'), r'%Y%m%d')
-    mae = formata_nome(dados_pessoa.get('mae'))
-    pai = formata_nome(dados_pessoa.get('pai'))
-    cidade_nascimento = formata_nome(dados_pessoa.get('cidade_nasc'))
-    pais_nascimento = formata_nome(dados_pessoa.get('pais_nasc'))
-    cpf = formata_documento(dados_pessoa.get('cpf'))
-    documento = formata_documento(dados_pessoa.get('rg'))
-    sexo = formata_sexo(dados_pessoa.get('sexo'))
+def formata_nascimento_canaime(valor):
+    return formata_data_nascimento(valor, r'%Y%m%d')
 
+
+# Campos do NIST do Canaimé, normalizados pelo NistBuilder
+BUILDER_CANAIME = NistBuilder(
+    campos=[
+        ('2.030', 'nome', formata_nome),
+        ('2.035', 'dn', formata_nascimento_canaime),
+        ('2.037', 'cidade_nasc', formata_nome),
+        ('2.038', 'pais_nasc', formata_nome),
+        ('2.039', 'sexo', formata_sexo),
+        ('2.201', 'pai', formata_nome),
+        ('2.202', 'mae', formata_nome),
+        ('2.211', 'rg', formata_documento),
+        ('2.212', 'cpf', formata_documento),
+    ],
+    face='foto',
+)
+
+
+def gera_nist_canaime(dados_pessoa: dict, foto: bytes, base_nome: str, caminho_destino: str) -> None:
+    new_nist = BUILDER_CANAIME.construir_um({**dados_pessoa, 'foto': foto})
     new_nist.set_field('1.008', base_nome, idc=0)
-    new_nist.set_field('2.030', nome, idc=0)
-    new_nist.set_field('2.035', nascimento, idc=0)
-    new_nist.set_field('2.037', cidade_nascimento, idc=0)
-    new_nist.set_field('2.038', pais_nascimento, idc=0)
-    new_nist.set_field('2.039', sexo, idc=0)
-    new_nist.set_field('2.201', pai, idc=0)
-    new_nist.set_field('2.202', mae, idc=0)
-    new_nist.set_field('2.211', documento)
-    new_nist.set_field('2.212', cpf, idc=0)
-
-    new_nist.add_ntype(10)
-    new_nist.set_field('10.999', foto, idc=1)
-    new_nist.write(caminho_destino)
-
-
-def processar_pagina(token: str, usuario: str, senha: str, base_nome: str, pagina: int) -> None:
+    GravadorNist.gravar_agora(new_nist, caminho_destino)
+
+
+class MarcaDagua:
+    """
+    Último ID contínuo concluído de uma base.
+
+    Os IDs terminam fora de ordem; o arquivo de controle só avança até o maior ID abaixo do qual
+    todos já foram concluídos. Assim uma interrupção nunca pula IDs que ainda estavam em andamento.
+    """
+
+    def __init__(self, base_nome: str, ultimo_id: int):
+        self.base_nome = base_nome
+        self.ultimo_id = ultimo_id
+        self._concluidos = set()
+        self._lock = threading.Lock()
+
+    def concluir(self, id_concluido: int) -> None:
+        with self._lock:
+            self._concluidos.add(id_concluido)
+            avancou = False
+            while self.ultimo_id + 1 in self._concluidos:
+                self.ultimo_id += 1
+                self._concluidos.remove(self.ultimo_id)
+                avancou = True
+            if avancou:
+                salvar_ultimo_id(self.base_nome, self.ultimo_id)
+
+
+def processar_id(token: str, usuario: str, senha: str, base_nome: str, pagina: int, id_atual: int) -> str:
+    """
+    Baixa um ID da base e grava o NIST.
+
+    Retorna:
+    - 'salvo', 'sem_dados' ou 'sem_foto'. Erros de rede/HTTP são propagados para nova tentativa.
+    """
+    resposta = fazer_requisicao(token, usuario, senha, pagina, id_atual)
+
+    if not resposta or not resposta.get('id'):
+        logger.info(f"[Base: {base_nome} | Página: {pagina}] ID {id_atual} não retornou dados válidos, ignorando.")
+        return 'sem_dados'
+
+    url_foto = resposta.get('url_foto')
+    if not url_foto:
+        logger.info(f"[Base: {base_nome} | Página: {pagina}] Nenhuma foto encontrada para o ID {id_atual}.")
+        return 'sem_foto'
+
+    base_convertida = base_para_nome_arquivo(base_nome)
+    id_formatado = str(resposta['id']).zfill(9)
+    nome_arquivo = f"{base_convertida}-{id_formatado}.nst"
+    grupo = id_formatado[-3:]  # três últimos dígitos
+
+    nome_diretorio = os.path.join('downloads', base_convertida, grupo)
+    os.makedirs(nome_diretorio, exist_ok=True)
+
+    caminho_destino = os.path.join(nome_diretorio, nome_arquivo)
+
+    conteudo_foto = download_imagem(url_foto)
+    gera_nist_canaime(dados_pessoa=resposta, foto=conteudo_foto, base_nome=base_nome, caminho_destino=caminho_destino)
+
+    logger.info(f"[Base: {base_nome} | Página: {pagina}] Nist {nome_arquivo} salvo em {nome_diretorio}.")
+    return 'salvo'
+
+
+def processar_pagina(token: str, usuario: str, senha: str, base_nome: str, pagina: int,
+                     janela: int = JANELA_PADRAO, tentativas: int = TENTATIVAS_PADRAO) -> Counter:
+    """
+    Baixa os IDs novos de uma base com até 'janela' IDs em andamento ao mesmo tempo.
+
+    IDs com erro voltam para uma fila de retentativa com espera crescente; após 'tentativas'
+    falhas são registrados no log e considerados concluídos, como no processamento sequencial.
+
+    Retorna:
+    - Counter com a quantidade de IDs por resultado (salvo, sem_dados, sem_foto, erro).
+    """
     logger.info(f"[Base: {base_nome} | Página: {pagina}] Iniciando processamento...")
+    metricas = Counter()
 
     ultimo_id_lido = ler_ultimo_id(base_nome)
     id_atual = ultimo_id_lido + 1
@@ -106,50 +200,55 @@ def processar_pagina(token: str, usuario: str, senha: str, base_nome: str, pagin
         resposta = fazer_requisicao(token, usuario, senha, pagina, id_atual)
     except Exception as e:
         logger.error(f"[Base: {base_nome} | Página: {pagina}] Erro na requisição inicial: {e}")
-        return
+        return metricas
 
     if not resposta or 'ultimo_id' not in resposta:
         logger.info(f"[Base: {base_nome} | Página: {pagina}] Nenhum dado encontrado.")
-        return
+        return metricas
 
     ultimo_id = int(resposta.get('ultimo_id', id_atual))
-
-    while id_atual <= ultimo_id:
-        try:
-            resposta = fazer_requisicao(token, usuario, senha, pagina, id_atual)
-
-            if not resposta or not resposta.get('id'):
-                logger.info(f"[Base: {base_nome} | Página: {pagina}] ID {id_atual} não retornou dados válidos, ignorando.")
+    marca = MarcaDagua(base_nome, ultimo_id_lido)
+    retentativas = []  # (horario, id, tentativa)
+    em_andamento = {}
+    inicio = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=janela) as executor:
+        while id_atual <= ultimo_id or retentativas or em_andamento:
+            # Preenche a janela: primeiro as retentativas vencidas, depois os IDs novos
+            agora = time.monotonic()
+            retentativas.sort()
+            while len(em_andamento) < janela and retentativas and retentativas[0][0] <= agora:
+                _, id_retentativa, tentativa = retentativas.pop(0)
+                futuro = executor.submit(processar_id, token, usuario, senha, base_nome, pagina, id_retentativa)
+                em_andamento[futuro] = (id_retentativa, tentativa)
+            while len(em_andamento) < janela and id_atual <= ultimo_id:
+                futuro = executor.submit(processar_id, token, usuario, senha, base_nome, pagina, id_atual)
+                em_andamento[futuro] = (id_atual, 1)
                 id_atual += 1
-                continue
-
-            url_foto = resposta.get('url_foto')
-            if url_foto:
-                base_convertida = base_para_nome_arquivo(base_nome)
-                id_formatado = str(resposta['id']).zfill(9)
-                nome_arquivo = f"{base_convertida}-{id_formatado}.nst"
-                grupo = id_formatado[-3:]  # três últimos dígitos
 
-                nome_diretorio = os.path.join('downloads', base_convertida, grupo)
-                os.makedirs(nome_diretorio, exist_ok=True)
-
-                caminho_destino = os.path.join(nome_diretorio, nome_arquivo)
-
-                conteudo_foto = download_imagem(url_foto)
-                gera_nist_canaime(dados_pessoa=resposta, foto=conteudo_foto, base_nome=base_nome, caminho_destino=caminho_destino)
-
-                logger.info(f"[Base: {base_nome} | Página: {pagina}] Nist {nome_arquivo} salvo em {nome_diretorio}.")
-                salvar_ultimo_id(base_nome, int(resposta['id']))
-            else:
-                logger.info(f"[Base: {base_nome} | Página: {pagina}] Nenhuma foto encontrada para o ID {id_atual}.")
-        except requests.HTTPError as e:
-            logger.error(f"[Base: {base_nome} | Página: {pagina}] Erro HTTP ao processar ID {id_atual}: {e}")
-        except Exception as e:
-            logger.error(f"[Base: {base_nome} | Página: {pagina}] Erro ao processar ID {id_atual}: {e}")
-
-        id_atual += 1
+            if not em_andamento:
+                time.sleep(max(0, retentativas[0][0] - time.monotonic()))
+                continue
 
-    logger.info(f"[Base: {base_nome} | Página: {pagina}] Processamento concluído.")
+            concluidos, _ = wait(em_andamento, timeout=1, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                id_concluido, tentativa = em_andamento.pop(futuro)
+                try:
+                    metricas[futuro.result()] += 1
+                except Exception as e:
+                    if tentativa < tentativas:
+                        logger.warning(f"[Base: {base_nome} | Página: {pagina}] Erro no ID {id_concluido} (tentativa {tentativa}): {e}")
+                        retentativas.append((time.monotonic() + 2 ** tentativa, id_concluido, tentativa + 1))
+                        continue
+                    logger.error(f"[Base: {base_nome} | Página: {pagina}] Erro ao processar ID {id_concluido}: {e}")
+                    metricas['erro'] += 1
+                marca.concluir(id_concluido)
+
+    segundos = time.monotonic() - inicio
+    total = sum(metricas.values())
+    logger.info(f"[Base: {base_nome} | Página: {pagina}] Processamento concluído: {total} IDs em {segundos:.1f}s "
+                f"({total / segundos if segundos else 0:.2f} IDs/s) {dict(metricas)}. Último ID: {marca.ultimo_id}.")
+    return metricas
 
 
 def main() -> None:
@@ -165,6 +264,8 @@ def main() -> None:
 
     config = ler_configuracao_yaml('config.yaml')
     bases = config.get('BASES', {})
+    janela = int(config.get('JANELA', JANELA_PADRAO))
+    tentativas = int(config.get('TENTATIVAS', TENTATIVAS_PADRAO))
 
     if not bases:
         logger.error("Nenhuma base encontrada no arquivo de configuração.")
@@ -172,7 +273,7 @@ def main() -> None:
 
     with ThreadPoolExecutor() as executor:
         futures = [
-            executor.submit(processar_pagina, token, usuario, senha, base_nome, pagina)
+            executor.submit(processar_pagina, token, usuario, senha, base_nome, pagina, janela, tentativas)
             for base_nome, pagina in bases.items()
         ]
 
@@ -0,0 +1,329 @@
+"""
+Montagem de NISTs em lote, compartilhada pelos downloaders.
+
+Em vez de cada downloader repetir dezenas de set_field e chamar os formatadores registro a
+registro, o NistBuilder recebe a especificação dos campos uma vez e monta um lote inteiro:
+
+- Os campos texto são normalizados coluna a coluna: cada formatador roda uma única vez por valor
+  distinto do lote, com cache LRU entre lotes (nomes de cidades, mães, datas etc. se repetem muito).
+- As faces (tipo 10) e digitais (tipo 4) são adicionadas a partir de colunas de bytes.
+- Com um transcodificador (ex.: o TranscodificadorImagens do nist_downloader), as faces do lote são
+  convertidas para JPEG e as digitais para WSQ em uma única chamada, fora da thread que monta os NISTs.
+  Registros com alguma imagem que não pôde ser convertida são descartados (None na posição do lote), a
+  menos que o builder mantenha os originais (manter_originais). Imagens ausentes (None ou vazias, ex.: dedo
+  não coletado) não rejeitam o registro: só ficam fora do NIST.
+- O GravadorNist grava os NISTs em um pool de threads: arquivo temporário, fsync e rename, de modo
+  que um arquivo com o nome final está sempre completo.
+
+O lote pode ser uma lista de dicts ou um dict de colunas ({coluna: [valores]}, ou qualquer objeto com
+to_pydict(), como uma tabela Arrow).
+
+Uso:
+    builder = NistBuilder(
+        campos=[('2.030', 'nome', formata_nome), ('2.212', 'cpf', validate_cpf)],
+        fixos={'1.008': 'RR/DETRAN'},
+        face='face',
+    )
+    for nist, caminho in zip(builder.construir(pessoas), caminhos):
+        if nist is not None:
+            GRAVADOR.gravar(nist, caminho)
+
+Cada deployable (nist_downloader, canaime, backup-nist-from-ff) tem uma cópia deste módulo; os
+formatadores são sempre injetados por quem usa, então as cópias devem permanecer iguais.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from NIST import NIST
+
+
+TAMANHO_CACHE_PADRAO = 65536
+
+
+def memoizar(formatador, tamanho_cache: int = TAMANHO_CACHE_PADRAO):
+    """
+    Envolve o formatador com um cache LRU. Valores não hasheáveis são formatados sem cache.
+    """
+    if formatador is None:
+        return lambda valor: valor
+
+    em_cache = lru_cache(maxsize=tamanho_cache)(formatador)
+
+    def formatar(valor):
+        try:
+            return em_cache(valor)
+        except TypeError:
+            if getattr(valor, '__hash__', None) is None:
+                return formatador(valor)
+            raise
+
+    formatar.cache_info = em_cache.cache_info
+    return formatar
+
+
+def colunas(lote) -> tuple[dict, int]:
+    """
+    Converte o lote para {coluna: [valores]} e retorna também a quantidade de registros.
+    """
+    if hasattr(lote, 'to_pydict'):
+        lote = lote.to_pydict()
+
+    if isinstance(lote, dict):
+        tamanhos = {len(valores) for valores in lote.values()}
+        if len(tamanhos) > 1:
+            raise ValueError(f"Colunas com tamanhos diferentes: {sorted(tamanhos)}")
+        return {coluna: list(valores) for coluna, valores in lote.items()}, (tamanhos.pop() if tamanhos else 0)
+
+    registros = list(lote)
+    nomes = {}
+    for registro in registros:
+        for coluna in registro:
+            nomes.setdefault(coluna, None)
+    return {coluna: [registro.get(coluna) for registro in registros] for coluna in nomes}, len(registros)
+
+
+class NistBuilder:
+    """
+    Monta NISTs (tipos 1, 2, 4 e 10) a partir de lotes de registros de pessoas.
+    """
+
+    def __init__(self, campos: list, fixos: dict | None = None, face: str | None = None, digitais: str | None = None,
+                 campos_digital: dict | None = None, tamanho_cache: int = TAMANHO_CACHE_PADRAO, transcodificador=None,
+                 manter_originais: bool = False):
+        """
+        Argumentos:
+        - campos (list): Tuplas (tag, coluna) ou (tag, coluna, formatador) dos campos texto, na ordem de gravação.
+        - fixos (dict, opcional): {tag: valor} gravados igualmente em todos os NISTs (ex.: '1.008').
+        - face (str, opcional): Coluna com os bytes da face, ou lista de faces (IDC 1, 2, ...). Vazia = sem tipo 10.
+        - digitais (str, opcional): Coluna com a lista das digitais WSQ na ordem dos IDC 1 a 10.
+        - campos_digital (dict, opcional): {tag: valor} fixos de cada registro tipo 4 (ex.: '4.006': 800).
+        - tamanho_cache (int): Tamanho do cache LRU de cada formatador.
+        - transcodificador (opcional): Objeto com para_jpeg(itens) e para_wsq(itens), que recebem [(id, bytes)]
+          e retornam {id: bytes|None}. Sem ele, faces e digitais são gravadas como recebidas.
+        - manter_originais (bool): Grava a imagem como recebida quando a conversão falha, em vez de descartar o
+          registro. Para bases cujos NISTs sempre foram gravados com as imagens originais (DETRAN, IDNet civil).
+        """
+        self.fixos = dict(fixos or {})
+        self.face = face
+        self.digitais = digitais
+        self.campos_digital = dict(campos_digital or {})
+        self.transcodificador = transcodificador
+        self.manter_originais = manter_originais
+
+        # Formatadores iguais (ex.: formata_nome para nome, pai e mãe) compartilham o mesmo cache
+        caches = {}
+        self.campos = []
+        for campo in campos:
+            tag, coluna, formatador = (tuple(campo) + (None,))[:3]
+            if formatador not in caches:
+                caches[formatador] = memoizar(formatador, tamanho_cache)
+            self.campos.append((tag, coluna, caches[formatador]))
+
+    def normalizar(self, lote) -> tuple[dict, int]:
+        """
+        Aplica os formatadores coluna a coluna e retorna ({tag: [valores]}, quantidade de registros).
+        """
+        dados, quantidade = colunas(lote)
+        normalizados = {}
+        for tag, coluna, formatar in self.campos:
+            valores = dados.get(coluna, [None] * quantidade)
+            # Uma chamada por valor distinto do lote
+            distintos = {}
+            resultado = []
+            for valor in valores:
+                try:
+                    resultado.append(distintos[valor])
+                except KeyError:
+                    distintos[valor] = formatar(valor)
+                    resultado.append(distintos[valor])
+                except TypeError:
+                    resultado.append(formatar(valor))
+            normalizados[tag] = resultado
+        return normalizados, quantidade
+
+    def transcodificar(self, faces: list, digitais: list) -> tuple[list, list, set]:
+        """
+        Converte as faces (JPEG) e digitais (WSQ) do lote inteiro com o transcodificador.
+
+        Imagens ausentes (None ou vazias) continuam None na mesma posição; não são convertidas nem rejeitam
+        o registro.
+
+        Retorna:
+        - tuple: (faces, digitais, rejeitados), em que rejeitados tem as posições dos registros com alguma
+          imagem presente que não pôde ser convertida. Esses registros não devem virar NIST: a imagem original
+          não seria aceita como face/digital. Com manter_originais, a imagem original é mantida e nenhum
+          registro é rejeitado.
+        """
+        rejeitados = set()
+
+        def lote(imagens):
+            itens = []
+            for i, imagens_registro in enumerate(imagens):
+                if isinstance(imagens_registro, (bytes, bytearray, memoryview)):
+                    imagens_registro = [imagens_registro]
+                for j, imagem in enumerate(imagens_registro or []):
+                    if imagem:
+                        itens.append(((i, j), imagem))
+            return itens
+
+        def substituir(imagens, convertidas):
+            resultado = []
+            for i, imagens_registro in enumerate(imagens):
+                if isinstance(imagens_registro, (bytes, bytearray, memoryview)):
+                    imagens_registro = [imagens_registro]
+                if imagens_registro:
+                    substituidas = []
+                    for j, imagem in enumerate(imagens_registro):
+                        convertida = convertidas.get((i, j)) if imagem else None
+                        if imagem and not convertida:
+                            if self.manter_originais:
+                                convertida = imagem
+                            else:
+                                rejeitados.add(i)
+                        substituidas.append(convertida)
+                    imagens_registro = substituidas
+                resultado.append(imagens_registro)
+            return resultado
+
+        faces = substituir(faces, self.transcodificador.para_jpeg(lote(faces)))
+        digitais = substituir(digitais, self.transcodificador.para_wsq(lote(digitais)))
+        return faces, digitais, rejeitados
+
+    def construir(self, lote) -> list:
+        """
+        Retorna a lista de objetos NIST do lote, na ordem dos registros. Registros descartados na
+        transcodificação ficam como None.
+        """
+        dados, _ = colunas(lote)
+        normalizados, quantidade = self.normalizar(dados)
+        faces = dados.get(self.face, [None] * quantidade) if self.face else [None] * quantidade
+        digitais = dados.get(self.digitais, [None] * quantidade) if self.digitais else [None] * quantidade
+        rejeitados = set()
+        if self.transcodificador is not None:
+            faces, digitais, rejeitados = self.transcodificar(faces, digitais)
+
+        nists = []
+        for i in range(quantidade):
+            if i in rejeitados:
+                nists.append(None)
+                continue
+
+            new_nist = NIST()
+            new_nist.add_Type01()
+            new_nist.add_Type02()
+
+            for tag, valor in self.fixos.items():
+                new_nist.set_field(tag, valor, idc=0)
+            for tag, valores in normalizados.items():
+                new_nist.set_field(tag, valores[i], idc=0)
+
+            # Faces
+            faces_registro = faces[i]
+            if isinstance(faces_registro, (bytes, bytearray, memoryview)):
+                faces_registro = [faces_registro]
+            faces_registro = [face for face in faces_registro or [] if face]
+            if faces_registro:
+                new_nist.add_ntype(10)
+                for idc, face in enumerate(faces_registro, start=1):
+                    new_nist.add_idc(10, idc)
+                    new_nist.set_field('10.999', bytes(face), idc=idc)
+
+            # Digitais: o IDC é a posição do dedo (1 a 10); dedos ausentes ficam fora do tipo 4
+            digitais_registro = [(idc, digital) for idc, digital in enumerate(digitais[i] or [], start=1) if digital]
+            if digitais_registro:
+                new_nist.add_ntype(4)
+                for idc, digital in digitais_registro:
+                    new_nist.add_idc(4, idc)
+                    new_nist.set_field('4.001', 4, idc=idc)  # Record Type (TYP) [Mandatory]
+                    new_nist.set_field('4.002', idc, idc=idc)  # Image Designation Character (IDC) [Mandatory]
+                    new_nist.set_field('4.004', idc, idc=idc)  # Finger Position (FGP) [Mandatory]
+                    for tag, valor in self.campos_digital.items():
+                        new_nist.set_field(tag, valor, idc=idc)
+                    new_nist.set_field('4.999', digital, idc=idc)
+
+            nists.append(new_nist)
+
+        return nists
+
+    def construir_bytes(self, lote) -> list:
+        """
+        Retorna o conteúdo binário de cada NIST do lote.
+        """
+        return [new_nist.dumpbin() if new_nist is not None else None for new_nist in self.construir(lote)]
+
+    def construir_um(self, registro: dict):
+        """
+        Atalho para um único registro. Retorna None se a imagem não pôde ser convertida.
+        """
+        return self.construir([registro])[0]
+
+
+class GravadorNist:
+    """
+    Pool de gravação de NISTs em disco (temporário + fsync + rename).
+    """
+
+    def __init__(self, gravadores: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=gravadores, thread_name_prefix='gravador_nist')
+
+    @staticmethod
+    def gravar_agora(conteudo, caminho: str | Path) -> Path:
+        """
+        Grava o NIST (objeto NIST ou bytes) de forma atômica na thread atual.
+        """
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.{threading.get_ident()}.part")
+        try:
+            if isinstance(conteudo, (bytes, bytearray, memoryview)):
+                with open(temporario, 'wb') as f:
+                    f.write(conteudo)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                conteudo.write(str(temporario))
+                with open(temporario, 'rb+') as f:
+                    os.fsync(f.fileno())
+            os.replace(temporario, caminho)
+        except BaseException:
+            temporario.unlink(missing_ok=True)
+            raise
+        return caminho
+
+    def gravar(self, conteudo, caminho: str | Path, ao_concluir=None) -> Future:
+        """
+        Agenda a gravação e retorna o Future com o caminho gravado.
+
+        Argumentos:
+        - conteudo: Objeto NIST ou bytes.
+        - caminho (str | Path): Caminho final do arquivo.
+        - ao_concluir (callable, opcional): Chamado com o caminho após a gravação (ex.: registrar no índice).
+        """
+        def tarefa():
+            gravado = self.gravar_agora(conteudo, caminho)
+            if ao_concluir is not None:
+                ao_concluir(gravado)
+            return gravado
+
+        return self._executor.submit(tarefa)
+
+    def encerrar(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_gravador = None
+_gravador_lock = threading.Lock()
+
+
+def obter_gravador(gravadores: int = 4) -> GravadorNist:
+    """
+    Retorna o pool de gravação compartilhado do processo, criando-o no primeiro uso.
+    """
+    global _gravador
+    with _gravador_lock:
+        if _gravador is None:
+            _gravador = GravadorNist(gravadores)
+        return _gravador
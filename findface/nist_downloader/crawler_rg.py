@@ -0,0 +1,456 @@
+"""
+Varredura retomável de faixas de RG nos web services do IDNet.
+
+- FronteiraRG: estado de cada RG em SQLite (pendente, em_andamento, concluido, ausente, erro, falha),
+  com o horário da próxima tentativa para os RGs com erro. Sobrevive a quedas e reinícios.
+- BitmapRG: conjunto compacto (1 bit por RG) dos RGs já baixados, substituto da lista_rgs_idnet.txt.
+- BaldeDeFichas: limite de requisições por segundo (token bucket).
+- ControleConcorrencia: número de consultas simultâneas ajustado conforme erros e sucessos (AIMD).
+- CrawlerRG: junta as peças acima e executa a função de download para cada RG da faixa.
+"""
+import os
+import sqlite3
+import threading
+import traceback
+from datetime import datetime
+from pathlib import Path
+from time import monotonic, sleep, time
+
+
+PENDENTE = 'pendente'
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+AUSENTE = 'ausente'
+ERRO = 'erro'
+FALHA = 'falha'
+
+APP_DIR = Path(__file__).parent
+# Controle da varredura do IDNet (substitui a lista_rgs_idnet.txt)
+BITMAP_RGS_IDNET = APP_DIR / 'rgs_idnet.bitmap'
+FRONTEIRA_IDNET = APP_DIR / 'fronteira_idnet.sqlite3'
+LISTA_RGS_IDNET_LEGADA = APP_DIR / 'lista_rgs_idnet.txt'
+
+
+class BitmapRG:
+    """
+    Conjunto de RGs em um bitmap persistido em disco (1 milhão de RGs ocupam 125 KB).
+    """
+
+    def __init__(self, caminho: str | Path, lista_legada: str | Path | None = None):
+        """
+        Argumentos:
+        - caminho: Arquivo do bitmap. É criado se não existir.
+        - lista_legada: Arquivo texto com um RG por linha (lista_rgs_idnet.txt). Importado apenas
+          quando o bitmap ainda não existe.
+        """
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._alterado = False
+
+        if self.caminho.exists():
+            self._bits = bytearray(self.caminho.read_bytes())
+        else:
+            self._bits = bytearray()
+            if lista_legada and Path(lista_legada).exists():
+                with open(lista_legada) as f:
+                    for linha in f:
+                        linha = linha.strip()
+                        if linha.isdigit():
+                            self.marcar(int(linha))
+                self.salvar()
+                print(f"[crawler_rg] {len(self)} RGs importados de {lista_legada}.")
+
+    def __contains__(self, rg: int) -> bool:
+        rg = int(rg)
+        indice = rg >> 3
+        return indice < len(self._bits) and bool(self._bits[indice] & (1 << (rg & 7)))
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count('1') for byte in self._bits)
+
+    def __iter__(self):
+        for indice, byte in enumerate(self._bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (indice << 3) + bit
+
+    def marcar(self, rg: int) -> None:
+        rg = int(rg)
+        if rg < 0:
+            raise ValueError("'rg' deve ser um inteiro não negativo.")
+        indice = rg >> 3
+        with self._lock:
+            if indice >= len(self._bits):
+                self._bits.extend(bytes(indice + 1 - len(self._bits)))
+            self._bits[indice] |= 1 << (rg & 7)
+            self._alterado = True
+
+    def maior(self) -> int | None:
+        """
+        Retorna o maior RG marcado ou None se o bitmap estiver vazio.
+        """
+        for indice in range(len(self._bits) - 1, -1, -1):
+            byte = self._bits[indice]
+            if byte:
+                return (indice << 3) + byte.bit_length() - 1
+        return None
+
+    def salvar(self) -> None:
+        """
+        Grava o bitmap de forma atômica (arquivo temporário + rename).
+        """
+        with self._lock:
+            if not self._alterado and self.caminho.exists():
+                return
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = self.caminho.with_suffix(self.caminho.suffix + '.tmp')
+            temporario.write_bytes(bytes(self._bits))
+            os.replace(temporario, self.caminho)
+            self._alterado = False
+
+
+class FronteiraRG:
+    """
+    Estado persistente da varredura, um registro por (tarefa, RG).
+    """
+
+    def __init__(self, caminho_db: str | Path, tarefa: str):
+        self.tarefa = tarefa
+        self._lock = threading.Lock()
+
+        Path(caminho_db).parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(str(caminho_db), check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tb_fronteira_rg (
+                tarefa TEXT NOT NULL,
+                rg INTEGER NOT NULL,
+                estado TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                proxima_tentativa REAL NOT NULL DEFAULT 0,
+                erro TEXT,
+                dt_atualizacao TEXT,
+                PRIMARY KEY (tarefa, rg)
+            )
+            """
+        )
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS ix_fronteira_rg_estado ON tb_fronteira_rg (tarefa, estado, proxima_tentativa)"
+        )
+        self._conexao.commit()
+
+    def adicionar_faixa(self, inicio: int, fim: int) -> None:
+        """
+        Inclui os RGs de inicio a fim (exclusivo) como pendentes. RGs já conhecidos mantêm o estado.
+        """
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO tb_fronteira_rg (tarefa, rg, estado) VALUES (?, ?, ?)",
+                ((self.tarefa, rg, PENDENTE) for rg in range(inicio, fim)),
+            )
+            self._conexao.commit()
+
+    def recuperar(self) -> int:
+        """
+        Devolve à fila os RGs que estavam em andamento quando o processo anterior parou.
+        """
+        with self._lock:
+            cursor = self._conexao.execute(
+                "UPDATE tb_fronteira_rg SET estado = ? WHERE tarefa = ? AND estado = ?",
+                (PENDENTE, self.tarefa, EM_ANDAMENTO),
+            )
+            self._conexao.commit()
+            return cursor.rowcount
+
+    def reservar(self, quantidade: int) -> list[int]:
+        """
+        Marca como em andamento e retorna até 'quantidade' RGs prontos para consulta.
+        """
+        with self._lock:
+            rgs = [row[0] for row in self._conexao.execute(
+                """
+                SELECT rg FROM tb_fronteira_rg
+                WHERE tarefa = ? AND estado IN (?, ?) AND proxima_tentativa <= ?
+                ORDER BY rg LIMIT ?
+                """,
+                (self.tarefa, PENDENTE, ERRO, time(), quantidade),
+            )]
+            self._conexao.executemany(
+                "UPDATE tb_fronteira_rg SET estado = ? WHERE tarefa = ? AND rg = ?",
+                ((EM_ANDAMENTO, self.tarefa, rg) for rg in rgs),
+            )
+            self._conexao.commit()
+            return rgs
+
+    def proxima_retentativa(self) -> float | None:
+        """
+        Retorna o horário (epoch) da próxima retentativa agendada ou None se não houver.
+        """
+        with self._lock:
+            return self._conexao.execute(
+                "SELECT min(proxima_tentativa) FROM tb_fronteira_rg WHERE tarefa = ? AND estado IN (?, ?)",
+                (self.tarefa, PENDENTE, ERRO),
+            ).fetchone()[0]
+
+    def registrar(self, resultados: list[tuple]) -> None:
+        """
+        Grava em lote os resultados [(rg, estado, tentativas, proxima_tentativa, erro)].
+        """
+        agora = datetime.now().isoformat()
+        with self._lock:
+            self._conexao.executemany(
+                """
+                UPDATE tb_fronteira_rg
+                SET estado = ?, tentativas = ?, proxima_tentativa = ?, erro = ?, dt_atualizacao = ?
+                WHERE tarefa = ? AND rg = ?
+                """,
+                ((estado, tentativas, proxima, erro, agora, self.tarefa, rg) for rg, estado, tentativas, proxima, erro in resultados),
+            )
+            self._conexao.commit()
+
+    def tentativas(self, rg: int) -> int:
+        with self._lock:
+            row = self._conexao.execute(
+                "SELECT tentativas FROM tb_fronteira_rg WHERE tarefa = ? AND rg = ?", (self.tarefa, rg)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def contagem(self) -> dict:
+        with self._lock:
+            return dict(self._conexao.execute(
+                "SELECT estado, count(*) FROM tb_fronteira_rg WHERE tarefa = ? GROUP BY estado", (self.tarefa,)
+            ).fetchall())
+
+    def maior_concluido(self, inicio: int) -> int | None:
+        with self._lock:
+            return self._conexao.execute(
+                "SELECT max(rg) FROM tb_fronteira_rg WHERE tarefa = ? AND rg >= ? AND estado = ?",
+                (self.tarefa, inicio, CONCLUIDO),
+            ).fetchone()[0]
+
+
+class BaldeDeFichas:
+    """
+    Token bucket: libera no máximo 'taxa' requisições por segundo, com rajadas de até 'capacidade'.
+    """
+
+    def __init__(self, taxa: float, capacidade: int | None = None):
+        if taxa <= 0:
+            raise ValueError("'taxa' deve ser maior que zero.")
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, int(taxa))
+        self._fichas = float(self.capacidade)
+        self._ultimo = monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self) -> None:
+        """
+        Bloqueia até haver uma ficha disponível.
+        """
+        while True:
+            with self._lock:
+                agora = monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            sleep(espera)
+
+
+class ControleConcorrencia:
+    """
+    Limite de consultas simultâneas com aumento aditivo e redução multiplicativa (AIMD).
+
+    A cada 'janela' sucessos seguidos o limite sobe 1; a cada erro cai pela metade. Assim a varredura
+    acompanha a capacidade do serviço em vez de insistir com muitas conexões quando ele degrada.
+    """
+
+    def __init__(self, minimo: int = 1, maximo: int = 16, inicial: int | None = None, janela: int = 20):
+        if minimo < 1 or maximo < minimo:
+            raise ValueError("Informe 1 <= minimo <= maximo.")
+        self.minimo = minimo
+        self.maximo = maximo
+        self.janela = janela
+        self.limite = inicial or minimo
+        self._em_uso = 0
+        self._sucessos = 0
+        self._condicao = threading.Condition()
+
+    def __enter__(self):
+        with self._condicao:
+            while self._em_uso >= self.limite:
+                self._condicao.wait()
+            self._em_uso += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condicao:
+            self._em_uso -= 1
+            self._condicao.notify_all()
+
+    def sucesso(self) -> None:
+        with self._condicao:
+            self._sucessos += 1
+            if self._sucessos >= self.janela and self.limite < self.maximo:
+                self.limite += 1
+                self._sucessos = 0
+                self._condicao.notify_all()
+
+    def erro(self) -> None:
+        with self._condicao:
+            self._sucessos = 0
+            self.limite = max(self.minimo, self.limite // 2)
+
+
+class CrawlerRG:
+    """
+    Executa 'funcao(rg)' para cada RG de uma faixa, com checkpoint contínuo na fronteira.
+
+    Resultado da função:
+    - valor verdadeiro: RG concluído (marcado no bitmap, se houver).
+    - None/falso: RG inexistente ou sem biometria (ausente).
+    - exceção: erro; nova tentativa após espera exponencial, até 'max_tentativas'.
+    """
+
+    def __init__(self, funcao, fronteira: FronteiraRG, bitmap: BitmapRG | None = None, taxa: float = 10,
+                 concorrencia_min: int = 1, concorrencia_max: int = 16, max_tentativas: int = 5,
+                 espera_retentativa: float = 30, lote_gravacao: int = 100):
+        self.funcao = funcao
+        self.fronteira = fronteira
+        self.bitmap = bitmap
+        self.balde = BaldeDeFichas(taxa)
+        self.concorrencia = ControleConcorrencia(concorrencia_min, concorrencia_max)
+        self.max_tentativas = max_tentativas
+        self.espera_retentativa = espera_retentativa
+        self.lote_gravacao = lote_gravacao
+
+        self._fila = []
+        self._resultados = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._processados = 0
+
+    def _proximo_rg(self) -> int | None:
+        with self._lock:
+            if not self._fila:
+                self._fila = self.fronteira.reservar(max(self.lote_gravacao, self.concorrencia.maximo * 4))
+            return self._fila.pop(0) if self._fila else None
+
+    def _registrar(self, resultado: tuple, forcar: bool = False) -> None:
+        with self._lock:
+            if resultado:
+                self._resultados.append(resultado)
+                self._processados += 1
+            if self._resultados and (forcar or len(self._resultados) >= self.lote_gravacao):
+                resultados, self._resultados = self._resultados, []
+                # O bitmap é gravado antes da fronteira: RG concluído nunca fica fora do bitmap
+                if self.bitmap is not None:
+                    self.bitmap.salvar()
+                self.fronteira.registrar(resultados)
+
+    def _processa(self, rg: int) -> None:
+        self.balde.consumir()
+        with self.concorrencia:
+            try:
+                retorno = self.funcao(rg)
+            except Exception:
+                self.concorrencia.erro()
+                tentativas = self.fronteira.tentativas(rg) + 1
+                estado = FALHA if tentativas >= self.max_tentativas else ERRO
+                proxima = time() + self.espera_retentativa * 2 ** (tentativas - 1)
+                self._registrar((rg, estado, tentativas, proxima, traceback.format_exc(limit=3)))
+                print(f"[crawler_rg] Erro no RG {rg} (tentativa {tentativas}/{self.max_tentativas}).")
+                return
+
+        self.concorrencia.sucesso()
+        if retorno:
+            if self.bitmap is not None:
+                self.bitmap.marcar(rg)
+            self._registrar((rg, CONCLUIDO, 0, 0, None))
+        else:
+            self._registrar((rg, AUSENTE, 0, 0, None))
+
+    def _worker(self) -> None:
+        while not self._parar.is_set():
+            rg = self._proximo_rg()
+            if rg is None:
+                return
+            self._processa(rg)
+
+    def executar(self, inicio: int, fim: int, intervalo_progresso: int = 60) -> dict:
+        """
+        Processa os RGs de inicio a fim (exclusivo). RGs já resolvidos em execuções anteriores são ignorados.
+
+        Retorna:
+        - dict com a contagem de RGs por estado ao final.
+        """
+        self.fronteira.adicionar_faixa(inicio, fim)
+        recuperados = self.fronteira.recuperar()
+        if recuperados:
+            print(f"[crawler_rg] {recuperados} RGs interrompidos na execução anterior voltaram para a fila.")
+
+        inicio_execucao = monotonic()
+        ultimo_progresso = inicio_execucao
+        threads = []
+        try:
+            while True:
+                threads = [threading.Thread(target=self._worker, name=f'crawler_rg_{i}') for i in range(self.concorrencia.maximo)]
+                for t in threads:
+                    t.start()
+                while any(t.is_alive() for t in threads):
+                    for t in threads:
+                        t.join(timeout=1)
+                    if monotonic() - ultimo_progresso >= intervalo_progresso:
+                        ultimo_progresso = monotonic()
+                        taxa = self._processados / (ultimo_progresso - inicio_execucao)
+                        print(f"[crawler_rg] {self._processados} RGs processados ({taxa:.1f} RG/s, "
+                              f"concorrência {self.concorrencia.limite}).")
+                self._registrar(None, forcar=True)
+
+                # Restam apenas RGs com retentativa agendada: aguarda o horário e continua
+                proxima = self.fronteira.proxima_retentativa()
+                if proxima is None or self._parar.is_set():
+                    break
+                sleep(max(0, proxima - time()))
+        except KeyboardInterrupt:
+            self._parar.set()
+            print("[crawler_rg] Interrompido. Gravando o estado...")
+            for t in threads:
+                t.join()
+        finally:
+            self._registrar(None, forcar=True)
+
+        contagem = self.fronteira.contagem()
+        print(f"[crawler_rg] Faixa {inicio}-{fim} finalizada: {contagem}")
+        return contagem
+
+    def executar_ate_ausencias(self, inicio: int, ausencias: int = 20, janela: int = 100) -> int | None:
+        """
+        Avança a partir de 'inicio' em janelas de RGs até encontrar 'ausencias' RGs seguidos sem
+        registro após o último concluído. Usado na busca diária de RGs novos.
+
+        Retorna:
+        - Maior RG concluído na varredura ou None.
+        """
+        janela = max(janela, ausencias)
+        primeiro = inicio
+        while not self._parar.is_set():
+            fim = inicio + janela
+            self.executar(inicio, fim)
+            maior = self.fronteira.maior_concluido(inicio)
+            if maior is None or fim - 1 - maior >= ausencias:
+                break
+            inicio = fim
+        return self.fronteira.maior_concluido(primeiro)
+
+
+def obter_bitmap_idnet() -> BitmapRG:
+    """
+    Bitmap dos RGs já baixados do IDNet. Na primeira execução importa a lista_rgs_idnet.txt.
+    """
+    return BitmapRG(BITMAP_RGS_IDNET, lista_legada=LISTA_RGS_IDNET_LEGADA)
@@ -1,6 +1,9 @@
 import requests
+import threading
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from functions import *
 
 
@@ -9,6 +12,13 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 BASE_URL = "https://uci-dados-api.searchtecnologia.com.br"
 
+# Conexões simultâneas com a API do DETRAN (downloads de biometria de todas as pessoas em andamento)
+MAX_CONEXOES = 32
+
+_sessao = None
+_sessao_lock = threading.Lock()
+_executor_biometria = ThreadPoolExecutor(max_workers=MAX_CONEXOES, thread_name_prefix='detranrr_biometria')
+
 
 def obter_certificados():
     base_dir = Path(__file__).parent
@@ -22,16 +32,32 @@ def obter_certificados():
     return certificado_digital, chave_privada
 
 
-def busca_por_cpf(cpf: str) -> dict:
+def obter_sessao() -> requests.Session:
+    """
+    Sessão HTTP compartilhada, com o certificado mTLS carregado uma única vez e pool de conexões
+    keep-alive. Evita um novo handshake TLS a cada requisição.
+    """
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            certificado_digital, chave_privada = obter_certificados()
+            sessao = requests.Session()
+            sessao.cert = (str(certificado_digital), str(chave_privada))
+            sessao.verify = False
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONEXOES, max_retries=3)
+            sessao.mount('https://', adaptador)
+            _sessao = sessao
+        return _sessao
 
-    certificado_digital, chave_privada = obter_certificados()
+
+def busca_por_cpf(cpf: str) -> dict:
 
     cpf = validate_cpf(cpf)
     if not cpf:
         raise Exception("CPF inválido.")
 
     cpf_info_url = f"{BASE_URL}/biometria/cpf/{cpf}"
-    response = requests.get(cpf_info_url, cert=(str(certificado_digital), str(chave_privada)), verify=False)
+    response = obter_sessao().get(cpf_info_url)
 
     if 200 <= response.status_code < 300:
         if response.json()['dados'][0] is None:
@@ -41,12 +67,11 @@ def busca_por_cpf(cpf: str) -> dict:
 
 
 def busca_por_data(data_pesquisa: str) -> list:
-    certificado_digital, chave_privada = obter_certificados()    
 
     data_pesquisa = formata_data_nascimento(data_pesquisa)
     
     biometria_download_base_url = f"{BASE_URL}/biometria/data/{data_pesquisa}"
-    response = requests.get(biometria_download_base_url, cert=(str(certificado_digital), str(chave_privada)), verify=False)
+    response = obter_sessao().get(biometria_download_base_url)
 
     if 200 <= response.status_code < 300:
         if 'dados' not in response.json():
@@ -56,12 +81,25 @@ def busca_por_data(data_pesquisa: str) -> list:
 
 
 def obter_arquivo_biometria(id_biometria: str) -> bytes:
-    certificado_digital, chave_privada = obter_certificados()
-    
+
     biometria_download_base_url = f"{BASE_URL}/biometria/arquivo/{id_biometria}"
-    response = requests.get(biometria_download_base_url, cert=(str(certificado_digital), str(chave_privada)), verify=False)
+    response = obter_sessao().get(biometria_download_base_url)
 
     if 200 <= response.status_code < 300:
         return response.content
     else:
         return None
+
+
+def obter_arquivos_biometria(ids_biometria: dict) -> dict:
+    """
+    Baixa em paralelo os arquivos de biometria de uma pessoa.
+
+    Argumentos:
+    - ids_biometria (dict): {nome: id_biometria}, ex.: {'face': '...', 'dedo_polegar_direito': '...'}.
+
+    Retorna:
+    - dict: {nome: bytes|None}, na mesma ordem de ids_biometria.
+    """
+    futuros = {nome: _executor_biometria.submit(obter_arquivo_biometria, id_biometria) for nome, id_biometria in ids_biometria.items()}
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
@@ -1,39 +1,44 @@
-from detranrr.wsdetranrr import busca_por_cpf, busca_por_data, obter_arquivo_biometria
+from detranrr.wsdetranrr import busca_por_cpf, busca_por_data, obter_arquivo_biometria, obter_arquivos_biometria
 from NIST import NIST
 from functions import *
 from pathlib import Path
 from datetime import datetime
 from threader import Threader
+from indice_arquivos import obter_indice
+from nist_builder import NistBuilder, GravadorNist
+from transcodificador import obter_transcodificador
 from concurrent.futures import ThreadPoolExecutor
 import traceback
+import threading
 import os
 import shutil
 import time
 
 
 
-def find_unique_files(directory):
-    unique_files = set()
-    
-    # Walk através de todos os diretórios e subdiretórios
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            # Adiciona cada arquivo ao set, que automaticamente lida com duplicatas
-            unique_files.add(file)
-    
-    # Retorna a lista de arquivos únicos
-    return list(unique_files)
-
-
 APP_DIR = Path(__file__).parent
 DOWNLOAD_DIR = APP_DIR / "nists/rr/detran"
 
-# Lê todo os arquivos do diretório recursivamente, excluindo os duplicados
-ARQUIVOS_EXISTENTES = find_unique_files(DOWNLOAD_DIR)
-
-
-def create_nist_detranrr(pessoa):
 
+# Ordem dos dedos nos registros tipo 4 (IDC 1 a 10)
+DEDOS = [
+    'dedo_polegar_direito',
+    'dedo_indicador_direito',
+    'dedo_medio_direito',
+    'dedo_anelar_direito',
+    'dedo_minimo_direito',
+    'dedo_polegar_esquerdo',
+    'dedo_indicador_esquerdo',
+    'dedo_medio_esquerdo',
+    'dedo_anelar_esquerdo',
+    'dedo_minimo_esquerdo'
+]
+
+
+def caminho_nist_detranrr(pessoa) -> Path | None:
+    """
+    Retorna o caminho do NIST da pessoa ou None se o arquivo foi tratado pelo patch do diretório default.
+    """
     # Extrai a data da coleta da pessoa
     data_coleta = datetime.strptime( pessoa["dt_coleta_biometria"], r"%Y-%m-%d %H:%M:%S" ).strftime(r"%Y-%m-%d")
 
@@ -55,91 +60,175 @@ def create_nist_detranrr(pessoa):
         print(f"[patch] Arquivo movido para o destino {filepath_detino}")
         return
 
+    return filepath
+
+
+def baixar_biometria_detranrr(pessoa) -> dict:
+    """
+    Baixa em paralelo a face e as dez digitais da pessoa.
+    """
+    return obter_arquivos_biometria({nome: pessoa["biometria"][nome] for nome in ['face'] + DEDOS})
+
+
+# Campos do NIST do DETRAN/RR, normalizados em lote pelo NistBuilder
+BUILDER_DETRANRR = NistBuilder(
+    campos=[
+        ('2.030', 'no_nome', formata_nome),  # Nome
+        ('2.035', 'dt_nascimento', formata_data_nascimento),  # Data de nascimento
+        ('2.201', 'no_pai', formata_nome),  # Pai
+        ('2.202', 'no_mae', formata_nome),  # Mae
+        ('2.212', 'nu_cpf', validate_cpf),  # CPF
+    ],
+    fixos={
+        '1.008': 'RR/DETRAN',  # Base de Origem
+        '2.037': None,  # Cidade de nascimento
+        '2.038': None,  # País de nascimento
+        '2.039': None,  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
+        '2.211': None,  # Identidade
+        # '2.213': '',  # Titulo de eleitor
+        # '2.214': '',  # CNH
+        '2.224': None,  # Nome social
+    },
+    face='face',
+    digitais='digitais',
+    campos_digital={
+        '4.003': 1,  # Impression Type (IMP) [Mandatory]
+        '4.005': 1,  # Fingerprint Image Scanning Resolution (FIR) [Mandatory]
+        '4.006': 800,  # Image Horizontal Line Length (HLL) [Mandatory]
+        '4.007': 750,  # Image Vertical Line Length (VLL) [Mandatory]
+        '4.008': 1,  # Image Compression Algorithm (ICA) [Mandatory]
+    },
+    # Face em JPEG e digitais em WSQ, convertidas no pool de processos. Imagem que não converte é gravada
+    # como recebida (como antes do pool): descartar a pessoa a perderia no backfill (dia marcado como concluído)
+    transcodificador=obter_transcodificador(),
+    manter_originais=True,
+)
+
+
+def registro_nist_detranrr(pessoa, biometria) -> dict:
+    """
+    Registro da pessoa no formato esperado pelo BUILDER_DETRANRR.
+    """
+    return {
+        **pessoa,
+        'face': biometria['face'],
+        'digitais': [biometria[dedo] for dedo in DEDOS],
+        # Assinatura (tipo 8) não é gravada
+    }
+
+
+def _grava_nist_detranrr(pessoa, biometria, filepath):
+    """
+    Monta e grava o NIST da pessoa. Erros na montagem ou na gravação são propagados; imagens que não
+    convertem são gravadas como recebidas (BUILDER_DETRANRR mantém os originais).
+    """
+    new_nist = BUILDER_DETRANRR.construir_um(registro_nist_detranrr(pessoa, biometria))
+
+    # Patch para evitar bug desconhecido na gravação do NIST no disco
+    GravadorNist.gravar_agora(new_nist, filepath)
+
+    obter_indice(DOWNLOAD_DIR).registrar(filepath)
+
+    return new_nist
+
+
+def grava_nist_detranrr(pessoa, biometria, filepath):
+
+    try:
+        return _grava_nist_detranrr(pessoa, biometria, filepath)
+    except Exception as e:
+        print(traceback.format_exc())
+        return None
+
+
+def create_nist_detranrr(pessoa):
+
+    filepath = caminho_nist_detranrr(pessoa)
+    if filepath is None:
+        return
+
     # Cria o diretório se não existe
     filepath.parent.mkdir(parents=True, exist_ok=True)
 
     print(f"[baixa_detranrr] Baixando dados do CPF {pessoa['nu_cpf']} em {filepath}")
 
-    dedos = [ 
-        'dedo_polegar_direito',
-        'dedo_indicador_direito',
-        'dedo_medio_direito',
-        'dedo_anelar_direito',
-        'dedo_minimo_direito',
-        'dedo_polegar_esquerdo',
-        'dedo_indicador_esquerdo',
-        'dedo_medio_esquerdo',
-        'dedo_anelar_esquerdo',
-        'dedo_minimo_esquerdo'            
-    ]
-
     try:
-        # Cria o NIST
-        new_nist = NIST()
-        new_nist.add_Type01()
-        new_nist.add_Type02()
-
-        # Base de Origem
-        new_nist.set_field('1.008', 'RR/DETRAN', idc=0)  # Base de Origem
-        
-        new_nist.set_field('2.030', formata_nome(pessoa["no_nome"]), idc=0)  # Nome
-        new_nist.set_field('2.035', formata_data_nascimento(pessoa["dt_nascimento"]), idc=0)  # Data de nascimento
-        new_nist.set_field('2.037', None, idc=0)  # Cidade de nascimento
-        new_nist.set_field('2.038', None, idc=0)  # País de nascimento
-        new_nist.set_field('2.039', None, idc=0)  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
-        new_nist.set_field('2.201', formata_nome(pessoa["no_pai"]), idc=0)  # Pai
-        new_nist.set_field('2.202', formata_nome(pessoa["no_mae"]), idc=0)  # Mae
-        new_nist.set_field('2.211', None)  # Identidade
-        new_nist.set_field('2.212', validate_cpf(pessoa["nu_cpf"]), idc=0),  # CPF
-        # new_nist.set_field('2.213', '', idc=0)  # Titulo de eleitor
-        # new_nist.set_field('2.214', '', idc=0)  # CNH
-        new_nist.set_field('2.224', None, idc=0)  # Nome social
-
-        # # Faces
-        new_nist.add_ntype(10)
-        new_nist.add_idc(10, 1)
-        face = obter_arquivo_biometria(pessoa["biometria"]["face"])
-        new_nist.set_field('10.999', face, idc=1)
-
-        # Assinatura
-        # new_nist.add_ntype(8)
-        # new_nist.add_idc(8, 1)
-        # assinatura = formata_imagem(obter_arquivo_biometria(pessoa["biometria"]["assinatura"]))
-        # new_nist.set_field('8.999', assinatura)
-
-        # Digitais
-        new_nist.add_ntype(4)        
-        for idc in range(1, 11):
-            new_nist.add_idc(4, idc)
-            digital = obter_arquivo_biometria(pessoa["biometria"][dedos[idc-1]])
-            new_nist.add_ntype(4)
-            new_nist.set_field('4.001', 4, idc=idc)  # Record Type (TYP) [Mandatory]
-            new_nist.set_field('4.002', idc, idc=idc)  # Image Designation Character (IDC) [Mandatory]
-            new_nist.set_field('4.003', 1, idc=idc)  # Impression Type (IMP) [Mandatory]
-            new_nist.set_field('4.004', idc, idc=idc)  # Finger Position (FGP) [Mandatory]
-            new_nist.set_field('4.005', 1, idc=idc)  # Fingerprint Image Scanning Resolution (FIR) [Mandatory] 
-            new_nist.set_field('4.006', 800, idc=idc)  # Image Horizontal Line Length (HLL) [Mandatory]
-            new_nist.set_field('4.007', 750, idc=idc)  # Image Vertical Line Length (VLL) [Mandatory]
-            new_nist.set_field('4.008', 1, idc=idc)  # Image Compression Algorithm (ICA) [Mandatory]
-            new_nist.set_field('4.999', digital, idc=idc)  # Image binary
-    
+        biometria = baixar_biometria_detranrr(pessoa)
     except Exception as e:
         print(traceback.format_exc())
         return None
-    
-    # Patch para evitar bug desconhecido na gravação do NIST no disco
-    try:
-        new_nist.write(filepath)
-    except:
-        traceback.format_exc()
-        return
 
-    return new_nist
+    return grava_nist_detranrr(pessoa, biometria, filepath)
+
+
+def processa_pessoas_detranrr(pessoas, simultaneas: int = 8, gravadores: int = 2) -> dict:
+    """
+    Cria os NISTs de uma lista de pessoas em pipeline: enquanto os NISTs de umas são montados e
+    gravados, as biometrias das próximas já estão sendo baixadas.
+
+    Argumentos:
+    - pessoas: Iterável de pessoas retornadas por busca_por_data/busca_por_cpf.
+    - simultaneas (int): Pessoas com download em andamento ao mesmo tempo.
+    - gravadores (int): Threads de montagem/gravação dos NISTs.
+
+    Retorna:
+    - dict: Quantidade de pessoas por desfecho:
+      - 'gravados': NISTs gravados;
+      - 'falhas': erros no caminho, no download, na montagem ou na gravação; a pessoa deve ser refeita.
+    """
+    # Limita as pessoas entre o início do download e o fim da gravação (memória das biometrias)
+    limite = threading.BoundedSemaphore(simultaneas * 2)
+    gravacoes = []
+
+    resultado = {'gravados': 0, 'falhas': 0}
+    resultado_lock = threading.Lock()
+
+    def conta(desfecho):
+        with resultado_lock:
+            resultado[desfecho] += 1
+
+    def grava(pessoa, filepath, download):
+        try:
+            _grava_nist_detranrr(pessoa, download.result(), filepath)
+        except Exception:
+            print(traceback.format_exc())
+            conta('falhas')
+            return
+        conta('gravados')
+
+    # O executor de gravação é o externo para encerrar depois de todos os downloads
+    with ThreadPoolExecutor(max_workers=gravadores) as executor_gravacao:
+
+        def agenda_gravacao(download, pessoa, filepath):
+            gravacao = executor_gravacao.submit(grava, pessoa, filepath, download)
+            gravacao.add_done_callback(lambda _: limite.release())
+            gravacoes.append(gravacao)
+
+        with ThreadPoolExecutor(max_workers=simultaneas) as executor_download:
+            for pessoa in pessoas:
+                try:
+                    filepath = caminho_nist_detranrr(pessoa)
+                except Exception:
+                    print(traceback.format_exc())
+                    conta('falhas')
+                    continue
+                if filepath is None:
+                    continue
+                filepath.parent.mkdir(parents=True, exist_ok=True)
+                print(f"[baixa_detranrr] Baixando dados do CPF {pessoa['nu_cpf']} em {filepath}")
+
+                limite.acquire()
+                download = executor_download.submit(baixar_biometria_detranrr, pessoa)
+                download.add_done_callback(lambda download, pessoa=pessoa, filepath=filepath: agenda_gravacao(download, pessoa, filepath))
+
+    for gravacao in gravacoes:
+        gravacao.result()
+    return resultado
 
 
 def busca_por_cpf_paralelo(cpf):
     filename = f"rr-detran-cpf{cpf}.nst"
-    if filename in ARQUIVOS_EXISTENTES:
+    if filename in obter_indice(DOWNLOAD_DIR):
         print(f"[baixa_detranrr] Arquivo já existe: {filename}")
         return
 
@@ -1,54 +1,175 @@
 from detranrr.wsdetranrr import busca_por_cpf, busca_por_data, obter_arquivo_biometria
-from detranrr_baixar import create_nist_detranrr
+from detranrr_baixar import create_nist_detranrr, processa_pessoas_detranrr
 from NIST import NIST
 from functions import *
 from pathlib import Path
 from datetime import datetime, timedelta
+import argparse
 import json
+import os
+import threading
+import time
+import traceback
 from threader import Threader
-from concurrent.futures import ThreadPoolExecutor
-    
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-if __name__ == '__main__':
 
-    root_dir = Path(__file__).parent
-    arquivo_dt_ultima_atualizacao = root_dir / 'data_ultima_atualizacao_detranrr.txt'
+root_dir = Path(__file__).parent
+arquivo_dt_ultima_atualizacao = root_dir / 'data_ultima_atualizacao_detranrr.txt'
+# Checkpoint por dia concluído (um dia por linha), usado no modo backfill
+arquivo_dias_concluidos = root_dir / 'dias_concluidos_detranrr.txt'
+
+lock_checkpoint = threading.Lock()
+
 
+def ler_data_ultima_atualizacao() -> datetime:
     if not arquivo_dt_ultima_atualizacao.exists():
         raise FileNotFoundError(f"Arquivo '{arquivo_dt_ultima_atualizacao}' não encontrado.")
 
     with arquivo_dt_ultima_atualizacao.open('r') as f:
         data_ultima_atualizacao = f.read().splitlines()[0]
 
-    data_ultima_atualizacao = datetime.strptime(data_ultima_atualizacao, r'%Y-%m-%d')
-
-    while data_ultima_atualizacao.date() < datetime.now().date():
-
-        print(f"Lendo {data_ultima_atualizacao.strftime(r'%Y-%m-%d')}...")
-
-        lista_pessoas = busca_por_data(data_ultima_atualizacao.strftime(r'%Y-%m-%d'))
-        if lista_pessoas is None:
-            print(f"Data pesquisada '{data_ultima_atualizacao.strftime(r'%Y-%m-%d')}' é anterior ao permitido.")
-        else:
-            if lista_pessoas:
-                print(f"{len(lista_pessoas)} pessoas encontradas.")
-                # Em paralelo, cria os nists
-                # with ThreadPoolExecutor() as executor:
-                #     result = executor.map(create_nist_detranrr, lista_pessoas)
-
-                # Em sequência
-                for pessoa in lista_pessoas:
-                    try:
-                        create_nist_detranrr(pessoa)
-                    except Exception as e:
-                        print(str(e))
-            else:
-                print(f"Nenhuma coleta biometrica encontrada na data {data_ultima_atualizacao.strftime(r'%Y-%m-%d')}")
-
-        # Atualiza o arquivo com a data da última atualização lida
-        with arquivo_dt_ultima_atualizacao.open('w') as f:
-            f.write(data_ultima_atualizacao.strftime(r'%Y-%m-%d'))
-
-        data_ultima_atualizacao = data_ultima_atualizacao + timedelta(days=1)
-    
-    print(f"Finalizado.")
\ No newline at end of file
+    return datetime.strptime(data_ultima_atualizacao, r'%Y-%m-%d')
+
+
+def gravar_data_ultima_atualizacao(data: datetime) -> None:
+    with arquivo_dt_ultima_atualizacao.open('w') as f:
+        f.write(data.strftime(r'%Y-%m-%d'))
+
+
+def ler_dias_concluidos() -> set:
+    if not arquivo_dias_concluidos.exists():
+        return set()
+
+    with arquivo_dias_concluidos.open('r') as f:
+        return {linha.strip() for linha in f if linha.strip()}
+
+
+def marcar_dia_concluido(data: datetime) -> None:
+    with lock_checkpoint:
+        with arquivo_dias_concluidos.open('a') as f:
+            f.write(f"{data.strftime(r'%Y-%m-%d')}\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def processa_dia(data: datetime, pessoas_simultaneas: int = 8) -> dict | None:
+    """
+    Baixa as coletas biométricas de um dia e grava os NISTs.
+
+    Retorna:
+    - dict com pessoas, gravados, falhas e segundos (ver processa_pessoas_detranrr).
+    - None se a API não retornou a lista do dia (o dia não é considerado concluído).
+    """
+    inicio = time.monotonic()
+    data_pesquisa = data.strftime(r'%Y-%m-%d')
+
+    lista_pessoas = busca_por_data(data_pesquisa)
+    if lista_pessoas is None:
+        print(f"Data pesquisada '{data_pesquisa}' é anterior ao permitido.")
+        return None
+
+    resultado = {'gravados': 0, 'falhas': 0}
+    if lista_pessoas:
+        print(f"[detranrr_diario] {data_pesquisa}: {len(lista_pessoas)} pessoas encontradas.")
+        resultado = processa_pessoas_detranrr(lista_pessoas, simultaneas=pessoas_simultaneas)
+    else:
+        print(f"Nenhuma coleta biometrica encontrada na data {data_pesquisa}")
+
+    segundos = time.monotonic() - inicio
+    taxa = len(lista_pessoas) / segundos if segundos else 0
+    print(f"[detranrr_diario] {data_pesquisa}: {resultado['gravados']}/{len(lista_pessoas)} NISTs gravados, "
+          f"{resultado['falhas']} falhas em {segundos:.1f}s ({taxa:.2f} pessoas/s).")
+
+    return {'pessoas': len(lista_pessoas), **resultado, 'segundos': segundos}
+
+
+def backfill(data_inicial: datetime, data_final: datetime, dias_simultaneos: int = 3, pessoas_simultaneas: int = 8) -> list:
+    """
+    Processa em paralelo todos os dias de data_inicial a data_final (inclusive) ainda não concluídos.
+
+    Observações:
+    - Cada dia concluído é registrado em dias_concluidos_detranrr.txt; dias com falha (lista do dia
+      indisponível ou alguma pessoa com falha) ficam de fora e são refeitos na próxima execução.
+    - data_ultima_atualizacao_detranrr.txt avança até o último dia da sequência contínua de dias concluídos.
+
+    Retorna:
+    - list: Dias (YYYY-MM-DD) que falharam.
+    """
+    concluidos = ler_dias_concluidos()
+    dias = []
+    data = data_inicial
+    while data <= data_final:
+        if data.strftime(r'%Y-%m-%d') not in concluidos:
+            dias.append(data)
+        data += timedelta(days=1)
+
+    print(f"[detranrr_diario] Backfill de {data_inicial:%Y-%m-%d} a {data_final:%Y-%m-%d}: {len(dias)} dias pendentes.")
+
+    falhas = []
+    inicio = time.monotonic()
+    total_pessoas = 0
+    with ThreadPoolExecutor(max_workers=dias_simultaneos) as executor:
+        futuros = {executor.submit(processa_dia, dia, pessoas_simultaneas): dia for dia in dias}
+        for futuro in as_completed(futuros):
+            dia = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception:
+                print(traceback.format_exc())
+                resultado = None
+
+            if resultado is None or resultado['falhas']:
+                falhas.append(dia.strftime(r'%Y-%m-%d'))
+                continue
+
+            total_pessoas += resultado['pessoas']
+            marcar_dia_concluido(dia)
+            concluidos.add(dia.strftime(r'%Y-%m-%d'))
+
+    # Avança a data da última atualização até a primeira lacuna
+    data = data_inicial
+    ultima_continua = None
+    while data <= data_final and data.strftime(r'%Y-%m-%d') in concluidos:
+        ultima_continua = data
+        data += timedelta(days=1)
+    if ultima_continua and ultima_continua > ler_data_ultima_atualizacao():
+        gravar_data_ultima_atualizacao(ultima_continua)
+
+    segundos = time.monotonic() - inicio
+    print(f"[detranrr_diario] Backfill finalizado: {len(dias) - len(falhas)} dias, {total_pessoas} pessoas em {segundos:.1f}s. "
+          f"Dias com falha: {falhas or 'nenhum'}")
+
+    return falhas
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Baixa as coletas biométricas diárias do DETRAN/RR.")
+    parser.add_argument('--backfill', action='store_true', help="Processa vários dias em paralelo, com checkpoint por dia.")
+    parser.add_argument('--inicio', type=lambda s: datetime.strptime(s, r'%Y-%m-%d'), default=None,
+                        help="Primeiro dia do backfill (YYYY-MM-DD). Padrão: data da última atualização.")
+    parser.add_argument('--fim', type=lambda s: datetime.strptime(s, r'%Y-%m-%d'), default=None,
+                        help="Último dia do backfill (YYYY-MM-DD). Padrão: ontem.")
+    parser.add_argument('--dias-simultaneos', type=int, default=3)
+    parser.add_argument('--pessoas-simultaneas', type=int, default=8)
+    args = parser.parse_args()
+
+    data_ultima_atualizacao = ler_data_ultima_atualizacao()
+
+    if args.backfill:
+        data_final = args.fim or datetime.combine(datetime.now().date() - timedelta(days=1), datetime.min.time())
+        backfill(args.inicio or data_ultima_atualizacao, data_final, args.dias_simultaneos, args.pessoas_simultaneas)
+    else:
+        while data_ultima_atualizacao.date() < datetime.now().date():
+
+            print(f"Lendo {data_ultima_atualizacao.strftime(r'%Y-%m-%d')}...")
+
+            processa_dia(data_ultima_atualizacao, args.pessoas_simultaneas)
+
+            # Atualiza o arquivo com a data da última atualização lida
+            gravar_data_ultima_atualizacao(data_ultima_atualizacao)
+
+            data_ultima_atualizacao = data_ultima_atualizacao + timedelta(days=1)
+
+    print(f"Finalizado.")
@@ -1,9 +1,7 @@
-from unidecode import unidecode
 import io
 import filetype
 from datetime import datetime
 import copy
-import csv
 from io import BytesIO
 from PIL import Image
 from pathlib import Path
@@ -11,6 +9,8 @@ import imageio
 import numpy as np
 import imagecodecs
 import wsq
+from normalizacao import (formata_nome, formata_documento, formata_data_nascimento, formata_nacionalidade, preencher_zeros,
+                         validate_cpf, formata_nomes, formata_documentos, formata_datas_nascimento, formata_nacionalidades, valida_cpfs)
 
 
 def convert_to_wsq(input_data):
@@ -60,41 +60,6 @@ def convert_to_jpeg(input_data):
         return new_file.getvalue()
 
 
-def formata_nacionalidade(value):
-
-    if value is None:
-        return None
-    
-    file_path = Path(__file__).parent / 'TB_PAIS.csv'
-    dict_codigo_nome_pais = {}
-    dict_nome_codigo_pais = {}
-
-    with open(file_path, mode='r', encoding='utf-8') as file:
-        csv_reader = csv.reader(file)
-        paises = []
-        for row in csv_reader:
-            if row[0] == 'CD_PAIS':  # Exclui a linha cabeçalho
-                continue
-
-            codigo_pais = formata_nome(row[0])
-            nome_pais = formata_nome(row[1])
-
-            dict_codigo_nome_pais[codigo_pais] = nome_pais
-            # dict_nome_codigo_pais[nome_pais] = codigo_pais
-
-    nacionalidade = formata_nome(value)
-
-    if nacionalidade.isdigit():
-        try:
-            nacionalidade = dict_codigo_nome_pais[value]
-        except Exception as e:
-            nacionalidade = None
-    elif nacionalidade not in dict_codigo_nome_pais.values():
-        nacionalidade = None
-
-    return nacionalidade
-
-
 def formata_sexo(sexo):
     new_value = None
     if str(sexo).isdigit():
@@ -116,153 +81,127 @@ def formata_sexo(sexo):
     return formata_nome(new_value)
 
 
-def formata_nome(s):
-    if s is None:
-        return None
- 
-    # Ensure that it's string type
-    if not isinstance(s, str):
-        raise TypeError("Input must be a string")
-
-    # Remove spaces at the beginning and end
-    s = s.strip()
-
-    # If the remaining string is empty, set it to None
-    if not s:
-        return None
-
-    # Remove all double spaces between words
-    s = ' '.join(s.split())
-
-    # Uppercase all letters
-    s = s.upper()
+# Magic bytes of the image formats handled without filetype (checked on a prefix of the content)
+ASSINATURAS_IMAGEM = (
+    (b'\xff\xa0', 'wsq'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'\x00\x00\x00\x0cjP  ', 'jp2'),
+)
 
-    # Convert all letters to ASCII representation
-    s = unidecode(s)
+JPEG_QUALIDADE_PADRAO = 95
 
-    return s
 
+def _conteudo_imagem(file: str | bytes | bytearray | memoryview | io.BytesIO) -> memoryview:
+    """
+    Returns a memoryview over the file content, without copying in-memory inputs.
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as f:
+            return memoryview(f.read())
+    elif isinstance(file, io.BytesIO):
+        return file.getbuffer()
+    elif isinstance(file, (bytes, bytearray, memoryview)):
+        return memoryview(file)
+    else:
+        raise TypeError(f'Tipo <{type(file)}> inválido para "file". Esperado tipo <str>|<bytes>|<io.BytesIO>.')
 
-def formata_documento(s):
-    if s is None:
-        return None
-
-    # Ensure that it's string type
-    if not isinstance(s, (str)):
-        raise TypeError("Input must be a string")
 
+def identifica_imagem(file: str | bytes | io.BytesIO) -> str | None:
+    """
+    Identifies the image format from the magic bytes at the start of the content.
 
-    # Remove spaces at the beginning and end
-    s = s.strip()
+    Common formats (WSQ, JPEG, PNG, GIF, BMP, TIFF, JPEG 2000) are matched directly on a memoryview prefix;
+    other formats fall back to 'filetype.guess' on the first bytes only.
 
-    # If the remaining string is empty, set it to None
-    if not s:
-        return None
+    Parameters:
+    - file (str | bytes | io.BytesIO): File path, bytes, memoryview or io.BytesIO.
 
-    # Remove all characters that are not alpha or digit
-    s = ''.join(filter(str.isalnum, s))
+    Returns:
+    - str | None: Format name ('wsq', 'jpeg', 'png', ...) or None if the content is not a recognized image.
+    """
+    conteudo = _conteudo_imagem(file)
+    prefixo = bytes(conteudo[:16])
 
-    # Convert all letters to ASCII representation
-    s = unidecode(s)
+    for assinatura, formato in ASSINATURAS_IMAGEM:
+        if prefixo.startswith(assinatura):
+            return formato
+    if prefixo[:4] == b'RIFF' and prefixo[8:12] == b'WEBP':
+        return 'webp'
 
-    # Uppercase all letters
-    s = s.upper()
+    kind = filetype.guess(bytes(conteudo[:8192]))
+    if kind is not None and kind.mime.startswith('image/'):
+        return kind.extension
 
-    return s
+    return None
 
 
-def formata_data_nascimento(date_input):
+def normaliza_imagem(file: str | bytes | io.BytesIO, qualidade: int = JPEG_QUALIDADE_PADRAO, tamanho_maximo: int | None = None,
+                     formatos_aceitos: tuple | None = None) -> tuple[bytes, dict]:
     """
-    Formats a given date input (datetime object or string in various formats) to a string in '%Y-%m-%d' format.
+    Normalizes an image in a single pass: sniffs the format, decodes at most once and transcodes to JPEG only when needed.
+
+    The image is transcoded when it is WSQ, when its format is not in 'formatos_aceitos' or when its largest side
+    exceeds 'tamanho_maximo'. Otherwise the original bytes are returned untouched (only the header is parsed).
 
     Parameters:
-    - date_input (datetime or str): The date to format, which can be a datetime object or a string in one of the following formats:
-      '%Y-%m-%d', '%Y%m%d', '%d-%m-%Y', or '%d%m%Y'.
+    - file (str | bytes | io.BytesIO): File path, bytes, memoryview or io.BytesIO.
+    - qualidade (int): JPEG quality used when transcoding.
+    - tamanho_maximo (int, optional): Maximum width/height in pixels (e.g. the face detector's input size).
+    - formatos_aceitos (tuple, optional): Formats returned as-is. None accepts every recognized format except WSQ.
 
     Returns:
-    - str: The date formatted in '%Y-%m-%d' format if the input is valid. Returns None if the date is invalid.
-    """
-    
-    # Define the list of acceptable string date formats
-    date_formats = [r'%Y-%m-%d', r'%Y%m%d', r'%d-%m-%Y', r'%d%m%Y', r'%d/%m/%Y',]
-    
-    # If input is already a datetime object, format it to the desired format
-    if isinstance(date_input, datetime):
-        return date_input.strftime('%Y-%m-%d')
-    
-    # If input is a string, try parsing it with the acceptable formats
-    elif isinstance(date_input, str):
-        for fmt in date_formats:
-            try:
-                # Parse the date string using the current format
-                parsed_date = datetime.strptime(date_input, fmt)
-                # If successful, return the date in the desired format
-                return parsed_date.strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-    
-    # If no formats match
-    # raise ValueError(f'Data de nascimento "{date_input}" inválida.')
-    return None
+    - tuple[bytes, dict]: The image bytes and its metadata: formato, formato_original, largura, altura,
+      tamanho (bytes) and transcodificada.
 
+    Raises:
+    - ValueError: If the content is not a valid image.
+    """
+    conteudo = _conteudo_imagem(file)
+    formato = identifica_imagem(conteudo)
+    if formato is None:
+        raise ValueError('Arquivo não é uma imagem válida.')
 
-def preencher_zeros(valor):
-    # Converte o valor para string, se não for uma já
-    valor_str = str(valor)
-    # Preenche com zeros à esquerda até completar 11 caracteres
-    return valor_str.zfill(11)
+    try:
+        # Image.open only parses the header; pixels are decoded on the first load()/save()
+        img = Image.open(io.BytesIO(conteudo))
+    except Exception as e:
+        raise ValueError('Arquivo não é uma imagem válida.') from e
 
+    with img:
+        largura, altura = img.size
+        reduzir = tamanho_maximo is not None and max(largura, altura) > tamanho_maximo
+        aceito = formato != 'wsq' and (formatos_aceitos is None or formato in formatos_aceitos)
 
-def validate_cpf(numbers: str | int) -> str:
-    """
-    Validates a Brazilian CPF number for correct formatting and checks the digits according to the CPF rules.
-    
-    The CPF (Cadastro de Pessoas Físicas) is a Brazilian individual taxpayer registry identification. This function
-    checks if the provided CPF is valid by ensuring it contains 11 digits, is not a sequence of identical numbers,
-    and both of its verifying digits are correct according to the standard CPF formula.
-    
-    Parameters:
-    - numbers (str | int): The CPF number to validate. It can be provided as a string or integer. Strings
-      can contain non-digit characters, which will be ignored.
-    
-    Returns:
-    - str: The validated CPF number as a string of digits if it is valid.
-    - bool: False if the CPF number is invalid.
-    - None: If the input is not a string or an integer, or if it's an empty or whitespace-only string.
-    
-    Examples:
-    - validate_cpf("123.456.789-09") -> False (assuming it's an invalid CPF number)
-    - validate_cpf(12345678909) -> "12345678909" (assuming it's a valid CPF number)
-    - validate_cpf("111.111.111-11") -> False (invalid because it's a sequence of identical numbers)
-    """
-    
-    if isinstance(numbers, int):
-        numbers = str(numbers)
+        if aceito and not reduzir:
+            dados = bytes(conteudo)
+            return dados, {'formato': formato, 'formato_original': formato, 'largura': largura, 'altura': altura,
+                           'tamanho': len(dados), 'transcodificada': False}
 
-    numbers = preencher_zeros(numbers)
+        if reduzir:
+            # JPEG: decodes directly at a reduced scale (DCT scaling) before the final resize
+            img.draft('RGB', (tamanho_maximo, tamanho_maximo))
+            img.thumbnail((tamanho_maximo, tamanho_maximo))
+        if img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
 
-    if isinstance(numbers, str) and numbers is not None and len(numbers.strip()) > 0:
-        cpf = [int(char) for char in numbers if char.isdigit()]
-        if len(cpf) != 11:
-            return False
-        if all(cpf[i] == cpf[i + 1] for i in range(0, len(cpf) - 1)):
-            return False
-        for i in range(9, 11):
-            value = sum((cpf[num] * ((i + 1) - num) for num in range(0, i)))
-            digit = ((value * 10) % 11) % 10
-            if digit != cpf[i]:
-                return False    
-        return ''.join(str(x) for x in cpf)
+        saida = BytesIO()
+        img.save(saida, 'JPEG', quality=qualidade)
+        dados = saida.getvalue()
+        return dados, {'formato': 'jpeg', 'formato_original': formato, 'largura': img.size[0], 'altura': img.size[1],
+                       'tamanho': len(dados), 'transcodificada': True}
 
 
 def is_image(file: str | bytes | io.BytesIO) -> bool:
     """
-    Determines whether the provided file is an image by checking its MIME type.
+    Determines whether the provided file is an image by checking its magic bytes.
     
-    This function reads the content of the file, which can be specified as a file path, a bytes object,
-    or an io.BytesIO object. It uses the 'filetype.guess' function to determine the MIME type of the file content.
-    If the MIME type starts with 'image/', the file is considered an image and the function returns True. Otherwise,
-    it returns False.
+    Only a prefix of the content is inspected (see 'identifica_imagem'); the content is not copied.
     
     Parameters:
     - file (str | bytes | io.BytesIO): The file to be checked. This can be:
@@ -274,33 +213,16 @@ def is_image(file: str | bytes | io.BytesIO) -> bool:
     - bool: True if the file is an image, False otherwise.
     
     Raises:
-    - ValueError: If the 'file' parameter is not one of the accepted types.
+    - TypeError: If the 'file' parameter is not one of the accepted types.
     """
-    if isinstance(file, str):
-        with open(file, 'rb') as f:
-            file_content = f.read()    
-    elif isinstance(file, io.BytesIO):
-        file_content = file.getvalue()
-    elif isinstance(file, bytes):
-        file_content = file
-    else:
-        raise TypeError(f'Tipo <{type(file)}> inválido para "file". Esperado tipo <str>|<bytes>|<io.BytesIO>.')
-
-    kind = filetype.guess(file_content)
-    if kind is not None and kind.mime.startswith('image/'):
-        return True
-    
-    return False
+    return identifica_imagem(file) is not None
     
 
 def is_valid_wsq(file: str | bytes | io.BytesIO) -> bool:
     """
     Determines whether the provided file is a WSQ (Wavelet Scalar Quantization) file based on its content.
     
-    This function reads the content of the file, which can be specified as a file path, a bytes object,
-    or an io.BytesIO object. It then checks the start of the file content for specific markers that indicate
-    it is a WSQ file. Note: This example uses a hypothetical marker for illustration. Actual WSQ file validation
-    requires more detailed analysis of the file structure.
+    WSQ files start with the SOI marker 0xFFA0; only the first two bytes are inspected.
     
     Parameters:
     - file (str | bytes | io.BytesIO): The file to be checked. This can be:
@@ -312,80 +234,33 @@ def is_valid_wsq(file: str | bytes | io.BytesIO) -> bool:
     - bool: True if the file is a WSQ file, False otherwise.
     
     Raises:
-    - ValueError: If the 'file' parameter is not one of the accepted types.
+    - TypeError: If the 'file' parameter is not one of the accepted types.
     """
-    if isinstance(file, str):
-        with open(file, 'rb') as f:
-            file_content = f.read()    
-    elif isinstance(file, io.BytesIO):
-        file_content = file.getvalue()
-    elif isinstance(file, bytes):
-        file_content = file
-    else:
-        raise TypeError(f'Tipo <{type(file)}> inválido para "file". Esperado tipo <str>|<bytes>|<io.BytesIO>.')
-
-
-    file_stream = BytesIO(file_content)
-
-    # Go to the start of the file stream
-    file_stream.seek(0)
-    
-    # Read the first few bytes to check for WSQ markers
-    start_bytes = file_stream.read(4)
-    
-    # Example check for specific bytes; adjust based on more reliable markers if available
-    # This is a placeholder; real WSQ validation would require more detailed analysis
-    if start_bytes[:2] == b'\xff\xa0':  # Hypothetical marker; actual WSQ files do not have a simple magic number
-        return True
-
-    return False
+    return bytes(_conteudo_imagem(file)[:2]) == b'\xff\xa0'
 
 
-def convert_wsq_to_jpg(file: str | bytes | io.BytesIO) -> bytes:
+def convert_wsq_to_jpg(file: str | bytes | io.BytesIO, qualidade: int = 75) -> bytes:
     """
     Converts an image from WSQ (Wavelet Scalar Quantization) format to JPEG format.
     
-    This function reads the content of the file, which can be specified as a file path, a bytes object,
-    or an io.BytesIO object. It then opens the image using PIL (Pillow) and converts it to JPEG format,
-    returning the JPEG image as a bytes object.
-    
     Parameters:
     - file (str | bytes | io.BytesIO): The WSQ file to be converted. This can be:
         - A string representing a file path to the file on disk.
         - A bytes object containing the file's content.
         - An io.BytesIO object wrapping the file's content in a file-like object.
+    - qualidade (int): JPEG quality (PIL's default, 75, unless specified).
     
     Returns:
     - bytes: The content of the converted JPEG image as a bytes object.
     
     Raises:
-    - ValueError: If the 'file' parameter is not one of the accepted types.
+    - ValueError: If the content is not a valid image.
     """
-    if isinstance(file, str):
-        with open(file, 'rb') as f:
-            file_content = f.read()    
-    elif isinstance(file, io.BytesIO):
-        file_content = file.getvalue()
-    elif isinstance(file, bytes):
-        file_content = file
-    else:
-        raise TypeError(f'Tipo <{type(file)}> inválido para "file". Esperado tipo <str>|<bytes>|<io.BytesIO>.')        
-
-    # Use PIL to open the image. Note: Direct WSQ to JPEG conversion assumes PIL can handle WSQ format,
-    # which may require additional plugins or libraries.
-    image_stream = BytesIO(file_content)
-    pil_img = Image.open(image_stream)
+    jpg, _ = normaliza_imagem(file, qualidade=qualidade, formatos_aceitos=())
+    return jpg
 
-    # Convert the image to JPEG
-    jpg_stream = BytesIO()
-    pil_img.save(jpg_stream, "JPEG")
 
-    # Return the JPEG image as bytes
-    jpg_stream.seek(0)
-    return jpg_stream.getvalue()
-
-
-def formata_imagem(file: str | bytes | io.BytesIO) -> bytes:
+def formata_imagem(file: str | bytes | io.BytesIO, qualidade: int = 75, tamanho_maximo: int | None = None) -> bytes:
     """
     Formats an image file by converting it from WSQ format to JPEG if necessary and
     checks whether the file is a valid image. If the file is not a valid image, it raises an error.
@@ -393,38 +268,27 @@ def formata_imagem(file: str | bytes | io.BytesIO) -> bytes:
     Parameters:
     - file (str | bytes | io.BytesIO): The file to format. This can be a file path (str),
       the content of the file in bytes, or an io.BytesIO object containing the file's content.
+    - qualidade (int): JPEG quality used when the image is transcoded.
+    - tamanho_maximo (int, optional): Downscales images whose largest side exceeds this size.
     
     Returns:
     - bytes: The content of the formatted image file as a bytes object. If the file was originally
       in WSQ format, it will be converted to JPEG format.
     
     Raises:
-    - ValueError: If the input 'file' is not a valid type or if the file content is not a valid image.
+    - ValueError: If the file content is not a valid image.
     """
-    
-    # Read the file content based on its type
-    if isinstance(file, str):
-        with open(file, 'rb') as f:
-            file_content = f.read()    
-    elif isinstance(file, io.BytesIO):
-        file_content = file.getvalue()
-    elif isinstance(file, bytes):
-        file_content = file
-    else:
-        raise TypeError(f'Tipo <{type(file)}> inválido para "file". Esperado tipo <str>|<bytes>|<io.BytesIO>.')
-
-    # Convert WSQ to JPEG if necessary
-    if is_valid_wsq(file_content):
-        file_content = convert_wsq_to_jpg(file_content)
-    
-    # Validate the final image
-    if not is_image(file_content):
-        raise ValueError('Arquivo não é uma imagem válida.')
+    imagem, _ = normaliza_imagem(file, qualidade=qualidade, tamanho_maximo=tamanho_maximo)
+    return imagem
 
-    return file_content
 
+def extract_faces_from_nist(nist, normalizar: bool = False, qualidade: int = JPEG_QUALIDADE_PADRAO, tamanho_maximo: int | None = None):
+    """
+    Returns the face images (type 10 records) of the NIST.
 
-def extract_faces_from_nist(nist):
+    With 'normalizar', each face goes through 'normaliza_imagem' (WSQ/other formats to JPEG, optional downscale)
+    and a list of (bytes, metadata) tuples is returned instead of a list of bytes.
+    """
     if not isinstance(nist, NIST):
         raise TypeError(f'Tipo <{type(nist)}> inválido para "nist". Esperado tipo <NIST>.')
 
@@ -436,6 +300,14 @@ def extract_faces_from_nist(nist):
         for idc in idcs_nytpe10:
             face = nist.get_field('10.999', idc=idc)
 
+            if normalizar:
+                try:
+                    faces.append(normaliza_imagem(face, qualidade=qualidade, tamanho_maximo=tamanho_maximo,
+                                                  formatos_aceitos=('jpeg', 'png')))
+                except ValueError:
+                    raise Exception('Aquivo não é uma imagem.')
+                continue
+
             if not is_image(face):
                 raise Exception('Aquivo não é uma imagem.')
 
@@ -10,6 +10,8 @@ from concurrent.futures import ThreadPoolExecutor
 import base64
 import json
 from idnetrr.idnetrr import obter_biometria_idnet_por_rg, obter_diretorio_download
+from crawler_rg import obter_bitmap_idnet
+from indice_arquivos import obter_indice
 
 
 APP_DIR = Path(__file__).parent
@@ -17,31 +19,11 @@ NIST_DIR = APP_DIR / "nists/rr/civil"
 DOWNLOAD_DIR = NIST_DIR
 
 
-def find_unique_files(directory=NIST_DIR):
-    unique_files = set()
-    
-    # Walk através de todos os diretórios e subdiretórios
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            # Adiciona cada arquivo ao set, que automaticamente lida com duplicatas
-            unique_files.add(file)
-    
-    # Retorna a lista de arquivos únicos
-    return list(unique_files)
-
-
-# Lê todo os arquivos do diretório recursivamente, excluindo os duplicados
-ARQUIVOS_EXISTENTES = find_unique_files(NIST_DIR)
-
-
 if __name__ == '__main__':
     
-    lista_rgs = APP_DIR / 'lista_rgs_idnet.txt'
-
-    with open(str(lista_rgs)) as f:
-        rgs = f.read().splitlines()
+    rgs = [str(rg) for rg in obter_bitmap_idnet()]
 
-        # print(f"{len(rgs)} RGs encontrados.")
+    # print(f"{len(rgs)} RGs encontrados.")
 
     # # Em paralelo, baixa os dados e cria o nist
     # with ThreadPoolExecutor() as executor:
@@ -57,7 +39,7 @@ if __name__ == '__main__':
         filename = f"rr-civil-rg{rg}.nst"
         rg_download_dir = obter_diretorio_download(rg)
         filepath = rg_download_dir / filename
-        if filename in ARQUIVOS_EXISTENTES:
+        if filename in obter_indice(NIST_DIR):
             print(f"[idnet] Arquivo já existe: {filepath}")
             continue
 
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from time import perf_counter
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from zeep import Client
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+
+
+# WSDL e XSDs baixados ficam neste SQLite e são reaproveitados entre execuções
+CACHE_WSDL = os.environ.get("IDNET_CACHE_WSDL", str(Path(__file__).parent.parent / ".cache" / "wsdl_idnet.sqlite3"))
+CACHE_WSDL_VALIDADE = int(os.environ.get("IDNET_CACHE_WSDL_VALIDADE", 7 * 24 * 3600))
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    if not valores_ordenados:
+        return 0.0
+    return valores_ordenados[min(len(valores_ordenados) - 1, int(p * len(valores_ordenados)))]
+
+
+class MetricasSoap:
+    """
+    Latência e erros por operação SOAP, compartilhados entre as threads.
+    """
+
+    def __init__(self, amostras: int = 10000):
+        self.amostras = amostras
+        self._operacoes = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, operacao: str, segundos: float, erro: bool = False) -> None:
+        with self._lock:
+            metrica = self._operacoes.get(operacao)
+            if metrica is None:
+                # Mantém apenas as amostras mais recentes para os percentis
+                metrica = {'chamadas': 0, 'erros': 0, 'total': 0.0, 'maximo': 0.0, 'latencias': deque(maxlen=self.amostras)}
+                self._operacoes[operacao] = metrica
+            metrica['chamadas'] += 1
+            metrica['erros'] += int(erro)
+            metrica['total'] += segundos
+            metrica['maximo'] = max(metrica['maximo'], segundos)
+            metrica['latencias'].append(segundos)
+
+    def resumo(self) -> dict:
+        """
+        Retorna {operacao: {chamadas, erros, media, p50, p95, maximo}} com tempos em segundos.
+        """
+        with self._lock:
+            resumo = {}
+            for operacao, metrica in self._operacoes.items():
+                latencias = sorted(metrica['latencias'])
+                resumo[operacao] = {
+                    'chamadas': metrica['chamadas'],
+                    'erros': metrica['erros'],
+                    'media': round(metrica['total'] / metrica['chamadas'], 4),
+                    'p50': round(percentil(latencias, 0.50), 4),
+                    'p95': round(percentil(latencias, 0.95), 4),
+                    'maximo': round(metrica['maximo'], 4),
+                }
+            return resumo
+
+    def imprimir(self) -> None:
+        for operacao, metrica in self.resumo().items():
+            print(f"[idnet] {operacao}: {metrica['chamadas']} chamadas, {metrica['erros']} erros, "
+                  f"média {metrica['media']}s, p50 {metrica['p50']}s, p95 {metrica['p95']}s, máx {metrica['maximo']}s")
+
+
+class ClienteSoap:
+    """
+    Cliente SOAP reaproveitável para os web services do IDNet.
+
+    O WSDL é lido uma única vez por thread (e baixado uma única vez por semana, graças ao cache em
+    SQLite). Todas as threads compartilham a mesma requests.Session, com pool de conexões keep-alive.
+    Cada thread tem seu próprio zeep.Client, pois o Client não é thread-safe.
+    """
+
+    def __init__(self, wsdl: str, cabecalho=None, conexoes: int = 32, timeout: int = 60, metricas: MetricasSoap | None = None):
+        """
+        Argumentos:
+        - wsdl (str): URL do WSDL do serviço.
+        - cabecalho (callable, opcional): Função que recebe o zeep.Client e retorna a lista de _soapheaders.
+        - conexoes (int): Tamanho do pool de conexões HTTP (use ao menos o número de threads).
+        - timeout (int): Timeout, em segundos, das chamadas às operações.
+        - metricas (MetricasSoap, opcional): Coletor de métricas. Se omitido, usa o global METRICAS.
+        """
+        self.wsdl = wsdl
+        self.cabecalho = cabecalho
+        self.timeout = timeout
+        self.metricas = metricas or METRICAS
+
+        self.session = Session()
+        adaptador = HTTPAdapter(pool_connections=conexoes, pool_maxsize=conexoes, max_retries=3)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+
+        Path(CACHE_WSDL).parent.mkdir(parents=True, exist_ok=True)
+        self._cache = SqliteCache(path=CACHE_WSDL, timeout=CACHE_WSDL_VALIDADE)
+        self._local = threading.local()
+
+    @property
+    def client(self) -> Client:
+        """
+        zeep.Client da thread atual, criado no primeiro uso.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            transport = Transport(session=self.session, cache=self._cache, operation_timeout=self.timeout)
+            client = Client(wsdl=self.wsdl, transport=transport)
+            self._local.client = client
+            self._local.soapheaders = self.cabecalho(client) if self.cabecalho else None
+        return client
+
+    def chamar(self, operacao: str, body: dict):
+        """
+        Executa a operação SOAP e registra sua latência.
+        """
+        client = self.client
+        argumentos = dict(body)
+        if self._local.soapheaders:
+            argumentos['_soapheaders'] = self._local.soapheaders
+
+        inicio = perf_counter()
+        erro = True
+        try:
+            response = client.service[operacao](**argumentos)
+            erro = False
+            return response
+        finally:
+            self.metricas.registrar(operacao, perf_counter() - inicio, erro=erro)
+
+
+METRICAS = MetricasSoap()
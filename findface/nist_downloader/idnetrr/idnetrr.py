@@ -3,6 +3,9 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from NIST import NIST
 from functions import *
+from indice_arquivos import obter_indice
+from nist_builder import NistBuilder, GravadorNist
+from transcodificador import obter_transcodificador
 import traceback
 import os
 import base64
@@ -13,6 +16,30 @@ APP_DIR = Path(__file__).parent.parent
 NIST_DIR = APP_DIR / "nists/rr/civil"
 DOWNLOAD_DIR = NIST_DIR
 
+# Campos do NIST do IDNet (wsPolicia), normalizados pelo NistBuilder
+BUILDER_IDNET = NistBuilder(
+    campos=[
+        ('2.030', 'nome', formata_nome),  # Nome
+        ('2.035', 'nascimento', formata_data_nascimento),  # Data de nascimento
+        ('2.037', 'cidade_nascimento', formata_nome),  # Cidade de nascimento
+        ('2.039', 'sexo', formata_sexo),  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
+        ('2.201', 'pai', formata_nome),  # Pai
+        ('2.202', 'mae', formata_nome),  # Mae
+        ('2.211', 'documento', formata_documento),  # Documento de Identidade (RG)
+        ('2.212', 'cpf', validate_cpf),  # CPF
+    ],
+    fixos={
+        '1.008': 'RR/CIVIL',  # Base de Origem
+        '2.038': None,  # País de nascimento
+        # '2.213': '',  # Titulo de eleitor
+        # '2.214': '',  # CNH
+        '2.224': None,  # Nome social
+    },
+    face='face',
+    # Foto em JPEG, convertida no pool de processos
+    transcodificador=obter_transcodificador(),
+)
+
 
 def obter_diretorio_download(rg):
     subdiretorio = hash_to_3_digits(int(rg))
@@ -47,47 +74,28 @@ def obter_biometria_idnet_por_rg(rg):
 
             documento = str(info_cidadao['rg'])
 
-            # Cria o NIST
-            new_nist = NIST()
-            new_nist.add_Type01()
-            new_nist.add_Type02()
-
-            # Base de Origem
-            new_nist.set_field('1.008', 'RR/CIVIL', idc=0)  # Base de Origem
-            
-            new_nist.set_field('2.030', formata_nome(info_cidadao['nome']), idc=0)  # Nome
-            new_nist.set_field('2.035', formata_data_nascimento(info_cidadao['nascimento']), idc=0)  # Data de nascimento
-            new_nist.set_field('2.037', formata_nome(info_cidadao["cidade_nascimento"]), idc=0)  # Cidade de nascimento
-            new_nist.set_field('2.038', None, idc=0)  # País de nascimento
-            new_nist.set_field('2.039', formata_sexo(info_cidadao["sexo"]), idc=0)  # Sexo 1|M-Masculino, 2|F-Feminino, ?|O-Outros
-            new_nist.set_field('2.201', formata_nome(info_cidadao['pai']), idc=0)  # Pai
-            new_nist.set_field('2.202', formata_nome(info_cidadao['mae']), idc=0)  # Mae
-            new_nist.set_field('2.211', formata_documento(documento))  # Documento de Identidade (RG)
-            new_nist.set_field('2.212', validate_cpf(info_cidadao['cpf']), idc=0),  # CPF
-            # new_nist.set_field('2.213', '', idc=0)  # Titulo de eleitor
-            # new_nist.set_field('2.214', '', idc=0)  # CNH
-            new_nist.set_field('2.224', None, idc=0)  # Nome social
-
-            # Assinatura
-            # new_nist.add_ntype(8)
-            # new_nist.add_idc(8, 1)
+            # Assinatura (tipo 8) não é gravada
             # assinatura = convert_to_jpeg(wscivil.obter_assinatura(info_cidadao['numero_pessoa']))
-            # new_nist.set_field('8.999', assinatura, idc=1)
 
             # face = convert_to_jpeg(wscivil.obter_foto_3x4(info_cidadao['numero_pessoa']))
             if info_cidadao["foto"] is not None and isinstance(info_cidadao["foto"], str):
-                # Faces
-                new_nist.add_ntype(10)
-                new_nist.add_idc(10, 1)
-                face = base64.b64decode(info_cidadao["foto"])
-                new_nist.set_field('10.999', face, idc=1)
+                # Cria o NIST
+                new_nist = BUILDER_IDNET.construir_um({
+                    **info_cidadao,
+                    'documento': documento,
+                    'face': base64.b64decode(info_cidadao["foto"]),
+                })
+                if new_nist is None:
+                    print(f"RG {rg} sem foto.")
+                    return
 
                 filename = f"rr-civil-rg{rg}.nst"
                 rg_download_dir = obter_diretorio_download(rg)
                 filepath = rg_download_dir / f"rr-civil-rg{documento}.nst"
 
-                new_nist.write(filepath)
+                GravadorNist.gravar_agora(new_nist, filepath)
                 print(f'[idnet] NIST salvo com sucesso. {filepath}')
+                obter_indice(DOWNLOAD_DIR).registrar(filepath)
 
                 return new_nist
             
@@ -1,6 +1,4 @@
-from zeep import Client, xsd
-from zeep.transports import Transport
-from requests import Session
+from .cliente_soap import ClienteSoap
 import json
 from datetime import datetime, timedelta
 from base64 import b64decode, b64encode
@@ -9,6 +7,12 @@ import re
 import traceback
 
 
+WSDL_WSPOLICIA = 'http://www.idnetbrasil.rr.gov.br/idNet.WebServicesnEW/Forms/wsPolicia.asmx?WSDL'
+
+# Cliente compartilhado: o WSDL é carregado uma vez por thread, e não a cada consulta de RG
+CLIENTE_WSPOLICIA = ClienteSoap(WSDL_WSPOLICIA)
+
+
 def busca_wspolicia(operacao, body):
 
     if not isinstance(operacao, str):
@@ -17,21 +21,7 @@ def busca_wspolicia(operacao, body):
     if not isinstance(body, dict):
         raise TypeError(f"Tipo {type(body)} inválido. Esperado <'dict'>.")
 
-    wsdl = 'http://www.idnetbrasil.rr.gov.br/idNet.WebServicesnEW/Forms/wsPolicia.asmx?WSDL'
-
-    client = Client(wsdl=wsdl)
-
-    # Assuming the SOAP header needs to be set
-    # Criar um header vazio
-    header = xsd.Element(
-        '{http://tempuri.org/}AuthHeader',
-        xsd.ComplexType([])
-    )
-    header_value = header()
-
-    # Make the call to the SOAP method
-    # response = client.service[operacao](_soapheaders=[header_value], **body)
-    response = client.service[operacao](**body)
+    response = CLIENTE_WSPOLICIA.chamar(operacao, body)
 
     return response
 
@@ -1,22 +1,14 @@
-from zeep import Client, xsd
-from zeep.transports import Transport
-from requests import Session
+from zeep import xsd
+from .cliente_soap import ClienteSoap
 import json
 from datetime import datetime, timedelta
 from base64 import b64decode, b64encode
 
 
-def busca_wscivil(operacao, body):
-
-    if not isinstance(operacao, str):
-        raise TypeError("Tipo <operacao> inválida. Esperado 'str'.")
-    
-    if not isinstance(body, dict):
-        raise TypeError("Tipo <body> inválido. Esperado 'dict'.")
+WSDL_WSCIVIL = 'http://www.idnetbrasil.rr.gov.br/idNet.WebServices/Forms/wscivil.asmx?WSDL'
 
-    wsdl = 'http://www.idnetbrasil.rr.gov.br/idNet.WebServices/Forms/wscivil.asmx?WSDL'
-    client = Client(wsdl)
 
+def cabecalho_wscivil(client):
     # Assuming the SOAP header needs to be set
     header = xsd.Element(
         '{http://tempuri.org/}AuthHeader',
@@ -27,9 +19,23 @@ def busca_wscivil(operacao, body):
         ])
     )
     header_value = header(Usuario='PFRR', Senha='PFRR2024', Key='1')
-    # Make the call to the SOAP method
+    return [header_value]
+
+
+# Cliente compartilhado: o WSDL é carregado uma vez por thread e o cabeçalho montado uma única vez
+CLIENTE_WSCIVIL = ClienteSoap(WSDL_WSCIVIL, cabecalho=cabecalho_wscivil)
+
+
+def busca_wscivil(operacao, body):
+
+    if not isinstance(operacao, str):
+        raise TypeError("Tipo <operacao> inválida. Esperado 'str'.")
+    
+    if not isinstance(body, dict):
+        raise TypeError("Tipo <body> inválido. Esperado 'dict'.")
+
     # response = client.service.BuscarPorRG(_soapheaders=[header_value], v_iRG='222921')
-    response = client.service[operacao](_soapheaders=[header_value], **body)
+    response = CLIENTE_WSCIVIL.chamar(operacao, body)
 
     return response
 
@@ -0,0 +1,169 @@
+"""
+Índice dos arquivos NIST já baixados, por nome de arquivo.
+
+Substitui a listagem completa da árvore de downloads (os.walk) feita na inicialização dos scripts.
+Os nomes ficam em um SQLite dentro do próprio diretório de download e, na memória, em um filtro de
+Bloom: a maioria das consultas de arquivos inexistentes é respondida sem acessar o disco, e as
+positivas são confirmadas no SQLite.
+
+Uso:
+    indice = obter_indice(DOWNLOAD_DIR)
+    if 'rr-detran-cpf123.nst' in indice: ...
+    indice.registrar(filepath)
+
+Para (re)construir o índice a partir dos arquivos existentes:
+    python indice_arquivos.py nists/rr/detran
+"""
+import argparse
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+NOME_DB = '.indice_arquivos.sqlite3'
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom simples: sem falsos negativos, falsos positivos na taxa configurada.
+    """
+
+    def __init__(self, capacidade: int = 1_000_000, taxa_falso_positivo: float = 0.01):
+        bits = max(8, int(-capacidade * math.log(taxa_falso_positivo) / (math.log(2) ** 2)))
+        self.bits = bits
+        self.hashes = max(1, round(bits / capacidade * math.log(2)))
+        self._bitmap = bytearray((bits + 7) // 8)
+
+    def _posicoes(self, chave: str):
+        digest = hashlib.blake2b(chave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def adicionar(self, chave: str) -> None:
+        for posicao in self._posicoes(chave):
+            self._bitmap[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave: str) -> bool:
+        return all(self._bitmap[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+
+class IndiceArquivos:
+    """
+    Conjunto persistente dos nomes de arquivo existentes em um diretório de download.
+
+    Observações:
+    - O filtro de Bloom é carregado do SQLite na criação e atualizado por registrar(). Arquivos
+      registrados por outro processo depois disso podem não ser vistos pelo filtro; nesse caso o
+      download é refeito, como acontecia com a lista carregada na inicialização.
+    """
+
+    def __init__(self, diretorio: str | Path, capacidade: int = 1_000_000):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        caminho_db = self.diretorio / NOME_DB
+        self.novo = not caminho_db.exists()
+
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(str(caminho_db), check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tb_arquivo (
+                nome TEXT PRIMARY KEY,
+                caminho TEXT NOT NULL,
+                dt_registro TEXT NOT NULL
+            )
+            """
+        )
+        self._conexao.commit()
+
+        total = self._conexao.execute("SELECT count(*) FROM tb_arquivo").fetchone()[0]
+        self._bloom = FiltroBloom(max(capacidade, total * 2))
+        for (nome,) in self._conexao.execute("SELECT nome FROM tb_arquivo"):
+            self._bloom.adicionar(nome)
+
+        # Primeira execução: importa os arquivos que já existem no diretório (única varredura da árvore)
+        if self.novo:
+            self.reconstruir()
+
+    def __contains__(self, nome: str) -> bool:
+        if nome not in self._bloom:
+            return False
+        with self._lock:
+            return self._conexao.execute("SELECT 1 FROM tb_arquivo WHERE nome = ?", (nome,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conexao.execute("SELECT count(*) FROM tb_arquivo").fetchone()[0]
+
+    def registrar(self, filepath: str | Path) -> None:
+        """
+        Registra um arquivo recém-gravado.
+        """
+        filepath = Path(filepath)
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO tb_arquivo (nome, caminho, dt_registro) VALUES (?, ?, ?)",
+                (filepath.name, str(filepath), datetime.now().isoformat()),
+            )
+            self._conexao.commit()
+            self._bloom.adicionar(filepath.name)
+
+    def reconstruir(self, extensao: str = '.nst') -> int:
+        """
+        Percorre o diretório e substitui o conteúdo do índice pelos arquivos com a extensão informada.
+
+        Retorna:
+        - int: Quantidade de arquivos encontrados.
+        """
+        registros = []
+        for root, dirs, files in os.walk(self.diretorio):
+            for file in files:
+                if file.endswith(extensao):
+                    registros.append((file, os.path.join(root, file)))
+
+        agora = datetime.now().isoformat()
+        with self._lock:
+            self._conexao.execute("DELETE FROM tb_arquivo")
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO tb_arquivo (nome, caminho, dt_registro) VALUES (?, ?, ?)",
+                ((nome, caminho, agora) for nome, caminho in registros),
+            )
+            self._conexao.commit()
+            for nome, _ in registros:
+                self._bloom.adicionar(nome)
+
+        print(f"[indice_arquivos] {len(registros)} arquivos indexados em {self.diretorio}.")
+        return len(registros)
+
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def obter_indice(diretorio: str | Path) -> IndiceArquivos:
+    """
+    Retorna o índice compartilhado do diretório, criando-o no primeiro uso.
+    """
+    chave = str(Path(diretorio).resolve())
+    with _indices_lock:
+        if chave not in _indices:
+            _indices[chave] = IndiceArquivos(diretorio)
+        return _indices[chave]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="(Re)constrói o índice de arquivos NIST de um diretório de download.")
+    parser.add_argument('diretorio', type=Path)
+    args = parser.parse_args()
+
+    indice = obter_indice(args.diretorio)
+    if not indice.novo:
+        indice.reconstruir()
@@ -0,0 +1,338 @@
+"""
+Normalização dos campos texto das pessoas (nomes, datas, documentos, CPF e nacionalidade).
+
+Os formatadores rodam campo a campo, registro a registro, nos downloaders, envios e backups, e os valores
+se repetem muito (nomes de mães, cidades, nacionalidades, datas). Por isso:
+
+- cada formatador tem um cache LRU limitado (valores não hasheáveis são formatados sem cache);
+- datas nos formatos mais comuns são interpretadas por expressões regulares pré-compiladas, sem strptime
+  (os demais casos seguem pelo strptime, como antes);
+- a tabela de países é lida uma única vez, e não a cada chamada;
+- as variantes em lote (formata_nomes, valida_cpfs etc.) recebem listas, arrays NumPy ou qualquer
+  iterável e formatam cada valor distinto uma única vez.
+
+O functions.py reexporta estes formatadores; os scripts continuam usando "from functions import *".
+
+Micro-benchmark (operações/s sem cache, com cache e em lote):
+    python normalizacao.py --valores 100000
+"""
+import argparse
+import csv
+import re
+import time
+from datetime import date, datetime
+from functools import lru_cache, wraps
+from pathlib import Path
+
+from unidecode import unidecode
+
+
+TAMANHO_CACHE = 65536
+
+TB_PAIS = Path(__file__).parent / 'TB_PAIS.csv'
+
+# Formatos de data na ordem de prioridade; os rápidos cobrem os mesmos formatos com dia e mês com dois dígitos
+FORMATOS_DATA = [r'%Y-%m-%d', r'%Y%m%d', r'%d-%m-%Y', r'%d%m%Y', r'%d/%m/%Y',]
+FORMATOS_DATA_RAPIDOS = [
+    (re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})'), (1, 2, 3)),  # %Y-%m-%d
+    (re.compile(r'([0-9]{4})([0-9]{2})([0-9]{2})'), (1, 2, 3)),  # %Y%m%d
+    (re.compile(r'([0-9]{2})-([0-9]{2})-([0-9]{4})'), (3, 2, 1)),  # %d-%m-%Y
+    (re.compile(r'([0-9]{2})([0-9]{2})([0-9]{4})'), (3, 2, 1)),  # %d%m%Y
+    (re.compile(r'([0-9]{2})/([0-9]{2})/([0-9]{4})'), (3, 2, 1)),  # %d/%m/%Y
+]
+
+
+def memoizar(funcao):
+    """
+    Cache LRU limitado (TAMANHO_CACHE) que formata sem cache os valores não hasheáveis.
+    A função original continua acessível em funcao.__wrapped__.
+    """
+    em_cache = lru_cache(maxsize=TAMANHO_CACHE, typed=True)(funcao)
+
+    @wraps(funcao)
+    def formatar(valor):
+        try:
+            return em_cache(valor)
+        except TypeError:
+            if getattr(valor, '__hash__', None) is None:
+                return funcao(valor)
+            raise
+
+    formatar.cache_info = em_cache.cache_info
+    formatar.cache_clear = em_cache.cache_clear
+    return formatar
+
+
+def em_lote(formatador):
+    """
+    Cria a variante em lote do formatador: recebe um iterável (lista, array NumPy, coluna) e retorna a lista
+    dos valores formatados, chamando o formatador uma única vez por valor distinto.
+    """
+    def formatar_lote(valores) -> list:
+        if hasattr(valores, 'tolist'):
+            valores = valores.tolist()
+        distintos = {}
+        resultado = []
+        for valor in valores:
+            try:
+                resultado.append(distintos[valor])
+            except KeyError:
+                distintos[valor] = formatador(valor)
+                resultado.append(distintos[valor])
+            except TypeError:
+                resultado.append(formatador(valor))
+        return resultado
+
+    formatar_lote.__name__ = f'{formatador.__name__}_lote'
+    formatar_lote.__doc__ = f'Variante em lote de {formatador.__name__}.'
+    return formatar_lote
+
+
+@memoizar
+def formata_nome(s):
+    if s is None:
+        return None
+
+    # Ensure that it's string type
+    if not isinstance(s, str):
+        raise TypeError("Input must be a string")
+
+    # Remove all double spaces between words (and spaces at the beginning and end)
+    s = ' '.join(s.split())
+
+    # If the remaining string is empty, set it to None
+    if not s:
+        return None
+
+    # Uppercase all letters and convert them to ASCII representation
+    return unidecode(s.upper())
+
+
+@memoizar
+def formata_documento(s):
+    if s is None:
+        return None
+
+    # Ensure that it's string type
+    if not isinstance(s, (str)):
+        raise TypeError("Input must be a string")
+
+    # Remove spaces at the beginning and end
+    s = s.strip()
+
+    # If the remaining string is empty, set it to None
+    if not s:
+        return None
+
+    # Remove all characters that are not alpha or digit
+    s = ''.join(filter(str.isalnum, s))
+
+    # Convert all letters to ASCII representation and uppercase them
+    return unidecode(s).upper()
+
+
+@memoizar
+def _formata_data_texto(date_input: str) -> str | None:
+    # Caminho rápido: formatos com dia e mês com dois dígitos, sem strptime
+    for expressao, (ano, mes, dia) in FORMATOS_DATA_RAPIDOS:
+        correspondencia = expressao.fullmatch(date_input)
+        if correspondencia is None:
+            continue
+        try:
+            data = date(int(correspondencia[ano]), int(correspondencia[mes]), int(correspondencia[dia]))
+        except ValueError:
+            continue
+        if data.year < 1000:
+            break  # O strftime não completa anos com menos de 4 dígitos: mantém o resultado do strptime
+        return f'{data.year}-{data.month:02d}-{data.day:02d}'
+
+    # Demais variações aceitas pelo strptime (ex.: dia/mês com um dígito)
+    for fmt in FORMATOS_DATA:
+        try:
+            # Parse the date string using the current format
+            parsed_date = datetime.strptime(date_input, fmt)
+            # If successful, return the date in the desired format
+            return parsed_date.strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+    return None
+
+
+def formata_data_nascimento(date_input):
+    """
+    Formats a given date input (datetime object or string in various formats) to a string in '%Y-%m-%d' format.
+
+    Parameters:
+    - date_input (datetime or str): The date to format, which can be a datetime object or a string in one of the following formats:
+      '%Y-%m-%d', '%Y%m%d', '%d-%m-%Y', '%d%m%Y' or '%d/%m/%Y'.
+
+    Returns:
+    - str: The date formatted in '%Y-%m-%d' format if the input is valid. Returns None if the date is invalid.
+    """
+    # If input is already a datetime object, format it to the desired format
+    if isinstance(date_input, datetime):
+        return date_input.strftime('%Y-%m-%d')
+
+    # If input is a string, try parsing it with the acceptable formats
+    elif isinstance(date_input, str):
+        return _formata_data_texto(date_input)
+
+    # If no formats match
+    # raise ValueError(f'Data de nascimento "{date_input}" inválida.')
+    return None
+
+
+def preencher_zeros(valor):
+    # Converte o valor para string, se não for uma já
+    valor_str = str(valor)
+    # Preenche com zeros à esquerda até completar 11 caracteres
+    return valor_str.zfill(11)
+
+
+@memoizar
+def validate_cpf(numbers: str | int) -> str:
+    """
+    Validates a Brazilian CPF number for correct formatting and checks the digits according to the CPF rules.
+
+    The CPF (Cadastro de Pessoas Físicas) is a Brazilian individual taxpayer registry identification. This function
+    checks if the provided CPF is valid by ensuring it contains 11 digits, is not a sequence of identical numbers,
+    and both of its verifying digits are correct according to the standard CPF formula.
+
+    Parameters:
+    - numbers (str | int): The CPF number to validate. It can be provided as a string or integer. Strings
+      can contain non-digit characters, which will be ignored.
+
+    Returns:
+    - str: The validated CPF number as a string of digits if it is valid.
+    - bool: False if the CPF number is invalid.
+    - None: If the input is not a string or an integer, or if it's an empty or whitespace-only string.
+
+    Examples:
+    - validate_cpf("123.456.789-09") -> False (assuming it's an invalid CPF number)
+    - validate_cpf(12345678909) -> "12345678909" (assuming it's a valid CPF number)
+    - validate_cpf("111.111.111-11") -> False (invalid because it's a sequence of identical numbers)
+    """
+
+    if isinstance(numbers, int):
+        numbers = str(numbers)
+
+    numbers = preencher_zeros(numbers)
+
+    if isinstance(numbers, str) and numbers is not None and len(numbers.strip()) > 0:
+        cpf = [int(char) for char in numbers if char.isdigit()]
+        if len(cpf) != 11:
+            return False
+        if cpf.count(cpf[0]) == 11:
+            return False
+        for i in range(9, 11):
+            value = sum(cpf[num] * (i + 1 - num) for num in range(0, i))
+            digit = ((value * 10) % 11) % 10
+            if digit != cpf[i]:
+                return False
+        return ''.join(map(str, cpf))
+
+
+@lru_cache(maxsize=1)
+def tabela_paises() -> tuple[dict, frozenset]:
+    """
+    Lê o TB_PAIS.csv uma única vez e retorna ({código: nome}, {nomes}), já normalizados por formata_nome.
+    """
+    dict_codigo_nome_pais = {}
+
+    with open(TB_PAIS, mode='r', encoding='utf-8') as file:
+        csv_reader = csv.reader(file)
+        for row in csv_reader:
+            if row[0] == 'CD_PAIS':  # Exclui a linha cabeçalho
+                continue
+
+            dict_codigo_nome_pais[formata_nome(row[0])] = formata_nome(row[1])
+
+    return dict_codigo_nome_pais, frozenset(dict_codigo_nome_pais.values())
+
+
+@memoizar
+def formata_nacionalidade(value):
+
+    if value is None:
+        return None
+
+    dict_codigo_nome_pais, nomes_paises = tabela_paises()
+
+    nacionalidade = formata_nome(value)
+
+    if nacionalidade.isdigit():
+        nacionalidade = dict_codigo_nome_pais.get(value)
+    elif nacionalidade not in nomes_paises:
+        nacionalidade = None
+
+    return nacionalidade
+
+
+formata_nomes = em_lote(formata_nome)
+formata_documentos = em_lote(formata_documento)
+formata_datas_nascimento = em_lote(formata_data_nascimento)
+valida_cpfs = em_lote(validate_cpf)
+formata_nacionalidades = em_lote(formata_nacionalidade)
+
+
+def _valores_benchmark(quantidade: int) -> dict:
+    """
+    Gera valores com a repetição típica dos cadastros (poucos nomes de mães, cidades e datas distintos).
+    """
+    nomes = ['maria  da silva', 'José de Souza ', 'ANA PAULA  conceição', 'Francisca das Chagas', 'joão batista']
+    datas = ['1990-01-31', '31/01/1990', '19851225', '25121985', '1-2-1970']
+    documentos = ['123.456-7 SSP/RR', ' 98765 ', 'rg 1.234.567']
+    cpfs = ['529.982.247-25', '11144477735', 12345678909, '000.000.000-00']
+    return {
+        'formata_nome': [nomes[i % len(nomes)] + str(i % 500) for i in range(quantidade)],
+        'formata_data_nascimento': [datas[i % len(datas)] for i in range(quantidade)],
+        'formata_documento': [documentos[i % len(documentos)] + str(i % 500) for i in range(quantidade)],
+        'validate_cpf': [cpfs[i % len(cpfs)] for i in range(quantidade)],
+    }
+
+
+def _data_strptime(valor):
+    """
+    Interpretação das datas somente pelo strptime (sem o caminho rápido), para comparação no benchmark.
+    """
+    for fmt in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+
+def benchmark(quantidade: int = 100000) -> None:
+    """
+    Mede operações/s de cada formatador: sem cache (função original), com cache e em lote.
+    """
+    formatadores = {
+        'formata_nome': (formata_nome.__wrapped__, formata_nome, formata_nomes),
+        'formata_data_nascimento': (_data_strptime, formata_data_nascimento, formata_datas_nascimento),
+        'formata_documento': (formata_documento.__wrapped__, formata_documento, formata_documentos),
+        'validate_cpf': (validate_cpf.__wrapped__, validate_cpf, valida_cpfs),
+    }
+    for nome, valores in _valores_benchmark(quantidade).items():
+        sem_cache, com_cache, lote = formatadores[nome]
+        for formatador in (formata_nome, formata_documento, validate_cpf, _formata_data_texto):
+            formatador.cache_clear()
+
+        medicoes = []
+        for rotulo, executar in (
+            ('sem cache', lambda: [sem_cache(valor) for valor in valores]),
+            ('com cache', lambda: [com_cache(valor) for valor in valores]),
+            ('em lote', lambda: lote(valores)),
+        ):
+            inicio = time.perf_counter()
+            executar()
+            medicoes.append(f"{rotulo}: {quantidade / (time.perf_counter() - inicio):,.0f} ops/s")
+        print(f"[normalizacao] {nome:<24} " + ' | '.join(medicoes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Micro-benchmark dos formatadores (operações/s).")
+    parser.add_argument('--valores', type=int, default=100000, help="Valores formatados por formatador.")
+    args = parser.parse_args()
+
+    benchmark(args.valores)
@@ -0,0 +1,92 @@
+"""
+Testes da montagem das faces e digitais no NistBuilder, com um transcodificador falso.
+
+Execução:
+    python -m pytest -q test_nist_builder.py
+"""
+from nist_builder import NistBuilder
+
+
+class TranscodificadorFalso:
+    """
+    Mesmo contrato do TranscodificadorImagens: ignora itens vazios e retorna None para o que não converte.
+    """
+
+    def __init__(self):
+        self.itens = []
+
+    def _converter(self, itens, prefixo):
+        itens = [(id_imagem, conteudo) for id_imagem, conteudo in itens if conteudo]
+        self.itens.extend(itens)
+        return {id_imagem: None if conteudo == b'corrompida' else prefixo + conteudo for id_imagem, conteudo in itens}
+
+    def para_jpeg(self, itens):
+        return self._converter(itens, b'jpeg:')
+
+    def para_wsq(self, itens):
+        return self._converter(itens, b'wsq:')
+
+
+def builder(manter_originais=False):
+    return NistBuilder(
+        campos=[('2.030', 'nome')],
+        fixos={'1.008': 'RR/DETRAN'},
+        face='face',
+        digitais='digitais',
+        campos_digital={'4.008': 1},
+        transcodificador=TranscodificadorFalso(),
+        manter_originais=manter_originais,
+    )
+
+
+def pessoa(nome, digitais, face=b'face'):
+    return {'nome': nome, 'face': face, 'digitais': digitais}
+
+
+def test_dedo_ausente_fica_fora_do_tipo_4():
+    dedos = [b'dedo%d' % dedo for dedo in range(1, 10)] + [None]
+
+    sem_dedo, completo = builder().construir([pessoa('FULANO', dedos), pessoa('CICLANO', [b'dedo'] * 10)])
+
+    assert sem_dedo is not None and completo is not None
+    assert sem_dedo.get_field('10.999', idc=1) == b'jpeg:face'
+    assert sem_dedo.get_idc(4) == list(range(1, 10))
+    assert sem_dedo.get_field('4.999', idc=9) == b'wsq:dedo9'
+    assert sem_dedo.get_field('4.004', idc=9) == 9
+    assert completo.get_idc(4) == list(range(1, 11))
+
+
+def test_dedo_ausente_no_meio_mantem_a_posicao_dos_demais():
+    dedos = [b'dedo1', b'', None] + [b'dedo%d' % dedo for dedo in range(4, 11)]
+
+    new_nist = builder().construir_um(pessoa('FULANO', dedos))
+
+    assert new_nist.get_idc(4) == [1] + list(range(4, 11))
+    assert new_nist.get_field('4.999', idc=4) == b'wsq:dedo4'
+    assert new_nist.get_field('4.004', idc=4) == 4
+
+
+def test_pessoa_sem_digitais_nem_face_gera_nist_so_com_texto():
+    new_nist = builder().construir_um(pessoa('FULANO', [None] * 10, face=None))
+
+    assert new_nist is not None
+    assert 4 not in new_nist.get_ntype() and 10 not in new_nist.get_ntype()
+
+
+def test_imagem_presente_que_nao_converte_rejeita_o_registro():
+    dedos = [b'dedo'] * 9 + [b'corrompida']
+
+    rejeitado, gravado = builder().construir([pessoa('FULANO', dedos), pessoa('CICLANO', [b'dedo'] * 10)])
+
+    assert rejeitado is None
+    assert gravado is not None
+
+
+def test_manter_originais_grava_a_imagem_que_nao_converte():
+    dedos = [b'dedo'] * 9 + [b'corrompida']
+
+    new_nist = builder(manter_originais=True).construir_um(pessoa('FULANO', dedos, face=b'corrompida'))
+
+    assert new_nist.get_field('10.999', idc=1) == b'corrompida'
+    assert new_nist.get_field('4.999', idc=10) == b'corrompida'
+    assert new_nist.get_field('4.999', idc=1) == b'wsq:dedo'
@@ -0,0 +1,238 @@
+"""
+Serviço de transcodificação de imagens (faces em JPEG, digitais em WSQ) em um pool de processos.
+
+Os codecs (PIL, wsq, imagecodecs) rodam em Python puro na maior parte do tempo e seguram o GIL: com
+dez digitais por pessoa, a conversão feita na thread de gravação limitava os downloaders a um núcleo.
+O TranscodificadorImagens recebe lotes de (id, bytes), copia o lote inteiro para um bloco de memória
+compartilhada e distribui fatias de offsets entre os processos, que leem dali sem serializar as imagens
+de entrada. Só as imagens convertidas voltam pelo pipe do pool.
+
+Imagens que já estão no formato de destino não são reconvertidas (ver functions.normaliza_imagem).
+
+Uso:
+    transcodificador = obter_transcodificador()
+    faces = transcodificador.para_jpeg([(cpf, foto) for cpf, foto in fotos])
+    digitais = transcodificador.para_wsq(list(enumerate(dedos, start=1)))
+
+Benchmark (imagens/s por codec, em linha e no pool):
+    python transcodificador.py --imagens 200 --processos 4
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from functions import JPEG_QUALIDADE_PADRAO, convert_to_wsq, is_valid_wsq, normaliza_imagem
+
+
+FORMATOS = ('jpeg', 'wsq')
+
+
+def transcodifica_imagem(conteudo: bytes, formato: str, qualidade: int = JPEG_QUALIDADE_PADRAO) -> bytes:
+    """
+    Converte uma imagem para 'jpeg' ou 'wsq'. Imagens já no formato de destino são devolvidas sem alteração.
+    """
+    if formato == 'jpeg':
+        imagem, _ = normaliza_imagem(conteudo, qualidade=qualidade, formatos_aceitos=('jpeg',))
+        return imagem
+    elif formato == 'wsq':
+        if is_valid_wsq(conteudo):
+            return conteudo
+        return convert_to_wsq(conteudo)
+    else:
+        raise ValueError(f"Formato '{formato}' inválido. Esperado um de {FORMATOS}.")
+
+
+def _transcodifica_fatia(nome_memoria: str, fatia: list, formato: str, qualidade: int) -> list:
+    """
+    Executada nos processos do pool: converte as imagens [(id, offset, tamanho)] do bloco compartilhado.
+
+    Retorna [(id, bytes|None, erro|None)].
+    """
+    # Os workers usam o mesmo resource_tracker do processo principal, que é quem remove o bloco (unlink)
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    try:
+        resultado = []
+        for id_imagem, offset, tamanho in fatia:
+            conteudo = bytes(memoria.buf[offset:offset + tamanho])
+            try:
+                resultado.append((id_imagem, transcodifica_imagem(conteudo, formato, qualidade), None))
+            except Exception as e:
+                resultado.append((id_imagem, None, f"{type(e).__name__}: {e}"))
+        return resultado
+    finally:
+        memoria.close()
+
+
+class TranscodificadorImagens:
+    """
+    Pool de processos para conversão de lotes de imagens.
+    """
+
+    def __init__(self, processos: int | None = None, imagens_por_tarefa: int = 8):
+        """
+        Argumentos:
+        - processos (int, opcional): Processos do pool (padrão: núcleos da máquina). 0 converte na thread atual.
+        - imagens_por_tarefa (int): Máximo de imagens de uma fatia enviada a um processo.
+        """
+        self.processos = os.cpu_count() if processos is None else processos
+        self.imagens_por_tarefa = max(1, imagens_por_tarefa)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _obter_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: os downloaders já têm várias threads rodando quando o pool é criado (fork não é seguro)
+                self._executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def transcodificar(self, itens, formato: str, qualidade: int = JPEG_QUALIDADE_PADRAO) -> dict:
+        """
+        Converte um lote de imagens.
+
+        Argumentos:
+        - itens: Iterável de (id, bytes). Itens com bytes vazios/None são ignorados.
+        - formato (str): 'jpeg' ou 'wsq'.
+        - qualidade (int): Qualidade do JPEG.
+
+        Retorna:
+        - dict: {id: bytes convertidos}, ou {id: None} para as imagens que não puderam ser convertidas.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato '{formato}' inválido. Esperado um de {FORMATOS}.")
+
+        itens = [(id_imagem, conteudo) for id_imagem, conteudo in itens if conteudo]
+        if not itens:
+            return {}
+
+        if self.processos == 0:
+            resultado = []
+            for id_imagem, conteudo in itens:
+                try:
+                    resultado.append((id_imagem, transcodifica_imagem(bytes(conteudo), formato, qualidade), None))
+                except Exception as e:
+                    resultado.append((id_imagem, None, f"{type(e).__name__}: {e}"))
+            return self._resultado(resultado)
+
+        # Copia o lote inteiro para um único bloco compartilhado
+        offsets = []
+        total = 0
+        for id_imagem, conteudo in itens:
+            offsets.append((id_imagem, total, len(conteudo)))
+            total += len(conteudo)
+
+        memoria = shared_memory.SharedMemory(create=True, size=total)
+        try:
+            for (_, offset, tamanho), (_, conteudo) in zip(offsets, itens):
+                memoria.buf[offset:offset + tamanho] = conteudo
+
+            # Divide o lote entre os processos, respeitando o máximo de imagens por tarefa
+            tamanho_fatia = min(self.imagens_por_tarefa, math.ceil(len(offsets) / self.processos))
+            executor = self._obter_executor()
+            futuros = [
+                executor.submit(_transcodifica_fatia, memoria.name, offsets[i:i + tamanho_fatia], formato, qualidade)
+                for i in range(0, len(offsets), tamanho_fatia)
+            ]
+            resultado = [item for futuro in futuros for item in futuro.result()]
+        finally:
+            memoria.close()
+            memoria.unlink()
+
+        return self._resultado(resultado)
+
+    @staticmethod
+    def _resultado(resultado: list) -> dict:
+        convertidas = {}
+        for id_imagem, conteudo, erro in resultado:
+            if erro is not None:
+                print(f"[transcodificador] Falha ao converter a imagem {id_imagem}: {erro}")
+            convertidas[id_imagem] = conteudo
+        return convertidas
+
+    def para_jpeg(self, itens, qualidade: int = JPEG_QUALIDADE_PADRAO) -> dict:
+        return self.transcodificar(itens, 'jpeg', qualidade)
+
+    def para_wsq(self, itens) -> dict:
+        return self.transcodificar(itens, 'wsq')
+
+    def encerrar(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_transcodificador = None
+_transcodificador_lock = threading.Lock()
+
+
+def obter_transcodificador(processos: int | None = None) -> TranscodificadorImagens:
+    """
+    Retorna o transcodificador compartilhado do processo, criando-o no primeiro uso.
+    """
+    global _transcodificador
+    with _transcodificador_lock:
+        if _transcodificador is None:
+            _transcodificador = TranscodificadorImagens(processos)
+        return _transcodificador
+
+
+def _imagens_teste(quantidade: int, formato: str, largura: int, altura: int) -> list:
+    """
+    Gera imagens sintéticas (ruído em tons de cinza) no formato PIL informado.
+    """
+    imagens = []
+    for i in range(quantidade):
+        img = Image.frombytes('L', (largura, altura), os.urandom(largura * altura))
+        saida = BytesIO()
+        img.save(saida, formato)
+        imagens.append((i, saida.getvalue()))
+    return imagens
+
+
+def benchmark(imagens: int = 100, processos: int | None = None, largura: int = 800, altura: int = 750) -> None:
+    """
+    Mede imagens/s de cada conversão, na thread atual e no pool de processos.
+    """
+    casos = [
+        ('png -> wsq', 'PNG', 'wsq'),
+        ('jpeg -> wsq', 'JPEG', 'wsq'),
+        ('wsq -> jpeg', 'WSQ', 'jpeg'),
+        ('png -> jpeg', 'PNG', 'jpeg'),
+    ]
+    em_linha = TranscodificadorImagens(processos=0)
+    pool = TranscodificadorImagens(processos=processos)
+    try:
+        # Aquece o pool (criação dos processos e imports) fora da medição
+        pool.para_jpeg(_imagens_teste(pool.processos, 'PNG', 64, 64))
+
+        print(f"[transcodificador] {imagens} imagens {largura}x{altura}, pool com {pool.processos} processos")
+        for nome, formato_origem, formato_destino in casos:
+            lote = _imagens_teste(imagens, formato_origem, largura, altura)
+            for rotulo, transcodificador in (('em linha', em_linha), ('pool', pool)):
+                inicio = time.perf_counter()
+                convertidas = transcodificador.transcodificar(lote, formato_destino)
+                duracao = time.perf_counter() - inicio
+                falhas = sum(1 for conteudo in convertidas.values() if conteudo is None)
+                print(f"[transcodificador] {nome:<12} {rotulo:<9} {imagens / duracao:8.1f} imagens/s ({falhas} falhas)")
+    finally:
+        pool.encerrar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark do transcodificador de imagens (imagens/s por codec).")
+    parser.add_argument('--imagens', type=int, default=100, help="Imagens por codec.")
+    parser.add_argument('--processos', type=int, default=None, help="Processos do pool (padrão: núcleos da máquina).")
+    parser.add_argument('--largura', type=int, default=800)
+    parser.add_argument('--altura', type=int, default=750)
+    args = parser.parse_args()
+
+    benchmark(args.imagens, args.processos, args.largura, args.altura)
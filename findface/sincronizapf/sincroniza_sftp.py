@@ -0,0 +1,390 @@
+"""
+Motor de sincronização SFTP usado pelos scripts sismigra_diario.py e sismigra_semanal.py.
+
+- A árvore remota é listada com listdir_attr: tamanho, mtime e tipo vêm na própria listagem,
+  sem um stat por arquivo.
+- Um manifesto local (SQLite) guarda (caminho, tamanho, mtime) de cada arquivo já baixado; a
+  comparação com a listagem remota é feita em memória, sem acessar o disco arquivo a arquivo.
+- Os downloads são distribuídos entre várias conexões SFTP em paralelo. Cada arquivo é lido com
+  prefetch (leituras em pipeline) para um arquivo temporário '.part' e renomeado ao final, de modo
+  que um download interrompido nunca deixa um arquivo incompleto com o nome definitivo.
+
+O acesso ao servidor é feito por uma função "conectar" que retorna um objeto com a interface do
+paramiko.SFTPClient (listdir_attr, get, close). SftpLocal implementa essa interface sobre o sistema
+de arquivos local e serve para testar a sincronização sem um servidor SSH.
+"""
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+import time
+import traceback
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import paramiko
+
+
+NOME_MANIFESTO = '.manifesto_sftp.sqlite3'
+SUFIXO_TEMPORARIO = '.part'
+
+ArquivoRemoto = namedtuple('ArquivoRemoto', ['caminho', 'tamanho', 'mtime'])
+
+
+def conector_ssh(hostname: str, port: int = 22, username: str | None = None, **kwargs):
+    """
+    Retorna uma função que abre uma nova conexão SSH e devolve o SFTPClient dela.
+
+    Cada chamada cria uma conexão (transporte) independente: a criptografia de cada transporte roda
+    em uma única thread, então várias conexões escalam melhor do que vários canais na mesma.
+    """
+    def conectar() -> paramiko.SFTPClient:
+        # Carrega as chaves SSH padrão do usuário (normalmente ~/.ssh/id_rsa ou ~/.ssh/id_dsa)
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(hostname, port=port, username=username, **kwargs)
+        sftp = ssh.open_sftp()
+        # Mantém o SSHClient vivo enquanto o SFTPClient estiver em uso
+        sftp._ssh = ssh
+        return sftp
+
+    return conectar
+
+
+def fechar_sftp(sftp) -> None:
+    try:
+        sftp.close()
+    finally:
+        ssh = getattr(sftp, '_ssh', None)
+        if ssh is not None:
+            ssh.close()
+
+
+class SftpLocal:
+    """
+    Substituto do paramiko.SFTPClient que lê de um diretório local (para testes).
+    """
+
+    def __init__(self, raiz: str | Path = '/'):
+        self.raiz = Path(raiz)
+
+    def _local(self, caminho: str) -> Path:
+        return self.raiz / caminho.lstrip('/')
+
+    def listdir_attr(self, caminho: str = '.') -> list:
+        atributos = []
+        for entrada in os.scandir(self._local(caminho)):
+            attr = paramiko.SFTPAttributes.from_stat(entrada.stat(), entrada.name)
+            atributos.append(attr)
+        return atributos
+
+    def get(self, remotepath: str, localpath: str, callback=None, prefetch: bool = True) -> None:
+        shutil.copyfile(self._local(remotepath), localpath)
+
+    def close(self) -> None:
+        pass
+
+
+def listar_remoto(sftp, diretorio_remoto: str, filtro=None, relativo: str = ''):
+    """
+    Percorre recursivamente o diretório remoto e gera um ArquivoRemoto por arquivo.
+
+    Argumentos:
+    - sftp: Cliente SFTP.
+    - diretorio_remoto (str): Diretório remoto a percorrer.
+    - filtro (callable, opcional): Recebe o nome do arquivo e retorna se ele deve ser sincronizado.
+    - relativo (str): Prefixo do caminho relativo (uso interno na recursão).
+    """
+    for attr in sftp.listdir_attr(diretorio_remoto):
+        caminho_relativo = f"{relativo}/{attr.filename}" if relativo else attr.filename
+        if stat.S_ISDIR(attr.st_mode):
+            yield from listar_remoto(sftp, f"{diretorio_remoto.rstrip('/')}/{attr.filename}", filtro, caminho_relativo)
+        elif stat.S_ISREG(attr.st_mode):
+            if filtro is None or filtro(attr.filename):
+                yield ArquivoRemoto(caminho_relativo, attr.st_size, int(attr.st_mtime))
+
+
+class Manifesto:
+    """
+    Registro local de (caminho, tamanho, mtime) dos arquivos já sincronizados.
+    """
+
+    def __init__(self, caminho_db: str | Path):
+        self.caminho_db = Path(caminho_db)
+        self.caminho_db.parent.mkdir(parents=True, exist_ok=True)
+        self.novo = not self.caminho_db.exists()
+
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(str(self.caminho_db), check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tb_manifesto (
+                caminho TEXT PRIMARY KEY,
+                tamanho INTEGER NOT NULL,
+                mtime INTEGER NOT NULL
+            )
+            """
+        )
+        self._conexao.commit()
+
+    def carregar(self, prefixo: str = '') -> dict:
+        """
+        Retorna {caminho: (tamanho, mtime)} dos arquivos registrados sob o prefixo informado.
+        """
+        with self._lock:
+            if prefixo:
+                cursor = self._conexao.execute(
+                    "SELECT caminho, tamanho, mtime FROM tb_manifesto WHERE caminho >= ? AND caminho < ?",
+                    (prefixo, prefixo + '\uffff'),
+                )
+            else:
+                cursor = self._conexao.execute("SELECT caminho, tamanho, mtime FROM tb_manifesto")
+            return {caminho: (tamanho, mtime) for caminho, tamanho, mtime in cursor}
+
+    def registrar(self, arquivos: list) -> None:
+        """
+        Registra uma lista de ArquivoRemoto sincronizados.
+        """
+        if not arquivos:
+            return
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO tb_manifesto (caminho, tamanho, mtime) VALUES (?, ?, ?)",
+                arquivos,
+            )
+            self._conexao.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conexao.execute("SELECT count(*) FROM tb_manifesto").fetchone()[0]
+
+    def fechar(self) -> None:
+        with self._lock:
+            self._conexao.close()
+
+
+class SincronizadorSftp:
+    """
+    Sincroniza um diretório remoto com um diretório local usando várias conexões SFTP.
+    """
+
+    def __init__(self, conectar, diretorio_remoto: str, diretorio_local: str | Path, conexoes: int = 4,
+                 filtro=None, manifesto: Manifesto | None = None, lote_manifesto: int = 200, prefixo_log: str = 'sftp'):
+        """
+        Argumentos:
+        - conectar (callable): Função sem argumentos que abre e retorna um novo cliente SFTP.
+        - diretorio_remoto (str): Diretório base remoto.
+        - diretorio_local (str | Path): Diretório base local.
+        - conexoes (int): Quantidade de conexões SFTP simultâneas (uma por thread de download).
+        - filtro (callable, opcional): Recebe o nome do arquivo e retorna se ele deve ser sincronizado.
+        - manifesto (Manifesto, opcional): Se omitido, usa .manifesto_sftp.sqlite3 no diretório local.
+        - lote_manifesto (int): Quantidade de arquivos baixados acumulados antes de gravar no manifesto.
+        - prefixo_log (str): Prefixo das mensagens impressas.
+        """
+        self.conectar = conectar
+        self.diretorio_remoto = diretorio_remoto.rstrip('/') or '/'
+        self.diretorio_local = Path(diretorio_local)
+        self.conexoes = max(1, conexoes)
+        self.filtro = filtro
+        self.manifesto = manifesto or Manifesto(self.diretorio_local / NOME_MANIFESTO)
+        self.lote_manifesto = lote_manifesto
+        self.prefixo_log = prefixo_log
+
+        self._local = threading.local()
+        self._clientes = []
+        self._clientes_lock = threading.Lock()
+        self._pendentes_manifesto = []
+        self._manifesto_lock = threading.Lock()
+
+    def _sftp(self):
+        """
+        Cliente SFTP da thread atual, aberto no primeiro uso.
+        """
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            sftp = self.conectar()
+            self._local.sftp = sftp
+            with self._clientes_lock:
+                self._clientes.append(sftp)
+        return sftp
+
+    def _fechar_clientes(self) -> None:
+        with self._clientes_lock:
+            for sftp in self._clientes:
+                try:
+                    fechar_sftp(sftp)
+                except Exception:
+                    pass
+            self._clientes.clear()
+        self._local = threading.local()
+
+    def _caminho_remoto(self, caminho_relativo: str) -> str:
+        return f"{self.diretorio_remoto.rstrip('/')}/{caminho_relativo}"
+
+    def listar_subdiretorios(self) -> list:
+        """
+        Retorna os nomes dos subdiretórios imediatos do diretório remoto.
+        """
+        return sorted(attr.filename for attr in self._sftp().listdir_attr(self.diretorio_remoto) if stat.S_ISDIR(attr.st_mode))
+
+    def listar(self, subdiretorios: list | None = None, executor: ThreadPoolExecutor | None = None) -> list:
+        """
+        Lista os arquivos remotos. Os subdiretórios imediatos (todos, ou apenas os informados) são
+        listados em paralelo, reaproveitando as conexões das threads do executor.
+        """
+        if subdiretorios is None:
+            subdiretorios = []
+            arquivos = []
+            for attr in self._sftp().listdir_attr(self.diretorio_remoto):
+                if stat.S_ISDIR(attr.st_mode):
+                    subdiretorios.append(attr.filename)
+                elif stat.S_ISREG(attr.st_mode) and (self.filtro is None or self.filtro(attr.filename)):
+                    arquivos.append(ArquivoRemoto(attr.filename, attr.st_size, int(attr.st_mtime)))
+        else:
+            arquivos = []
+
+        def listar_subdiretorio(nome):
+            return list(listar_remoto(self._sftp(), self._caminho_remoto(nome), self.filtro, nome))
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.conexoes) as executor:
+                for parcial in executor.map(listar_subdiretorio, subdiretorios):
+                    arquivos.extend(parcial)
+        else:
+            for parcial in executor.map(listar_subdiretorio, subdiretorios):
+                arquivos.extend(parcial)
+        return arquivos
+
+    def diferenca(self, arquivos: list, prefixos: list | None = None) -> list:
+        """
+        Retorna os arquivos remotos ausentes do manifesto ou com tamanho/mtime diferentes.
+
+        Na primeira execução (manifesto novo), arquivos que já existem localmente com o mesmo tamanho
+        são apenas registrados no manifesto, sem novo download.
+        """
+        if prefixos is None:
+            registrados = self.manifesto.carregar()
+        else:
+            registrados = {}
+            for prefixo in prefixos:
+                registrados.update(self.manifesto.carregar(prefixo + '/'))
+
+        pendentes = []
+        importados = []
+        for arquivo in arquivos:
+            if registrados.get(arquivo.caminho) == (arquivo.tamanho, arquivo.mtime):
+                continue
+            if self.manifesto.novo and arquivo.caminho not in registrados:
+                try:
+                    if os.stat(self.diretorio_local / arquivo.caminho).st_size == arquivo.tamanho:
+                        importados.append(arquivo)
+                        continue
+                except FileNotFoundError:
+                    pass
+            pendentes.append(arquivo)
+
+        if importados:
+            self.manifesto.registrar(importados)
+            print(f"[{self.prefixo_log}] {len(importados)} arquivos locais existentes importados para o manifesto.")
+
+        return pendentes
+
+    def _registrar_baixado(self, arquivo: ArquivoRemoto, forcar: bool = False) -> None:
+        with self._manifesto_lock:
+            if arquivo is not None:
+                self._pendentes_manifesto.append(arquivo)
+            if forcar or len(self._pendentes_manifesto) >= self.lote_manifesto:
+                lote, self._pendentes_manifesto = self._pendentes_manifesto, []
+                self.manifesto.registrar(lote)
+
+    def baixar(self, arquivo: ArquivoRemoto) -> int:
+        """
+        Baixa um arquivo para '<destino>.part' e o renomeia para o destino ao final.
+
+        Retorna:
+        - int: Bytes baixados.
+        """
+        destino = self.diretorio_local / arquivo.caminho
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporario = destino.with_name(destino.name + SUFIXO_TEMPORARIO)
+
+        try:
+            # prefetch=True: várias requisições de leitura em voo ao mesmo tempo na mesma conexão
+            self._sftp().get(self._caminho_remoto(arquivo.caminho), str(temporario), prefetch=True)
+            tamanho = temporario.stat().st_size
+            if tamanho != arquivo.tamanho:
+                raise IOError(f"Tamanho divergente em {arquivo.caminho}: esperado {arquivo.tamanho}, recebido {tamanho}")
+            os.utime(temporario, (arquivo.mtime, arquivo.mtime))
+            os.replace(temporario, destino)
+        except BaseException:
+            temporario.unlink(missing_ok=True)
+            raise
+
+        self._registrar_baixado(arquivo)
+        return tamanho
+
+    def sincronizar(self, subdiretorios: list | None = None, tentativas: int = 3) -> dict:
+        """
+        Lista, compara com o manifesto e baixa em paralelo os arquivos novos ou alterados.
+
+        Argumentos:
+        - subdiretorios (list, opcional): Restringe a sincronização a estes subdiretórios imediatos.
+        - tentativas (int): Tentativas por arquivo; a conexão da thread é reaberta após cada falha.
+
+        Retorna:
+        - dict: Métricas (listados, pendentes, baixados, falhas, bytes, segundos).
+        """
+        inicio = time.monotonic()
+        metricas = Counter()
+
+        executor = ThreadPoolExecutor(max_workers=self.conexoes)
+        try:
+            arquivos = self.listar(subdiretorios, executor)
+            pendentes = self.diferenca(arquivos, subdiretorios)
+            metricas['listados'] = len(arquivos)
+            metricas['pendentes'] = len(pendentes)
+            print(f"[{self.prefixo_log}] {len(arquivos)} arquivos remotos listados em {time.monotonic() - inicio:.1f}s, "
+                  f"{len(pendentes)} a baixar com {self.conexoes} conexões.")
+
+            def baixar_com_tentativas(arquivo):
+                for tentativa in range(1, tentativas + 1):
+                    try:
+                        return self.baixar(arquivo)
+                    except Exception:
+                        if tentativa == tentativas:
+                            raise
+                        # Descarta a conexão da thread: pode ter sido ela a causa da falha
+                        sftp = getattr(self._local, 'sftp', None)
+                        self._local.sftp = None
+                        if sftp is not None:
+                            with self._clientes_lock:
+                                if sftp in self._clientes:
+                                    self._clientes.remove(sftp)
+                            try:
+                                fechar_sftp(sftp)
+                            except Exception:
+                                pass
+                        time.sleep(2 ** tentativa)
+
+            futuros = {executor.submit(baixar_com_tentativas, arquivo): arquivo for arquivo in pendentes}
+            for futuro in as_completed(futuros):
+                arquivo = futuros[futuro]
+                try:
+                    metricas['bytes'] += futuro.result()
+                    metricas['baixados'] += 1
+                except Exception:
+                    metricas['falhas'] += 1
+                    print(f"[{self.prefixo_log}] Falha ao baixar {arquivo.caminho}:\n{traceback.format_exc()}")
+        finally:
+            executor.shutdown(wait=True)
+            self._registrar_baixado(None, forcar=True)
+            self._fechar_clientes()
+
+        metricas['segundos'] = round(time.monotonic() - inicio, 1)
+        taxa = metricas['bytes'] / metricas['segundos'] / 2 ** 20 if metricas['segundos'] else 0
+        print(f"[{self.prefixo_log}] {metricas['baixados']}/{metricas['pendentes']} arquivos baixados "
+              f"({metricas['bytes'] / 2 ** 20:.1f} MiB, {taxa:.1f} MiB/s), {metricas['falhas']} falhas, em {metricas['segundos']}s.")
+        return dict(metricas)
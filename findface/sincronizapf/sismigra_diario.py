@@ -1,9 +1,9 @@
-import paramiko
+import argparse
 import os
-from pathlib import Path
-import stat
 from datetime import datetime
 
+from sincroniza_sftp import SincronizadorSftp, conector_ssh
+
 # Configurações de conexão SSH
 hostname = 'sdf0990.pf.gov.br'
 port = 22
@@ -13,70 +13,52 @@ username = 'leonardo.lad'
 remote_base_dir = '/mnt/mitra/nists/pf/sismigra/'
 local_base_dir = '/mnt/mitra/nists/pf/sismigra/'
 
-def sync_directories(sftp, remote_dir, local_dir):
-    # Cria o diretório local se não existir
-    Path(local_dir).mkdir(parents=True, exist_ok=True)
-
-    # Lista os arquivos do diretório remoto
-    remote_files = sftp.listdir(remote_dir)
-
-    for remote_file in remote_files:
-        remote_file_path = f"{remote_dir}/{remote_file}"
-        local_file_path = os.path.join(local_dir, remote_file)
-
-        if is_directory(sftp, remote_file_path):
-            # Se for um diretório, chama a função recursivamente
-            sync_directories(sftp, remote_file_path, local_file_path)
-        else:
-            # Se for um arquivo, copia se não existir ou se for diferente
-            if not os.path.exists(local_file_path):
-                print(f"Copiando {remote_file_path} para {local_file_path}")
-                sftp.get(remote_file_path, local_file_path)
-
-def is_directory(sftp, path):
-    try:
-        return stat.S_ISDIR(sftp.stat(path).st_mode)
-    except IOError:
-        return False
-
 def get_latest_local_directory():
     """Retorna o subdiretório de data mais recente no diretório local."""
-    dirs = [d for d in os.listdir(local_base_dir) if os.path.isdir(os.path.join(local_base_dir, d))]
+    dirs = []
+    for d in os.listdir(local_base_dir):
+        if not os.path.isdir(os.path.join(local_base_dir, d)):
+            continue
+        try:
+            dirs.append((datetime.strptime(d, '%Y%m%d'), d))
+        except ValueError:
+            continue
     if not dirs:
         return None
-    latest_dir = max(dirs, key=lambda d: datetime.strptime(d, '%Y%m%d'))
-    return latest_dir
+    return max(dirs)[1]
 
-def main():
-    # Carrega as chaves SSH padrão do usuário (normalmente ~/.ssh/id_rsa ou ~/.ssh/id_dsa)
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
-    # Estabelece a conexão SSH usando a chave privada
-    ssh.connect(hostname, port=port, username=username)
-
-    sftp = ssh.open_sftp()
-
-    # Lista os subdiretórios do diretório remoto
-    remote_dirs = sftp.listdir(remote_base_dir)
+def main(conexoes=4, sincronizador=None):
+    # O sincronizador pode ser injetado (ex.: com SftpLocal) para testes
+    sincronizador = sincronizador or SincronizadorSftp(
+        conector_ssh(hostname, port=port, username=username),
+        remote_base_dir,
+        local_base_dir,
+        conexoes=conexoes,
+        prefixo_log='sismigra_diario',
+    )
 
     # Obtém o diretório de data mais recente no local
+    os.makedirs(local_base_dir, exist_ok=True)
     latest_local_dir = get_latest_local_directory()
 
-    for remote_dir in remote_dirs:
-        remote_dir_path = os.path.join(remote_base_dir, remote_dir)
+    # Sincroniza os diretórios que ainda não existem localmente e o mais recente (que pode estar incompleto)
+    remote_dirs = []
+    for remote_dir in sincronizador.listar_subdiretorios():
         local_dir_path = os.path.join(local_base_dir, remote_dir)
-        
-        if is_directory(sftp, remote_dir_path):
-            # Verifica se o diretório local já existe
-            if not os.path.exists(local_dir_path) or remote_dir == latest_local_dir:
-                print(f"Sincronizando diretório {remote_dir} para {local_dir_path}")
-                sync_directories(sftp, remote_dir_path, local_dir_path)
-            else:
-                print(f"Diretório {local_dir_path} já existe localmente, ignorando.")
+        if not os.path.exists(local_dir_path) or remote_dir == latest_local_dir:
+            print(f"Sincronizando diretório {remote_dir} para {local_dir_path}")
+            remote_dirs.append(remote_dir)
+
+    if not remote_dirs:
+        print("Nenhum diretório novo para sincronizar.")
+        return {}
 
-    sftp.close()
-    ssh.close()
+    return sincronizador.sincronizar(remote_dirs)
 
 if __name__ == '__main__':
-    main()
+
+    parser = argparse.ArgumentParser(description="Sincroniza os diretórios novos do SISMIGRA via SFTP.")
+    parser.add_argument('--conexoes', type=int, default=4, help="Conexões SFTP simultâneas.")
+    args = parser.parse_args()
+
+    main(args.conexoes)
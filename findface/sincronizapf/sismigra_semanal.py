@@ -1,6 +1,6 @@
-import paramiko
-import os
-from pathlib import Path
+import argparse
+
+from sincroniza_sftp import SincronizadorSftp, conector_ssh
 
 # Configurações de conexão SSH
 hostname = 'sdf0990.pf.gov.br'
@@ -11,47 +11,24 @@ username = 'leonardo.lad'
 remote_base_dir = '/mnt/mitra/nists/pf/sismigra/'
 local_base_dir = '/mnt/mitra/nists/pf/sismigra/'
 
-def copy_nst_files(sftp, remote_dir, local_dir):
-    # Cria o diretório local se não existir
-    Path(local_dir).mkdir(parents=True, exist_ok=True)
-
-    # Lista os itens do diretório remoto
-    remote_items = sftp.listdir(remote_dir)
-
-    for item in remote_items:
-        remote_item_path = f"{remote_dir}/{item}"
-        local_item_path = os.path.join(local_dir, item)
-
-        if is_directory(sftp, remote_item_path):
-            # Se for um diretório, chama a função recursivamente
-            copy_nst_files(sftp, remote_item_path, local_item_path)
-        elif item.endswith('.nst'):
-            # Se for um arquivo com extensão .nst e não existir localmente, copia
-            if not os.path.exists(local_item_path):
-                print(f"Copiando {remote_item_path} para {local_item_path}")
-                sftp.get(remote_item_path, local_item_path)
+def main(conexoes=8, sincronizador=None):
+    # O sincronizador pode ser injetado (ex.: com SftpLocal) para testes
+    sincronizador = sincronizador or SincronizadorSftp(
+        conector_ssh(hostname, port=port, username=username),
+        remote_base_dir,
+        local_base_dir,
+        conexoes=conexoes,
+        filtro=lambda nome: nome.endswith('.nst'),
+        prefixo_log='sismigra_semanal',
+    )
 
-def is_directory(sftp, path):
-    try:
-        return stat.S_ISDIR(sftp.stat(path).st_mode)
-    except IOError:
-        return False
+    # Varre toda a árvore remota e copia os arquivos .nst novos ou alterados
+    return sincronizador.sincronizar()
 
-def main():
-    # Carrega as chaves SSH padrão do usuário (normalmente ~/.ssh/id_rsa ou ~/.ssh/id_dsa)
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
-    # Estabelece a conexão SSH usando a chave privada
-    ssh.connect(hostname, port=port, username=username)
-
-    sftp = ssh.open_sftp()
-
-    # Começa a copiar os arquivos .nst do diretório remoto para o local
-    copy_nst_files(sftp, remote_base_dir, local_base_dir)
+if __name__ == '__main__':
 
-    sftp.close()
-    ssh.close()
+    parser = argparse.ArgumentParser(description="Sincroniza todos os arquivos .nst do SISMIGRA via SFTP.")
+    parser.add_argument('--conexoes', type=int, default=8, help="Conexões SFTP simultâneas.")
+    args = parser.parse_args()
 
-if __name__ == '__main__':
-    main()
+    main(args.conexoes)
@@ -0,0 +1,222 @@
+"""
+Acervo local das fotos (source_photo) dos face objects do FindFace, endereçado por conteúdo.
+
+Cada foto é gravada uma única vez em <diretorio>/<hash[0:2]>/<hash[2:4]>/<hash> (sha256 do conteúdo).
+Um índice SQLite relaciona o face object (instância do FindFace + id) ao hash e guarda o último acesso
+de cada foto, usado para descartar as menos acessadas quando o acervo passa do tamanho máximo.
+
+Só guarda fotos que podem ser baixadas de novo do FindFace, pois qualquer uma pode ser descartada; fotos
+recebidas de usuários (ex.: as do telegram-bot, em Download/) ficam fora do acervo.
+
+O mesmo diretório é compartilhado pelo backup_nists_ff2, pelo telegram-bot e pelo wspcrr2 (cada um
+tem uma cópia deste módulo; mantenha as cópias iguais). Eles falam com instâncias diferentes do FindFace,
+cujos ids de face object podem coincidir: o índice separa os ids por instância (o host da URL do FindFace),
+e só o conteúdo das fotos é compartilhado.
+
+Uso:
+    acervo = obter_acervo(FINDFACE_URL)
+    foto = acervo.obter_ou_baixar(face_object["id"], face_object["source_photo"], baixar_foto)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+ACERVO_FOTOS_DIR = os.environ.get("ACERVO_FOTOS_DIR", "/opt/findface/acervo_fotos")
+ACERVO_FOTOS_LIMITE_MB = int(os.environ.get("ACERVO_FOTOS_LIMITE_MB", 20 * 1024))
+
+NOME_DB = 'indice.sqlite3'
+
+
+def nome_instancia(url_findface: str) -> str:
+    """
+    Identifica a instância do FindFace pelo host da URL (ex.: 'findface2-mitrarr.ddns.net').
+    """
+    return (urlparse(url_findface).netloc or url_findface).lower()
+
+
+class AcervoFotos:
+    """
+    Armazém de fotos por sha256, com índice (instância, face object) -> hash e descarte LRU por tamanho.
+    """
+
+    def __init__(self, instancia: str, diretorio: str | Path = ACERVO_FOTOS_DIR,
+                 limite_bytes: int = ACERVO_FOTOS_LIMITE_MB * 2**20, intervalo_verificacao: int = 100):
+        """
+        Argumentos:
+        - instancia (str): Instância do FindFace dos face objects (ver nome_instancia).
+        - diretorio (str | Path): Raiz do acervo.
+        - limite_bytes (int): Tamanho máximo das fotos; ao ultrapassar, as menos acessadas são removidas até 90% dele.
+        - intervalo_verificacao (int): Quantidade de fotos novas entre duas verificações do tamanho total.
+        """
+        self.instancia = instancia
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.limite_bytes = limite_bytes
+        self.intervalo_verificacao = intervalo_verificacao
+        self._novas = 0
+
+        self._lock = threading.Lock()
+        # O índice pode ser usado por vários processos ao mesmo tempo (bot, backup, API)
+        self._conexao = sqlite3.connect(str(self.diretorio / NOME_DB), check_same_thread=False, timeout=60)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tb_foto (
+                hash TEXT PRIMARY KEY,
+                tamanho INTEGER NOT NULL,
+                dt_acesso REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_foto_dt_acesso ON tb_foto (dt_acesso);
+            -- Índice antigo, só pelo id do face object: ids de instâncias diferentes se misturavam
+            DROP TABLE IF EXISTS tb_objeto;
+            CREATE TABLE IF NOT EXISTS tb_face_object (
+                instancia TEXT NOT NULL,
+                id_objeto TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (instancia, id_objeto)
+            );
+            CREATE INDEX IF NOT EXISTS ix_face_object_hash ON tb_face_object (hash);
+            """
+        )
+        self._conexao.commit()
+
+    def caminho(self, hash_foto: str) -> Path:
+        return self.diretorio / hash_foto[:2] / hash_foto[2:4] / hash_foto
+
+    def _ler(self, hash_foto: str) -> bytes | None:
+        try:
+            with open(self.caminho(hash_foto), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def obter(self, id_objeto) -> bytes | None:
+        """
+        Retorna a foto do face object desta instância, se estiver no acervo.
+        """
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT hash FROM tb_face_object WHERE instancia = ? AND id_objeto = ?", (self.instancia, str(id_objeto))
+            ).fetchone()
+        if linha is None:
+            return None
+
+        conteudo = self._ler(linha[0])
+        with self._lock:
+            if conteudo is None:
+                # Arquivo removido por fora do acervo: esquece a referência
+                self._conexao.execute(
+                    "DELETE FROM tb_face_object WHERE instancia = ? AND id_objeto = ?", (self.instancia, str(id_objeto))
+                )
+            else:
+                self._conexao.execute("UPDATE tb_foto SET dt_acesso = ? WHERE hash = ?", (time.time(), linha[0]))
+            self._conexao.commit()
+        return conteudo
+
+    def guardar(self, conteudo: bytes, id_objeto=None) -> str:
+        """
+        Grava a foto (se ainda não existir) e, opcionalmente, associa o face object desta instância a ela.
+
+        Retorna:
+        - str: sha256 do conteúdo.
+        """
+        hash_foto = hashlib.sha256(conteudo).hexdigest()
+        destino = self.caminho(hash_foto)
+        if not destino.exists():
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            temporario = destino.with_name(f"{hash_foto}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, destino)
+
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO tb_foto (hash, tamanho, dt_acesso) VALUES (?, ?, ?)",
+                (hash_foto, len(conteudo), time.time()),
+            )
+            if id_objeto is not None:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO tb_face_object (instancia, id_objeto, hash) VALUES (?, ?, ?)",
+                    (self.instancia, str(id_objeto), hash_foto),
+                )
+            self._conexao.commit()
+            self._novas += 1
+            verificar = self._novas >= self.intervalo_verificacao
+            if verificar:
+                self._novas = 0
+
+        if verificar:
+            self.remover_excedente()
+        return hash_foto
+
+    def obter_ou_baixar(self, id_objeto, url: str, baixar) -> bytes | None:
+        """
+        Retorna a foto do acervo ou, se ausente, baixa com baixar(url) e guarda.
+
+        Argumentos:
+        - id_objeto: Id do face object nesta instância.
+        - url (str): source_photo do face object.
+        - baixar (callable): Recebe a URL e retorna os bytes da foto ou None.
+        """
+        conteudo = self.obter(id_objeto)
+        if conteudo is not None:
+            return conteudo
+
+        conteudo = baixar(url)
+        if conteudo:
+            self.guardar(conteudo, id_objeto)
+        return conteudo
+
+    def tamanho_total(self) -> int:
+        with self._lock:
+            return self._conexao.execute("SELECT coalesce(sum(tamanho), 0) FROM tb_foto").fetchone()[0]
+
+    def remover_excedente(self) -> int:
+        """
+        Remove as fotos acessadas há mais tempo até o acervo ficar em 90% do limite.
+
+        Retorna:
+        - int: Quantidade de fotos removidas.
+        """
+        total = self.tamanho_total()
+        if total <= self.limite_bytes:
+            return 0
+
+        alvo = int(self.limite_bytes * 0.9)
+        removidas = []
+        with self._lock:
+            for hash_foto, tamanho in self._conexao.execute("SELECT hash, tamanho FROM tb_foto ORDER BY dt_acesso"):
+                if total <= alvo:
+                    break
+                removidas.append(hash_foto)
+                total -= tamanho
+
+            self._conexao.executemany("DELETE FROM tb_face_object WHERE hash = ?", ((h,) for h in removidas))
+            self._conexao.executemany("DELETE FROM tb_foto WHERE hash = ?", ((h,) for h in removidas))
+            self._conexao.commit()
+
+        for hash_foto in removidas:
+            self.caminho(hash_foto).unlink(missing_ok=True)
+
+        print(f"[acervo_fotos] {len(removidas)} fotos removidas; acervo com {total / 2**20:.1f} MiB.")
+        return len(removidas)
+
+
+_acervos = {}
+_acervos_lock = threading.Lock()
+
+
+def obter_acervo(url_findface: str) -> AcervoFotos:
+    """
+    Retorna o acervo do processo para os face objects da instância do FindFace, criando-o no primeiro uso.
+    """
+    instancia = nome_instancia(url_findface)
+    with _acervos_lock:
+        if instancia not in _acervos:
+            _acervos[instancia] = AcervoFotos(instancia)
+        return _acervos[instancia]
@@ -8,11 +8,16 @@ import os
 from base64 import b64decode
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+import time
 from local.logger import logger
 from telebot import apihelper
 import traceback
 from findface_multi.findface_multi import *
 from functions import validar_celular_brasileiro, validate_cpf, remove_non_alphanumeric
+from acervo_fotos import obter_acervo
+from triagem_faces import TRIAGEM_ATIVA, triar_foto, obter_relatorio
+from reconhecimento import RECONHECIMENTO_PRAZO, RECONHECIMENTO_WORKERS, Reconhecimento
 import io
 
 
@@ -292,6 +297,63 @@ def admin_usuario(message):
             bot.send_document(message.chat.id, files['document'], caption="Aqui está o seu arquivo!")
 
   
+# Sessão compartilhada pelas threads do reconhecimento, reaproveitando as conexões com o FindFace
+sessao_fotos = requests.Session()
+sessao_fotos.verify = False
+sessao_fotos.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=RECONHECIMENTO_WORKERS))
+sessao_fotos.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=RECONHECIMENTO_WORKERS))
+
+
+def baixar_foto(url_foto):
+    response = sessao_fotos.get(url_foto, timeout=RECONHECIMENTO_PRAZO)
+    if 200 <= response.status_code < 300:
+        return response.content
+    print(response.text)
+    return None
+
+
+def texto_card(card, list_names, listas_nao_verificadas=None):
+    text_message = f'Nome: {card["name"]}\n'
+
+    try:
+        dt_nascimento = datetime.fromisoformat(card["meta"]["data_nascimento"])
+    except Exception as e:
+        dt_nascimento = None
+    if dt_nascimento:
+        text_message += f'Nascimento: {dt_nascimento.strftime("%d/%m/%Y")}\n'
+
+    if card["meta"]["nacionalidade"]:
+        text_message += f'Nacionalidade: {card["meta"]["nacionalidade"]}\n'
+    if card["meta"]["mae"]:
+        text_message += f'Filiacao 1: {card["meta"]["mae"]}\n'
+    if card["meta"]["pai"]:
+        text_message += f'Filiacao 2: {card["meta"]["pai"]}\n'
+    if card["meta"]["cpf"]:
+        text_message += f'CPF: {card["meta"]["cpf"]}\n'
+    if card["meta"]["passaporte"]:
+        text_message += f'Passaporte: {card["meta"]["passaporte"]}\n'
+    if card["meta"]["rnm"]:
+        text_message += f'RNM: {card["meta"]["rnm"]}\n'
+    if card["meta"]["documento"]:
+        text_message += f'Documento: {card["meta"]["documento"]}\n'
+    if card["looks_like_confidence"]:
+        semelhanca = card["looks_like_confidence"] * 100
+        truncado = "{:.2f}".format(semelhanca)
+        text_message += f'Semelhança: {truncado}%\n'
+    if list_names:
+        bases = ', '.join(list_names)
+        text_message += f'Bases: {bases}\n'
+
+    if "PF/BNMP" in list_names and card["active"]:
+        text_message += f'**ALERTA!!! Pessoa com mandado de prisão {card["meta"]["bnmp"]}. Consultar BNMP.**'
+    elif listas_nao_verificadas:
+        # O nome de alguma lista não foi obtido a tempo: não dá para descartar o alerta de BNMP
+        ids = ', '.join(f'#{id_lista}' for id_lista in listas_nao_verificadas)
+        text_message += f'**ATENÇÃO!!! Bases não verificadas ({ids}) — consultar BNMP.**'
+
+    return text_message
+
+
 # Função que realiza o reconhecimento facial
 @bot.message_handler(content_types=['photo', 'document'])
 def foto_recebida(message):
@@ -341,93 +403,58 @@ def foto_recebida(message):
         if not download_dir.exists():
             os.mkdir(download_dir)
 
-        # Salva o arquivo no diretorio Download
+        # Salva o arquivo no diretorio Download (fora do acervo de fotos, que descarta as menos acessadas)
         filepath = download_dir / filename
         with open(filepath, 'wb') as wbf:
             wbf.write(file_content)
 
+        # Triagem local: fotos sem condições de detecção não são enviadas ao FindFace; as grandes são reduzidas
+        if TRIAGEM_ATIVA:
+            triagem = obter_relatorio().registrar(triar_foto(file_content))
+            if not triagem.aprovada:
+                text_message = f"Foto sem qualidade para o reconhecimento facial: {'; '.join(triagem.motivos)}. Envie outra foto."
+                logger.info(log_resposta(text_message, message_username))
+                bot.send_message(message_chat_id, text_message)
+                return
+            file_content = triagem.conteudo
+
         usuario = os.environ["USUARIO_CONSULTA_FF"]
         senha = os.environ["SENHA_CONSULTA_FF"]
 
+        # O prazo inclui o detect; o que não chegar até lá é descartado
+        limite = time.monotonic() + RECONHECIMENTO_PRAZO
+
         with FindfaceConnection(base_url=findface_url, username=usuario, password=senha) as findface_conn:
 
             findface = FindfaceMulti(findface_conn)
-            
+
             detection = findface.detect(file_content, face={})
 
-            cards_humans = []
-            for face in detection["objects"]["face"]:
-
-                response = findface.get_human_cards(looks_like=f'detection:{face["id"]}')
-                if len(response["results"]) > 0:
-                    cards_humans.extend(response["results"])
-
-            if len(cards_humans) > 0:
-
-                for card in cards_humans:
-
-                    card_id = card["id"]
-
-                    data = {"card": [card_id]}
-                    face_objects = findface.get_face_objects(card=card_id)["results"]
-
-                    for face_object in face_objects:
-                        url_foto = face_object["source_photo"]
-
-                        response = requests.get(url_foto, verify=False)
-
-                        if 200 <= response.status_code < 300:
-
-                            foto_bin = response.content
-
-                            bot.send_photo(message.chat.id, foto_bin)
-                            text_message = f'Nome: {card["name"]}\n'
-
-                            try:
-                                dt_nascimento = datetime.fromisoformat(card["meta"]["data_nascimento"])
-                            except Exception as e:
-                                dt_nascimento = None                    
-                            if dt_nascimento:
-                                text_message += f'Nascimento: {dt_nascimento.strftime("%d/%m/%Y")}\n'
-                                
-                            if card["meta"]["nacionalidade"]:
-                                text_message += f'Nacionalidade: {card["meta"]["nacionalidade"]}\n'
-                            if card["meta"]["mae"]:
-                                text_message += f'Filiacao 1: {card["meta"]["mae"]}\n'
-                            if card["meta"]["pai"]:                    
-                                text_message += f'Filiacao 2: {card["meta"]["pai"]}\n'
-                            if card["meta"]["cpf"]:
-                                text_message += f'CPF: {card["meta"]["cpf"]}\n'
-                            if card["meta"]["passaporte"]:
-                                text_message += f'Passaporte: {card["meta"]["passaporte"]}\n'
-                            if card["meta"]["rnm"]:
-                                text_message += f'RNM: {card["meta"]["rnm"]}\n'
-                            if card["meta"]["documento"]:
-                                text_message += f'Documento: {card["meta"]["documento"]}\n'
-                            if card["looks_like_confidence"]:
-                                semelhanca = card["looks_like_confidence"] * 100
-                                truncado = "{:.2f}".format(semelhanca)
-                                text_message += f'Semelhança: {truncado}%\n'
-                            if card["watch_lists"]:
-                                list_names = [findface.get_watch_list_name_by_id(x) for x in card["watch_lists"]]
-                                bases = ', '.join(list_names)
-                                text_message += f'Bases: {bases}\n'                        
-                            
-                            if "PF/BNMP" in list_names and card["active"]:
-                                text_message += f'**ALERTA!!! Pessoa com mandado de prisão {card["meta"]["bnmp"]}. Consultar BNMP.**'
-
-                            logger.info(log_resposta(text_message, message_username))
-                            bot.send_message(message.chat.id, text_message)
-
-                            recado = "Atenção! O reconhecimento facial é um indicativo e não deve ser utilizado como certeza da identidade da face pesquisada. "
-                            recado += "A identificação criminal deve obedecer o disposto na Lei nº 12.037/2009."
-                            bot.send_message(message.chat.id, recado)
-
-
-                        else:
-                            print(response.text)
+            # Cards, face objects, fotos e nomes das listas são buscados em paralelo; cada foto é
+            # enviada assim que fica pronta, sem esperar as demais
+            reconhecimento = Reconhecimento(findface, detection["objects"]["face"], obter_acervo(findface_url), baixar_foto, limite=limite)
+            for resultado in reconhecimento:
 
-            else:
+                bot.send_photo(message.chat.id, resultado.foto)
+                text_message = texto_card(resultado.card, resultado.listas, resultado.listas_nao_verificadas)
+
+                logger.info(log_resposta(text_message, message_username))
+                bot.send_message(message.chat.id, text_message)
+
+                recado = "Atenção! O reconhecimento facial é um indicativo e não deve ser utilizado como certeza da identidade da face pesquisada. "
+                recado += "A identificação criminal deve obedecer o disposto na Lei nº 12.037/2009."
+                bot.send_message(message.chat.id, recado)
+
+            if reconhecimento.expirado:
+                text_message = f"Tempo limite de {RECONHECIMENTO_PRAZO:.0f}s atingido: "
+                if reconhecimento.entregues:
+                    text_message += "os resultados acima podem estar incompletos."
+                else:
+                    text_message += "nenhum resultado foi carregado. Tente novamente."
+                logger.info(log_resposta(text_message, message_username))
+                bot.send_message(message.chat.id, text_message)
+
+            elif len(reconhecimento.cards) == 0:
                 text_message = "Nenhum cadastro encontrado."
                 bot.send_message(message.chat.id, text_message)
     
@@ -0,0 +1,195 @@
+"""
+Busca dos candidatos do reconhecimento facial em paralelo, com prazo por requisição.
+
+Depois do detect, cada etapa é disparada assim que a anterior termina, sem esperar as demais:
+
+- uma busca de cards (looks_like) por face detectada;
+- para cada card novo, a busca dos face objects e os nomes das watch lists ainda fora do cache;
+- para cada face object, a foto (acervo local ou download).
+
+Percorrer um Reconhecimento devolve cada foto encontrada (com o card e os nomes das listas) assim que
+ela e os nomes ficam prontos, para o bot enviá-la ao chat enquanto o restante ainda é buscado. Ao
+fim do prazo (RECONHECIMENTO_PRAZO segundos), as tarefas pendentes são descartadas e o atributo
+'expirado' indica que o resultado é parcial.
+
+Se o nome de alguma watch list do card não for obtido (falha na busca ou fim do prazo), a foto sai
+com os ids dessas listas em 'listas_nao_verificadas': o bot não pode afirmar que a pessoa não está
+em uma lista de alerta (ex.: PF/BNMP) e deve avisar isso na resposta.
+
+Todas as requisições compartilham um pool de RECONHECIMENTO_WORKERS threads. As tarefas nunca
+esperam umas pelas outras (quem encadeia as etapas é a thread do bot), então o pool não trava
+mesmo com vários reconhecimentos ao mesmo tempo.
+
+Uso:
+    reconhecimento = Reconhecimento(findface, detection["objects"]["face"], acervo, baixar_foto)
+    for resultado in reconhecimento:
+        bot.send_photo(chat_id, resultado.foto)
+    if reconhecimento.expirado:
+        ...
+"""
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+RECONHECIMENTO_PRAZO = float(os.environ.get("RECONHECIMENTO_PRAZO", 30))
+RECONHECIMENTO_WORKERS = int(os.environ.get("RECONHECIMENTO_WORKERS", 8))
+# Validade (segundos) dos nomes de watch lists em cache; mudam raramente
+RECONHECIMENTO_CACHE_LISTAS = int(os.environ.get("RECONHECIMENTO_CACHE_LISTAS", 3600))
+
+Resultado = namedtuple('Resultado', ['card', 'foto', 'listas', 'listas_nao_verificadas'])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def obter_executor() -> ThreadPoolExecutor:
+    """
+    Retorna o pool de threads compartilhado pelos reconhecimentos, criando-o no primeiro uso.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=RECONHECIMENTO_WORKERS, thread_name_prefix='reconhecimento')
+        return _executor
+
+
+_nomes_listas = {}
+_nomes_listas_lock = threading.Lock()
+
+
+def nome_lista_em_cache(id_lista):
+    """
+    Retorna o nome da watch list guardado há menos de RECONHECIMENTO_CACHE_LISTAS segundos, ou None.
+    """
+    with _nomes_listas_lock:
+        item = _nomes_listas.get(id_lista)
+    if item and time.monotonic() - item[1] < RECONHECIMENTO_CACHE_LISTAS:
+        return item[0]
+    return None
+
+
+def buscar_nome_lista(findface, id_lista) -> str:
+    nome = findface.get_watch_list_name_by_id(id_lista)
+    with _nomes_listas_lock:
+        _nomes_listas[id_lista] = (nome, time.monotonic())
+    return nome
+
+
+def buscar_cards(findface, id_face) -> list:
+    return findface.get_human_cards(looks_like=f'detection:{id_face}')["results"]
+
+
+def buscar_face_objects(findface, id_card) -> list:
+    return findface.get_face_objects(card=id_card)["results"]
+
+
+class Reconhecimento:
+    """
+    Iterável com as fotos dos cards semelhantes às faces detectadas, na ordem em que ficam prontas.
+    """
+
+    def __init__(self, findface, faces: list, acervo, baixar, prazo: float = RECONHECIMENTO_PRAZO,
+                 limite: float | None = None, executor: ThreadPoolExecutor | None = None):
+        """
+        Argumentos:
+        - findface (FindfaceMulti): Cliente já autenticado.
+        - faces (list): detection["objects"]["face"] do detect.
+        - acervo (AcervoFotos): Acervo local das fotos dos face objects.
+        - baixar (callable): Recebe a URL e retorna os bytes da foto ou None.
+        - prazo (float): Segundos a partir do início da iteração, se 'limite' não for informado.
+        - limite (float): Instante (time.monotonic) em que a busca é interrompida; permite incluir o detect no prazo.
+        - executor (ThreadPoolExecutor): Pool das tarefas. Padrão: obter_executor().
+        """
+        self.findface = findface
+        self.faces = faces
+        self.acervo = acervo
+        self.baixar = baixar
+        self.prazo = prazo
+        self.limite = limite
+        self.executor = executor or obter_executor()
+
+        self.cards = {}
+        self.entregues = 0
+        self.falhas = 0
+        self.expirado = False
+
+    def __iter__(self):
+        limite = self.limite if self.limite is not None else time.monotonic() + self.prazo
+        tarefas = {}
+        listas = {}
+        listas_com_falha = set()
+        fotos_em_espera = {}
+
+        def dispara(tipo, chave, funcao, *args):
+            tarefas[self.executor.submit(funcao, *args)] = (tipo, chave)
+
+        for face in self.faces:
+            dispara('cards', face["id"], buscar_cards, self.findface, face["id"])
+
+        while tarefas:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            prontas, _ = wait(tarefas, timeout=restante, return_when=FIRST_COMPLETED)
+
+            for tarefa in prontas:
+                tipo, chave = tarefas.pop(tarefa)
+                try:
+                    valor = tarefa.result()
+                except Exception:
+                    self.falhas += 1
+                    print(f"[reconhecimento] Falha ao buscar {tipo} {chave}: {traceback.format_exc(limit=1)}")
+                    if tipo == 'lista':
+                        listas_com_falha.add(chave)
+                    continue
+
+                if tipo == 'cards':
+                    for card in valor:
+                        # A mesma pessoa pode ser encontrada por mais de uma face da foto
+                        if card["id"] in self.cards:
+                            continue
+                        self.cards[card["id"]] = card
+                        dispara('objetos', card["id"], buscar_face_objects, self.findface, card["id"])
+                        for id_lista in card["watch_lists"] or []:
+                            if id_lista not in listas:
+                                listas[id_lista] = nome_lista_em_cache(id_lista)
+                                if listas[id_lista] is None:
+                                    dispara('lista', id_lista, buscar_nome_lista, self.findface, id_lista)
+                elif tipo == 'objetos':
+                    for face_object in valor:
+                        dispara('foto', chave, self.acervo.obter_ou_baixar, face_object["id"],
+                                face_object["source_photo"], self.baixar)
+                elif tipo == 'lista':
+                    listas[chave] = valor
+                elif tipo == 'foto' and valor:
+                    fotos_em_espera.setdefault(chave, []).append(valor)
+
+            # Entrega as fotos dos cards cujas watch lists já têm nome ou falharam (o alerta de BNMP depende delas)
+            for id_card in list(fotos_em_espera):
+                ids_listas = self.cards[id_card]["watch_lists"] or []
+                if all(listas.get(id_lista) is not None or id_lista in listas_com_falha for id_lista in ids_listas):
+                    yield from self._entregar(id_card, fotos_em_espera.pop(id_card), listas)
+
+        if tarefas:
+            self.expirado = True
+            for tarefa in tarefas:
+                tarefa.cancel()
+            print(f"[reconhecimento] Prazo esgotado com {len(tarefas)} tarefa(s) pendente(s).")
+
+        # Fotos que chegaram antes do prazo saem mesmo sem o nome de alguma lista (marcada como não verificada)
+        for id_card in list(fotos_em_espera):
+            yield from self._entregar(id_card, fotos_em_espera.pop(id_card), listas)
+
+    def _entregar(self, id_card, fotos: list, listas: dict):
+        card = self.cards[id_card]
+        ids_listas = card["watch_lists"] or []
+        nomes = [listas[id_lista] for id_lista in ids_listas if listas.get(id_lista) is not None]
+        nao_verificadas = [id_lista for id_lista in ids_listas if listas.get(id_lista) is None]
+        for foto in fotos:
+            self.entregues += 1
+            yield Resultado(card, foto, nomes, nao_verificadas)
@@ -0,0 +1,146 @@
+"""
+Testes da busca paralela de candidatos (reconhecimento.py), com um Findface e um acervo falsos.
+
+Execução:
+    python -m pytest -q test_reconhecimento.py
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import reconhecimento
+from reconhecimento import Reconhecimento
+
+
+class FindfaceFalso:
+
+    def __init__(self, cards_por_face, face_objects_por_card, nomes_listas, falhas_listas=(), bloqueio=None):
+        self.cards_por_face = cards_por_face
+        self.face_objects_por_card = face_objects_por_card
+        self.nomes_listas = nomes_listas
+        self.falhas_listas = set(falhas_listas)
+        # Listas cujo nome só é devolvido depois do bloqueio ser liberado
+        self.bloqueio = bloqueio
+        self.buscas_listas = []
+
+    def get_human_cards(self, looks_like):
+        return {"results": self.cards_por_face[looks_like.split(':')[1]]}
+
+    def get_face_objects(self, card):
+        return {"results": self.face_objects_por_card[card]}
+
+    def get_watch_list_name_by_id(self, id_lista):
+        self.buscas_listas.append(id_lista)
+        if id_lista in self.falhas_listas:
+            raise RuntimeError(f"Falha ao buscar a lista {id_lista}")
+        if self.bloqueio is not None:
+            self.bloqueio.wait(5)
+        return self.nomes_listas[id_lista]
+
+
+class AcervoFalso:
+
+    def obter_ou_baixar(self, id_face_object, url, baixar):
+        return f"foto-{id_face_object}".encode()
+
+
+def card(id_card, *watch_lists):
+    return {"id": id_card, "watch_lists": list(watch_lists)}
+
+
+@pytest.fixture(autouse=True)
+def limpa_cache_listas():
+    reconhecimento._nomes_listas.clear()
+    yield
+    reconhecimento._nomes_listas.clear()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def reconhece(findface, faces, executor, prazo=5):
+    rec = Reconhecimento(findface, [{"id": face} for face in faces], AcervoFalso(), baixar=None, prazo=prazo,
+                         executor=executor)
+    return rec, list(rec)
+
+
+def test_entrega_fotos_com_nomes_das_listas(executor):
+    findface = FindfaceFalso(
+        cards_por_face={"f1": [card(10, 1, 2)]},
+        face_objects_por_card={10: [{"id": 100, "source_photo": "u1"}, {"id": 101, "source_photo": "u2"}]},
+        nomes_listas={1: "RR/IDNET", 2: "PF/BNMP"},
+    )
+
+    rec, resultados = reconhece(findface, ["f1"], executor)
+
+    assert sorted(resultado.foto for resultado in resultados) == [b"foto-100", b"foto-101"]
+    assert all(resultado.listas == ["RR/IDNET", "PF/BNMP"] for resultado in resultados)
+    assert all(resultado.listas_nao_verificadas == [] for resultado in resultados)
+    assert rec.entregues == 2 and not rec.expirado
+
+
+def test_card_encontrado_por_duas_faces_sai_uma_vez(executor):
+    findface = FindfaceFalso(
+        cards_por_face={"f1": [card(10, 1)], "f2": [card(10, 1)]},
+        face_objects_por_card={10: [{"id": 100, "source_photo": "u1"}]},
+        nomes_listas={1: "RR/IDNET"},
+    )
+
+    rec, resultados = reconhece(findface, ["f1", "f2"], executor)
+
+    assert [resultado.card["id"] for resultado in resultados] == [10]
+    assert list(rec.cards) == [10]
+
+
+def test_falha_no_nome_da_lista_marca_lista_nao_verificada(executor):
+    findface = FindfaceFalso(
+        cards_por_face={"f1": [card(10, 1, 2)]},
+        face_objects_por_card={10: [{"id": 100, "source_photo": "u1"}]},
+        nomes_listas={1: "RR/IDNET"},
+        falhas_listas={2},
+    )
+
+    rec, resultados = reconhece(findface, ["f1"], executor)
+
+    assert len(resultados) == 1
+    assert resultados[0].listas == ["RR/IDNET"]
+    assert resultados[0].listas_nao_verificadas == [2]
+    assert rec.falhas == 1 and not rec.expirado
+
+
+def test_prazo_esgotado_entrega_foto_com_lista_nao_verificada(executor):
+    bloqueio = threading.Event()
+    findface = FindfaceFalso(
+        cards_por_face={"f1": [card(10, 2)]},
+        face_objects_por_card={10: [{"id": 100, "source_photo": "u1"}]},
+        nomes_listas={2: "PF/BNMP"},
+        bloqueio=bloqueio,
+    )
+
+    try:
+        rec, resultados = reconhece(findface, ["f1"], executor, prazo=0.3)
+    finally:
+        bloqueio.set()
+
+    assert rec.expirado
+    assert len(resultados) == 1
+    assert resultados[0].listas == []
+    assert resultados[0].listas_nao_verificadas == [2]
+
+
+def test_nome_da_lista_em_cache_nao_e_buscado_de_novo(executor):
+    findface = FindfaceFalso(
+        cards_por_face={"f1": [card(10, 1)]},
+        face_objects_por_card={10: [{"id": 100, "source_photo": "u1"}]},
+        nomes_listas={1: "RR/IDNET"},
+    )
+
+    reconhece(findface, ["f1"], executor)
+    _, resultados = reconhece(findface, ["f1"], executor)
+
+    assert findface.buscas_listas == [1]
+    assert resultados[0].listas == ["RR/IDNET"]
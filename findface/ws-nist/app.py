@@ -4,6 +4,7 @@ from flask_migrate import Migrate
 from pathlib import Path
 import os
 from routes.api.v1.route_upload_nist import bp_upload_nist
+from routes.api.v1.route_fila_upload import bp_fila_upload
 from config_app import *
 
 
@@ -24,6 +25,8 @@ db.init_app(app)
 migrate = Migrate(app, db)
 
 app.register_blueprint(bp_upload_nist)  # Register the Blueprint
+app.register_blueprint(bp_fila_upload)
 
 if __name__ == '__main__':
+    # Desenvolvimento. Em produção: gunicorn -c gunicorn.conf.py app:app
     app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
@@ -5,6 +5,7 @@ import json
 from datetime import datetime
 import requests
 import io
+from triagem_faces import TRIAGEM_ATIVA, triar_foto, obter_relatorio
 
 
 ff_url = os.environ["FINDFACE_URL"]
@@ -35,6 +36,15 @@ if __name__ == '__main__':
         else:
             raise TypeError(f"'source_photo' inválido. Aceitos string com o caminho do arquivo, bytes, or io.BytesIO.")
         
+        # Triagem local antes do detect (tamanho, nitidez, exposição e redução de fotos grandes)
+        if TRIAGEM_ATIVA:
+            log_message("Triagem da foto...")
+            triagem = obter_relatorio().registrar(triar_foto(file_stream))
+            log_message(f"Triagem: {triagem.metricas}")
+            if not triagem.aprovada:
+                raise MitraException(f"Foto rejeitada na triagem: {'; '.join(triagem.motivos)}")
+            file_stream = triagem.conteudo
+
         log_message("Detectando de faces...")
 
         faces_with_quality = []
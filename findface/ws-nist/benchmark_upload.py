@@ -0,0 +1,225 @@
+"""
+Teste de carga do upload de NISTs pela fila (/api/v1/upload-nist/fila/).
+
+Gera variações de um NIST de exemplo (mesmo tamanho, nome 2.030 alterado para mudar o md5), envia
+com vários clientes simultâneos e acompanha os lotes até o processamento terminar. Mede:
+
+- uploads/s e latência (p50/p99) da resposta 202, que inclui só o spool e o enfileiramento;
+- jobs/s e tempo do enfileiramento à conclusão (p50/p99), que incluem validação e cadastro no banco.
+
+Sem --url, sobe o app em uma thread local com um banco de testes (SQLite por padrão, com o schema
+'findface' emulado via ATTACH DATABASE) e a fila e os diretórios em uma pasta temporária. Com --url,
+mede um servidor já em execução (ex.: gunicorn -c gunicorn.conf.py app:app).
+
+Exemplos:
+    python benchmark_upload.py --nist amostras/exemplo.nst --uploads 500 --clientes 16
+    python benchmark_upload.py --nist amostras/exemplo.nst --url http://localhost:5001
+"""
+import argparse
+import json
+import logging
+import os
+import string
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# O nist_manager importa o app de produção, que exige as variáveis abaixo. O teste local usa o seu
+# próprio app Flask apontando para o banco de testes, então valores vazios bastam.
+for _variavel in ("ORACLE_USER", "ORACLE_PASSWORD", "ORACLE_DSN", "PG_USER", "PG_PASSWORD", "PG_HOST",
+                  "FINDFACE_USER", "FINDFACE_PASSWORD"):
+    os.environ.setdefault(_variavel, "")
+
+import requests
+
+from leitor_nist import LeitorNist, indexa_nist
+
+
+def gera_variacoes(conteudo: bytes, quantidade: int) -> list:
+    """
+    Gera 'quantidade' cópias do NIST com o final do nome (2.030) trocado por um contador em letras.
+
+    O tamanho do campo não muda, então o NIST continua válido (2.001 e offsets iguais) e cada cópia
+    tem um md5 diferente.
+    """
+    campos = next((campos for tipo, _, _, _, campos in indexa_nist(conteudo) if tipo == 2), {})
+    if 30 not in campos:
+        raise SystemExit("O NIST de exemplo não tem o campo 2.030.")
+    inicio, fim = campos[30]
+
+    digitos = min(fim - inicio, 6)
+    variacoes = []
+    for i in range(quantidade):
+        sufixo = ''
+        numero = i
+        for _ in range(digitos):
+            numero, resto = divmod(numero, 26)
+            sufixo = string.ascii_uppercase[resto] + sufixo
+        variacoes.append(conteudo[:fim - digitos] + sufixo.encode('ascii') + conteudo[fim:])
+    return variacoes
+
+
+def percentil(valores: list, p: float) -> float | None:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return round(ordenados[indice], 4)
+
+
+def inicia_servidor_local(nist_exemplo: bytes, db_url: str | None, processadores: int) -> tuple[str, object]:
+    """
+    Sobe o app com a fila, o banco e os diretórios em uma pasta temporária. Retorna (url, servidor).
+    """
+    diretorio = Path(tempfile.mkdtemp(prefix='benchmark_upload_'))
+    os.environ['UPLOAD_FILA_DB'] = str(diretorio / 'fila_upload.sqlite3')
+
+    from flask import Flask
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+
+    from database.models import db, BaseOrigem
+    from fila_upload import obter_fila, obter_processador
+    from mitra_toolkit.functions import formata_nome_base_origem
+    from routes.api.v1.route_fila_upload import bp_fila_upload
+
+    db_url = db_url or f"sqlite:///{diretorio / 'bench.sqlite3'}"
+    app_benchmark = Flask(__name__)
+    app_benchmark.config['SQLALCHEMY_DATABASE_URI'] = db_url
+    app_benchmark.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app_benchmark.config['UPLOAD_FILA_DIR'] = diretorio / 'fila'
+    db.init_app(app_benchmark)
+    app_benchmark.register_blueprint(bp_fila_upload)
+
+    with app_benchmark.app_context():
+        if db_url.startswith('sqlite'):
+            caminho_schema = str(Path(db_url.split(':///', 1)[1]).with_suffix('.findface.sqlite3'))
+
+            @event.listens_for(db.engine, "connect")
+            def anexa_schema_findface(dbapi_connection, connection_record):
+                dbapi_connection.execute(f"ATTACH DATABASE '{caminho_schema}' AS findface")
+
+        db.create_all()
+        with LeitorNist(nist_exemplo) as leitor:
+            nome_base_origem = formata_nome_base_origem(leitor.obter_campo('1.008'))
+        if not BaseOrigem.query.filter_by(no_base_origem=nome_base_origem).first():
+            db.session.add(BaseOrigem(no_base_origem=nome_base_origem, ativo=True))
+            db.session.commit()
+
+    obter_processador(app_benchmark, fila=obter_fila(), processadores=processadores,
+                      diretorio_nists=diretorio / 'nists').iniciar()
+
+    # Sem o log de acesso do werkzeug (uma linha por requisição)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    servidor = make_server('127.0.0.1', 0, app_benchmark, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"[benchmark_upload] Servidor local em http://127.0.0.1:{servidor.server_port}, dados em {diretorio}")
+    return f"http://127.0.0.1:{servidor.server_port}", servidor
+
+
+def executa_carga(url: str, variacoes: list, clientes: int, arquivos_por_upload: int, timeout: float) -> dict:
+    sessao_por_thread = threading.local()
+
+    def envia(indice_inicial: int) -> tuple[float, int, str | None]:
+        if not hasattr(sessao_por_thread, 'sessao'):
+            sessao_por_thread.sessao = requests.Session()
+        arquivos = [('arquivo_nist', (f'carga_{i:06d}.nst', variacoes[i], 'application/octet-stream'))
+                    for i in range(indice_inicial, min(indice_inicial + arquivos_por_upload, len(variacoes)))]
+        inicio = time.perf_counter()
+        resposta = sessao_por_thread.sessao.post(f'{url}/api/v1/upload-nist/fila/', files=arquivos, timeout=timeout)
+        latencia = time.perf_counter() - inicio
+        lote = resposta.json().get('lote') if resposta.status_code == 202 else None
+        return latencia, resposta.status_code, lote
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        respostas = list(executor.map(envia, range(0, len(variacoes), arquivos_por_upload)))
+    duracao_envio = time.perf_counter() - inicio
+
+    # Acompanha os lotes até todos os jobs serem concluídos
+    lotes = [lote for _, _, lote in respostas if lote]
+    jobs = {}
+    limite = time.monotonic() + timeout
+    pendentes = list(lotes)
+    while pendentes and time.monotonic() < limite:
+        for lote in list(pendentes):
+            status = requests.get(f'{url}/api/v1/upload-nist/fila/lote/{lote}/', timeout=timeout).json()
+            if status['concluido']:
+                pendentes.remove(lote)
+                for job in status['jobs']:
+                    jobs[job['id_job']] = job
+        if pendentes:
+            time.sleep(0.1)
+    duracao_total = time.perf_counter() - inicio
+
+    latencias = [latencia for latencia, codigo, _ in respostas if codigo == 202]
+    segundos_jobs = [job['segundos'] for job in jobs.values()]
+    situacoes = {}
+    for job in jobs.values():
+        situacoes[job['status']] = situacoes.get(job['status'], 0) + 1
+
+    return {
+        'uploads': len(respostas),
+        'arquivos': len(variacoes),
+        'falhas_http': sum(1 for _, codigo, _ in respostas if codigo != 202),
+        'lotes_nao_concluidos': len(pendentes),
+        'envio': {
+            'segundos': round(duracao_envio, 3),
+            'uploads_por_segundo': round(len(respostas) / duracao_envio, 1),
+            'latencia_p50': percentil(latencias, 50),
+            'latencia_p99': percentil(latencias, 99),
+            'latencia_max': round(max(latencias), 4) if latencias else None,
+        },
+        'processamento': {
+            'segundos': round(duracao_total, 3),
+            'jobs_por_segundo': round(len(jobs) / duracao_total, 1),
+            'tempo_job_p50': percentil(segundos_jobs, 50),
+            'tempo_job_p99': percentil(segundos_jobs, 99),
+            'situacoes': situacoes,
+        },
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Teste de carga do upload de NISTs pela fila.")
+    parser.add_argument('--nist', type=Path, required=True, help="NIST de exemplo usado para gerar os uploads.")
+    parser.add_argument('--url', default=None, help="Servidor já em execução. Padrão: sobe um servidor local de testes.")
+    parser.add_argument('--db-url', default=None,
+                        help="URL SQLAlchemy do banco local de testes (sem --url). Padrão: SQLite em diretório temporário.")
+    parser.add_argument('--uploads', type=int, default=200, help="Quantidade de NISTs enviados.")
+    parser.add_argument('--clientes', type=int, default=8, help="Clientes enviando ao mesmo tempo.")
+    parser.add_argument('--arquivos-por-upload', type=int, default=1, help="Arquivos em cada requisição.")
+    parser.add_argument('--processadores', type=int, default=2, help="Threads do processador da fila (servidor local).")
+    parser.add_argument('--timeout', type=float, default=300, help="Limite em segundos para as requisições e o processamento.")
+    parser.add_argument('--saida', type=Path, default=Path('benchmark_upload.json'), help="Arquivo JSON do relatório.")
+    return parser
+
+
+if __name__ == '__main__':
+
+    args = build_parser().parse_args()
+    conteudo = args.nist.read_bytes()
+    variacoes = gera_variacoes(conteudo, args.uploads)
+
+    servidor = None
+    url = args.url
+    if not url:
+        url, servidor = inicia_servidor_local(conteudo, args.db_url, args.processadores)
+
+    try:
+        relatorio = {'inicio': datetime.now().isoformat(), 'url': url, 'parametros': {k: str(v) for k, v in vars(args).items()}}
+        relatorio.update(executa_carga(url.rstrip('/'), variacoes, args.clientes, args.arquivos_por_upload, args.timeout))
+        relatorio['fim'] = datetime.now().isoformat()
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+
+    args.saida.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+    envio, processamento = relatorio['envio'], relatorio['processamento']
+    print(f"[benchmark_upload] Envio: {envio['uploads_por_segundo']} uploads/s, p50 {envio['latencia_p50']}s, p99 {envio['latencia_p99']}s")
+    print(f"[benchmark_upload] Processamento: {processamento['jobs_por_segundo']} jobs/s, p50 {processamento['tempo_job_p50']}s, "
+          f"p99 {processamento['tempo_job_p99']}s, {processamento['situacoes']}")
+    print(f"[benchmark_upload] Relatório salvo em {args.saida}.")
@@ -20,4 +20,16 @@ FINDFACE_PASSWORD = os.environ["FINDFACE_PASSWORD"]
 
 # Caminhos padrão
 APP_DIR = Path(__file__).parent
-NIST_DIR = str(APP_DIR / "nists")
\ No newline at end of file
+NIST_DIR = str(APP_DIR / "nists")
+# Cache de NISTs lidos (nist_cache.py)
+NIST_CACHE_DB = os.environ.get("NIST_CACHE_DB", str(APP_DIR / "cache" / "nist_cache.sqlite3"))
+NIST_CACHE_TAMANHO = int(os.environ.get("NIST_CACHE_TAMANHO", 1024))
+# Retenção das partições mensais de tb_log (particoes_log.py; PARTICIONAR_TB_LOG é lido em database/models.py)
+RETENCAO_LOG_MESES = int(os.environ.get("RETENCAO_LOG_MESES", 12))
+# Threads que validam os NISTs recebidos no upload (route_upload_nist.py)
+UPLOAD_VALIDADORES = int(os.environ.get("UPLOAD_VALIDADORES", 4))
+# Fila de uploads do modo de produção (fila_upload.py, gunicorn.conf.py)
+UPLOAD_FILA_DB = os.environ.get("UPLOAD_FILA_DB", str(APP_DIR / "cache" / "fila_upload.sqlite3"))
+UPLOAD_PROCESSADORES = int(os.environ.get("UPLOAD_PROCESSADORES", 2))
+# Jobs em processamento há mais que isso (segundos) voltam para a fila: o worker que os reservou morreu
+UPLOAD_FILA_TIMEOUT = int(os.environ.get("UPLOAD_FILA_TIMEOUT", 600))
@@ -1,67 +1,36 @@
 from findface_multi.findface_multi import FindfaceConnection, FindfaceMulti, FindfaceException
 import os
-import json
-import requests
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
-import threading
 import mylogger
 from datetime import datetime
+from reconciliacao_cards import ExecutorCorrecoes, stream_cards
 
 
-def exclui_card(findface: FindfaceMulti, card: dict, arquivo_conf_lista: str) -> None:
+def card_selecionado(card: dict) -> bool:
     """
-    Exclui um cartão do sistema FindFace.
+    Critérios de exclusão:
+    1 - Todos do sexo feminino
+    2 - Data de nascimento >= 2015
+    """
+    meta = card["meta"]
+    return meta["sexo"] == 'F' or datetime.strptime(meta["data_nascimento"], r"%Y-%m-%d") >= datetime(2015, 1, 1)
 
-    Parameters:
-    - findface (FindfaceMulti): Conexão com o sistema FindFace.
-    - card (dict): Dicionário com informações do cartão.
 
-    Returns:
-    - None
+def salva_data_criacao(arquivo_conf_lista: str, data_criacao: str, aplicar: bool) -> None:
+    """
+    Salva a data de criação do último card tratado. Na simulação não salva, para não pular cards na execução real.
     """
-    if not isinstance(findface, FindfaceMulti):
-        raise TypeError("findface deve ser uma instância de FindfaceMulti.")
-    if not isinstance(card, dict):
-        raise TypeError("card deve ser um dicionário.")
-
-    try:
-        findface.delete_human_card(card["id"])
-        with log_lock:
-            logger.info(f"Card #{card['id']} excluído. Lista: {card['watch_lists']}, Sexo: {card['meta']['sexo']}, Nascimento: {card['meta']['data_nascimento']}")
-    except Exception as e:
-        with log_lock:
-            logger.error(f"{str(e)}")
-
-    # Salva a data da ultima atualização
-    data_criacao = card["created_date"]
-    with txt_lock:
+    if aplicar:
         with open(arquivo_conf_lista, 'w') as wf:
             wf.write(data_criacao)
 
 
-def imprime_card(findface: FindfaceMulti, card: dict) -> None:
-    """
-    Imprime informações de um cartão no log.
-
-    Parameters:
-    - findface (FindfaceMulti): Conexão com o sistema FindFace.
-    - card (dict): Dicionário com informações do cartão.
-
-    Returns:
-    - None
+def main(aplicar: bool = True, tamanho_lote: int = 400) -> None:
     """
-    if not isinstance(findface, FindfaceMulti):
-        raise TypeError("findface deve ser uma instância de FindfaceMulti.")
-    if not isinstance(card, dict):
-        raise TypeError("card deve ser um dicionário.")
-
-    logger.info(f"Card #{card['id']}, Listas: {card['watch_lists']}")
+    Percorre os cards das listas uma única vez (cursor da API) e exclui os selecionados em lotes paralelos.
 
-
-def main() -> None:
-    """
-    Função principal para processar e excluir cartões em paralelo do sistema FindFace.
+    A cada tamanho_lote cards lidos, as exclusões pendentes são executadas e o created_date do último card
+    é gravado em corrige_card_<lista>.txt; a próxima execução continua a partir dele.
     """
     FINDFACE_URL = os.environ["FINDFACE_URL"]
     FINDFACE_USER = os.environ["FINDFACE_USER"]
@@ -81,43 +50,33 @@ def main() -> None:
             if os.path.exists(arquivo_conf_lista):
                 with open(arquivo_conf_lista) as f:
                     data_criacao = f.read()
-            
+
             # Obtém o ID d lista no Findface
             id_lista = findface.get_watch_list_id_by_name(lista)
 
-            while True:               
-
-                cards = findface.get_human_cards(
-                    watch_lists=[id_lista],
-                    created_date_gt=data_criacao,
-                    has_face_objects=True,
-                    ordering='created_date',
-                    limit=400
-                )
-
-                if cards["results"]:                    
-                    # Atualiza a data de criação
-                    cards["results"][-1]["created_date"]
-                    
-                    cards_selecionados = [x for x in cards["results"] if x["meta"]["sexo"] == 'F' or ( datetime.strptime(x["meta"]["data_nascimento"], r"%Y-%m-%d") >= datetime(2015, 1, 1) )]
-
-                    # Selecion os cards para exclusão. Critérios:
-                    # 1 - Todos do sexo feminino
-                    # 2 - Data de nascimento > 2015
-                    if cards_selecionados:                        
-                        # print(json.dumps(cards_selecionados, indent=4))                    
-                        # exit(-1)
-
-                        # Agora com 4 workers fixos
-                        with ThreadPoolExecutor(max_workers=4) as executor:
-                            futures = [
-                                executor.submit(exclui_card, findface, card, arquivo_conf_lista)
-                                for card in cards_selecionados
-                            ]
-                            for future in futures:
-                                future.result()
-                else:
-                    break
+            correcoes = ExecutorCorrecoes(findface, aplicar=aplicar)
+            lidos = 0
+            ultima_data = None
+            try:
+                # Os ids crescem com a data de criação: a ordem por id do cursor também é a de created_date
+                for card in stream_cards(findface, id_lista, has_face_objects=True, created_date_gt=data_criacao):
+                    lidos += 1
+                    ultima_data = card["created_date"]
+                    if card_selecionado(card):
+                        logger.info(f"Card #{card['id']} selecionado. Lista: {card['watch_lists']}, Sexo: {card['meta']['sexo']}, Nascimento: {card['meta']['data_nascimento']}")
+                        correcoes.excluir_card(card["id"])
+
+                    if lidos % tamanho_lote == 0:
+                        # Só avança a data depois de executar as exclusões dos cards já lidos
+                        correcoes.descarregar()
+                        salva_data_criacao(arquivo_conf_lista, ultima_data, aplicar)
+            finally:
+                correcoes.encerrar()
+
+            if ultima_data:
+                salva_data_criacao(arquivo_conf_lista, ultima_data, aplicar)
+
+            logger.info(f"Lista {lista}: {lidos} cards lidos, {dict(correcoes.executadas)} excluídos, {dict(correcoes.falhas)} falhas.")
 
 
 if __name__ == '__main__':
@@ -125,9 +84,5 @@ if __name__ == '__main__':
     log_file = Path(__file__).parent / 'corrige_card.log'
     # Logger configurado
     logger = mylogger.configurar_logger(str(log_file))
-    # Lock global para sincronização do logger    
-    log_lock = threading.Lock()
-    # Lock global para gravação no arquivo TXT de controle de data da última leitura
-    txt_lock = threading.Lock()
 
     main()
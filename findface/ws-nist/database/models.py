@@ -1,11 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import CheckConstraint, UniqueConstraint, func, event, Index, or_
+from sqlalchemy import CheckConstraint, DDL, UniqueConstraint, func, event, Index, or_, text
 from sqlalchemy.orm import relationship, attributes, aliased
 from datetime import datetime, date
 from decimal import Decimal
+import os
 
 db = SQLAlchemy()
 
+# Particionamento mensal de tb_log por dt_log (particoes_log.py). Lido direto do ambiente, sem o
+# config_app: importar os modelos não exige as credenciais do app
+PARTICIONAR_TB_LOG = os.environ.get("PARTICIONAR_TB_LOG", "0") == "1"
+
 def model_to_dict(model, joined_load=False) -> dict:
     item = {}
     for c in model.__table__.columns:
@@ -31,12 +36,11 @@ class AlertaNist(db.Model):
     __tablename__ = 'tb_alerta_nist'
     __table_args__ = (
         UniqueConstraint('id_nist', 'id_alerta', name='uq_alerta_nist'),
-        Index('ix_alerta_nist', 'id_nist', 'id_alerta'),
         {'schema': 'findface'},
     )
 
     id_alerta_nist = db.Column(db.Integer, primary_key=True)
-    id_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_nist.id_nist', ondelete="CASCADE"), nullable=False, index=True)
+    id_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_nist.id_nist', ondelete="CASCADE"), nullable=False)
     id_alerta = db.Column(db.Integer, db.ForeignKey('findface.tb_alerta.id_alerta', ondelete="CASCADE"), nullable=False, index=True)
 
     def to_dict(self, joined_load=False):
@@ -46,14 +50,16 @@ class AlertaNistFindface(db.Model):
     __tablename__ = 'tb_alerta_nist_findface'
     __table_args__ = (
         Index('ix_alerta_nist_findface_ids', 'id_alerta_nist', 'id_findface'),
-        Index('ix_alerta_nist_findface_all', 'id_alerta_nist', 'id_findface', 'card_id'),
+        # Alertas pendentes de envio ao Findface (card_id IS NULL)
+        Index('ix_alerta_nist_findface_sem_card', 'id_alerta_nist_findface',
+              postgresql_where=text('card_id IS NULL'), sqlite_where=text('card_id IS NULL')),
         {'schema': 'findface'}
     )
 
     id_alerta_nist_findface = db.Column(db.Integer, primary_key=True)
-    id_alerta_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_alerta_nist.id_alerta_nist', ondelete="CASCADE"), nullable=False, index=True)
+    id_alerta_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_alerta_nist.id_alerta_nist', ondelete="CASCADE"), nullable=False)
     id_findface = db.Column(db.Integer, db.ForeignKey('findface.tb_findface.id_findface', ondelete="CASCADE"), nullable=False, index=True)
-    card_id = db.Column(db.Integer, nullable=True, index=True)
+    card_id = db.Column(db.Integer, nullable=True)
 
     def to_dict(self, joined_load=False):
         return model_to_dict(self)
@@ -62,14 +68,19 @@ class NistFindface(db.Model):
     __tablename__ = 'tb_nist_findface'
     __table_args__ = (
         UniqueConstraint('id_nist', 'id_findface', name='uq_nist_findface'),
-        Index('ix_nist_findface', 'id_nist', 'id_findface'),
+        # Anti-join dos Nists ainda sem card no Findface (card_id IS NULL)
+        Index('ix_nist_findface_sem_card', 'id_nist', 'id_findface',
+              postgresql_where=text('card_id IS NULL'), sqlite_where=text('card_id IS NULL')),
+        # Relações de um Findface em ordem de card_id (merge-join de reconciliacao_cards.py)
+        Index('ix_nist_findface_card', 'id_findface', 'card_id',
+              postgresql_where=text('card_id IS NOT NULL'), sqlite_where=text('card_id IS NOT NULL')),
         {'schema': 'findface'},
     )
 
     id_nist_findface = db.Column(db.Integer, primary_key=True)
-    id_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_nist.id_nist', ondelete="CASCADE"), nullable=False, index=True)
+    id_nist = db.Column(db.Integer, db.ForeignKey('findface.tb_nist.id_nist', ondelete="CASCADE"), nullable=False)
     id_findface = db.Column('id_findface', db.Integer, db.ForeignKey('findface.tb_findface.id_findface', ondelete="CASCADE"), nullable=False, index=True)
-    card_id = db.Column(db.Integer, nullable=True, index=True)
+    card_id = db.Column(db.Integer, nullable=True)
 
     def to_dict(self, joined_load=False):
         return model_to_dict(self)
@@ -79,27 +90,28 @@ class Nist(db.Model):
     __table_args__ = (
         Index('ix_tb_nist_no_pessoa_dt_nascimento_no_mae', 'no_pessoa', 'dt_nascimento', 'no_mae'),
         Index('ix_tb_nist_no_pessoa_dt_nascimento_no_pai', 'no_pessoa', 'dt_nascimento', 'no_pai'),
+        Index('ix_tb_nist_nr_cpf', 'nr_cpf', postgresql_where=text('nr_cpf IS NOT NULL'), sqlite_where=text('nr_cpf IS NOT NULL')),
         {'schema': 'findface'}
     )
     
     id_nist = db.Column(db.Integer, primary_key=True)
-    no_pessoa = db.Column(db.String(250), nullable=False, index=True)
-    no_social = db.Column(db.String(250), nullable=True, index=True)
-    dt_nascimento = db.Column(db.Date, nullable=True, index=True)
-    tp_sexo = db.Column(db.String(1), nullable=True, index=True)
-    no_mae = db.Column(db.String(250), nullable=True, index=True)
-    no_pai = db.Column(db.String(250), nullable=True, index=True)
-    ds_naturalidade = db.Column(db.String(150), nullable=True, index=True)
-    ds_pais_nacionalidade = db.Column(db.String(150), nullable=True, index=True)
-    nr_cpf = db.Column(db.String(11), nullable=True, index=True)
-    nr_rnm = db.Column(db.String(30), nullable=True, index=True)
-    nr_passaporte = db.Column(db.String(30), nullable=True, index=True)
-    nr_documento = db.Column(db.String(50), nullable=True, index=True)
+    no_pessoa = db.Column(db.String(250), nullable=False)
+    no_social = db.Column(db.String(250), nullable=True)
+    dt_nascimento = db.Column(db.Date, nullable=True)
+    tp_sexo = db.Column(db.String(1), nullable=True)
+    no_mae = db.Column(db.String(250), nullable=True)
+    no_pai = db.Column(db.String(250), nullable=True)
+    ds_naturalidade = db.Column(db.String(150), nullable=True)
+    ds_pais_nacionalidade = db.Column(db.String(150), nullable=True)
+    nr_cpf = db.Column(db.String(11), nullable=True)
+    nr_rnm = db.Column(db.String(30), nullable=True)
+    nr_passaporte = db.Column(db.String(30), nullable=True)
+    nr_documento = db.Column(db.String(50), nullable=True)
     uri_nist = db.Column(db.String(1000), nullable=True, index=True, unique=True)
-    nr_mandado_prisao = db.Column(db.String(250), nullable=True, index=True)
+    nr_mandado_prisao = db.Column(db.String(250), nullable=True)
     id_base_origem = db.Column(db.Integer, db.ForeignKey('findface.tb_base_origem.id_base_origem', ondelete="CASCADE"), nullable=True, index=True)
-    ativo = db.Column(db.Boolean, nullable=False, index=True, default=True)
-    dt_atualizacao = db.Column(db.DateTime, nullable=False, index=True, default=lambda: datetime.now())
+    ativo = db.Column(db.Boolean, nullable=False, default=True)
+    dt_atualizacao = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now())
     md5_hash = db.Column(db.String(250), nullable=False, index=True)
 
     base_origem = db.relationship('BaseOrigem', backref='nists')
@@ -113,22 +125,22 @@ class Alerta(db.Model):
     __tablename__ = 'tb_alerta'
     __table_args__ = (
         Index('ix_tb_alerta_no_qualificado_dt_nascimento_no_mae', 'no_qualificado', 'dt_nascimento', 'no_mae'),
-        Index('ix_tb_alerta_no_qualificado_dt_nascimento_no_pai', 'no_qualificado', 'dt_nascimento', 'no_pai'),
+        Index('ix_tb_alerta_nr_cpf', 'nr_cpf', postgresql_where=text('nr_cpf IS NOT NULL'), sqlite_where=text('nr_cpf IS NOT NULL')),
         {'schema': 'findface'}
     )
 
     id_alerta = db.Column(db.Integer, primary_key=True)
     sq_alerta_restricao = db.Column(db.Integer, nullable=False, index=True)
-    sq_tipo_alerta_restricao = db.Column(db.Integer, nullable=False, index=True)
-    tp_status = db.Column(db.Integer, nullable=False, index=True)
-    no_qualificado = db.Column(db.String(250), nullable=False, index=True)
-    dt_nascimento = db.Column(db.Date, nullable=True, index=True)
-    no_mae = db.Column(db.String(250), nullable=True, index=True)
-    no_pai = db.Column(db.String(250), nullable=True, index=True)
-    nr_cpf = db.Column(db.String(11), nullable=True, index=True)
-    dt_atualizacao_alerta_restricao = db.Column(db.DateTime, nullable=False, index=True)
-    dt_atualizacao_qualificado = db.Column(db.DateTime, nullable=False, index=True)
-    nr_mandado_prisao = db.Column(db.String(250), nullable=True, index=True)
+    sq_tipo_alerta_restricao = db.Column(db.Integer, nullable=False)
+    tp_status = db.Column(db.Integer, nullable=False)
+    no_qualificado = db.Column(db.String(250), nullable=False)
+    dt_nascimento = db.Column(db.Date, nullable=True)
+    no_mae = db.Column(db.String(250), nullable=True)
+    no_pai = db.Column(db.String(250), nullable=True)
+    nr_cpf = db.Column(db.String(11), nullable=True)
+    dt_atualizacao_alerta_restricao = db.Column(db.DateTime, nullable=False)
+    dt_atualizacao_qualificado = db.Column(db.DateTime, nullable=False)
+    nr_mandado_prisao = db.Column(db.String(250), nullable=True)
     dt_download = db.Column(db.DateTime, nullable=False, index=True)
 
     nists = relationship('Nist', secondary='findface.tb_alerta_nist', back_populates='alertas')
@@ -186,10 +198,20 @@ class TipoLog(db.Model):
 
 class Log(db.Model):
     __tablename__ = 'tb_log'
-    __table_args__ = {'schema': 'findface'}
+    # Com PARTICIONAR_TB_LOG a tabela é particionada por mês em dt_log (PostgreSQL). A chave de
+    # partição precisa fazer parte da chave primária. Partições: particoes_log.py
+    __table_args__ = {'schema': 'findface', 'postgresql_partition_by': 'RANGE (dt_log)'} if PARTICIONAR_TB_LOG else {'schema': 'findface'}
 
-    id_log = db.Column(db.Integer, primary_key=True)
+    id_log = db.Column(db.Integer, primary_key=True, autoincrement=True)
     id_origem = db.Column(db.Integer, nullable=True, index=True)
     cd_tipo_log = db.Column(db.Integer, db.ForeignKey('findface.tb_tipo_log.cd_tipo_log', ondelete="CASCADE"), nullable=False, index=True)
     ds_log = db.Column(db.Text, nullable=True)
-    dt_log = db.Column(db.DateTime, nullable=False, index=True, default=lambda: datetime.now())
+    dt_log = db.Column(db.DateTime, nullable=False, index=True, default=lambda: datetime.now(), primary_key=PARTICIONAR_TB_LOG)
+
+if PARTICIONAR_TB_LOG:
+    # Registros fora das partições mensais já criadas caem na partição padrão
+    event.listen(
+        Log.__table__,
+        'after_create',
+        DDL("CREATE TABLE IF NOT EXISTS findface.tb_log_default PARTITION OF findface.tb_log DEFAULT").execute_if(dialect='postgresql'),
+    )
@@ -0,0 +1,391 @@
+"""
+Fila de uploads de NIST do modo de produção do ws-nist.
+
+No upload síncrono (/api/v1/upload-nist/) a validação dos arquivos e as consultas ao banco rodam na
+thread da requisição, que fica presa enquanto isso. No modo de produção (gunicorn com vários workers,
+ver gunicorn.conf.py) a requisição só copia os arquivos para temp/fila e grava um job por arquivo nesta
+fila; o ProcessadorUploads de cada worker reserva os jobs pendentes, valida o NIST, grava o arquivo em
+nists/ e cadastra o Nist no banco (nist_manager.add_nist_to_db_by_uri).
+
+A fila é um banco SQLite (WAL) compartilhado pelos workers do gunicorn: qualquer worker responde o
+status de um job e a reserva é atômica (BEGIN IMMEDIATE), então um job nunca é processado por dois
+workers. Jobs que ficaram 'processando' além de UPLOAD_FILA_TIMEOUT (worker morto) voltam para a fila.
+
+O destino em nists/ é gravado no job antes de mover o arquivo: se o worker morrer depois do move, o job
+devolvido à fila é retomado a partir do arquivo já gravado (conferido pelo md5), sem rejeitar o NIST.
+
+Situações de um job: pendente -> processando -> recebido | existente | rejeitado | erro.
+
+Uso:
+    fila = obter_fila()
+    jobs = fila.enfileirar(lote, [(nome_arquivo, caminho_temp, md5_hash)])
+    obter_processador(app).iniciar()
+    fila.obter(jobs[0]['id_job'])
+"""
+import sqlite3
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from config_app import NIST_DIR, UPLOAD_FILA_DB, UPLOAD_FILA_TIMEOUT, UPLOAD_PROCESSADORES
+from database.models import db, BaseOrigem, Nist
+from routes.api.v1.route_upload_nist import caminho_serializado, md5_arquivo, valida_nist
+
+
+SITUACOES_FINAIS = ('recebido', 'existente', 'rejeitado', 'erro')
+
+# Intervalo entre consultas à fila quando não há jobs (os jobs podem vir de outro worker do gunicorn)
+INTERVALO_CONSULTA = 0.2
+
+
+class FilaUpload:
+    """
+    Jobs de upload de NIST persistidos em SQLite, compartilhados entre processos.
+    """
+
+    def __init__(self, caminho_db: str):
+        """
+        Argumentos:
+        - caminho_db (str): Caminho do arquivo SQLite. Os diretórios são criados se necessário.
+        """
+        self._lock = threading.Lock()
+
+        Path(caminho_db).parent.mkdir(parents=True, exist_ok=True)
+        # Sem transação implícita: a reserva abre a sua com BEGIN IMMEDIATE
+        self._conexao = sqlite3.connect(caminho_db, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conexao.row_factory = sqlite3.Row
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tb_fila_upload (
+                id_job TEXT PRIMARY KEY,
+                lote TEXT NOT NULL,
+                arquivo TEXT NOT NULL,
+                caminho_temp TEXT NOT NULL,
+                md5_hash TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                motivo TEXT,
+                caminho TEXT,
+                id_nist INTEGER,
+                dt_criacao REAL NOT NULL,
+                dt_inicio REAL,
+                dt_fim REAL
+            )
+            """
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS ix_fila_upload_status ON tb_fila_upload (status, dt_criacao)")
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS ix_fila_upload_lote ON tb_fila_upload (lote)")
+
+    def enfileirar(self, lote: str, arquivos: list) -> list:
+        """
+        Grava um job pendente para cada arquivo.
+
+        Argumentos:
+        - lote (str): Identificador da requisição que enviou os arquivos.
+        - arquivos (list): [(nome do arquivo, caminho temporário, md5)].
+
+        Retorna:
+        - list: [{'id_job', 'arquivo'}], na ordem dos arquivos.
+        """
+        agora = time.time()
+        jobs = [(uuid.uuid4().hex, lote, arquivo, str(caminho_temp), md5_hash, agora)
+                for arquivo, caminho_temp, md5_hash in arquivos]
+        with self._lock:
+            self._conexao.execute("BEGIN")
+            try:
+                self._conexao.executemany(
+                    "INSERT INTO tb_fila_upload (id_job, lote, arquivo, caminho_temp, md5_hash, dt_criacao) VALUES (?, ?, ?, ?, ?, ?)",
+                    jobs,
+                )
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+        return [{'id_job': id_job, 'arquivo': arquivo} for id_job, _, arquivo, *_ in jobs]
+
+    def reservar(self) -> dict | None:
+        """
+        Marca o job pendente mais antigo como 'processando' e o retorna, ou None se a fila estiver vazia.
+        """
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._conexao.execute(
+                    "SELECT * FROM tb_fila_upload WHERE status = 'pendente' ORDER BY dt_criacao LIMIT 1"
+                ).fetchone()
+                if linha:
+                    self._conexao.execute(
+                        "UPDATE tb_fila_upload SET status = 'processando', dt_inicio = ? WHERE id_job = ?",
+                        (time.time(), linha['id_job']),
+                    )
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+        return dict(linha) if linha else None
+
+    def registrar_destino(self, id_job: str, caminho: str, md5_hash: str) -> None:
+        """
+        Grava o destino do NIST em nists/ e o md5 do NIST reserializado antes do arquivo ser movido.
+        """
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE tb_fila_upload SET caminho = ?, md5_hash = ? WHERE id_job = ?", (caminho, md5_hash, id_job)
+            )
+
+    def concluir(self, id_job: str, status: str, motivo: str | None = None, caminho: str | None = None,
+                 id_nist: int | None = None, md5_hash: str | None = None) -> None:
+        """
+        Grava a situação final do job. md5_hash, se informado, substitui o md5 do upload pelo do NIST
+        reserializado (o mesmo de Nist.md5_hash).
+        """
+        if status not in SITUACOES_FINAIS:
+            raise ValueError(f"Situação '{status}' inválida. Esperado um de {SITUACOES_FINAIS}.")
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE tb_fila_upload SET status = ?, motivo = ?, caminho = ?, id_nist = ?, dt_fim = ?, "
+                "md5_hash = coalesce(?, md5_hash) WHERE id_job = ?",
+                (status, motivo, caminho, id_nist, time.time(), md5_hash, id_job),
+            )
+
+    def recuperar_orfaos(self, timeout: int = UPLOAD_FILA_TIMEOUT) -> int:
+        """
+        Devolve à fila os jobs reservados há mais de 'timeout' segundos. Retorna a quantidade.
+        """
+        with self._lock:
+            cursor = self._conexao.execute(
+                "UPDATE tb_fila_upload SET status = 'pendente', dt_inicio = NULL WHERE status = 'processando' AND dt_inicio < ?",
+                (time.time() - timeout,),
+            )
+        return cursor.rowcount
+
+    def limpar(self, dias: int = 30) -> int:
+        """
+        Remove os jobs concluídos há mais de 'dias' dias. Retorna a quantidade.
+        """
+        with self._lock:
+            cursor = self._conexao.execute(
+                f"DELETE FROM tb_fila_upload WHERE status IN ({', '.join('?' * len(SITUACOES_FINAIS))}) AND dt_fim < ?",
+                (*SITUACOES_FINAIS, time.time() - dias * 86400),
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _formata_job(linha: sqlite3.Row) -> dict:
+        job = {chave: linha[chave] for chave in ('id_job', 'lote', 'arquivo', 'md5_hash', 'status', 'motivo', 'caminho', 'id_nist')}
+        for chave in ('dt_criacao', 'dt_inicio', 'dt_fim'):
+            job[chave] = datetime.fromtimestamp(linha[chave]).isoformat() if linha[chave] else None
+        # Segundos entre o enfileiramento e a conclusão
+        job['segundos'] = round(linha['dt_fim'] - linha['dt_criacao'], 3) if linha['dt_fim'] else None
+        return job
+
+    def obter(self, id_job: str) -> dict | None:
+        with self._lock:
+            linha = self._conexao.execute("SELECT * FROM tb_fila_upload WHERE id_job = ?", (id_job,)).fetchone()
+        return self._formata_job(linha) if linha else None
+
+    def obter_lote(self, lote: str) -> list:
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT * FROM tb_fila_upload WHERE lote = ? ORDER BY dt_criacao, rowid", (lote,)
+            ).fetchall()
+        return [self._formata_job(linha) for linha in linhas]
+
+    def resumo(self) -> dict:
+        """
+        Quantidade de jobs por situação.
+        """
+        with self._lock:
+            return dict(self._conexao.execute("SELECT status, COUNT(*) FROM tb_fila_upload GROUP BY status").fetchall())
+
+
+_fila = None
+_fila_lock = threading.Lock()
+
+
+def obter_fila(caminho_db: str = UPLOAD_FILA_DB) -> FilaUpload:
+    """
+    Retorna a fila compartilhada do processo, criando-a no primeiro uso.
+    """
+    global _fila
+    with _fila_lock:
+        if _fila is None:
+            _fila = FilaUpload(caminho_db)
+        return _fila
+
+
+def cadastra_nist(caminho: Path, md5_hash: str, inserir_nist) -> dict:
+    """
+    Cadastra no banco o NIST já gravado em nists/, se ainda não estiver cadastrado.
+    """
+    nist = Nist.query.filter_by(md5_hash=md5_hash).first()
+    if nist is None:
+        nist = inserir_nist(str(caminho))
+        if nist is None:
+            # O arquivo fica em nists/ para o watchdog-app/adiciona_nists tentarem de novo
+            return {'status': 'erro', 'motivo': 'Falha ao cadastrar o NIST no banco.', 'caminho': str(caminho),
+                    'md5_hash': md5_hash}
+    elif nist.uri_nist != str(caminho):
+        return {'status': 'existente', 'caminho': nist.uri_nist, 'id_nist': nist.id_nist, 'md5_hash': md5_hash}
+    return {'status': 'recebido', 'caminho': nist.uri_nist, 'id_nist': nist.id_nist, 'md5_hash': md5_hash}
+
+
+def processa_job(job: dict, diretorio_nists: Path, inserir_nist, registrar_destino=None) -> dict:
+    """
+    Valida o NIST de um job, grava o arquivo em nists/<base>/<data>/ e cadastra o Nist no banco.
+
+    Deve ser chamada dentro do app_context do Flask.
+
+    Argumentos:
+    - registrar_destino (callable, opcional): Recebe (caminho, md5) antes do arquivo ser movido
+      (FilaUpload.registrar_destino). Com ele, um job devolvido à fila depois do move é retomado.
+
+    Retorna:
+    - dict: {'status', 'motivo', 'caminho', 'id_nist', 'md5_hash'} para FilaUpload.concluir.
+    """
+    destino_anterior = Path(job['caminho']) if job.get('caminho') else None
+    if destino_anterior is not None and not Path(job['caminho_temp']).exists():
+        # O worker anterior caiu depois de mover o arquivo: retoma a partir do arquivo em nists/
+        if not destino_anterior.exists():
+            return {'status': 'erro', 'motivo': 'Arquivo do job não encontrado em temp nem em nists.'}
+        if md5_arquivo(destino_anterior) != job['md5_hash']:
+            return {'status': 'erro', 'caminho': str(destino_anterior),
+                    'motivo': 'Arquivo em nists difere do NIST validado no job.'}
+        return cadastra_nist(destino_anterior, job['md5_hash'], inserir_nist)
+
+    # A base de origem é conferida na triagem, antes do parse completo do NIST
+    resultado = valida_nist(Path(job['caminho_temp']),
+                            lambda nome: BaseOrigem.query.filter_by(no_base_origem=nome).first() is not None)
+    if 'motivo' in resultado:
+        return {'status': 'rejeitado', 'motivo': resultado['motivo']}
+    md5_hash = resultado['md5']
+    nome_base_origem = resultado['base_origem']
+
+    caminho = destino_anterior or \
+        Path(diretorio_nists) / str(nome_base_origem).lower() / datetime.now().strftime('%Y-%m-%d') / job['arquivo']
+
+    nist = Nist.query.filter_by(md5_hash=md5_hash).first()
+    if nist and nist.uri_nist != str(caminho):
+        return {'status': 'existente', 'caminho': nist.uri_nist, 'id_nist': nist.id_nist, 'md5_hash': md5_hash}
+
+    if caminho.exists():
+        # O mesmo conteúdo já no destino é de uma tentativa anterior deste job (ex.: move interrompido)
+        if md5_arquivo(caminho) != md5_hash:
+            return {'status': 'existente', 'caminho': str(caminho), 'md5_hash': md5_hash}
+    else:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        if registrar_destino is not None:
+            registrar_destino(str(caminho), md5_hash)
+        shutil.move(str(resultado['caminho']), str(caminho))
+
+    return cadastra_nist(caminho, md5_hash, inserir_nist)
+
+
+class ProcessadorUploads:
+    """
+    Threads que consomem a fila de uploads dentro de um worker do gunicorn.
+    """
+
+    def __init__(self, app, fila: FilaUpload, processadores: int = UPLOAD_PROCESSADORES,
+                 diretorio_nists: str | Path = NIST_DIR, inserir_nist=None):
+        """
+        Argumentos:
+        - app (Flask): App cujo contexto (banco) é usado no processamento.
+        - fila (FilaUpload): Fila de onde os jobs são reservados.
+        - processadores (int): Quantidade de threads.
+        - diretorio_nists (str | Path): Raiz onde os NISTs aceitos são gravados.
+        - inserir_nist (callable, opcional): Cadastra o Nist a partir do caminho do arquivo
+          (padrão: nist_manager.add_nist_to_db_by_uri).
+        """
+        self.app = app
+        self.fila = fila
+        self.processadores = max(1, processadores)
+        self.diretorio_nists = Path(diretorio_nists)
+        self._inserir_nist = inserir_nist
+        self._threads = []
+        self._parar = threading.Event()
+        self._novos_jobs = threading.Event()
+        self._lock = threading.Lock()
+
+    def iniciar(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            if self._inserir_nist is None:
+                # nist_manager importa o app de produção: só carrega quando o processador é iniciado
+                from nist_manager import add_nist_to_db_by_uri
+                self._inserir_nist = add_nist_to_db_by_uri
+
+            orfaos = self.fila.recuperar_orfaos()
+            if orfaos:
+                print(f"[fila_upload] {orfaos} jobs órfãos devolvidos à fila.")
+            self.fila.limpar()
+
+            self._parar.clear()
+            self._threads = [threading.Thread(target=self._executa, name=f'processa_upload_{i}', daemon=True)
+                             for i in range(self.processadores)]
+            for thread in self._threads:
+                thread.start()
+
+    def notificar(self) -> None:
+        """
+        Acorda as threads ociosas (jobs enfileirados por este mesmo worker).
+        """
+        self._novos_jobs.set()
+
+    def _executa(self) -> None:
+        while not self._parar.is_set():
+            job = self.fila.reservar()
+            if job is None:
+                self._novos_jobs.wait(INTERVALO_CONSULTA)
+                self._novos_jobs.clear()
+                continue
+            self._processa(job)
+
+    def _processa(self, job: dict) -> None:
+        with self.app.app_context():
+            try:
+                resultado = processa_job(job, self.diretorio_nists, self._inserir_nist,
+                                         lambda caminho, md5_hash: self.fila.registrar_destino(job['id_job'], caminho, md5_hash))
+            except Exception:
+                db.session.rollback()
+                print(f"[fila_upload] Erro no job {job['id_job']} ({job['arquivo']}):\n{traceback.format_exc()}")
+                resultado = {'status': 'erro', 'motivo': traceback.format_exc(limit=1).strip().splitlines()[-1]}
+            finally:
+                Path(job['caminho_temp']).unlink(missing_ok=True)
+                caminho_serializado(job['caminho_temp']).unlink(missing_ok=True)
+                db.session.remove()
+        self.fila.concluir(job['id_job'], **resultado)
+
+    def encerrar(self) -> None:
+        """
+        Para as threads depois do job em andamento.
+        """
+        with self._lock:
+            self._parar.set()
+            self._novos_jobs.set()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+
+_processador = None
+_processador_lock = threading.Lock()
+
+
+def obter_processador(app=None, **kwargs) -> ProcessadorUploads:
+    """
+    Retorna o processador compartilhado do processo, criando-o no primeiro uso (exige o app).
+    """
+    global _processador
+    with _processador_lock:
+        if _processador is None:
+            if app is None:
+                raise ValueError("O app é obrigatório na criação do processador de uploads.")
+            kwargs.setdefault('fila', obter_fila())
+            _processador = ProcessadorUploads(app, **kwargs)
+        return _processador
@@ -0,0 +1,39 @@
+"""
+Configuração do gunicorn para o modo de produção do ws-nist.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Cada worker atende as requisições em threads (gthread) e roda o seu ProcessadorUploads, que consome a
+fila de uploads (fila_upload.py) compartilhada por todos os workers.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# Uploads grandes em redes lentas
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 300))
+graceful_timeout = 60
+# Recicla os workers aos poucos (vazamentos de memória das bibliotecas de imagem)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    # Jobs deixados na fila por um worker anterior começam a ser processados sem esperar um novo upload
+    from fila_upload import obter_processador
+    obter_processador(worker.wsgi).iniciar()
+
+
+def worker_exit(server, worker):
+    from fila_upload import obter_processador
+    try:
+        obter_processador().encerrar()
+    except ValueError:
+        # O worker saiu antes de criar o processador
+        pass
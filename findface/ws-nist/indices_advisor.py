@@ -0,0 +1,435 @@
+"""
+Consultor de índices do schema findface.
+
+Executa EXPLAIN em cada consulta do catálogo abaixo (as consultas quentes do pipeline:
+ws-nist, envio ao Findface e STIMAR), compara os índices existentes no banco com os declarados
+em database/models.py e mostra o uso real de cada índice (pg_stat_user_indexes). Com
+--gerar-migracao, grava em migrations/versions uma revisão Alembic explícita, encadeada na head
+do servidor, que remove os índices que deixaram de ser declarados e cria os índices parciais
+(op.create_index com postgresql_where). O autogenerate não é usado: ele não detecta mudanças na
+cláusula WHERE de um índice.
+
+Exemplos:
+    python indices_advisor.py
+    python indices_advisor.py --analyze --saida indices.json
+    python indices_advisor.py --gerar-migracao
+"""
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import aliased
+
+from app import app
+from database.models import db, Nist, Alerta, AlertaNist, AlertaNistFindface, NistFindface, Log
+from reconciliacao_cards import consulta_relacoes_por_card
+from stimar import consulta_matches_bnmp_join, consulta_matches_bnmp_subquery
+
+
+SCHEMA = 'findface'
+
+
+def consulta_nists_sem_card():
+    # nist_manager.obtem_todos_os_nists_com_findface_mas_sem_cardid
+    return Nist.query.join(NistFindface, Nist.id_nist == NistFindface.id_nist).filter(NistFindface.card_id == None).limit(400)
+
+
+def consulta_novas_relacoes_nist_findface():
+    # nist_manager.obter_todas_as_novas_relacoes_nist_findface
+    return db.session.query(Nist.id_nist) \
+        .filter(Nist.id_base_origem == 1) \
+        .outerjoin(NistFindface, NistFindface.id_nist == Nist.id_nist) \
+        .filter(NistFindface.id_findface == None) \
+        .limit(100)
+
+
+def consulta_relacao_nist_findface():
+    # nist_manager.envia_nist_para_findface
+    return NistFindface.query.filter_by(id_nist=1, id_findface=1).limit(1)
+
+
+def consulta_nist_por_md5():
+    # nist_manager.add_nist_to_db e route_upload_nist.handle_nist
+    return Nist.query.filter_by(md5_hash='00000000000000000000000000000000').limit(1)
+
+
+def consulta_nist_por_uri():
+    # nist_manager.add_nist_to_db_by_uri
+    return Nist.query.filter_by(uri_nist='nists/exemplo.nst').limit(1)
+
+
+def consulta_alerta_nist_existente():
+    # stimar.descobre_novos_alertas_bnmp_*
+    return db.session.query(AlertaNist).filter_by(id_nist=1, id_alerta=1).limit(1)
+
+
+def consulta_alertanist_sem_findface():
+    # stimar.vincula_alertanist_com_findface
+    alerta_nist = aliased(AlertaNist)
+    alerta_nist_findface = aliased(AlertaNistFindface)
+    return db.session.query(alerta_nist.id_alerta_nist) \
+        .outerjoin(alerta_nist_findface, alerta_nist.id_alerta_nist == alerta_nist_findface.id_alerta_nist) \
+        .filter(alerta_nist_findface.id_alerta_nist_findface == None)
+
+
+def consulta_alertanistfindface_sem_card():
+    # stimar (__main__): alertas pendentes de envio
+    return db.session.query(AlertaNistFindface.id_alerta_nist_findface).filter(AlertaNistFindface.card_id == None)
+
+
+def consulta_ultima_atualizacao_stimar():
+    # stimar.obtem_dt_ultima_atualizacao_stimar
+    return db.session.query(func.max(Alerta.dt_download))
+
+
+def consulta_relacoes_para_reconciliacao():
+    # reconciliacao_cards.stream_relacoes
+    return consulta_relacoes_por_card(id_findface=1, id_base_origem=1)
+
+
+def consulta_log_por_tipo():
+    # manual_upload.obter_arquivos_nist_com_erro
+    return Log.query.filter_by(cd_tipo_log=18)
+
+
+CATALOGO_CONSULTAS = {
+    'nists_sem_card': consulta_nists_sem_card,
+    'novas_relacoes_nist_findface': consulta_novas_relacoes_nist_findface,
+    'relacao_nist_findface': consulta_relacao_nist_findface,
+    'nist_por_md5': consulta_nist_por_md5,
+    'nist_por_uri': consulta_nist_por_uri,
+    'matches_bnmp_subquery': consulta_matches_bnmp_subquery,
+    'matches_bnmp_join': consulta_matches_bnmp_join,
+    'alerta_nist_existente': consulta_alerta_nist_existente,
+    'alertanist_sem_findface': consulta_alertanist_sem_findface,
+    'alertanistfindface_sem_card': consulta_alertanistfindface_sem_card,
+    'ultima_atualizacao_stimar': consulta_ultima_atualizacao_stimar,
+    'log_por_tipo': consulta_log_por_tipo,
+    'relacoes_para_reconciliacao': consulta_relacoes_para_reconciliacao,
+}
+
+
+# Índices de coluna única e compostos substituídos pelos índices parciais (nomes gerados pelos modelos antigos)
+INDICES_REMOVIDOS = [
+    ('tb_nist', 'ix_findface_tb_nist_no_pessoa', ['no_pessoa']),
+    ('tb_nist', 'ix_findface_tb_nist_no_social', ['no_social']),
+    ('tb_nist', 'ix_findface_tb_nist_dt_nascimento', ['dt_nascimento']),
+    ('tb_nist', 'ix_findface_tb_nist_tp_sexo', ['tp_sexo']),
+    ('tb_nist', 'ix_findface_tb_nist_no_mae', ['no_mae']),
+    ('tb_nist', 'ix_findface_tb_nist_no_pai', ['no_pai']),
+    ('tb_nist', 'ix_findface_tb_nist_ds_naturalidade', ['ds_naturalidade']),
+    ('tb_nist', 'ix_findface_tb_nist_ds_pais_nacionalidade', ['ds_pais_nacionalidade']),
+    ('tb_nist', 'ix_findface_tb_nist_nr_cpf', ['nr_cpf']),
+    ('tb_nist', 'ix_findface_tb_nist_nr_rnm', ['nr_rnm']),
+    ('tb_nist', 'ix_findface_tb_nist_nr_passaporte', ['nr_passaporte']),
+    ('tb_nist', 'ix_findface_tb_nist_nr_documento', ['nr_documento']),
+    ('tb_nist', 'ix_findface_tb_nist_nr_mandado_prisao', ['nr_mandado_prisao']),
+    ('tb_nist', 'ix_findface_tb_nist_ativo', ['ativo']),
+    ('tb_nist', 'ix_findface_tb_nist_dt_atualizacao', ['dt_atualizacao']),
+    ('tb_alerta', 'ix_findface_tb_alerta_sq_tipo_alerta_restricao', ['sq_tipo_alerta_restricao']),
+    ('tb_alerta', 'ix_findface_tb_alerta_tp_status', ['tp_status']),
+    ('tb_alerta', 'ix_findface_tb_alerta_no_qualificado', ['no_qualificado']),
+    ('tb_alerta', 'ix_findface_tb_alerta_dt_nascimento', ['dt_nascimento']),
+    ('tb_alerta', 'ix_findface_tb_alerta_no_mae', ['no_mae']),
+    ('tb_alerta', 'ix_findface_tb_alerta_no_pai', ['no_pai']),
+    ('tb_alerta', 'ix_findface_tb_alerta_nr_cpf', ['nr_cpf']),
+    ('tb_alerta', 'ix_findface_tb_alerta_dt_atualizacao_alerta_restricao', ['dt_atualizacao_alerta_restricao']),
+    ('tb_alerta', 'ix_findface_tb_alerta_dt_atualizacao_qualificado', ['dt_atualizacao_qualificado']),
+    ('tb_alerta', 'ix_findface_tb_alerta_nr_mandado_prisao', ['nr_mandado_prisao']),
+    ('tb_alerta', 'ix_tb_alerta_no_qualificado_dt_nascimento_no_pai', ['no_qualificado', 'dt_nascimento', 'no_pai']),
+    ('tb_alerta_nist', 'ix_alerta_nist', ['id_nist', 'id_alerta']),
+    ('tb_alerta_nist', 'ix_findface_tb_alerta_nist_id_nist', ['id_nist']),
+    ('tb_alerta_nist_findface', 'ix_alerta_nist_findface_all', ['id_alerta_nist', 'id_findface', 'card_id']),
+    ('tb_alerta_nist_findface', 'ix_findface_tb_alerta_nist_findface_id_alerta_nist', ['id_alerta_nist']),
+    ('tb_alerta_nist_findface', 'ix_findface_tb_alerta_nist_findface_card_id', ['card_id']),
+    ('tb_nist_findface', 'ix_nist_findface', ['id_nist', 'id_findface']),
+    ('tb_nist_findface', 'ix_findface_tb_nist_findface_id_nist', ['id_nist']),
+    ('tb_nist_findface', 'ix_findface_tb_nist_findface_card_id', ['card_id']),
+]
+
+MODELO_MIGRACAO = '''\"\"\"{mensagem}
+
+Revision ID: {revisao}
+Revises: {revisao_anterior}
+Create Date: {data}
+
+Gerada por indices_advisor.py --gerar-migracao. Os índices são criados com CREATE INDEX CONCURRENTLY
+(fora da transação), para não bloquear as gravações nas tabelas grandes.
+\"\"\"
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = {revisao!r}
+down_revision = {revisao_anterior!r}
+branch_labels = None
+depends_on = None
+
+SCHEMA = {schema!r}
+
+# (tabela, índice, colunas, WHERE)
+INDICES_PARCIAIS = {indices_parciais}
+
+# (tabela, índice, colunas) dos índices substituídos
+INDICES_REMOVIDOS = {indices_removidos}
+
+
+def indice_parcial_existe(tabela, indice):
+    for existente in sa.inspect(op.get_bind()).get_indexes(tabela, schema=SCHEMA):
+        if existente['name'] == indice:
+            # Índice com o mesmo nome criado sem WHERE (ex.: create_all antigo) é recriado
+            if any(chave.endswith('_where') for chave in existente.get('dialect_options', {{}})):
+                return True
+            op.drop_index(indice, table_name=tabela, schema=SCHEMA, postgresql_concurrently=True)
+    return False
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for tabela, indice, colunas, where in INDICES_PARCIAIS:
+            if not indice_parcial_existe(tabela, indice):
+                op.create_index(indice, tabela, colunas, schema=SCHEMA, postgresql_concurrently=True,
+                                postgresql_where=sa.text(where), sqlite_where=sa.text(where))
+        for tabela, indice, colunas in INDICES_REMOVIDOS:
+            op.drop_index(indice, table_name=tabela, schema=SCHEMA, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for tabela, indice, colunas in INDICES_REMOVIDOS:
+            op.create_index(indice, tabela, colunas, schema=SCHEMA, if_not_exists=True, postgresql_concurrently=True)
+        for tabela, indice, colunas, where in INDICES_PARCIAIS:
+            op.drop_index(indice, table_name=tabela, schema=SCHEMA, if_exists=True, postgresql_concurrently=True)
+'''
+
+
+def indices_parciais() -> list:
+    """
+    Retorna [(tabela, índice, colunas, WHERE)] dos índices parciais declarados nos modelos.
+    """
+    parciais = []
+    for tabela in db.metadata.sorted_tables:
+        if tabela.schema != SCHEMA:
+            continue
+        for indice in sorted(tabela.indexes, key=lambda indice: indice.name):
+            where = indice.dialect_options['postgresql'].get('where')
+            if where is not None:
+                parciais.append((tabela.name, indice.name, [c.name for c in indice.columns], str(where)))
+    return parciais
+
+
+def gera_migracao_indices(mensagem: str = 'indices parciais do pipeline (indices_advisor)') -> Path:
+    """
+    Grava a revisão explícita dos índices em migrations/versions, encadeada na head atual.
+
+    Retorna:
+    - Path: Arquivo da revisão.
+    """
+    from alembic.script import ScriptDirectory
+    from alembic.util import rev_id
+    from flask import current_app
+
+    config = current_app.extensions['migrate'].migrate.get_config()
+    scripts = ScriptDirectory.from_config(config)
+    revisao = rev_id()
+    formata = lambda itens: '[\n' + ''.join(f'    {item!r},\n' for item in itens) + ']'
+    conteudo = MODELO_MIGRACAO.format(
+        mensagem=mensagem,
+        revisao=revisao,
+        revisao_anterior=scripts.get_current_head(),
+        data=datetime.now(),
+        schema=SCHEMA,
+        indices_parciais=formata(indices_parciais()),
+        indices_removidos=formata(INDICES_REMOVIDOS),
+    )
+    arquivo = Path(scripts.versions) / f"{revisao}_indices_parciais_do_pipeline.py"
+    arquivo.write_text(conteudo, encoding='utf-8')
+    return arquivo
+
+
+def compila_sql(query) -> str:
+    statement = query.statement if hasattr(query, 'statement') else query
+    return str(statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def nos_do_plano(plano: dict) -> list:
+    """
+    Percorre o plano JSON do PostgreSQL e retorna a lista de nós (tipo, tabela, índice).
+    """
+    nos = [{
+        'tipo': plano.get('Node Type'),
+        'tabela': plano.get('Relation Name'),
+        'indice': plano.get('Index Name'),
+        'custo_total': plano.get('Total Cost'),
+        'linhas_estimadas': plano.get('Plan Rows'),
+        'tempo_real_ms': plano.get('Actual Total Time'),
+    }]
+    for subplano in plano.get('Plans', []):
+        nos.extend(nos_do_plano(subplano))
+    return nos
+
+
+def explica(query, analyze: bool = False) -> dict:
+    """
+    Executa EXPLAIN (ou EXPLAIN ANALYZE) sobre a consulta e resume o plano.
+
+    Retorna:
+    - dict com o custo total, os índices utilizados e as tabelas lidas por varredura sequencial.
+    """
+    sql = compila_sql(query)
+    opcoes = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    resultado = db.session.execute(text(f'EXPLAIN ({opcoes}) {sql}')).scalar()
+    plano = (resultado if isinstance(resultado, list) else json.loads(resultado))[0]['Plan']
+    nos = nos_do_plano(plano)
+    db.session.rollback()
+
+    return {
+        'custo_total': plano.get('Total Cost'),
+        'tempo_real_ms': plano.get('Actual Total Time'),
+        'indices_utilizados': sorted({no['indice'] for no in nos if no['indice']}),
+        'varreduras_sequenciais': sorted({no['tabela'] for no in nos if no['tipo'] == 'Seq Scan'}),
+        'nos': nos,
+    }
+
+
+def indices_declarados() -> dict:
+    """
+    Retorna {tabela: {nome_indice: colunas}} para os índices declarados nos modelos.
+    """
+    declarados = {}
+    for tabela in db.metadata.sorted_tables:
+        if tabela.schema != SCHEMA:
+            continue
+        declarados[tabela.name] = {indice.name: [c.name for c in indice.columns] for indice in tabela.indexes}
+    return declarados
+
+
+def indices_existentes() -> dict:
+    """
+    Retorna {tabela: {nome_indice: colunas}} para os índices não únicos existentes no banco.
+
+    Observações:
+    - Índices de chave primária e de UniqueConstraint ficam de fora, pois pertencem às restrições.
+    """
+    inspetor = inspect(db.engine)
+    existentes = {}
+    for tabela in inspetor.get_table_names(schema=SCHEMA):
+        restricoes = {uq['name'] for uq in inspetor.get_unique_constraints(tabela, schema=SCHEMA)}
+        existentes[tabela] = {
+            indice['name']: indice['column_names']
+            for indice in inspetor.get_indexes(tabela, schema=SCHEMA)
+            if indice['name'] not in restricoes
+        }
+    return existentes
+
+
+def indices_sem_where() -> set:
+    """
+    Retorna os nomes dos índices parciais declarados que existem no banco sem a cláusula WHERE.
+    """
+    inspetor = inspect(db.engine)
+    sem_where = set()
+    for tabela, indice, colunas, where in indices_parciais():
+        for existente in inspetor.get_indexes(tabela, schema=SCHEMA):
+            if existente['name'] == indice and not any(chave.endswith('_where') for chave in existente.get('dialect_options', {})):
+                sem_where.add(indice)
+    return sem_where
+
+
+def uso_dos_indices() -> dict:
+    """
+    Retorna {nome_indice: {'varreduras': n, 'tamanho': '12 MB'}} a partir de pg_stat_user_indexes.
+    """
+    linhas = db.session.execute(text(
+        """
+        SELECT indexrelname, idx_scan, pg_size_pretty(pg_relation_size(indexrelid))
+        FROM pg_stat_user_indexes
+        WHERE schemaname = :schema
+        """
+    ), {'schema': SCHEMA}).fetchall()
+    return {nome: {'varreduras': varreduras, 'tamanho': tamanho} for nome, varreduras, tamanho in linhas}
+
+
+def avalia_indices(analyze: bool = False) -> dict:
+    """
+    Monta o relatório completo: planos do catálogo, índices a criar, índices a remover e uso atual.
+    """
+    relatorio = {'consultas': {}, 'criar': [], 'remover': []}
+
+    for nome, consulta in CATALOGO_CONSULTAS.items():
+        try:
+            relatorio['consultas'][nome] = explica(consulta(), analyze=analyze)
+        except Exception as e:
+            db.session.rollback()
+            relatorio['consultas'][nome] = {'erro': str(e)}
+
+    declarados = indices_declarados()
+    existentes = indices_existentes()
+    uso = uso_dos_indices()
+    indices_no_catalogo = {indice for plano in relatorio['consultas'].values() for indice in plano.get('indices_utilizados', [])}
+
+    sem_where = indices_sem_where()
+    for tabela, indices in declarados.items():
+        for nome, colunas in indices.items():
+            if nome not in existentes.get(tabela, {}) or nome in sem_where:
+                relatorio['criar'].append({'tabela': tabela, 'indice': nome, 'colunas': colunas, 'sem_where': nome in sem_where})
+
+    for tabela, indices in existentes.items():
+        for nome, colunas in indices.items():
+            if nome not in declarados.get(tabela, {}):
+                relatorio['remover'].append({
+                    'tabela': tabela,
+                    'indice': nome,
+                    'colunas': colunas,
+                    'usado_pelo_catalogo': nome in indices_no_catalogo,
+                    **uso.get(nome, {}),
+                })
+
+    relatorio['uso'] = uso
+    return relatorio
+
+
+def imprime_relatorio(relatorio: dict) -> None:
+    for nome, plano in relatorio['consultas'].items():
+        if 'erro' in plano:
+            print(f"[indices_advisor] {nome}: erro no EXPLAIN: {plano['erro']}")
+            continue
+        indices = ', '.join(plano['indices_utilizados']) or '-'
+        seq = ', '.join(plano['varreduras_sequenciais']) or '-'
+        print(f"[indices_advisor] {nome}: custo {plano['custo_total']} | índices: {indices} | seq scan: {seq}")
+
+    for item in relatorio['criar']:
+        aviso = ' (existe sem WHERE: recriar)' if item['sem_where'] else ''
+        print(f"[indices_advisor] CRIAR {item['indice']} em {item['tabela']} ({', '.join(item['colunas'])}){aviso}")
+
+    for item in relatorio['remover']:
+        aviso = ' (ATENÇÃO: usado por consulta do catálogo)' if item['usado_pelo_catalogo'] else ''
+        print(f"[indices_advisor] REMOVER {item['indice']} em {item['tabela']} "
+              f"({', '.join(item['colunas'])}), varreduras: {item.get('varreduras')}, tamanho: {item.get('tamanho')}{aviso}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Avalia e migra os índices do schema findface para as consultas do pipeline.")
+    parser.add_argument('--analyze', action='store_true', help="Usa EXPLAIN ANALYZE (executa as consultas).")
+    parser.add_argument('--saida', type=Path, default=None, help="Grava o relatório completo em JSON.")
+    parser.add_argument('--gerar-migracao', action='store_true',
+                        help="Grava a revisão Alembic explícita dos índices parciais em migrations/versions.")
+    args = parser.parse_args()
+
+    with app.app_context():
+        relatorio = avalia_indices(analyze=args.analyze)
+        imprime_relatorio(relatorio)
+
+        if args.saida:
+            args.saida.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+            print(f"[indices_advisor] Relatório salvo em {args.saida}.")
+
+        if args.gerar_migracao:
+            if relatorio['criar'] or relatorio['remover']:
+                arquivo = gera_migracao_indices()
+                print(f"[indices_advisor] Revisão gerada em {arquivo}. Aplique com 'flask db upgrade'.")
+            else:
+                print("[indices_advisor] Índices já alinhados com os modelos. Nenhuma migração necessária.")
@@ -0,0 +1,288 @@
+"""
+Leitura preguiçosa de arquivos NIST (ANSI/NIST-ITL) por offsets.
+
+O NIST(...) interpreta o arquivo inteiro (todas as digitais e faces) mesmo quando só precisamos da base de
+origem (1.008) e do nome (2.030), ou apenas da face (tipo 10). O LeitorNist mapeia o arquivo em memória
+(mmap), monta no primeiro acesso um índice pequeno com o offset de cada registro e de cada campo e só
+decodifica os campos ou imagens pedidos.
+
+- Registros com tags (tipos 1, 2, 9, 10, 13 a 99): o tamanho vem do campo n.001; os campos texto são
+  separados por GS e o campo n.999 (imagem) ocupa o restante do registro.
+- Registros binários (tipos 3 a 8): o tamanho vem dos 4 primeiros bytes; a imagem começa após o cabeçalho
+  fixo do tipo.
+
+O índice pode ser gravado ao lado do arquivo (<arquivo>.idx, JSON), validado pelo tamanho e mtime do NIST,
+para que a próxima leitura não precise nem percorrer os cabeçalhos.
+
+Uso:
+    with LeitorNist(caminho) as leitor:
+        base, nome = leitor.obter_campo('1.008'), leitor.obter_campo('2.030')
+        faces = leitor.faces()
+"""
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+
+
+FS = 0x1C  # Fim de registro
+GS = 0x1D  # Separador de campos
+RS = 0x1E  # Separador de subcampos
+US = 0x1F  # Separador de itens
+
+# Tamanho do cabeçalho fixo dos registros binários (a imagem vem logo depois)
+CABECALHO_BINARIO = {3: 18, 4: 18, 5: 18, 6: 18, 7: 5, 8: 12}
+
+VERSAO_INDICE = 1
+
+
+class NistInvalido(ValueError):
+    pass
+
+
+def tag_campo(tag: str) -> tuple[int, int]:
+    """
+    Converte '2.030' (ou '2.30') em (2, 30).
+    """
+    tipo, campo = str(tag).split('.')
+    return int(tipo), int(campo)
+
+
+def decodifica_texto(valor: bytes) -> str:
+    try:
+        return valor.decode('utf-8')
+    except UnicodeDecodeError:
+        return valor.decode('latin-1')
+
+
+def _campos_registro(dados, inicio: int, fim: int) -> dict:
+    """
+    Retorna {número do campo: [início, fim]} de um registro com tags, sem decodificar os valores.
+    """
+    campos = {}
+    posicao = inicio
+    while posicao < fim:
+        dois_pontos = dados.find(b':', posicao, fim)
+        if dois_pontos < 0:
+            break
+        try:
+            _, campo = tag_campo(bytes(dados[posicao:dois_pontos]).decode('ascii'))
+        except (ValueError, UnicodeDecodeError):
+            raise NistInvalido(f"Tag inválida no offset {posicao}.")
+
+        valor_inicio = dois_pontos + 1
+        if campo == 999:
+            # Imagem binária: vai até o separador de fim de registro
+            valor_fim = fim - 1 if dados[fim - 1] == FS else fim
+            campos[campo] = [valor_inicio, valor_fim]
+            break
+
+        separadores = [p for p in (dados.find(b'\x1d', valor_inicio, fim), dados.find(b'\x1c', valor_inicio, fim)) if p >= 0]
+        valor_fim = min(separadores) if separadores else fim
+        campos[campo] = [valor_inicio, valor_fim]
+        posicao = valor_fim + 1
+
+    return campos
+
+
+def _tamanho_registro_tags(dados, inicio: int, tipo: int) -> int:
+    """
+    Lê o campo n.001 (LEN) no início de um registro com tags.
+    """
+    dois_pontos = dados.find(b':', inicio, inicio + 16)
+    if dois_pontos < 0:
+        raise NistInvalido(f"Registro tipo {tipo} sem o campo {tipo}.001 no offset {inicio}.")
+    fim = inicio
+    while fim < len(dados) and fim - inicio < 32 and dados[fim] not in (GS, FS):
+        fim += 1
+    try:
+        tipo_lido, campo = tag_campo(bytes(dados[inicio:dois_pontos]).decode('ascii'))
+        tamanho = int(bytes(dados[dois_pontos + 1:fim]))
+    except (ValueError, UnicodeDecodeError):
+        raise NistInvalido(f"Registro tipo {tipo} sem o campo {tipo}.001 no offset {inicio}.")
+    if tipo_lido != tipo or campo != 1:
+        raise NistInvalido(f"Esperado o registro tipo {tipo} no offset {inicio}, encontrado {tipo_lido}.{campo:03d}.")
+    return tamanho
+
+
+def indexa_nist(dados) -> list:
+    """
+    Monta o índice [[tipo, idc, início, fim, {campo: [início, fim]}], ...] dos registros do NIST.
+    """
+    if len(dados) < 8 or bytes(dados[:2]) != b'1.':
+        raise NistInvalido("Arquivo não começa com o registro tipo 1.")
+
+    # Registro tipo 1
+    tamanho = _tamanho_registro_tags(dados, 0, 1)
+    if tamanho > len(dados):
+        raise NistInvalido("Registro tipo 1 maior que o arquivo.")
+    campos = _campos_registro(dados, 0, tamanho)
+    registros = [[1, 0, 0, tamanho, campos]]
+
+    # Campo 1.003 (CNT): tipos e IDCs dos demais registros, na ordem do arquivo
+    if 3 not in campos:
+        raise NistInvalido("Campo 1.003 ausente.")
+    inicio_cnt, fim_cnt = campos[3]
+    conteudo = []
+    for subcampo in bytes(dados[inicio_cnt:fim_cnt]).split(bytes([RS]))[1:]:
+        tipo, idc = subcampo.split(bytes([US]))[:2]
+        conteudo.append((int(tipo), int(idc)))
+
+    posicao = tamanho
+    for tipo, idc in conteudo:
+        if posicao >= len(dados):
+            raise NistInvalido(f"Arquivo truncado antes do registro tipo {tipo} (IDC {idc}).")
+        if tipo in CABECALHO_BINARIO:
+            tamanho = int.from_bytes(bytes(dados[posicao:posicao + 4]), 'big')
+            campos = {999: [posicao + CABECALHO_BINARIO[tipo], posicao + tamanho]}
+        else:
+            tamanho = _tamanho_registro_tags(dados, posicao, tipo)
+            campos = _campos_registro(dados, posicao, posicao + tamanho)
+        if tamanho <= 0 or posicao + tamanho > len(dados):
+            raise NistInvalido(f"Tamanho inválido no registro tipo {tipo} (IDC {idc}).")
+        registros.append([tipo, idc, posicao, posicao + tamanho, campos])
+        posicao += tamanho
+
+    return registros
+
+
+class LeitorNist:
+    """
+    Acesso a campos e imagens de um NIST sem interpretar o arquivo inteiro.
+    """
+
+    def __init__(self, origem: str | Path | bytes | bytearray | memoryview, cache_indice: bool = False):
+        """
+        Argumentos:
+        - origem (str | Path | bytes): Caminho do arquivo (mapeado com mmap) ou o conteúdo já em memória.
+        - cache_indice (bool): Lê/grava o índice em <arquivo>.idx. Ignorado para conteúdo em memória.
+        """
+        self._arquivo = None
+        self._mmap = None
+        self._indice = None
+        self._lock = threading.Lock()
+
+        if isinstance(origem, (bytes, bytearray, memoryview)):
+            self.caminho = None
+            self._dados = origem if isinstance(origem, (bytes, bytearray)) else bytes(origem)
+            self.cache_indice = False
+        else:
+            self.caminho = Path(origem)
+            self._arquivo = open(self.caminho, 'rb')
+            tamanho = os.fstat(self._arquivo.fileno()).st_size
+            if tamanho == 0:
+                self._arquivo.close()
+                raise NistInvalido(f"Arquivo vazio: {self.caminho}")
+            self._mmap = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self._dados = self._mmap
+            self.cache_indice = cache_indice
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()
+
+    def fechar(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    @property
+    def caminho_indice(self) -> Path | None:
+        return self.caminho.with_name(self.caminho.name + '.idx') if self.caminho else None
+
+    def _assinatura(self) -> list:
+        estado = os.stat(self.caminho)
+        return [estado.st_size, estado.st_mtime_ns]
+
+    def _ler_indice_cache(self) -> list | None:
+        try:
+            with open(self.caminho_indice, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get('versao') != VERSAO_INDICE or cache.get('assinatura') != self._assinatura():
+            return None
+        # JSON só tem chaves texto
+        return [[tipo, idc, inicio, fim, {int(campo): posicao for campo, posicao in campos.items()}]
+                for tipo, idc, inicio, fim, campos in cache['registros']]
+
+    def _gravar_indice_cache(self, registros: list) -> None:
+        temporario = self.caminho_indice.with_name(f"{self.caminho_indice.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({'versao': VERSAO_INDICE, 'assinatura': self._assinatura(), 'registros': registros}, f)
+            os.replace(temporario, self.caminho_indice)
+        except OSError as e:
+            # O índice é só um atalho: sem permissão de escrita, segue sem ele
+            print(f"[leitor_nist] Não foi possível gravar o índice {self.caminho_indice}: {e}")
+            Path(temporario).unlink(missing_ok=True)
+
+    @property
+    def indice(self) -> list:
+        """
+        Índice dos registros, montado (ou lido do cache) no primeiro acesso.
+        """
+        with self._lock:
+            if self._indice is None:
+                registros = self._ler_indice_cache() if self.cache_indice else None
+                if registros is None:
+                    registros = indexa_nist(self._dados)
+                    if self.cache_indice:
+                        self._gravar_indice_cache(registros)
+                self._indice = registros
+            return self._indice
+
+    def registros(self, tipo: int | None = None) -> list[tuple[int, int]]:
+        """
+        Retorna [(tipo, idc)] dos registros do arquivo, opcionalmente de um único tipo.
+        """
+        return [(t, idc) for t, idc, *_ in self.indice if tipo is None or t == tipo]
+
+    def _registro(self, tipo: int, idc: int | None) -> list | None:
+        for registro in self.indice:
+            if registro[0] == tipo and (idc is None or registro[1] == idc):
+                return registro
+        return None
+
+    def obter_bytes(self, tag: str, idc: int | None = None) -> bytes | None:
+        """
+        Retorna o valor bruto do campo (ex.: '10.999') ou None se o registro/campo não existir.
+
+        Argumentos:
+        - tag (str): Tag do campo, ex.: '2.030'.
+        - idc (int, opcional): IDC do registro. Sem ele, usa o primeiro registro do tipo.
+        """
+        tipo, campo = tag_campo(tag)
+        registro = self._registro(tipo, idc)
+        if registro is None or campo not in registro[4]:
+            return None
+        inicio, fim = registro[4][campo]
+        return bytes(self._dados[inicio:fim])
+
+    def obter_campo(self, tag: str, idc: int | None = None) -> str | bytes | None:
+        """
+        Retorna o campo decodificado: texto para campos com tags e bytes para imagens (n.999) e registros binários.
+        """
+        valor = self.obter_bytes(tag, idc)
+        if valor is None:
+            return None
+        tipo, campo = tag_campo(tag)
+        if campo == 999 or tipo in CABECALHO_BINARIO:
+            return valor
+        return decodifica_texto(valor)
+
+    def obter_imagem(self, tipo: int = 10, idc: int | None = None) -> bytes | None:
+        return self.obter_bytes(f'{tipo}.999', idc)
+
+    def faces(self) -> list[bytes]:
+        """
+        Imagens de todos os registros tipo 10, na ordem do arquivo.
+        """
+        return [bytes(self._dados[campos[999][0]:campos[999][1]])
+                for tipo, _, _, _, campos in self.indice if tipo == 10 and 999 in campos]
@@ -0,0 +1,193 @@
+import copy
+import hashlib
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from time import sleep
+
+from mitra_toolkit.mitra_toolkit import PessoaFindface
+from config_app import NIST_CACHE_DB, NIST_CACHE_TAMANHO
+
+
+class CacheNist:
+    """
+    Cache dos NISTs já lidos, indexado pelo hash md5 do arquivo.
+
+    Mantém em memória os objetos PessoaFindface usados mais recentemente (LRU) e, atrás
+    dele, um banco SQLite em disco com o objeto serializado. Assim, o envio do mesmo NIST
+    para vários Findfaces ou para as listas de alerta faz a leitura e o parse do arquivo
+    uma única vez, inclusive entre execuções diferentes dos scripts.
+    """
+
+    def __init__(self, caminho_db: str, capacidade: int = 1024):
+        """
+        Argumentos:
+        - caminho_db (str): Caminho do arquivo SQLite. Os diretórios são criados se necessário.
+        - capacidade (int): Quantidade máxima de NISTs mantidos em memória.
+        """
+        if not isinstance(capacidade, int) or capacidade <= 0:
+            raise ValueError("'capacidade' deve ser um inteiro positivo.")
+
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+
+        Path(caminho_db).parent.mkdir(parents=True, exist_ok=True)
+        self._conexao = sqlite3.connect(caminho_db, check_same_thread=False, timeout=30)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tb_nist_cache (
+                md5_hash TEXT PRIMARY KEY,
+                pessoa_ff BLOB NOT NULL,
+                dt_cache TEXT NOT NULL
+            )
+            """
+        )
+        self._conexao.commit()
+
+    def obter(self, md5_hash: str) -> PessoaFindface | None:
+        """
+        Retorna uma cópia do PessoaFindface em cache para o hash informado ou None.
+
+        Observações:
+        - A cópia permite que o chamador altere lista, ativo, findface etc. sem afetar o cache.
+        """
+        if not md5_hash:
+            return None
+
+        with self._lock:
+            pessoa_ff = self._memoria.get(md5_hash)
+            if pessoa_ff is not None:
+                self._memoria.move_to_end(md5_hash)
+            else:
+                row = self._conexao.execute(
+                    "SELECT pessoa_ff FROM tb_nist_cache WHERE md5_hash = ?", (md5_hash,)
+                ).fetchone()
+                if row:
+                    try:
+                        pessoa_ff = pickle.loads(row[0])
+                    except Exception:
+                        # Registro gerado por outra versão do mitra_toolkit. Descarta.
+                        self._conexao.execute("DELETE FROM tb_nist_cache WHERE md5_hash = ?", (md5_hash,))
+                        self._conexao.commit()
+                        pessoa_ff = None
+                if pessoa_ff is not None:
+                    self._guarda_em_memoria(md5_hash, pessoa_ff)
+
+            if pessoa_ff is None:
+                self.falhas += 1
+                return None
+
+            self.acertos += 1
+            return copy.deepcopy(pessoa_ff)
+
+    def salvar(self, md5_hash: str, pessoa_ff: PessoaFindface) -> None:
+        """
+        Guarda o PessoaFindface recém-lido na memória e no disco.
+        """
+        if not md5_hash or pessoa_ff is None:
+            return
+
+        pessoa_ff = copy.deepcopy(pessoa_ff)
+        with self._lock:
+            self._guarda_em_memoria(md5_hash, pessoa_ff)
+            try:
+                conteudo = pickle.dumps(pessoa_ff, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                # Objeto não serializável: fica apenas no cache em memória
+                return
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO tb_nist_cache (md5_hash, pessoa_ff, dt_cache) VALUES (?, ?, ?)",
+                (md5_hash, conteudo, datetime.now().isoformat()),
+            )
+            self._conexao.commit()
+
+    def _guarda_em_memoria(self, md5_hash: str, pessoa_ff: PessoaFindface) -> None:
+        self._memoria[md5_hash] = pessoa_ff
+        self._memoria.move_to_end(md5_hash)
+        while len(self._memoria) > self.capacidade:
+            self._memoria.popitem(last=False)
+
+
+_cache_nist = None
+_cache_nist_lock = threading.Lock()
+
+
+def obter_cache_nist() -> CacheNist:
+    """
+    Retorna a instância compartilhada do CacheNist, criando-a no primeiro uso.
+    """
+    global _cache_nist
+    with _cache_nist_lock:
+        if _cache_nist is None:
+            _cache_nist = CacheNist(NIST_CACHE_DB, capacidade=NIST_CACHE_TAMANHO)
+        return _cache_nist
+
+
+def ler_conteudo_nist(nist_filepath: str, tentativas: int = 5, intervalo: float = 1) -> bytes:
+    """
+    Lê o conteúdo de um arquivo NIST, tentando novamente enquanto o arquivo estiver vazio.
+
+    Argumentos:
+    - nist_filepath (str): Caminho do arquivo NIST.
+    - tentativas (int): Número máximo de leituras.
+    - intervalo (float): Segundos de espera entre as leituras.
+
+    Retorna:
+    - bytes: Conteúdo do arquivo (vazio se todas as tentativas falharem).
+    """
+    conteudo = b''
+    for i in range(1, tentativas + 1):
+        with open(nist_filepath, 'rb') as f:
+            conteudo = f.read()
+        if conteudo:
+            break
+        print(f"[nist_cache] Arquivo NIST vazio. Tentando ler '{nist_filepath}' {i}x...")
+        if i < tentativas:
+            sleep(intervalo)
+
+    return conteudo
+
+
+def obter_pessoa_ff(nist_filepath: str, md5_hash: str | None = None) -> PessoaFindface | None:
+    """
+    Instancia um PessoaFindface a partir de um arquivo NIST, usando o cache sempre que possível.
+
+    Argumentos:
+    - nist_filepath (str): Caminho do arquivo NIST no disco.
+    - md5_hash (str, opcional): Hash já conhecido do arquivo (ex.: Nist.md5_hash). Quando
+      informado e presente no cache, o arquivo nem chega a ser lido.
+
+    Retorna:
+    - PessoaFindface com o atributo md5_hash preenchido.
+    - None se o arquivo estiver vazio.
+    """
+    cache = obter_cache_nist()
+
+    pessoa_ff = cache.obter(md5_hash)
+    if pessoa_ff is not None:
+        return pessoa_ff
+
+    conteudo = ler_conteudo_nist(nist_filepath)
+    if not conteudo:
+        return None
+
+    md5_conteudo = hashlib.md5(conteudo).hexdigest()
+    if md5_conteudo != md5_hash:
+        pessoa_ff = cache.obter(md5_conteudo)
+        if pessoa_ff is not None:
+            return pessoa_ff
+
+    pessoa_ff = PessoaFindface(findface=None, nist=conteudo)
+    if pessoa_ff:
+        pessoa_ff.md5_hash = md5_conteudo
+        cache.salvar(md5_conteudo, pessoa_ff)
+
+    return pessoa_ff
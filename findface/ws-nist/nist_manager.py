@@ -9,6 +9,7 @@ import traceback
 import os
 from findface_multi.findface_multi import FindfaceConnection, FindfaceException, FindfaceMulti
 from config_app import *
+from nist_cache import obter_pessoa_ff
 import hashlib
 from pathlib import Path
 from time import sleep
@@ -50,7 +51,7 @@ def envia_nist_para_findface(nist: Nist, carga_inicial=False)-> dict:
     
     if nist:
         # Instancia PessoaFindface com o nist recebido
-        pessoa_ff = nist_to_pessoa_ff(nist.uri_nist, id_nist=nist.id_nist)
+        pessoa_ff = nist_to_pessoa_ff(nist.uri_nist, id_nist=nist.id_nist, md5_hash=nist.md5_hash)
 
         for findface in nist.base_origem.findfaces:
             # Identifica a relação NistFindface
@@ -180,12 +181,14 @@ def add_relacao_nist_findface(id_nist: int) -> None|NistFindface:
     return relacoes_criadas
     
 
-def nist_to_pessoa_ff(nist_filepath:str, id_nist:int|None=None) -> None|PessoaFindface:
+def nist_to_pessoa_ff(nist_filepath:str, id_nist:int|None=None, md5_hash:str|None=None) -> None|PessoaFindface:
     """
     Função que instancia um objeto PessoaFindface a partir de um arquivo NIST.
 
     Parâmetros:
     nist_filepath: caminho para o arquivo NIST no disco.
+    id_nist: id do Nist no banco, se já cadastrado.
+    md5_hash: hash md5 do arquivo, se conhecido. Permite obter o Nist do cache sem ler o arquivo.
 
     Returno:
     Objeto PessoaFindface ou None
@@ -216,18 +219,11 @@ def nist_to_pessoa_ff(nist_filepath:str, id_nist:int|None=None) -> None|PessoaFi
         print(f"[envia_para_findface] Arquivo não encontrado. {nist_filepath}.")
         return
         
-    # Tenta 5x ler o conteúdo do arquivo Nist
-    for i in range(1, 6):
-        with open(nist_filepath, 'rb') as f:
-            conteudo_nist = io.BytesIO(f.read())        
-        if len(conteudo_nist.getvalue()) == 0:
-            print(f"[nist_manager] Arquivo NIST vazio. Tentando ler '{nist_filepath}' {i}x...")
-            sleep(1)
-        else:
-            break
+    # Lê e interpreta o Nist apenas se ele ainda não estiver no cache
+    pessoa_ff = obter_pessoa_ff(nist_filepath, md5_hash=md5_hash)
 
-    # Se o conteúdo continuar vazio após as 10 tentativas, retorna None
-    if not conteudo_nist.getvalue():
+    # Se o conteúdo continuar vazio após as tentativas de leitura, retorna None
+    if pessoa_ff is None:
         # Salva um log com código 18 contendo o caminho relativo para o NIST
         caminho_relativo_nist = obter_caminho_relativo_nist(nist_filepath)
         if not Log.query.filter_by(ds_log=caminho_relativo_nist).first():
@@ -236,16 +232,7 @@ def nist_to_pessoa_ff(nist_filepath:str, id_nist:int|None=None) -> None|PessoaFi
         print(f"[envia_para_findface] Arquivo vazio. {nist_filepath}.")
         return None
 
-        
-    # Gera o hash md5 do Nist
-    md5_hash = hashlib.md5(conteudo_nist.getvalue()).hexdigest()
-
-    # Instancia PessoaFindface com os dados do NIST
-    pessoa_ff = PessoaFindface(findface=None, nist=conteudo_nist.getvalue())
-
     if pessoa_ff:
-        pessoa_ff.md5_hash = md5_hash
-
         # Se foi passado o id_nist, adiciona no objeto pessoa
         if id_nist:
             pessoa_ff.id_nist = id_nist
@@ -1,70 +1,57 @@
 from app import app
-from database.models import db, Nist, BaseOrigem, BaseOrigemFindface, Findface, NistFindface, Log
-from pathlib import Path
-from nist_manager import envia_nist_para_findface, obtem_todos_os_nists_com_findface_mas_sem_cardid
-from manual_upload import envia_nist_findface_paralelo, adiciona_relacao_nist_findface_em_paralelo
+from database.models import db, Nist, BaseOrigemFindface, Findface, NistFindface
+from manual_upload import envia_nist_findface_paralelo
+from reconciliacao_cards import cria_relacoes_faltantes
 from threader import Threader
-from sqlalchemy.orm import aliased
-from sqlalchemy import and_, select
-import sys
 import os
 
 
 def add_novos_findfaces():
     """
-    Função que encontra Findfaces sem Nist correspondente (novo findface), 
-    depois enconra todos os NISTs relacionados ao novo findface por meio da base de origem do Nist
-    e cria as relações NistFindface
+    Função que encontra Findfaces sem Nist correspondente (novo findface), com base de origem associada,
+    e cria as relações NistFindface com os NISTs dessas bases, com um INSERT ... SELECT por Findface.
+
+    Os Findfaces que já têm relações não são alterados; as relações que faltam neles (ex.: base de origem
+    recém-associada) são criadas pelo reconciliacao_cards.py --aplicar.
+
+    Retorna os id_nist das relações criadas, ainda sem card.
     """
-    novos_findfaces = []        
+    novos_findfaces = []
     # Encontra novos Findfaces
-    findfaces = Findface.query.all()
-    for findface in findfaces:
+    for findface in Findface.query.all():
         if NistFindface.query.filter(NistFindface.id_findface == findface.id_findface, NistFindface.id_nist.isnot(None)).first():
-            pass
-        else:
-            # Verifica se já existe Base de Origem relacionada com os Findfaces encontrados
-            if BaseOrigemFindface.query.filter(BaseOrigemFindface.id_findface==findface.id_findface).first():
-                # print(f'[novos_findfaces] Base de origem encontrada para Findface #{findface.id_findface}')
-                novos_findfaces.append(findface)
-            else:
-                pass
-                # print(f'[novos_findfaces] Nenhuma Base de Origem associada ao Findface #{findface.id_findface}')
+            continue
+        # Verifica se já existe Base de Origem relacionada com o Findface encontrado
+        if BaseOrigemFindface.query.filter(BaseOrigemFindface.id_findface == findface.id_findface).first():
+            novos_findfaces.append(findface)
 
-    # Encontra os NISTs que possuem bases de origem relacionadas ao Findface criado
-    if novos_findfaces:
-        print(f'[novos_findfaces] Novos Findfaces encontrados:', [x.no_findface for x in novos_findfaces])
-        lista_novos_nists = []
-        for findface in novos_findfaces:
-            # print('novo Findface(s)', findface, findface.base_origens)
-            lista_novas_relacoes_nist_findface = []
-            for base_origem in findface.base_origens:
-                for nist in base_origem.nists:
-                    if nist not in lista_novos_nists:
-                        lista_novos_nists.append(nist)
-                        lista_novas_relacoes_nist_findface.append(NistFindface(id_nist=nist.id_nist, id_findface=findface.id_findface))
+    if not novos_findfaces:
+        print(f'[novos_findfaces] Nenhum novo Findface encontrado.')
+        return []
 
-            # Cadastra as novas relações criadas para os NISTs do novo Findface
-            print(f"[novos_findfaces] {len(lista_novas_relacoes_nist_findface)} novas relações com o '{findface.no_findface}'. Salvando no banco...")
-            th_relacao = Threader(lista_novas_relacoes_nist_findface, adiciona_relacao_nist_findface_em_paralelo)
-            print(f'[novos_findfaces] Concluído.')
- 
-        return lista_novos_nists
+    print(f'[novos_findfaces] Novos Findfaces encontrados:', [x.no_findface for x in novos_findfaces])
+    ids_novos_nists = set()
+    for findface in novos_findfaces:
+        ids_nist = cria_relacoes_faltantes(findface)
+        print(f"[novos_findfaces] {len(ids_nist)} novas relações com o '{findface.no_findface}'.")
+        ids_novos_nists.update(ids_nist)
 
-    else:
-        print(f'[novos_findfaces] Nenhum novo Findface encontrado.')
+    return sorted(ids_novos_nists)
 
 
 if __name__ == '__main__':
     
     with app.app_context() as context:
         
-        lista_novos_nists = add_novos_findfaces()
+        ids_novos_nists = add_novos_findfaces()
 
-        if lista_novos_nists:
+        if ids_novos_nists:
 
-            # Em paralelo, envia novos NISTs para o(s) Findface(s) relacionados           
+            # Em paralelo, envia novos NISTs para o(s) Findface(s) relacionados, em blocos
             print(f"[novos_findfaces] Enviando para o(s) Findface(s)...")
-            th_cards = Threader(lista_novos_nists, envia_nist_findface_paralelo)
+            tamanho_bloco = 100 * os.cpu_count()
+            for inicio in range(0, len(ids_novos_nists), tamanho_bloco):
+                nists = Nist.query.filter(Nist.id_nist.in_(ids_novos_nists[inicio:inicio + tamanho_bloco])).all()
+                th_cards = Threader(nists, envia_nist_findface_paralelo)
 
         print(f"[novos_findfaces] Finalizdo.")
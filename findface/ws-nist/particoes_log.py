@@ -0,0 +1,294 @@
+"""
+Manutenção das partições mensais de findface.tb_log (PostgreSQL).
+
+Requer PARTICIONAR_TB_LOG=1 no ambiente, para que o modelo Log declare a tabela como
+particionada (RANGE em dt_log, chave primária (id_log, dt_log)). O Alembic não detecta a
+mudança de tabela comum para particionada, por isso a conversão é feita pelo subcomando
+'converter' deste script, e não por 'flask db migrate'.
+
+Subcomandos:
+    converter   Converte a tb_log existente em tabela particionada, copiando os registros em lotes.
+    criar       Cria as partições do mês atual e dos próximos meses (rodar mensalmente no cron).
+    listar      Lista as partições e a quantidade aproximada de registros de cada uma.
+    retencao    Remove (ou apenas desanexa) as partições mais antigas que o período de retenção.
+
+Exemplos:
+    PARTICIONAR_TB_LOG=1 python particoes_log.py converter
+    PARTICIONAR_TB_LOG=1 python particoes_log.py criar --meses-a-frente 3
+    PARTICIONAR_TB_LOG=1 python particoes_log.py retencao --meses 12 --desanexar
+"""
+import argparse
+import re
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from app import app
+from config_app import RETENCAO_LOG_MESES
+from database.models import db, Log, PARTICIONAR_TB_LOG
+
+
+SCHEMA = 'findface'
+TABELA = 'tb_log'
+TABELA_ANTIGA = 'tb_log_antiga'
+PARTICAO_PADRAO = 'tb_log_default'
+RE_PARTICAO_MENSAL = re.compile(r'^tb_log_(\d{4})(\d{2})$')
+
+
+def soma_meses(mes: date, quantidade: int) -> date:
+    """
+    Retorna o primeiro dia do mês deslocado em 'quantidade' meses (pode ser negativo).
+    """
+    indice = mes.year * 12 + (mes.month - 1) + quantidade
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(mes: date) -> str:
+    return f'{TABELA}_{mes.year:04d}{mes.month:02d}'
+
+
+def tabela_particionada() -> bool:
+    return db.session.execute(text(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :tabela
+        )
+        """
+    ), {'schema': SCHEMA, 'tabela': TABELA}).scalar()
+
+
+def listar_particoes() -> list[dict]:
+    """
+    Retorna as partições de tb_log com o mês (None para a partição padrão) e o total estimado de linhas.
+    """
+    linhas = db.session.execute(text(
+        """
+        SELECT c.relname, c.reltuples::bigint, pg_size_pretty(pg_total_relation_size(c.oid))
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = :schema AND p.relname = :tabela
+        ORDER BY c.relname
+        """
+    ), {'schema': SCHEMA, 'tabela': TABELA}).fetchall()
+
+    particoes = []
+    for nome, linhas_estimadas, tamanho in linhas:
+        match = RE_PARTICAO_MENSAL.match(nome)
+        mes = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+        particoes.append({'nome': nome, 'mes': mes, 'linhas_estimadas': max(linhas_estimadas, 0), 'tamanho': tamanho})
+    return particoes
+
+
+def criar_particao_padrao() -> None:
+    db.session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {SCHEMA}.{PARTICAO_PADRAO} PARTITION OF {SCHEMA}.{TABELA} DEFAULT'
+    ))
+
+
+def criar_particao(mes: date) -> bool:
+    """
+    Cria a partição do mês informado, se ainda não existir.
+
+    Observações:
+    - Registros do mês que tenham caído na partição padrão são movidos para a nova partição,
+      pois o PostgreSQL não permite criá-la enquanto a partição padrão tiver linhas no intervalo.
+
+    Retorna:
+    - True se a partição foi criada.
+    """
+    nome = nome_particao(mes)
+    if nome in {particao['nome'] for particao in listar_particoes()}:
+        return False
+
+    inicio, fim = mes, soma_meses(mes, 1)
+    intervalo = {'inicio': inicio, 'fim': fim}
+    registros_na_padrao = db.session.execute(text(
+        f'SELECT count(*) FROM {SCHEMA}.{PARTICAO_PADRAO} WHERE dt_log >= :inicio AND dt_log < :fim'
+    ), intervalo).scalar()
+
+    if registros_na_padrao:
+        db.session.execute(text(f'ALTER TABLE {SCHEMA}.{TABELA} DETACH PARTITION {SCHEMA}.{PARTICAO_PADRAO}'))
+
+    db.session.execute(text(
+        f"CREATE TABLE {SCHEMA}.{nome} PARTITION OF {SCHEMA}.{TABELA} "
+        f"FOR VALUES FROM ('{inicio.isoformat()}') TO ('{fim.isoformat()}')"
+    ))
+
+    if registros_na_padrao:
+        db.session.execute(text(
+            f'INSERT INTO {SCHEMA}.{nome} SELECT * FROM {SCHEMA}.{PARTICAO_PADRAO} WHERE dt_log >= :inicio AND dt_log < :fim'
+        ), intervalo)
+        db.session.execute(text(
+            f'DELETE FROM {SCHEMA}.{PARTICAO_PADRAO} WHERE dt_log >= :inicio AND dt_log < :fim'
+        ), intervalo)
+        db.session.execute(text(f'ALTER TABLE {SCHEMA}.{TABELA} ATTACH PARTITION {SCHEMA}.{PARTICAO_PADRAO} DEFAULT'))
+        print(f"[particoes_log] {registros_na_padrao} registros movidos de {PARTICAO_PADRAO} para {nome}.")
+
+    db.session.commit()
+    print(f"[particoes_log] Partição {nome} criada ({inicio} a {fim}).")
+    return True
+
+
+def criar_particoes(meses_a_frente: int = 3, desde: date | None = None) -> int:
+    """
+    Garante as partições de 'desde' (padrão: mês atual) até 'meses_a_frente' meses adiante.
+
+    Retorna:
+    - int: Quantidade de partições criadas.
+    """
+    mes_atual = date.today().replace(day=1)
+    mes = (desde or mes_atual).replace(day=1)
+    ultimo = soma_meses(mes_atual, meses_a_frente)
+
+    criar_particao_padrao()
+    db.session.commit()
+
+    criadas = 0
+    while mes <= ultimo:
+        criadas += criar_particao(mes)
+        mes = soma_meses(mes, 1)
+    return criadas
+
+
+def aplicar_retencao(meses: int, desanexar: bool = False, simular: bool = False) -> list[str]:
+    """
+    Remove as partições cujos registros são todos anteriores ao período de retenção.
+
+    Argumentos:
+    - meses (int): Quantidade de meses mantidos, contando o mês atual.
+    - desanexar (bool): Apenas desanexa a partição (vira tabela comum, para arquivamento) em vez de apagá-la.
+    - simular (bool): Só informa o que seria feito.
+
+    Retorna:
+    - list[str]: Nomes das partições removidas/desanexadas.
+    """
+    if meses < 1:
+        raise ValueError("'meses' deve ser maior ou igual a 1.")
+
+    limite = soma_meses(date.today().replace(day=1), -(meses - 1))
+    expiradas = [p for p in listar_particoes() if p['mes'] and p['mes'] < limite]
+
+    for particao in expiradas:
+        acao = 'desanexada' if desanexar else 'removida'
+        if simular:
+            print(f"[particoes_log] (simulação) {particao['nome']} seria {acao} ({particao['linhas_estimadas']} linhas, {particao['tamanho']}).")
+            continue
+
+        db.session.execute(text(f"ALTER TABLE {SCHEMA}.{TABELA} DETACH PARTITION {SCHEMA}.{particao['nome']}"))
+        if not desanexar:
+            db.session.execute(text(f"DROP TABLE {SCHEMA}.{particao['nome']}"))
+        db.session.commit()
+        print(f"[particoes_log] Partição {particao['nome']} {acao} ({particao['linhas_estimadas']} linhas, {particao['tamanho']}).")
+
+    if not expiradas:
+        print(f"[particoes_log] Nenhuma partição anterior a {limite}.")
+
+    return [particao['nome'] for particao in expiradas]
+
+
+def renomeia_objetos_da_tabela_antiga() -> None:
+    """
+    Renomeia restrições, índices e sequência da tb_log antiga para liberar os nomes à tabela particionada.
+    """
+    restricoes = db.session.execute(text(
+        """
+        SELECT con.conname FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relname = :tabela
+        """
+    ), {'schema': SCHEMA, 'tabela': TABELA_ANTIGA}).scalars().all()
+    for restricao in restricoes:
+        if restricao.startswith(TABELA):
+            novo_nome = TABELA_ANTIGA + restricao[len(TABELA):]
+            db.session.execute(text(f'ALTER TABLE {SCHEMA}.{TABELA_ANTIGA} RENAME CONSTRAINT "{restricao}" TO "{novo_nome}"'))
+
+    # Os índices das restrições já foram renomeados junto com elas
+    for indice in inspect(db.session.connection()).get_indexes(TABELA_ANTIGA, schema=SCHEMA):
+        db.session.execute(text(f'DROP INDEX IF EXISTS {SCHEMA}."{indice["name"]}"'))
+
+    db.session.execute(text(f'ALTER SEQUENCE IF EXISTS {SCHEMA}.{TABELA}_id_log_seq RENAME TO {TABELA_ANTIGA}_id_log_seq'))
+
+
+def converter_tabela(lote: int = 50000) -> None:
+    """
+    Converte a tb_log comum em particionada: renomeia a atual para tb_log_antiga, cria a nova tabela
+    a partir do modelo, cria as partições necessárias e copia os registros em lotes de id_log.
+
+    Observações:
+    - A tb_log_antiga é mantida para conferência e deve ser removida manualmente depois.
+    - Os serviços que gravam log devem estar parados durante a conversão.
+    """
+    if tabela_particionada():
+        print(f"[particoes_log] {SCHEMA}.{TABELA} já é particionada.")
+        return
+
+    db.session.execute(text(f'ALTER TABLE {SCHEMA}.{TABELA} RENAME TO {TABELA_ANTIGA}'))
+    renomeia_objetos_da_tabela_antiga()
+    Log.__table__.create(db.session.connection())
+    db.session.commit()
+
+    primeiro_log, maior_id = db.session.execute(text(
+        f'SELECT min(dt_log), max(id_log) FROM {SCHEMA}.{TABELA_ANTIGA}'
+    )).one()
+    criar_particoes(desde=primeiro_log.date() if primeiro_log else None)
+
+    colunas = ', '.join(coluna.name for coluna in Log.__table__.columns)
+    ultimo_id = 0
+    while maior_id and ultimo_id < maior_id:
+        copiados = db.session.execute(text(
+            f'INSERT INTO {SCHEMA}.{TABELA} ({colunas}) SELECT {colunas} FROM {SCHEMA}.{TABELA_ANTIGA} '
+            f'WHERE id_log > :ultimo AND id_log <= :proximo'
+        ), {'ultimo': ultimo_id, 'proximo': ultimo_id + lote}).rowcount
+        db.session.commit()
+        ultimo_id += lote
+        print(f"[particoes_log] Copiados {copiados} registros até id_log {min(ultimo_id, maior_id)}/{maior_id}.")
+
+    if maior_id:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{SCHEMA}.{TABELA}', 'id_log'), :maior_id)"
+        ), {'maior_id': maior_id})
+        db.session.commit()
+
+    print(f"[particoes_log] Conversão concluída. Confira e remova {SCHEMA}.{TABELA_ANTIGA}.")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Manutenção das partições mensais de findface.tb_log.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_converter = subparsers.add_parser('converter', help="Converte a tb_log existente em particionada.")
+    parser_converter.add_argument('--lote', type=int, default=50000, help="Registros copiados por transação.")
+
+    parser_criar = subparsers.add_parser('criar', help="Cria as partições do mês atual e dos próximos meses.")
+    parser_criar.add_argument('--meses-a-frente', type=int, default=3)
+
+    subparsers.add_parser('listar', help="Lista as partições existentes.")
+
+    parser_retencao = subparsers.add_parser('retencao', help="Remove ou desanexa as partições expiradas.")
+    parser_retencao.add_argument('--meses', type=int, default=RETENCAO_LOG_MESES, help="Meses mantidos, contando o atual.")
+    parser_retencao.add_argument('--desanexar', action='store_true', help="Apenas desanexa, mantendo a tabela para arquivamento.")
+    parser_retencao.add_argument('--simular', action='store_true', help="Só lista o que seria feito.")
+
+    args = parser.parse_args()
+
+    if not PARTICIONAR_TB_LOG:
+        parser.error("Defina PARTICIONAR_TB_LOG=1 para usar o particionamento de tb_log.")
+
+    with app.app_context():
+        if args.comando == 'converter':
+            converter_tabela(lote=args.lote)
+        elif args.comando == 'criar':
+            criadas = criar_particoes(meses_a_frente=args.meses_a_frente)
+            print(f"[particoes_log] {criadas} partições criadas.")
+        elif args.comando == 'listar':
+            for particao in listar_particoes():
+                print(f"[particoes_log] {particao['nome']}: ~{particao['linhas_estimadas']} linhas, {particao['tamanho']}")
+        elif args.comando == 'retencao':
+            aplicar_retencao(args.meses, desanexar=args.desanexar, simular=args.simular)
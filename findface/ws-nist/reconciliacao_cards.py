@@ -0,0 +1,449 @@
+"""
+Reconciliação em lote entre tb_nist_findface e os cards do Findface.
+
+Para cada Findface e cada base de origem associada (a lista de monitoramento tem o nome da base),
+lê dois fluxos ordenados pelo id do card:
+
+- os cards da lista no Findface, página a página pelo cursor da API (ordering='id');
+- as relações de tb_nist_findface com card_id, junto com os dados do Nist, em um cursor do banco
+  (stream_results) ordenado por card_id.
+
+Um merge-join dos dois fluxos encontra, em uma única passada e com memória constante:
+
+- órfãos: cards da lista sem relação no banco (ex.: Nist excluído) -> card excluído no Findface;
+  os cards de alertas (tb_alerta_nist_findface, ex.: PF/BNMP) não são órfãos e ficam de fora;
+- ausentes: relações cujo card não existe mais na lista -> card_id volta a NULL e o
+  envia_para_findface.py recria o card;
+- divergentes: cards com nome/metadados/ativo diferentes do Nist -> PATCH só dos campos divergentes.
+
+As correções são acumuladas e executadas em lotes: um UPDATE por lote no banco e um pool de threads
+para as chamadas ao Findface. Antes do merge, as relações que faltam em tb_nist_findface (Nists de
+bases associadas ao Findface sem relação, ex.: Findface novo) são criadas com um único INSERT ... SELECT.
+
+Por padrão só relata as divergências; --aplicar executa as correções.
+
+Exemplos:
+    python reconciliacao_cards.py
+    python reconciliacao_cards.py --findface FF_RR --lista RR/IDNET --relatorio divergencias.csv
+    python reconciliacao_cards.py --aplicar
+"""
+import argparse
+import csv
+import json
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import exists, func, insert, literal, select, update
+
+from app import app
+from config_app import FINDFACE_USER, FINDFACE_PASSWORD
+from database.models import db, AlertaNistFindface, BaseOrigem, BaseOrigemFindface, Findface, Nist, NistFindface
+from findface_multi.findface_multi import FindfaceConnection, FindfaceMulti
+
+
+TAMANHO_PAGINA = 500
+TAMANHO_LOTE = 200
+WORKERS_FINDFACE = 4
+
+# Campo do card -> coluna de tb_nist
+CAMPOS_META_CARD = {
+    'data_nascimento': 'dt_nascimento',
+    'sexo': 'tp_sexo',
+    'mae': 'no_mae',
+    'pai': 'no_pai',
+    'cpf': 'nr_cpf',
+    'rnm': 'nr_rnm',
+    'passaporte': 'nr_passaporte',
+    'documento': 'nr_documento',
+    'naturalidade': 'ds_naturalidade',
+    'nacionalidade': 'ds_pais_nacionalidade',
+}
+
+Divergencia = namedtuple('Divergencia', ['tipo', 'card_id', 'id_nist_findface', 'id_nist', 'campos'])
+
+# Tipo da divergência -> correção executada
+CORRECOES = {
+    'orfao': 'excluir_card',
+    'ausente': 'limpar_card_id',
+    'divergente': 'atualizar_card',
+}
+
+
+def paginas_cards(findface: FindfaceMulti, id_lista: int, limite: int = TAMANHO_PAGINA, **filtros):
+    """
+    Gera as páginas de cards da lista em ordem crescente de id, seguindo o cursor (next_page) da API.
+
+    Argumentos:
+    - filtros: Filtros adicionais de get_human_cards (ex.: has_face_objects=True).
+    """
+    parametros = dict(watch_lists=[id_lista], ordering='id', limit=limite, **filtros)
+    cards = findface.get_human_cards(**parametros)
+
+    while cards["results"]:
+        yield cards["results"]
+
+        if "next_page" in cards:
+            if not cards["next_page"]:
+                break
+            cursor = parse_qs(urlparse(cards["next_page"]).query).get('page')
+            if not cursor:
+                break
+            cards = findface.get_human_cards(page=cursor[0], **parametros)
+        else:
+            # API sem cursor: continua a partir do id do último card lido
+            parametros['id_gt'] = cards["results"][-1]["id"]
+            cards = findface.get_human_cards(**parametros)
+
+
+def stream_cards(findface: FindfaceMulti, id_lista: int, limite: int = TAMANHO_PAGINA, **filtros):
+    """
+    Gera os cards da lista um a um, garantindo a ordem crescente de id exigida pelo merge-join.
+    """
+    ultimo_id = None
+    for pagina in paginas_cards(findface, id_lista, limite, **filtros):
+        for card in pagina:
+            if ultimo_id is not None and card["id"] <= ultimo_id:
+                raise RuntimeError(f"Cards fora de ordem na lista #{id_lista}: {card['id']} depois de {ultimo_id}.")
+            ultimo_id = card["id"]
+            yield card
+
+
+def consulta_relacoes_por_card(id_findface: int, id_base_origem: int):
+    """
+    Relações com card de um Findface e uma base de origem, com os dados do Nist, ordenadas por card_id.
+    """
+    return select(NistFindface.id_nist_findface, NistFindface.card_id, Nist.id_nist, Nist.no_pessoa, Nist.ativo,
+                  *[getattr(Nist, coluna) for coluna in CAMPOS_META_CARD.values()]) \
+        .join(Nist, Nist.id_nist == NistFindface.id_nist) \
+        .where(NistFindface.id_findface == id_findface, Nist.id_base_origem == id_base_origem, NistFindface.card_id.isnot(None)) \
+        .order_by(NistFindface.card_id)
+
+
+def stream_relacoes(id_findface: int, id_base_origem: int, tamanho: int = TAMANHO_PAGINA):
+    """
+    Gera as relações de consulta_relacoes_por_card em um cursor do lado do servidor.
+
+    Observações:
+    - Usa uma conexão própria: os commits das correções (db.session) não fecham o cursor.
+    """
+    with db.engine.connect() as conexao:
+        resultado = conexao.execution_options(stream_results=True, yield_per=tamanho) \
+            .execute(consulta_relacoes_por_card(id_findface, id_base_origem))
+        for linha in resultado:
+            yield linha
+
+
+def stream_cards_alertas(id_findface: int, tamanho: int = TAMANHO_PAGINA):
+    """
+    Gera, em ordem crescente, os card_id dos alertas (AlertaNistFindface) enviados ao Findface.
+
+    Observações:
+    - Os cards de alerta (ex.: lista PF/BNMP do stimar.py) não têm relação em tb_nist_findface.
+    """
+    consulta = select(AlertaNistFindface.card_id).distinct() \
+        .where(AlertaNistFindface.id_findface == id_findface, AlertaNistFindface.card_id.isnot(None)) \
+        .order_by(AlertaNistFindface.card_id)
+    with db.engine.connect() as conexao:
+        resultado = conexao.execution_options(stream_results=True, yield_per=tamanho).execute(consulta)
+        for card_id in resultado.scalars():
+            yield card_id
+
+
+def _valor_card(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    return valor
+
+
+def dados_card_nist(relacao) -> dict:
+    """
+    Nome, ativo e metadados esperados no card de uma relação (linha de stream_relacoes).
+    """
+    return {
+        'name': relacao.no_pessoa,
+        'active': bool(relacao.ativo),
+        'meta': {campo: _valor_card(getattr(relacao, coluna)) for campo, coluna in CAMPOS_META_CARD.items()},
+    }
+
+
+def campos_divergentes(esperado: dict, card: dict) -> dict:
+    """
+    Retorna o payload de PATCH com os campos do card diferentes do esperado ({} se não houver).
+
+    Observações:
+    - Valores vazios do Nist não apagam dados do card.
+    - O meta é enviado inteiro (o do card com os campos corrigidos), pois a API substitui o objeto.
+    """
+    payload = {}
+    if esperado['name'] and esperado['name'] != card.get('name'):
+        payload['name'] = esperado['name']
+    if esperado['active'] != card.get('active'):
+        payload['active'] = esperado['active']
+
+    meta_card = card.get('meta') or {}
+    meta_divergente = {campo: valor for campo, valor in esperado['meta'].items()
+                       if valor not in (None, '') and valor != meta_card.get(campo)}
+    if meta_divergente:
+        payload['meta'] = {**meta_card, **meta_divergente}
+    return payload
+
+
+def merge_join(relacoes, cards, contagem: Counter, cards_alertas=()):
+    """
+    Compara os dois fluxos ordenados por card_id e gera as divergências.
+
+    Argumentos:
+    - relacoes: Iterável de relações ordenadas por card_id (stream_relacoes).
+    - cards: Iterável de cards ordenados por id (stream_cards).
+    - contagem (Counter): Recebe 'relacoes', 'cards', 'conferidos' e 'alertas'.
+    - cards_alertas: Iterável de card_id de alertas em ordem crescente (stream_cards_alertas); esses
+      cards não têm relação no banco e não são tratados como órfãos.
+    """
+    relacoes = iter(relacoes)
+    cards = iter(cards)
+    cards_alertas = iter(cards_alertas)
+    relacao = next(relacoes, None)
+    card = next(cards, None)
+    card_alerta = next(cards_alertas, None)
+
+    while relacao is not None or card is not None:
+        if card is None or (relacao is not None and relacao.card_id < card["id"]):
+            contagem['relacoes'] += 1
+            yield Divergencia('ausente', relacao.card_id, relacao.id_nist_findface, relacao.id_nist, None)
+            relacao = next(relacoes, None)
+
+        elif relacao is None or card["id"] < relacao.card_id:
+            contagem['cards'] += 1
+            while card_alerta is not None and card_alerta < card["id"]:
+                card_alerta = next(cards_alertas, None)
+            if card_alerta == card["id"]:
+                contagem['alertas'] += 1
+            else:
+                yield Divergencia('orfao', card["id"], None, None, None)
+            card = next(cards, None)
+
+        else:
+            # Mais de uma relação pode apontar para o mesmo card
+            contagem['cards'] += 1
+            while relacao is not None and relacao.card_id == card["id"]:
+                contagem['relacoes'] += 1
+                contagem['conferidos'] += 1
+                payload = campos_divergentes(dados_card_nist(relacao), card)
+                if payload:
+                    yield Divergencia('divergente', card["id"], relacao.id_nist_findface, relacao.id_nist, payload)
+                relacao = next(relacoes, None)
+            card = next(cards, None)
+
+
+class ExecutorCorrecoes:
+    """
+    Acumula as correções e as executa em lotes.
+    """
+
+    def __init__(self, findface: FindfaceMulti | None, aplicar: bool = False, tamanho_lote: int = TAMANHO_LOTE,
+                 workers: int = WORKERS_FINDFACE):
+        """
+        Argumentos:
+        - findface (FindfaceMulti): Conexão usada em excluir_card e atualizar_card.
+        - aplicar (bool): Sem ele, só conta as correções (simulação).
+        - tamanho_lote (int): Correções acumuladas antes de cada execução.
+        - workers (int): Chamadas simultâneas ao Findface.
+        """
+        self.findface = findface
+        self.aplicar = aplicar
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.executadas = Counter()
+        self.falhas = Counter()
+        self._pendentes = {correcao: [] for correcao in set(CORRECOES.values())}
+        self._executor = ThreadPoolExecutor(max_workers=workers) if aplicar else None
+        self._lock = threading.Lock()
+
+    def adicionar(self, divergencia: Divergencia) -> None:
+        correcao = CORRECOES[divergencia.tipo]
+        self._pendentes[correcao].append(divergencia)
+        if len(self._pendentes[correcao]) >= self.tamanho_lote:
+            self._executa(correcao)
+
+    def excluir_card(self, card_id: int) -> None:
+        self.adicionar(Divergencia('orfao', card_id, None, None, None))
+
+    def descarregar(self) -> None:
+        for correcao in self._pendentes:
+            self._executa(correcao)
+
+    def encerrar(self) -> None:
+        self.descarregar()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _executa(self, correcao: str) -> None:
+        lote, self._pendentes[correcao] = self._pendentes[correcao], []
+        if not lote:
+            return
+        if not self.aplicar:
+            self.executadas[correcao] += len(lote)
+            return
+
+        if correcao == 'limpar_card_id':
+            try:
+                db.session.execute(
+                    update(NistFindface)
+                    .where(NistFindface.id_nist_findface.in_([divergencia.id_nist_findface for divergencia in lote]))
+                    .values(card_id=None)
+                )
+                db.session.commit()
+                self.executadas[correcao] += len(lote)
+            except Exception as e:
+                db.session.rollback()
+                self.falhas[correcao] += len(lote)
+                print(f"[reconciliacao_cards] Falha ao limpar {len(lote)} card_id: {e}")
+            return
+
+        funcao = self._exclui if correcao == 'excluir_card' else self._atualiza
+        for ok in self._executor.map(funcao, lote):
+            if ok:
+                self.executadas[correcao] += 1
+            else:
+                self.falhas[correcao] += 1
+
+    def _exclui(self, divergencia: Divergencia) -> bool:
+        try:
+            return bool(self.findface.delete_human_card(card_id=divergencia.card_id))
+        except Exception as e:
+            print(f"[reconciliacao_cards] Falha ao excluir o card #{divergencia.card_id}: {e}")
+            return False
+
+    def _atualiza(self, divergencia: Divergencia) -> bool:
+        try:
+            self.findface.update_human_card(divergencia.card_id, **divergencia.campos)
+            return True
+        except Exception as e:
+            print(f"[reconciliacao_cards] Falha ao atualizar o card #{divergencia.card_id}: {e}")
+            return False
+
+
+def cria_relacoes_faltantes(findface: Findface) -> list:
+    """
+    Cria, com um único INSERT ... SELECT, as relações NistFindface que faltam para os Nists das bases
+    de origem associadas ao Findface.
+
+    Retorna:
+    - list: id_nist das relações criadas (card_id NULL, pendentes de envio).
+    """
+    bases = select(BaseOrigemFindface.id_base_origem).where(BaseOrigemFindface.id_findface == findface.id_findface)
+    relacao_existente = exists().where(NistFindface.id_nist == Nist.id_nist, NistFindface.id_findface == findface.id_findface)
+    comando = insert(NistFindface).from_select(
+        ['id_nist', 'id_findface'],
+        select(Nist.id_nist, literal(findface.id_findface)).where(Nist.id_base_origem.in_(bases), ~relacao_existente),
+    ).returning(NistFindface.id_nist)
+    ids_nist = db.session.execute(comando).scalars().all()
+    db.session.commit()
+    return ids_nist
+
+
+def reconcilia_lista(findface_multi: FindfaceMulti, findface: Findface, base_origem: BaseOrigem,
+                     correcoes: ExecutorCorrecoes, relatorio=None) -> Counter:
+    """
+    Reconcilia a lista de monitoramento de uma base de origem em um Findface.
+    """
+    contagem = Counter()
+    id_lista = findface_multi.get_watch_list_id_by_name(base_origem.no_base_origem)
+    if not id_lista:
+        print(f"[reconciliacao_cards] Lista '{base_origem.no_base_origem}' não encontrada no Findface '{findface.no_findface}'.")
+        contagem['lista_inexistente'] += 1
+        return contagem
+
+    relacoes = stream_relacoes(findface.id_findface, base_origem.id_base_origem)
+    cards = stream_cards(findface_multi, id_lista)
+    cards_alertas = stream_cards_alertas(findface.id_findface)
+    for divergencia in merge_join(relacoes, cards, contagem, cards_alertas):
+        contagem[divergencia.tipo] += 1
+        correcoes.adicionar(divergencia)
+        if relatorio is not None:
+            relatorio.writerow([findface.no_findface, base_origem.no_base_origem, divergencia.tipo, divergencia.card_id,
+                                divergencia.id_nist_findface, divergencia.id_nist,
+                                json.dumps(divergencia.campos, ensure_ascii=False) if divergencia.campos else ''])
+
+    contagem['pendentes_envio'] = db.session.scalar(
+        select(func.count()).select_from(NistFindface).join(Nist, Nist.id_nist == NistFindface.id_nist)
+        .where(NistFindface.id_findface == findface.id_findface, Nist.id_base_origem == base_origem.id_base_origem,
+               NistFindface.card_id.is_(None))
+    )
+    return contagem
+
+
+def reconcilia_findface(findface: Findface, listas: list | None = None, aplicar: bool = False,
+                        tamanho_lote: int = TAMANHO_LOTE, relatorio=None) -> dict:
+    """
+    Reconcilia todas as listas (bases de origem) de um Findface.
+
+    Argumentos:
+    - findface (Findface): Instância a auditar.
+    - listas (list, opcional): Restringe às bases de origem com estes nomes.
+    - aplicar (bool): Executa as correções. Sem ele, só relata.
+    - tamanho_lote (int): Correções por lote.
+    - relatorio (csv.writer, opcional): Recebe uma linha por divergência.
+
+    Retorna:
+    - dict: {nome da lista: contagens} e '_correcoes' com as correções executadas e as falhas.
+    """
+    resultado = {}
+    if aplicar:
+        novas = cria_relacoes_faltantes(findface)
+        if novas:
+            print(f"[reconciliacao_cards] {len(novas)} relações criadas para o Findface '{findface.no_findface}'.")
+        resultado['_relacoes_criadas'] = len(novas)
+
+    with FindfaceConnection(base_url=findface.url_base, username=FINDFACE_USER, password=FINDFACE_PASSWORD,
+                            uuid="reconciliacao_cards.py") as ffcon:
+        findface_multi = FindfaceMulti(findface_connection=ffcon)
+        correcoes = ExecutorCorrecoes(findface_multi, aplicar=aplicar, tamanho_lote=tamanho_lote)
+        try:
+            for base_origem in findface.base_origens:
+                if listas and base_origem.no_base_origem not in listas:
+                    continue
+                print(f"[reconciliacao_cards] {findface.no_findface} / {base_origem.no_base_origem}...")
+                contagem = reconcilia_lista(findface_multi, findface, base_origem, correcoes, relatorio)
+                print(f"[reconciliacao_cards] {findface.no_findface} / {base_origem.no_base_origem}: {dict(contagem)}")
+                resultado[base_origem.no_base_origem] = dict(contagem)
+        finally:
+            correcoes.encerrar()
+
+    resultado['_correcoes'] = {'executadas': dict(correcoes.executadas), 'falhas': dict(correcoes.falhas)}
+    return resultado
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Reconciliação em lote entre tb_nist_findface e os cards do Findface.")
+    parser.add_argument('--findface', nargs='+', default=None, help="Nomes dos Findfaces (padrão: todos).")
+    parser.add_argument('--lista', nargs='+', default=None, help="Bases de origem/listas a reconciliar (padrão: todas).")
+    parser.add_argument('--aplicar', action='store_true', help="Executa as correções. Sem ele, só relata as divergências.")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Correções por lote.")
+    parser.add_argument('--relatorio', default=None, help="Arquivo CSV com uma linha por divergência.")
+    args = parser.parse_args()
+
+    with app.app_context() as context:
+        consulta = Findface.query.order_by(Findface.id_findface)
+        if args.findface:
+            consulta = consulta.filter(Findface.no_findface.in_(args.findface))
+
+        arquivo_relatorio = open(args.relatorio, 'w', newline='', encoding='utf-8') if args.relatorio else None
+        try:
+            relatorio = None
+            if arquivo_relatorio:
+                relatorio = csv.writer(arquivo_relatorio)
+                relatorio.writerow(['findface', 'lista', 'tipo', 'card_id', 'id_nist_findface', 'id_nist', 'campos'])
+
+            for findface in consulta.all():
+                resultado = reconcilia_findface(findface, listas=args.lista, aplicar=args.aplicar,
+                                                tamanho_lote=args.lote, relatorio=relatorio)
+                print(f"[reconciliacao_cards] {findface.no_findface}: {resultado['_correcoes']}")
+        finally:
+            if arquivo_relatorio:
+                arquivo_relatorio.close()
+
+    print(f"[reconciliacao_cards] {'Correções aplicadas' if args.aplicar else 'Simulação concluída (use --aplicar)'}.")
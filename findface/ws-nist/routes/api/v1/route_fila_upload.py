@@ -0,0 +1,58 @@
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+from pathlib import Path
+import traceback
+import uuid
+from fila_upload import obter_fila, obter_processador
+from routes.api.v1.route_upload_nist import TEMP_DIR, spool_arquivo
+
+
+bp_fila_upload = Blueprint('bp_fila_upload', __name__)
+
+FILA_DIR = TEMP_DIR / 'fila'
+
+
+@bp_fila_upload.route('/api/v1/upload-nist/fila/', methods=['POST'])
+def enfileira_nist():
+    """
+    Copia os arquivos para temp/fila e cria um job por arquivo. A validação e o cadastro no banco
+    ficam com o processador da fila; o status é consultado em /api/v1/upload-nist/fila/<id_job>/.
+    """
+    if 'arquivo_nist' not in request.files:
+        return jsonify(message="Nenhum arquivo enviado."), 400
+
+    lote = uuid.uuid4().hex
+    arquivos = []
+    try:
+        for file in request.files.getlist('arquivo_nist'):
+            caminho_temp, md5_hash = spool_arquivo(file, current_app.config.get('UPLOAD_FILA_DIR', FILA_DIR))
+            arquivos.append((secure_filename(file.filename), caminho_temp, md5_hash))
+
+        jobs = obter_fila().enfileirar(lote, arquivos)
+    except:
+        for _, caminho_temp, _ in arquivos:
+            Path(caminho_temp).unlink(missing_ok=True)
+        return jsonify(message=traceback.format_exc()), 500
+
+    processador = obter_processador(current_app._get_current_object())
+    processador.iniciar()
+    processador.notificar()
+
+    return jsonify(lote=lote, jobs=jobs), 202
+
+
+@bp_fila_upload.route('/api/v1/upload-nist/fila/<id_job>/', methods=['GET'])
+def status_job(id_job):
+    job = obter_fila().obter(id_job)
+    if job is None:
+        return jsonify(message=f"Job '{id_job}' não encontrado."), 404
+    return jsonify(job)
+
+
+@bp_fila_upload.route('/api/v1/upload-nist/fila/lote/<lote>/', methods=['GET'])
+def status_lote(lote):
+    jobs = obter_fila().obter_lote(lote)
+    if not jobs:
+        return jsonify(message=f"Lote '{lote}' não encontrado."), 404
+    concluidos = sum(1 for job in jobs if job['segundos'] is not None)
+    return jsonify(lote=lote, concluido=concluidos == len(jobs), jobs=jobs)
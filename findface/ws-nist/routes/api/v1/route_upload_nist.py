@@ -3,25 +3,206 @@ from werkzeug.utils import secure_filename
 from werkzeug.exceptions import BadRequest
 from database.models import db, Nist
 import os
+import shutil
+import tempfile
+import threading
 import traceback
 from NIST import NIST
 from pathlib import Path
 from database.models import Findface, BaseOrigem
 from datetime import datetime
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from mitra_toolkit.functions import *
 import hashlib
 import sys
-from config_app import APP_DIR
+from config_app import APP_DIR, UPLOAD_VALIDADORES
+from leitor_nist import LeitorNist
 
 
 bp_upload_nist = Blueprint('bp_upload_nist', __name__)
 
+TEMP_DIR = APP_DIR / 'temp'
+TAMANHO_BLOCO = 1024 * 1024
+
+_executor_validacao = None
+_executor_validacao_lock = threading.Lock()
+
+
+def obter_executor_validacao() -> ThreadPoolExecutor:
+    """
+    Pool de validação dos NISTs recebidos, compartilhado entre as requisições.
+    """
+    global _executor_validacao
+    with _executor_validacao_lock:
+        if _executor_validacao is None:
+            _executor_validacao = ThreadPoolExecutor(max_workers=UPLOAD_VALIDADORES, thread_name_prefix='valida_nist')
+        return _executor_validacao
+
+
+def spool_arquivo(file, diretorio: Path = TEMP_DIR) -> tuple[Path, str]:
+    """
+    Copia o arquivo enviado para o diretório temporário em blocos, calculando o md5 durante a cópia.
+
+    O md5 do conteúdo recebido só identifica o upload; o md5 gravado no banco é o do NIST
+    reserializado (ver valida_nist).
+
+    Retorna:
+    - tuple: (caminho temporário, md5 do conteúdo recebido).
+    """
+    diretorio.mkdir(parents=True, exist_ok=True)
+    md5 = hashlib.md5()
+    with tempfile.NamedTemporaryFile(dir=diretorio, suffix='.tmp', delete=False) as temporario:
+        while True:
+            bloco = file.stream.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            md5.update(bloco)
+            temporario.write(bloco)
+    return Path(temporario.name), md5.hexdigest()
+
+
+def caminho_serializado(caminho: Path) -> Path:
+    """
+    Caminho do NIST reserializado por valida_nist, ao lado do arquivo temporário recebido.
+    """
+    return Path(caminho).with_suffix('.nst')
+
+
+def md5_arquivo(caminho: Path) -> str:
+    md5 = hashlib.md5()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            md5.update(bloco)
+    return md5.hexdigest()
+
+
+def motivo_base_desconhecida(nome_base_origem: str) -> str:
+    return f'Base de Origem do NIST "{nome_base_origem}" desconhecida. Contate o administrador <leonardo.lad@pf.gov.br>.'
+
+
+def obter_bases_conhecidas() -> set:
+    """
+    Nomes de todas as bases de origem cadastradas (tabela pequena), para a validação no pool sem acesso ao banco.
+    """
+    return {nome for (nome,) in db.session.query(BaseOrigem.no_base_origem)}
+
+
+def valida_nist(caminho: Path, base_conhecida=None) -> dict:
+    """
+    Executada no pool: valida o NIST recebido e grava a versão reserializada em caminho_serializado(caminho).
+
+    A triagem (LeitorNist) lê só a cadeia de registros e os campos 1.008 e 2.030, sem decodificar as imagens:
+    arquivos truncados ou malformados, sem base de origem ou nome, ou de base desconhecida são rejeitados
+    antes do parse completo. Os aprovados passam pelo NIST(...) e são reescritos com nist.write(), como no
+    cadastro. O md5 retornado é o desse arquivo reescrito, o mesmo gravado em Nist.md5_hash (o md5 do
+    arquivo recebido não bate com o do banco).
+
+    Argumentos:
+    - caminho (Path): Arquivo recebido.
+    - base_conhecida (callable, opcional): Recebe o nome formatado da base de origem e retorna se ela está
+      cadastrada. Sem ele, a base não é conferida.
+
+    Retorna:
+    - dict: {'base_origem', 'nome', 'md5', 'caminho'} ou {'motivo'} se o arquivo for rejeitado.
+    """
+    try:
+        with LeitorNist(caminho) as leitor:
+            nome_base_origem = leitor.obter_campo('1.008')
+            nome_pessoa = leitor.obter_campo('2.030')
+    except Exception:
+        return {'motivo': 'Nist inválido.'}
+
+    if not nome_base_origem:
+        return {'motivo': 'Campo NIST "1.008" (Base de Origem) vazio.'}
+    if not nome_pessoa:
+        return {'motivo': 'Campo "nome" (2.030) vazio.'}
+    nome_base_origem = formata_nome_base_origem(nome_base_origem)
+    if base_conhecida is not None and not base_conhecida(nome_base_origem):
+        return {'motivo': motivo_base_desconhecida(nome_base_origem)}
+
+    try:
+        nist = NIST(Path(caminho).read_bytes())
+    except Exception:
+        return {'motivo': 'Nist inválido.'}
+
+    destino = caminho_serializado(caminho)
+    nist.write(str(destino))
+
+    return {
+        'base_origem': nome_base_origem,
+        'nome': nome_pessoa,
+        'md5': md5_arquivo(destino),
+        'caminho': destino,
+    }
+
+
+def processa_arquivos_nist(arquivos: list, validacoes: list | None = None) -> list:
+    """
+    Valida, deduplica e grava os NISTs já copiados para o diretório temporário.
+
+    Argumentos:
+    - arquivos (list): [(nome do arquivo, caminho temporário, md5 do conteúdo recebido)].
+    - validacoes (list, opcional): Futuros de valida_nist já submetidos ao pool, na mesma ordem dos arquivos
+      (com base_conhecida, para que a base de origem já tenha sido conferida).
+
+    Retorna:
+    - list: Situação de cada arquivo, na ordem recebida: {'arquivo', 'md5', 'status' (recebido|existente|rejeitado),
+      'caminho' ou 'motivo'}. O md5 é o do NIST reserializado (o do banco) quando o arquivo é válido.
+    """
+    if validacoes is None:
+        executor = obter_executor_validacao()
+        base_conhecida = obter_bases_conhecidas().__contains__
+        validacoes = [executor.submit(valida_nist, caminho, base_conhecida) for _, caminho, _ in arquivos]
+    resultados = [validacao.result() for validacao in validacoes]
+
+    # Uma consulta para todos os hashes da requisição
+    hashes = {resultado['md5'] for resultado in resultados if 'md5' in resultado}
+    hashes_existentes = {
+        md5_hash for (md5_hash,) in db.session.query(Nist.md5_hash).filter(Nist.md5_hash.in_(hashes))
+    } if hashes else set()
+
+    situacoes = []
+    rejeitados = set()
+    for (filename, caminho_temp, md5_hash), resultado in zip(arquivos, resultados):
+        md5_hash = resultado.get('md5', md5_hash)
+        situacao = {'arquivo': filename, 'md5': md5_hash}
+        situacoes.append(situacao)
+        try:
+            # Um arquivo rejeitado continua rejeitado mesmo se reenviado na mesma requisição
+            if filename in rejeitados:
+                situacao.update(status='rejeitado', motivo='Arquivo rejeitado anteriormente nesta requisição.')
+                continue
+
+            if 'motivo' in resultado:
+                rejeitados.add(filename)
+                situacao.update(status='rejeitado', motivo=resultado['motivo'])
+                continue
+
+            nome_base_origem = resultado['base_origem']
+            nist_relative_filepath = 'nists/' + str(nome_base_origem).lower() + '/' + datetime.now().strftime('%Y-%m-%d') + f'/{filename}'
+            nist_full_filepath = APP_DIR / nist_relative_filepath
+
+            if md5_hash in hashes_existentes or nist_full_filepath.exists():
+                situacao.update(status='existente', caminho=str(nist_full_filepath))
+                continue
+
+            # O arquivo gravado é o NIST reserializado: o md5 é o mesmo da inclusão no banco
+            nist_full_filepath.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(resultado['caminho']), str(nist_full_filepath))
+            hashes_existentes.add(md5_hash)  # Cópias do mesmo arquivo na requisição
+            situacao.update(status='recebido', caminho=str(nist_full_filepath))
+        finally:
+            Path(caminho_temp).unlink(missing_ok=True)
+            caminho_serializado(caminho_temp).unlink(missing_ok=True)
+
+    return situacoes
+
 
 @bp_upload_nist.route('/api/v1/upload-nist/', methods=['POST'])
 def handle_nist():
-    
+
+    arquivos = []
     try:
         # Ensure there are files in the request
         if 'arquivo_nist' not in request.files:
@@ -32,89 +213,29 @@ def handle_nist():
             # Get the files list
             files = request.files.getlist('arquivo_nist')
 
-            
-
-            arquivos_ja_enviados = set()
-            arquivos_recebidos = set()
-            arquivos_rejeitados = []
-            
+            # Spool: cada arquivo é lido uma única vez, em blocos, com o md5 calculado durante a cópia.
+            # A validação de um arquivo começa no pool enquanto o próximo ainda está sendo lido.
+            executor = obter_executor_validacao()
+            base_conhecida = obter_bases_conhecidas().__contains__
+            validacoes = []
             for file in files:
-
                 print("[WS-NIST] Lendo arquivo", file.filename)
-                # Valida o NIST
-                # file = request.files.get(file, None)
-                memory_file = BytesIO(file.read())
-
-                filename = secure_filename(file.filename)
-
-                try:
-                    nist = NIST(memory_file.getvalue())
-                except Exception as e:
-                    rejeitado = {'arquivo': filename, 'motivo': 'Nist inválido.'}
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        arquivos_rejeitados.append(rejeitado)
-                        continue
-
-                nome_base_origem = nist.get_field('1.008')
-                if not nome_base_origem:
-                    rejeitado = {'arquivo': filename, 'motivo': 'Campo NIST "1.008" (Base de Origem) vazio.'}
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        arquivos_rejeitados.append(rejeitado)
-                        continue
-                
-                nome_base_origem = formata_nome_base_origem(nome_base_origem)                    
-
-                nome_pessoa = nist.get_field('2.030')
-                if not nome_pessoa:
-                    rejeitado = {'arquivo': filename, 'motivo': 'Campo "nome" (2.030) vazio.'}
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        arquivos_rejeitados.append(rejeitado)
-                        continue
-
-                # Verifica se a base de origem existe no banco de dados
-                base_origem = BaseOrigem.query.filter(BaseOrigem.no_base_origem==nome_base_origem).first()
-                if not base_origem:
-                    rejeitado = {'arquivo': filename, 'motivo': f'Base de Origem do NIST "{nome_base_origem}" desconhecida. Contate o administrador <leonardo.lad@pf.gov.br>.'}
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        arquivos_rejeitados.append(rejeitado)
-                        continue
-                
-                nist_relative_filepath = 'nists/' + str(nome_base_origem).lower() + '/' + datetime.now().strftime('%Y-%m-%d') + f'/{filename}'
-                nist_full_filepath = APP_DIR / nist_relative_filepath
-                nist_full_dir = nist_full_filepath.parent
-
-                os.makedirs(nist_full_dir, exist_ok=True)
-
-                # Patch necessário porque o hash md5 direto do arquivo em memória não estava 
-                # batendo com o hash md5 gerado na inclusão do Nist no banco
-                temp_file = 'temp/' + hashlib.md5(memory_file.getvalue()).hexdigest() + '.tmp'
-                nist.write(temp_file)                
-                with open(temp_file, 'rb') as fb:
-                    nist_content = fb.read()
-                    md5_hash = hashlib.md5(nist_content).hexdigest()
-                os.remove(temp_file)
-
-                # Verifica se o Nist já foi enviado pelo seu hash md5                
-                # md5_hash = hashlib.md5(memory_file.getvalue()).hexdigest()
-                
-                # print('[WS-NIST] hash', md5_hash, len(memory_file.getvalue()), 'bytes')
-
-                reje = [x["arquivo"] for x in arquivos_rejeitados]
-                # print('[WS-NIST] rejeitados', reje)
-
-                if Nist.query.filter(Nist.md5_hash==md5_hash).first() or nist_full_filepath.exists():
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        # arquivos_ja_enviados.add(filename)
-                        arquivos_ja_enviados.add(str(nist_full_filepath))                        
-                    # print(f'[WS-NIST] Arquivo já enviado {nist_full_filepath}')
-                else:
-                    if filename not in [x["arquivo"] for x in arquivos_rejeitados]:
-                        arquivos_recebidos.add(str(nist_full_filepath))
-                        nist.write(str(nist_full_filepath))
-                        # print(f'[WS-NIST] Arquivo recebido {nist_full_filepath}')
-
-            return jsonify(recebidos=list(arquivos_recebidos), existentes=list(arquivos_ja_enviados), rejeitados=list(arquivos_rejeitados))
+                caminho_temp, md5_hash = spool_arquivo(file)
+                arquivos.append((secure_filename(file.filename), caminho_temp, md5_hash))
+                validacoes.append(executor.submit(valida_nist, caminho_temp, base_conhecida))
+
+            situacoes = processa_arquivos_nist(arquivos, validacoes)
+
+            recebidos = [x['caminho'] for x in situacoes if x['status'] == 'recebido']
+            existentes = list(dict.fromkeys(x['caminho'] for x in situacoes if x['status'] == 'existente'))
+            rejeitados = [{'arquivo': x['arquivo'], 'motivo': x['motivo']} for x in situacoes if x['status'] == 'rejeitado']
+
+            return jsonify(recebidos=recebidos, existentes=existentes, rejeitados=rejeitados, arquivos=situacoes)
 
     except:
         return jsonify(message=traceback.format_exc()), 500
 
+    finally:
+        for _, caminho_temp, _ in arquivos:
+            Path(caminho_temp).unlink(missing_ok=True)
+            caminho_serializado(caminho_temp).unlink(missing_ok=True)
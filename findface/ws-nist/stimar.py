@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from mitra_toolkit.mitra_toolkit import PessoaFindface, MitraToolkit, MitraException
 from findface_multi.findface_multi import FindfaceConnection, FindfaceException, FindfaceMulti
 from nist_manager import add_log, move_nists_lidos_com_erro
+from nist_cache import obter_pessoa_ff
 import traceback
 from threader import Threader
 from concurrent.futures import ThreadPoolExecutor
@@ -443,8 +444,10 @@ def envia_alertanistfindface_para_findface(id_alerta_nist_findface: int) -> None
         alerta = Alerta.query.filter(Alerta.id_alerta==alertanist.id_alerta).first()
         nist = Nist.query.filter(Nist.id_nist==alertanist.id_nist).first()
 
-        # Instancia um objeto PessoaFindface para enviar ao Findface
-        pessoa_ff = PessoaFindface(findface=None, nist=nist.uri_nist)
+        # Instancia um objeto PessoaFindface para enviar ao Findface (reaproveita o parse em cache)
+        pessoa_ff = obter_pessoa_ff(nist.uri_nist, md5_hash=nist.md5_hash)
+        if pessoa_ff is None:
+            raise MitraException(f'Arquivo NIST vazio: {nist.uri_nist}')
 
         # Atualiza a lista de PessoaFindface para a base de alerta correspondente
         if alerta.sq_tipo_alerta_restricao in (4, 7, 9, 13):  # 4, 7, 9 e 13 são Mandados de Prisão
@@ -699,48 +702,61 @@ def add_all_alerta_nist(lista_tuplas_ids: List[Tuple[int, int]]) -> None:
             raise e
 
 
-def descobre_novos_alertas_bnmp_subquery():
+def consulta_matches_bnmp_subquery():
     """
-    Verifica coincidências entre tb_nist e tb_alerta utilizando subqueries para otimizar performance,
-    garantindo que não haja duplicação e que o Nist possua base de origem ativa.
+    Monta a consulta de coincidências (id_nist, id_alerta) entre tb_nist e tb_alerta utilizando
+    subqueries e UNION das três regras de match (CPF, nome + nascimento + mãe, nome + nascimento + pai).
+
+    Retorna:
+    - Query SQLAlchemy ainda não executada.
     """
-    print(f"[stimar] Descobrindo novos alertas do BNMP (matches)...")
-    try:
-        subquery_nist = db.session.query(Nist.id_nist, Nist.nr_cpf, Nist.no_pessoa, Nist.dt_nascimento, Nist.no_mae, Nist.no_pai, Nist.id_base_origem).subquery()
-        subquery_alerta = db.session.query(Alerta.id_alerta, Alerta.nr_cpf, Alerta.no_qualificado, Alerta.dt_nascimento, Alerta.no_mae).subquery()
-        
-        matches_query = (
+    subquery_nist = db.session.query(Nist.id_nist, Nist.nr_cpf, Nist.no_pessoa, Nist.dt_nascimento, Nist.no_mae, Nist.no_pai, Nist.id_base_origem).subquery()
+    subquery_alerta = db.session.query(Alerta.id_alerta, Alerta.nr_cpf, Alerta.no_qualificado, Alerta.dt_nascimento, Alerta.no_mae).subquery()
+
+    matches_query = (
+        db.session.query(subquery_nist.c.id_nist, subquery_alerta.c.id_alerta)
+        .filter(
+            (subquery_alerta.c.nr_cpf == subquery_nist.c.nr_cpf) &
+            (subquery_alerta.c.nr_cpf.isnot(None)) &
+            (subquery_nist.c.nr_cpf.isnot(None))
+        )
+        .union(
             db.session.query(subquery_nist.c.id_nist, subquery_alerta.c.id_alerta)
             .filter(
-                (subquery_alerta.c.nr_cpf == subquery_nist.c.nr_cpf) &
-                (subquery_alerta.c.nr_cpf.isnot(None)) &
-                (subquery_nist.c.nr_cpf.isnot(None))
+                (subquery_alerta.c.no_qualificado == subquery_nist.c.no_pessoa) &
+                (subquery_alerta.c.dt_nascimento == subquery_nist.c.dt_nascimento) &
+                (subquery_alerta.c.no_mae == subquery_nist.c.no_mae) &
+                (subquery_alerta.c.no_qualificado.isnot(None)) &
+                (subquery_alerta.c.dt_nascimento.isnot(None)) &
+                (subquery_alerta.c.no_mae.isnot(None)) &
+                (subquery_nist.c.no_mae.isnot(None))
             )
-            .union(
-                db.session.query(subquery_nist.c.id_nist, subquery_alerta.c.id_alerta)
-                .filter(
-                    (subquery_alerta.c.no_qualificado == subquery_nist.c.no_pessoa) &
-                    (subquery_alerta.c.dt_nascimento == subquery_nist.c.dt_nascimento) &
-                    (subquery_alerta.c.no_mae == subquery_nist.c.no_mae) &
-                    (subquery_alerta.c.no_qualificado.isnot(None)) &
-                    (subquery_alerta.c.dt_nascimento.isnot(None)) &
-                    (subquery_alerta.c.no_mae.isnot(None)) &
-                    (subquery_nist.c.no_mae.isnot(None))
-                )
-            )
-            .union(
-                db.session.query(subquery_nist.c.id_nist, subquery_alerta.c.id_alerta)
-                .filter(
-                    (subquery_alerta.c.no_qualificado == subquery_nist.c.no_pessoa) &
-                    (subquery_alerta.c.dt_nascimento == subquery_nist.c.dt_nascimento) &
-                    (subquery_alerta.c.no_mae == subquery_nist.c.no_pai) &
-                    (subquery_alerta.c.no_qualificado.isnot(None)) &
-                    (subquery_alerta.c.dt_nascimento.isnot(None)) &
-                    (subquery_alerta.c.no_mae.isnot(None)) &
-                    (subquery_nist.c.no_pai.isnot(None))
-                )
+        )
+        .union(
+            db.session.query(subquery_nist.c.id_nist, subquery_alerta.c.id_alerta)
+            .filter(
+                (subquery_alerta.c.no_qualificado == subquery_nist.c.no_pessoa) &
+                (subquery_alerta.c.dt_nascimento == subquery_nist.c.dt_nascimento) &
+                (subquery_alerta.c.no_mae == subquery_nist.c.no_pai) &
+                (subquery_alerta.c.no_qualificado.isnot(None)) &
+                (subquery_alerta.c.dt_nascimento.isnot(None)) &
+                (subquery_alerta.c.no_mae.isnot(None)) &
+                (subquery_nist.c.no_pai.isnot(None))
             )
         )
+    )
+
+    return matches_query
+
+
+def descobre_novos_alertas_bnmp_subquery():
+    """
+    Verifica coincidências entre tb_nist e tb_alerta utilizando subqueries para otimizar performance,
+    garantindo que não haja duplicação e que o Nist possua base de origem ativa.
+    """
+    print(f"[stimar] Descobrindo novos alertas do BNMP (matches)...")
+    try:
+        matches_query = consulta_matches_bnmp_subquery()
         
         # lista_novos_alerta_nist = []
         # for id_nist, id_alerta in matches_query.all():
@@ -772,6 +788,29 @@ def descobre_novos_alertas_bnmp_subquery():
         print(f"Erro inesperado: {str(e)}")
 
 
+def consulta_matches_bnmp_join():
+    """
+    Monta a consulta de coincidências (id_alerta, id_nist) entre tb_alerta e tb_nist utilizando
+    um único JOIN com as três regras de match, restrita a Nists ativos de bases de origem ativas.
+
+    Retorna:
+    - Query SQLAlchemy ainda não executada.
+    """
+    matches_query = (
+        db.session.query(Alerta.id_alerta, Nist.id_nist)
+        .join(Nist, or_(
+            and_(Alerta.nr_cpf == Nist.nr_cpf, Alerta.nr_cpf.isnot(None), Nist.nr_cpf.isnot(None)),
+            and_(Alerta.no_qualificado == Nist.no_pessoa, Alerta.dt_nascimento == Nist.dt_nascimento, 
+                    Alerta.no_mae == Nist.no_mae, Alerta.no_qualificado.isnot(None), Alerta.dt_nascimento.isnot(None), Alerta.no_mae.isnot(None), Nist.no_mae.isnot(None)),
+            and_(Alerta.no_qualificado == Nist.no_pessoa, Alerta.dt_nascimento == Nist.dt_nascimento, 
+                    Alerta.no_mae == Nist.no_pai, Alerta.no_qualificado.isnot(None), Alerta.dt_nascimento.isnot(None), Alerta.no_mae.isnot(None), Nist.no_pai.isnot(None))
+        ))
+        .filter(Nist.ativo == True, Nist.base_origem.has(ativo=True))
+    )
+
+    return matches_query
+
+
 def descobre_novos_alertas_bnmp_join():
     """
     Verifica coincidências entre tb_nist e tb_alerta utilizando JOIN direto para otimizar performance,
@@ -780,17 +819,7 @@ def descobre_novos_alertas_bnmp_join():
 
     print(f"[stimar] Descobrindo novos alertas do BNMP (matches)...")
     try:
-        matches_query = (
-            db.session.query(Alerta.id_alerta, Nist.id_nist)
-            .join(Nist, or_(
-                and_(Alerta.nr_cpf == Nist.nr_cpf, Alerta.nr_cpf.isnot(None), Nist.nr_cpf.isnot(None)),
-                and_(Alerta.no_qualificado == Nist.no_pessoa, Alerta.dt_nascimento == Nist.dt_nascimento, 
-                        Alerta.no_mae == Nist.no_mae, Alerta.no_qualificado.isnot(None), Alerta.dt_nascimento.isnot(None), Alerta.no_mae.isnot(None), Nist.no_mae.isnot(None)),
-                and_(Alerta.no_qualificado == Nist.no_pessoa, Alerta.dt_nascimento == Nist.dt_nascimento, 
-                        Alerta.no_mae == Nist.no_pai, Alerta.no_qualificado.isnot(None), Alerta.dt_nascimento.isnot(None), Alerta.no_mae.isnot(None), Nist.no_pai.isnot(None))
-            ))
-            .filter(Nist.ativo == True, Nist.base_origem.has(ativo=True))
-        )
+        matches_query = consulta_matches_bnmp_join()
         
         lista_novos_alerta_nist = []
         for id_alerta, id_nist in matches_query.all():
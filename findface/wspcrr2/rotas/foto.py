@@ -4,10 +4,13 @@ from io import BytesIO
 from findface_multi.findface_multi import FindfaceConnection, FindfaceMulti, FindfaceException
 import os
 import requests
+from acervo_fotos import obter_acervo
 
 
 foto_bp = Blueprint('foto', __name__, url_prefix='/pessoas/foto')
 
+FINDFACE_URL = 'https://findface2-mitrarr.ddns.net'
+
 @foto_bp.route('/<object_id>', methods=['GET'])
 def foto(object_id):
 
@@ -16,7 +19,13 @@ def foto(object_id):
 
     try:
 
-        with FindfaceConnection(base_url='https://findface2-mitrarr.ddns.net', username=usuario, password=senha) as ffcon:
+        # Foto já baixada antes: responde do acervo local, sem consultar o FindFace
+        acervo = obter_acervo(FINDFACE_URL)
+        foto_bytes = acervo.obter(object_id)
+        if foto_bytes is not None:
+            return send_file(BytesIO(foto_bytes), mimetype='image/jpeg', as_attachment=True, download_name=f"{object_id}.jpg")
+
+        with FindfaceConnection(base_url=FINDFACE_URL, username=usuario, password=senha) as ffcon:
             findface = FindfaceMulti(findface_connection=ffcon)
 
             face_object = findface.get_face_object_by_id(int(object_id))
@@ -29,6 +38,7 @@ def foto(object_id):
                 response = requests.get(url=source_photo, verify=False)
                 if response.status_code in (200, 201):
                     foto_bytes = response.content
+                    acervo.guardar(foto_bytes, face_object["id"])
 
                     # Converte os bytes em um objeto BytesIO
                     foto_stream = BytesIO(foto_bytes)
@@ -4,6 +4,7 @@ from io import BytesIO
 from findface_multi.findface_multi import FindfaceConnection, FindfaceMulti, FindfaceException
 import os
 from funcoes import converter_card_para_pessoa
+from triagem_faces import TRIAGEM_ATIVA, triar_foto, obter_relatorio
 
 reconhecimento_facial_bp = Blueprint('reconhecimento-facial', __name__, url_prefix='/reconhecimento-facial')
 
@@ -35,6 +36,14 @@ def foto():
     # Se o arquivo for uma imagem válida, responde com sucesso
     # return jsonify({'message': 'Arquivo recebido é uma imagem válida.'}), 200
 
+    # Triagem local: fotos sem condições de detecção não são enviadas ao FindFace; as grandes são reduzidas
+    if TRIAGEM_ATIVA:
+        triagem = obter_relatorio().registrar(triar_foto(file_bytes.getvalue()))
+        if not triagem.aprovada:
+            print(f"[reconhecimento_facial] Foto rejeitada na triagem: {'; '.join(triagem.motivos)}")
+            return jsonify(mensagem=f"Foto sem qualidade para o reconhecimento: {'; '.join(triagem.motivos)}.", pessoas=[], status=0), 400
+        file_bytes = BytesIO(triagem.conteudo)
+
     usuario = os.environ["USUARIO_CONSULTA_FF"]
     senha = os.environ["SENHA_CONSULTA_FF"]
 
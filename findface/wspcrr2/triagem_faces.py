@@ -0,0 +1,212 @@
+"""
+Triagem local de fotos antes do envio ao detector do FindFace.
+
+Fotos pequenas demais, borradas ou muito escuras/claras voltam do detect como low_quality (ou sem face),
+depois de gastar upload e uma chamada ao detector. A triagem mede essas características localmente,
+em uma cópia reduzida da imagem em tons de cinza:
+
+- tamanho: menor lado da foto original;
+- nitidez: variância do Laplaciano (NumPy), quanto menor mais borrada;
+- exposição: brilho médio e fração de pixels estourados (pretos ou brancos).
+
+Fotos aprovadas maiores que o lado máximo são reduzidas (JPEG) antes do envio; as demais seguem sem
+alteração. Fotos que o PIL não consegue decodificar não são rejeitadas: seguem sem alteração para o
+detector do FindFace, que aceita formatos que o PIL não lê.
+
+A triagem fica desligada por padrão; TRIAGEM_FACES=1 a liga. Os limites vêm das variáveis de ambiente
+TRIAGEM_* e podem ser passados por chamada.
+
+O telegram-bot, o wspcrr2 e o ws-nist têm uma cópia deste módulo; mantenha as cópias iguais.
+
+Uso:
+    resultado = triar_foto(conteudo)
+    if not resultado.aprovada:
+        print(resultado.motivos)
+    detection = findface.detect(resultado.conteudo, face={})
+
+Para calibrar os limites com fotos reais:
+    python triagem_faces.py fotos/*.jpg
+"""
+import argparse
+import os
+import threading
+from collections import Counter, namedtuple
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+TRIAGEM_ATIVA = os.environ.get("TRIAGEM_FACES", "0") not in ("0", "false", "False", "")
+TRIAGEM_LADO_MINIMO = int(os.environ.get("TRIAGEM_LADO_MINIMO", 80))
+TRIAGEM_LADO_MAXIMO = int(os.environ.get("TRIAGEM_LADO_MAXIMO", 1920))
+TRIAGEM_NITIDEZ_MINIMA = float(os.environ.get("TRIAGEM_NITIDEZ_MINIMA", 15))
+TRIAGEM_BRILHO_MINIMO = float(os.environ.get("TRIAGEM_BRILHO_MINIMO", 30))
+TRIAGEM_BRILHO_MAXIMO = float(os.environ.get("TRIAGEM_BRILHO_MAXIMO", 225))
+TRIAGEM_ESTOURADOS_MAXIMO = float(os.environ.get("TRIAGEM_ESTOURADOS_MAXIMO", 0.5))
+
+# Lado da cópia usada nas medições (a variância do Laplaciano depende da escala)
+LADO_ANALISE = 512
+QUALIDADE_REDUCAO = 90
+
+ResultadoTriagem = namedtuple('ResultadoTriagem', ['aprovada', 'conteudo', 'motivos', 'metricas'])
+
+
+def nitidez(cinza: np.ndarray) -> float:
+    """
+    Variância do Laplaciano (vizinhança 4) de uma imagem em tons de cinza.
+    """
+    if cinza.shape[0] < 3 or cinza.shape[1] < 3:
+        return 0.0
+    laplaciano = (
+        cinza[:-2, 1:-1] + cinza[2:, 1:-1] + cinza[1:-1, :-2] + cinza[1:-1, 2:] - 4 * cinza[1:-1, 1:-1]
+    )
+    return float(laplaciano.var())
+
+
+def triar_foto(conteudo: bytes, lado_minimo: int = TRIAGEM_LADO_MINIMO, lado_maximo: int = TRIAGEM_LADO_MAXIMO,
+               nitidez_minima: float = TRIAGEM_NITIDEZ_MINIMA, brilho_minimo: float = TRIAGEM_BRILHO_MINIMO,
+               brilho_maximo: float = TRIAGEM_BRILHO_MAXIMO, estourados_maximo: float = TRIAGEM_ESTOURADOS_MAXIMO) -> ResultadoTriagem:
+    """
+    Avalia se a foto tem condições de ter uma face detectada com qualidade.
+
+    Argumentos:
+    - conteudo (bytes): Foto enviada pelo usuário.
+    - lado_minimo (int): Fotos com o menor lado abaixo disso são rejeitadas.
+    - lado_maximo (int): Fotos com o maior lado acima disso são reduzidas antes do envio.
+    - nitidez_minima (float): Variância mínima do Laplaciano.
+    - brilho_minimo, brilho_maximo (float): Faixa aceita do brilho médio (0 a 255).
+    - estourados_maximo (float): Fração máxima de pixels pretos (<= 5) ou brancos (>= 250).
+
+    Retorna:
+    - ResultadoTriagem: aprovada, conteúdo a enviar (reduzido ou o original), motivos da rejeição e métricas.
+      Se o PIL não decodificar a foto, ela é aprovada sem alteração e metricas['nao_decodificada'] tem o erro.
+    """
+    metricas = {'tamanho_bytes': len(conteudo)}
+    try:
+        img = Image.open(BytesIO(conteudo))
+        metricas['largura'], metricas['altura'] = img.size
+        # JPEG: decodifica direto em escala reduzida
+        img.draft('RGB', (LADO_ANALISE, LADO_ANALISE))
+        img = ImageOps.exif_transpose(img)
+        analise = img.convert('L')
+        analise.thumbnail((LADO_ANALISE, LADO_ANALISE))
+        cinza = np.asarray(analise, dtype=np.float32)
+    except Exception as e:
+        # Sem como medir, a decisão fica com o detector do FindFace
+        metricas['nao_decodificada'] = type(e).__name__
+        return ResultadoTriagem(True, conteudo, [], metricas)
+
+    motivos = []
+    if min(metricas['largura'], metricas['altura']) < lado_minimo:
+        motivos.append(f"foto pequena ({metricas['largura']}x{metricas['altura']}, mínimo {lado_minimo}px)")
+
+    metricas['nitidez'] = round(nitidez(cinza), 2)
+    metricas['brilho'] = round(float(cinza.mean()), 2)
+    metricas['estourados'] = round(float(((cinza <= 5) | (cinza >= 250)).mean()), 4)
+
+    if metricas['nitidez'] < nitidez_minima:
+        motivos.append(f"foto borrada (nitidez {metricas['nitidez']}, mínimo {nitidez_minima})")
+    if not brilho_minimo <= metricas['brilho'] <= brilho_maximo:
+        motivos.append(f"foto {'escura' if metricas['brilho'] < brilho_minimo else 'clara'} demais (brilho {metricas['brilho']})")
+    if metricas['estourados'] > estourados_maximo:
+        motivos.append(f"exposição estourada ({metricas['estourados']:.0%} dos pixels)")
+
+    if motivos:
+        return ResultadoTriagem(False, conteudo, motivos, metricas)
+
+    # Reduz fotos grandes: menos banda e o detector não precisa de mais que isso
+    if max(metricas['largura'], metricas['altura']) > lado_maximo:
+        try:
+            reduzida = Image.open(BytesIO(conteudo))
+            reduzida.draft('RGB', (lado_maximo, lado_maximo))
+            reduzida = ImageOps.exif_transpose(reduzida)
+            if reduzida.mode not in ('L', 'RGB'):
+                reduzida = reduzida.convert('RGB')
+            reduzida.thumbnail((lado_maximo, lado_maximo))
+            saida = BytesIO()
+            reduzida.save(saida, 'JPEG', quality=QUALIDADE_REDUCAO)
+        except Exception as e:
+            # Envia o original
+            metricas['nao_decodificada'] = type(e).__name__
+            return ResultadoTriagem(True, conteudo, [], metricas)
+        conteudo = saida.getvalue()
+        metricas['reduzida_para'] = reduzida.size
+        metricas['tamanho_enviado'] = len(conteudo)
+
+    return ResultadoTriagem(True, conteudo, [], metricas)
+
+
+class RelatorioTriagem:
+    """
+    Contagem das fotos aprovadas/rejeitadas (por motivo) e dos bytes economizados.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.aprovadas = 0
+        self.reduzidas = 0
+        self.nao_decodificadas = 0
+        self.bytes_economizados = 0
+        self.motivos = Counter()
+
+    def registrar(self, resultado: ResultadoTriagem) -> ResultadoTriagem:
+        with self._lock:
+            self.total += 1
+            if resultado.aprovada:
+                self.aprovadas += 1
+                if 'nao_decodificada' in resultado.metricas:
+                    self.nao_decodificadas += 1
+                if 'reduzida_para' in resultado.metricas:
+                    self.reduzidas += 1
+                    self.bytes_economizados += resultado.metricas['tamanho_bytes'] - resultado.metricas['tamanho_enviado']
+            else:
+                self.bytes_economizados += resultado.metricas['tamanho_bytes']
+                # Agrupa pelo tipo do motivo, sem os valores medidos
+                self.motivos.update(motivo.split(' (')[0] for motivo in resultado.motivos)
+        return resultado
+
+    def resumo(self) -> str:
+        with self._lock:
+            rejeitadas = self.total - self.aprovadas
+            texto = (f"{self.total} fotos: {self.aprovadas} aprovadas ({self.reduzidas} reduzidas, "
+                     f"{self.nao_decodificadas} não decodificadas), {rejeitadas} rejeitadas; "
+                     f"{self.bytes_economizados / 2**20:.1f} MiB não enviados")
+            if self.motivos:
+                texto += " | " + ", ".join(f"{motivo}: {quantidade}" for motivo, quantidade in self.motivos.most_common())
+            return texto
+
+
+_relatorio = None
+_relatorio_lock = threading.Lock()
+
+
+def obter_relatorio() -> RelatorioTriagem:
+    """
+    Retorna o relatório compartilhado do processo, criando-o no primeiro uso.
+    """
+    global _relatorio
+    with _relatorio_lock:
+        if _relatorio is None:
+            _relatorio = RelatorioTriagem()
+        return _relatorio
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aplica a triagem de faces a fotos locais e mostra as métricas.")
+    parser.add_argument('fotos', nargs='+', help="Arquivos de imagem.")
+    parser.add_argument('--lado-minimo', type=int, default=TRIAGEM_LADO_MINIMO)
+    parser.add_argument('--lado-maximo', type=int, default=TRIAGEM_LADO_MAXIMO)
+    parser.add_argument('--nitidez-minima', type=float, default=TRIAGEM_NITIDEZ_MINIMA)
+    args = parser.parse_args()
+
+    relatorio = RelatorioTriagem()
+    for caminho in args.fotos:
+        with open(caminho, 'rb') as f:
+            resultado = relatorio.registrar(triar_foto(f.read(), lado_minimo=args.lado_minimo, lado_maximo=args.lado_maximo,
+                                                       nitidez_minima=args.nitidez_minima))
+        situacao = 'aprovada' if resultado.aprovada else 'rejeitada: ' + '; '.join(resultado.motivos)
+        print(f"[triagem_faces] {caminho}: {situacao} {resultado.metricas}")
+
+    print(f"[triagem_faces] {relatorio.resumo()}")
@@ -2,5 +2,22 @@
 
 from .nist import NistFile
 from .relationship import RelationshipRecord
+from .shard import (
+    Shard,
+    ShardJobSummary,
+    ShardSpec,
+    split_date_range,
+    split_int_range,
+    split_values,
+)
 
-__all__ = ["NistFile", "RelationshipRecord"]
+__all__ = [
+    "NistFile",
+    "RelationshipRecord",
+    "Shard",
+    "ShardJobSummary",
+    "ShardSpec",
+    "split_date_range",
+    "split_int_range",
+    "split_values",
+]
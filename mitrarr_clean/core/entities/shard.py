@@ -0,0 +1,105 @@
+"""Representa fatias (shards) de jobs longos distribuídos entre vários workers."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Mapping, Sequence
+
+
+@dataclass(frozen=True, slots=True)
+class ShardSpec:
+    """Define uma fatia do espaço de chaves antes de ser gravada na tabela de jobs."""
+
+    key: str
+    params: Mapping[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        """Garante que a chave da fatia foi preenchida."""
+        if not self.key.strip():
+            raise ValueError("key não pode ser vazio.")
+
+
+@dataclass(frozen=True, slots=True)
+class Shard:
+    """Fatia reservada por um worker, com o progresso registrado até o momento."""
+
+    job: str
+    key: str
+    params: Mapping[str, Any]
+    owner: str
+    attempts: int
+    processed: int = 0
+    checkpoint: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ShardJobSummary:
+    """Contagem das fatias de um job por situação."""
+
+    job: str
+    pending: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+    processed: int = 0
+
+    @property
+    def total(self) -> int:
+        """Quantidade total de fatias do job."""
+        return self.pending + self.leased + self.done + self.failed
+
+    @property
+    def finished(self) -> bool:
+        """True quando nenhuma fatia está pendente ou em execução."""
+        return self.pending == 0 and self.leased == 0
+
+
+def split_int_range(start: int, stop: int, size: int) -> list[ShardSpec]:
+    """Divide o intervalo [start, stop) em fatias de até size chaves (ex.: ids de cards, RGs)."""
+    if size <= 0:
+        raise ValueError("size deve ser positivo.")
+    if stop < start:
+        raise ValueError("stop não pode ser menor que start.")
+    width = len(str(max(abs(start), abs(stop))))
+    shards = []
+    for lower in range(start, stop, size):
+        upper = min(lower + size, stop)
+        key = f"{lower:0{width}d}-{upper:0{width}d}"
+        shards.append(ShardSpec(key=key, params={"start": lower, "stop": upper}))
+    return shards
+
+
+def split_values(values: Sequence[str], per_shard: int = 1) -> list[ShardSpec]:
+    """Agrupa valores discretos (ex.: watch lists) em fatias de até per_shard itens."""
+    if per_shard <= 0:
+        raise ValueError("per_shard deve ser positivo.")
+    normalized = [value.strip() for value in values if value.strip()]
+    if not normalized:
+        raise ValueError("Nenhum valor informado.")
+    shards = []
+    for index in range(0, len(normalized), per_shard):
+        chunk = normalized[index : index + per_shard]
+        key = chunk[0] if per_shard == 1 else f"{index // per_shard:06d}"
+        shards.append(ShardSpec(key=key, params={"values": chunk}))
+    return shards
+
+
+def split_date_range(start: date, stop: date, days: int) -> list[ShardSpec]:
+    """Divide o período [start, stop) em janelas de até days dias."""
+    if days <= 0:
+        raise ValueError("days deve ser positivo.")
+    if stop < start:
+        raise ValueError("stop não pode ser anterior a start.")
+    shards = []
+    lower = start
+    while lower < stop:
+        upper = min(lower + timedelta(days=days), stop)
+        shards.append(
+            ShardSpec(
+                key=f"{lower.isoformat()}_{upper.isoformat()}",
+                params={"start": lower.isoformat(), "stop": upper.isoformat()},
+            )
+        )
+        lower = upper
+    return shards
@@ -1,6 +1,6 @@
 """Interfaces que definem os contratos entre o domínio e a infraestrutura."""
 
 from .gateways import FindFaceGateway
-from .repositories import NistRepository, RelationshipRepository
+from .repositories import NistRepository, RelationshipRepository, ShardRepository
 
-__all__ = ["FindFaceGateway", "NistRepository", "RelationshipRepository"]
+__all__ = ["FindFaceGateway", "NistRepository", "RelationshipRepository", "ShardRepository"]
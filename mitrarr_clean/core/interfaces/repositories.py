@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
+from datetime import timedelta
 from typing import Iterable, Protocol, Sequence
 
-from core.entities import NistFile, RelationshipRecord
+from core.entities import NistFile, RelationshipRecord, Shard, ShardJobSummary, ShardSpec
 
 
 class NistRepository(Protocol):
@@ -32,3 +33,37 @@ class RelationshipRepository(Protocol):
 
         :return: quantidade de registros sincronizados.
         """
+
+
+class ShardRepository(Protocol):
+    """Define a tabela de fatias compartilhada pelos workers de jobs longos."""
+
+    def create_job(self, job: str, shards: Sequence[ShardSpec]) -> int:
+        """
+        Registra as fatias do job, ignorando as que já existem.
+
+        :return: quantidade de fatias novas.
+        """
+
+    def lease(self, job: str, owner: str, lease_for: timedelta) -> Shard | None:
+        """Reserva a próxima fatia pendente (ou com reserva expirada) para o owner."""
+
+    def heartbeat(
+        self,
+        job: str,
+        key: str,
+        owner: str,
+        lease_for: timedelta,
+        processed: int | None = None,
+        checkpoint: str | None = None,
+    ) -> bool:
+        """Renova a reserva e grava o progresso. Retorna False se a fatia não é mais do owner."""
+
+    def complete(self, job: str, key: str, owner: str, processed: int | None = None) -> bool:
+        """Marca a fatia como concluída. Retorna False se a fatia não é mais do owner."""
+
+    def fail(self, job: str, key: str, owner: str, error: str) -> bool:
+        """Devolve a fatia à fila ou a marca como falha ao esgotar as tentativas."""
+
+    def summary(self, job: str) -> ShardJobSummary:
+        """Retorna a contagem de fatias do job por situação."""
@@ -1,3 +1,3 @@
 """Pacote de infraestrutura contendo repositories, gateways, CLI e monitoramento."""
 
-__all__ = ["cli", "gateways", "repositories", "monitoring", "container"]
+__all__ = ["cli", "gateways", "repositories", "monitoring", "jobs", "container"]
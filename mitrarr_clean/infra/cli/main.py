@@ -6,14 +6,20 @@ import argparse
 import json
 import subprocess
 import sys
-from datetime import UTC, datetime
+from datetime import UTC, date, datetime
 from pathlib import Path
 
-from core.entities import RelationshipRecord
+from core.entities import (
+    RelationshipRecord,
+    split_date_range,
+    split_int_range,
+    split_values,
+)
 from core.exceptions import UseCaseError
 from core.use_cases import RegisterNistInput
 from infra.auto_recovery import RetryRunner
-from infra.container import build_container, get_data_dir
+from infra.container import build_container, get_data_dir, get_shard_repository
+from infra.jobs import CommandShardHandler, ShardWorker
 from infra.monitoring import Alert, AlertDispatcher, VolumeValidator
 from infra.scheduler import JobScheduler, SchedulerResult, load_schedule
 
@@ -89,6 +95,58 @@ def build_parser() -> argparse.ArgumentParser:
     emit_alert.add_argument("--severity", default="info", help="Gravidade do alerta.")
     emit_alert.add_argument("--message", required=True, help="Mensagem descritiva.")
 
+    shard_create = subparsers.add_parser(
+        "shard-create",
+        help="Divide um job longo em fatias na tabela de jobs compartilhada.",
+    )
+    shard_create.add_argument("--job", required=True, help="Nome do job (ex.: deleta_cards_2024).")
+    key_space = shard_create.add_mutually_exclusive_group(required=True)
+    key_space.add_argument(
+        "--int-range",
+        nargs=2,
+        type=int,
+        metavar=("INICIO", "FIM"),
+        help="Intervalo numérico [INICIO, FIM) (ids de cards, RGs).",
+    )
+    key_space.add_argument("--values", nargs="+", help="Valores discretos (ex.: watch lists).")
+    key_space.add_argument(
+        "--date-range",
+        nargs=2,
+        type=date.fromisoformat,
+        metavar=("INICIO", "FIM"),
+        help="Período [INICIO, FIM) em ISO 8601.",
+    )
+    shard_create.add_argument(
+        "--size",
+        type=int,
+        default=1,
+        help="Chaves por fatia: números (--int-range), valores (--values) ou dias (--date-range).",
+    )
+
+    shard_work = subparsers.add_parser(
+        "shard-work",
+        help="Processa fatias do job executando o comando para cada uma.",
+    )
+    shard_work.add_argument("--job", required=True, help="Nome do job.")
+    shard_work.add_argument("--lease", type=float, default=300.0, help="Validade da reserva (s).")
+    shard_work.add_argument(
+        "--heartbeat", type=float, default=60.0, help="Intervalo de renovação da reserva (s)."
+    )
+    shard_work.add_argument("--max-shards", type=int, help="Encerra após processar N fatias.")
+    shard_work.add_argument(
+        "--wait",
+        action="store_true",
+        help="Aguarda as fatias reservadas por outros workers para assumir as que expirarem.",
+    )
+    shard_work.add_argument(
+        "cmd",
+        nargs=argparse.REMAINDER,
+        help="Comando por fatia; aceita {start}, {stop}, {values}, {key} e {checkpoint}.",
+    )
+
+    shard_status = subparsers.add_parser("shard-status", help="Mostra o progresso de um job.")
+    shard_status.add_argument("--job", required=True, help="Nome do job.")
+
     return parser
 
 
@@ -190,6 +248,54 @@ def handle_emit_alert(data_dir: Path, args: argparse.Namespace) -> int:
     return 0
 
 
+def handle_shard_create(data_dir: Path, args: argparse.Namespace) -> int:
+    """Grava as fatias do job; executar de novo não duplica as existentes."""
+    if args.int_range:
+        shards = split_int_range(args.int_range[0], args.int_range[1], args.size)
+    elif args.values:
+        shards = split_values(args.values, args.size)
+    else:
+        shards = split_date_range(args.date_range[0], args.date_range[1], args.size)
+    created = get_shard_repository(data_dir).create_job(args.job, shards)
+    print(f"{created} fatia(s) nova(s) no job '{args.job}' ({len(shards)} no total).")
+    return 0
+
+
+def handle_shard_work(data_dir: Path, args: argparse.Namespace) -> int:
+    """Executa um worker do job até as fatias acabarem."""
+    cmd = list(args.cmd)
+    if cmd and cmd[0] == "--":
+        cmd = cmd[1:]
+    worker = ShardWorker(
+        get_shard_repository(data_dir),
+        args.job,
+        CommandShardHandler(cmd),
+        lease_seconds=args.lease,
+        heartbeat_seconds=args.heartbeat,
+        wait_for_others=args.wait,
+    )
+    result = worker.run(max_shards=args.max_shards)
+    print(
+        f"Worker {worker.owner}: {len(result.completed)} concluída(s), "
+        f"{len(result.failed)} com falha, {len(result.lost)} perdida(s)."
+    )
+    return 0 if result.success else 1
+
+
+def handle_shard_status(data_dir: Path, args: argparse.Namespace) -> int:
+    """Mostra a contagem de fatias do job por situação."""
+    summary = get_shard_repository(data_dir).summary(args.job)
+    if not summary.total:
+        print(f"Job '{args.job}' não encontrado.", file=sys.stderr)
+        return 1
+    print(
+        f"Job '{args.job}': {summary.done}/{summary.total} concluída(s), "
+        f"{summary.leased} em execução, {summary.pending} pendente(s), "
+        f"{summary.failed} com falha; {summary.processed} registro(s)."
+    )
+    return 0 if not summary.failed else 1
+
+
 def main(argv: list[str] | None = None) -> int:
     """Ponto de entrada principal utilizado pelo CLI e pelos testes."""
     parser = build_parser()
@@ -212,6 +318,12 @@ def main(argv: list[str] | None = None) -> int:
             return handle_run_schedule(args)
         elif args.command == "emit-alert":
             return handle_emit_alert(data_dir, args)
+        elif args.command == "shard-create":
+            return handle_shard_create(data_dir, args)
+        elif args.command == "shard-work":
+            return handle_shard_work(data_dir, args)
+        elif args.command == "shard-status":
+            return handle_shard_status(data_dir, args)
         else:  # pragma: no cover
             parser.error("Comando desconhecido.")
     except (UseCaseError, ValueError, FileNotFoundError, json.JSONDecodeError) as exc:
@@ -13,6 +13,7 @@ from core.use_cases import (
     SyncRelationshipsUseCase,
 )
 from infra.gateways import LogFileFindFaceGateway
+from infra.jobs import SqlShardRepository, build_shard_repository
 from infra.monitoring import HeartbeatMonitor
 from infra.repositories import JsonNistRepository, JsonRelationshipRepository
 
@@ -49,3 +50,16 @@ def build_container(base_dir: Path | None = None) -> AppContainer:
         sync_relationships=SyncRelationshipsUseCase(rel_repo),
         heartbeat_monitor=heartbeat,
     )
+
+
+def get_shard_repository(data_dir: Path | None = None) -> SqlShardRepository:
+    """
+    Abre a tabela de fatias dos jobs distribuídos.
+
+    MITRARR_JOBS_DB aceita uma URL postgresql:// (workers em várias máquinas) ou um arquivo
+    SQLite; sem a variável, usa jobs/shards.sqlite3 no diretório de dados.
+    """
+    target = os.environ.get("MITRARR_JOBS_DB")
+    if not target:
+        target = str((data_dir or get_data_dir()) / "jobs" / "shards.sqlite3")
+    return build_shard_repository(target)
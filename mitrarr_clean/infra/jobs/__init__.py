@@ -0,0 +1,24 @@
+"""Execução de jobs longos em fatias, distribuída entre processos e máquinas."""
+
+from .command import CommandShardHandler, format_command, parse_progress
+from .shard_store import (
+    PostgresShardRepository,
+    SqliteShardRepository,
+    SqlShardRepository,
+    build_shard_repository,
+)
+from .worker import LeaseLostError, ShardProgress, ShardWorker, WorkerResult
+
+__all__ = [
+    "CommandShardHandler",
+    "LeaseLostError",
+    "PostgresShardRepository",
+    "ShardProgress",
+    "ShardWorker",
+    "SqlShardRepository",
+    "SqliteShardRepository",
+    "WorkerResult",
+    "build_shard_repository",
+    "format_command",
+    "parse_progress",
+]
@@ -0,0 +1,88 @@
+"""Handler que processa cada fatia executando um comando externo (scripts legados)."""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from typing import Sequence
+
+from core.entities import Shard
+
+from .worker import LeaseLostError, ShardProgress
+
+PROGRESS_PREFIX = "MITRARR_PROGRESS"
+
+
+def format_command(template: Sequence[str], shard: Shard) -> list[str]:
+    """
+    Substitui os campos da fatia nos argumentos do comando.
+
+    Aceita {key}, {checkpoint} e os parâmetros da fatia ({start}, {stop}, {values}); listas
+    são unidas por vírgula.
+    """
+    fields = {
+        name: ",".join(str(item) for item in value) if isinstance(value, list) else value
+        for name, value in shard.params.items()
+    }
+    fields["key"] = shard.key
+    fields["checkpoint"] = shard.checkpoint or ""
+    try:
+        return [part.format(**fields) for part in template]
+    except (KeyError, IndexError) as exc:
+        raise ValueError(f"Campo {exc} não existe na fatia '{shard.key}'.") from exc
+
+
+def parse_progress(line: str) -> tuple[int, str | None] | None:
+    """Interpreta linhas 'MITRARR_PROGRESS <processados> [checkpoint]' escritas pelo comando."""
+    parts = line.strip().split(maxsplit=2)
+    if len(parts) < 2 or parts[0] != PROGRESS_PREFIX:
+        return None
+    try:
+        processed = int(parts[1])
+    except ValueError:
+        return None
+    return processed, parts[2] if len(parts) == 3 else None
+
+
+class CommandShardHandler:
+    """
+    Executa o comando uma vez por fatia.
+
+    O comando recebe a fatia também pelas variáveis MITRARR_SHARD_JOB, MITRARR_SHARD_KEY,
+    MITRARR_SHARD_PARAMS (JSON) e MITRARR_SHARD_CHECKPOINT, e pode reportar o progresso
+    imprimindo linhas no formato de parse_progress; as demais linhas são repassadas ao stdout.
+    """
+
+    def __init__(self, template: Sequence[str]) -> None:
+        if not template:
+            raise ValueError("Nenhum comando informado.")
+        self.template = list(template)
+
+    def __call__(self, shard: Shard, progress: ShardProgress) -> int | None:
+        command = format_command(self.template, shard)
+        env = dict(
+            os.environ,
+            MITRARR_SHARD_JOB=shard.job,
+            MITRARR_SHARD_KEY=shard.key,
+            MITRARR_SHARD_PARAMS=json.dumps(dict(shard.params)),
+            MITRARR_SHARD_CHECKPOINT=shard.checkpoint or "",
+        )
+        with subprocess.Popen(
+            command, stdout=subprocess.PIPE, text=True, env=env, bufsize=1
+        ) as process:
+            try:
+                for line in process.stdout or ():
+                    parsed = parse_progress(line)
+                    if parsed is None:
+                        sys.stdout.write(line)
+                        continue
+                    progress.report(*parsed)
+            except LeaseLostError:
+                process.kill()
+                raise
+            returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"Comando retornou {returncode}")
+        return None
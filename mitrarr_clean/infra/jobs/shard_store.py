@@ -0,0 +1,299 @@
+"""Tabela de fatias (shards) compartilhada pelos workers, em SQLite ou PostgreSQL."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
+
+from core.entities import Shard, ShardJobSummary, ShardSpec
+from core.interfaces import ShardRepository
+
+TABLE_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS shard_jobs (
+        job TEXT NOT NULL,
+        shard_key TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        owner TEXT,
+        lease_expires_at TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        processed INTEGER NOT NULL DEFAULT 0,
+        checkpoint TEXT,
+        error TEXT,
+        updated_at TEXT,
+        PRIMARY KEY (job, shard_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_shard_jobs_status ON shard_jobs (job, status, position)",
+)
+
+
+def default_clock() -> datetime:
+    """Retorna o horário atual em UTC."""
+    return datetime.now(UTC)
+
+
+class SqlShardRepository(ShardRepository):
+    """
+    Implementação comum às duas bases. Os horários são gravados em ISO 8601 (UTC), então a
+    comparação textual equivale à cronológica; a reserva acontece em uma única transação.
+    """
+
+    placeholder = "?"
+    lock_clause = ""
+
+    def __init__(
+        self, clock: Callable[[], datetime] = default_clock, max_attempts: int = 3
+    ) -> None:
+        if max_attempts <= 0:
+            raise ValueError("max_attempts deve ser positivo.")
+        self.clock = clock
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._transaction() as cursor:
+            for ddl in TABLE_DDL:
+                cursor.execute(ddl)
+
+    def _connect(self) -> Any:  # pragma: no cover - implementado pelas subclasses
+        raise NotImplementedError
+
+    def _begin(self, cursor: Any) -> None:
+        """Abre a transação explicitamente quando o driver não o faz sozinho."""
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        """Executa os comandos do bloco em uma transação, serializada entre as threads."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                self._begin(cursor)
+                yield cursor
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _sql(self, query: str) -> str:
+        """Adapta os placeholders da consulta ao driver."""
+        return query if self.placeholder == "?" else query.replace("?", self.placeholder)
+
+    def _now(self) -> str:
+        return self.clock().isoformat()
+
+    def _expires_at(self, lease_for: timedelta) -> str:
+        if lease_for <= timedelta(0):
+            raise ValueError("lease_for deve ser positivo.")
+        return (self.clock() + lease_for).isoformat()
+
+    def create_job(self, job: str, shards: Sequence[ShardSpec]) -> int:
+        """Registra as fatias do job, ignorando as que já existem."""
+        if not job.strip():
+            raise ValueError("job não pode ser vazio.")
+        if not shards:
+            raise ValueError("Nenhuma fatia informada.")
+        count_sql = self._sql("SELECT COUNT(*) FROM shard_jobs WHERE job = ?")
+        with self._transaction() as cursor:
+            cursor.execute(count_sql, (job,))
+            before = cursor.fetchone()[0]
+            cursor.executemany(
+                self._sql(
+                    "INSERT INTO shard_jobs (job, shard_key, position, params, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (job, shard_key) DO NOTHING"
+                ),
+                [
+                    (job, spec.key, position, json.dumps(dict(spec.params)), self._now())
+                    for position, spec in enumerate(shards)
+                ],
+            )
+            cursor.execute(count_sql, (job,))
+            return cursor.fetchone()[0] - before
+
+    def lease(self, job: str, owner: str, lease_for: timedelta) -> Shard | None:
+        """Reserva a próxima fatia pendente ou cuja reserva expirou (worker caiu)."""
+        if not owner.strip():
+            raise ValueError("owner não pode ser vazio.")
+        now = self._now()
+        expires_at = self._expires_at(lease_for)
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(
+                    "UPDATE shard_jobs SET status = 'failed', owner = NULL, "
+                    "lease_expires_at = NULL, error = 'reserva expirou na última tentativa', "
+                    "updated_at = ? "
+                    "WHERE job = ? AND status = 'leased' AND lease_expires_at < ? AND attempts >= ?"
+                ),
+                (now, job, now, self.max_attempts),
+            )
+            cursor.execute(
+                self._sql(
+                    "SELECT shard_key, params, attempts, processed, checkpoint FROM shard_jobs "
+                    "WHERE job = ? AND (status = 'pending' "
+                    "OR (status = 'leased' AND lease_expires_at < ?)) "
+                    "ORDER BY position, shard_key LIMIT 1" + self.lock_clause
+                ),
+                (job, now),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            key, params, attempts, processed, checkpoint = row
+            cursor.execute(
+                self._sql(
+                    "UPDATE shard_jobs SET status = 'leased', owner = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, error = NULL, updated_at = ? "
+                    "WHERE job = ? AND shard_key = ?"
+                ),
+                (owner, expires_at, now, job, key),
+            )
+        return Shard(
+            job=job,
+            key=key,
+            params=json.loads(params),
+            owner=owner,
+            attempts=attempts + 1,
+            processed=processed,
+            checkpoint=checkpoint,
+        )
+
+    def heartbeat(
+        self,
+        job: str,
+        key: str,
+        owner: str,
+        lease_for: timedelta,
+        processed: int | None = None,
+        checkpoint: str | None = None,
+    ) -> bool:
+        """Renova a reserva e grava o progresso. Retorna False se a fatia não é mais do owner."""
+        expires_at = self._expires_at(lease_for)
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(
+                    "UPDATE shard_jobs SET lease_expires_at = ?, "
+                    "processed = COALESCE(?, processed), checkpoint = COALESCE(?, checkpoint), "
+                    "updated_at = ? "
+                    "WHERE job = ? AND shard_key = ? AND owner = ? AND status = 'leased'"
+                ),
+                (expires_at, processed, checkpoint, self._now(), job, key, owner),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: str, key: str, owner: str, processed: int | None = None) -> bool:
+        """Marca a fatia como concluída. Retorna False se a fatia não é mais do owner."""
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(
+                    "UPDATE shard_jobs SET status = 'done', lease_expires_at = NULL, "
+                    "processed = COALESCE(?, processed), updated_at = ? "
+                    "WHERE job = ? AND shard_key = ? AND owner = ? AND status = 'leased'"
+                ),
+                (processed, self._now(), job, key, owner),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job: str, key: str, owner: str, error: str) -> bool:
+        """Devolve a fatia à fila ou a marca como falha ao esgotar as tentativas."""
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(
+                    "UPDATE shard_jobs "
+                    "SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "owner = NULL, lease_expires_at = NULL, error = ?, updated_at = ? "
+                    "WHERE job = ? AND shard_key = ? AND owner = ? AND status = 'leased'"
+                ),
+                (self.max_attempts, error[:2000], self._now(), job, key, owner),
+            )
+            return cursor.rowcount == 1
+
+    def summary(self, job: str) -> ShardJobSummary:
+        """Retorna a contagem de fatias do job por situação."""
+        with self._transaction() as cursor:
+            cursor.execute(
+                self._sql(
+                    "SELECT status, COUNT(*), COALESCE(SUM(processed), 0) FROM shard_jobs "
+                    "WHERE job = ? GROUP BY status"
+                ),
+                (job,),
+            )
+            rows = cursor.fetchall()
+        counts = {status: int(count) for status, count, _ in rows}
+        return ShardJobSummary(
+            job=job,
+            pending=counts.get("pending", 0),
+            leased=counts.get("leased", 0),
+            done=counts.get("done", 0),
+            failed=counts.get("failed", 0),
+            processed=sum(int(processed) for _, _, processed in rows),
+        )
+
+    def close(self) -> None:
+        """Fecha a conexão com a base."""
+        with self._lock:
+            self._conn.close()
+
+
+class SqliteShardRepository(SqlShardRepository):
+    """Tabela de fatias em SQLite (WAL): vários processos na mesma máquina ou em disco local."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        clock: Callable[[], datetime] = default_clock,
+        max_attempts: int = 3,
+    ) -> None:
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(clock=clock, max_attempts=max_attempts)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _begin(self, cursor: sqlite3.Cursor) -> None:
+        """Trava a base para escrita já no início, evitando duas reservas da mesma fatia."""
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+class PostgresShardRepository(SqlShardRepository):
+    """Tabela de fatias no PostgreSQL, para workers em várias máquinas."""
+
+    placeholder = "%s"
+    lock_clause = " FOR UPDATE SKIP LOCKED"
+
+    def __init__(
+        self,
+        dsn: str,
+        clock: Callable[[], datetime] = default_clock,
+        max_attempts: int = 3,
+    ) -> None:
+        self.dsn = dsn
+        super().__init__(clock=clock, max_attempts=max_attempts)
+
+    def _connect(self) -> Any:
+        try:
+            import psycopg2
+        except ImportError as exc:  # pragma: no cover - depende do ambiente
+            raise RuntimeError(
+                "psycopg2 é necessário para usar a tabela de jobs no PostgreSQL."
+            ) from exc
+        return psycopg2.connect(self.dsn)
+
+
+def build_shard_repository(target: str, max_attempts: int = 3) -> SqlShardRepository:
+    """Cria o repositório a partir de uma URL postgresql:// ou de um caminho de arquivo SQLite."""
+    if target.startswith(("postgres://", "postgresql://")):
+        return PostgresShardRepository(target, max_attempts=max_attempts)
+    return SqliteShardRepository(Path(target).expanduser(), max_attempts=max_attempts)
@@ -0,0 +1,183 @@
+"""Worker que reserva fatias de um job, mantém a reserva viva e registra o progresso."""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+from core.entities import Shard
+from core.interfaces import ShardRepository
+
+
+class LeaseLostError(RuntimeError):
+    """A fatia foi devolvida à fila (reserva expirada) e passou para outro worker."""
+
+
+def default_owner() -> str:
+    """Identifica o worker por máquina e processo, com sufixo para workers no mesmo processo."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class ShardProgress:
+    """Repassado ao handler para registrar o progresso da fatia e renovar a reserva."""
+
+    def __init__(self, repository: ShardRepository, shard: Shard, lease_for: timedelta) -> None:
+        self._repository = repository
+        self._lease_for = lease_for
+        self._lock = threading.Lock()
+        self.shard = shard
+        self.processed = shard.processed
+        self.checkpoint = shard.checkpoint
+        self.lost = False
+
+    def beat(self) -> bool:
+        """Renova a reserva com o último progresso conhecido. Retorna False se ela foi perdida."""
+        with self._lock:
+            if self.lost:
+                return False
+            renewed = self._repository.heartbeat(
+                self.shard.job,
+                self.shard.key,
+                self.shard.owner,
+                self._lease_for,
+                processed=self.processed,
+                checkpoint=self.checkpoint,
+            )
+            self.lost = not renewed
+            return renewed
+
+    def report(self, processed: int | None = None, checkpoint: str | None = None) -> None:
+        """
+        Grava o progresso da fatia (ex.: último id processado em checkpoint).
+
+        :raises LeaseLostError: quando a fatia não pertence mais a este worker.
+        """
+        if processed is not None:
+            self.processed = processed
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        if not self.beat():
+            raise LeaseLostError(f"Reserva da fatia '{self.shard.key}' perdida.")
+
+
+ShardHandler = Callable[[Shard, ShardProgress], int | None]
+
+
+@dataclass(frozen=True)
+class WorkerResult:
+    """Fatias tratadas por um worker, agrupadas pelo desfecho."""
+
+    completed: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    lost: list[str] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        """True quando nenhuma fatia falhou neste worker."""
+        return not self.failed
+
+
+class ShardWorker:
+    """
+    Processa fatias de um job até a fila esvaziar.
+
+    Uma thread renova a reserva a cada heartbeat_seconds enquanto o handler executa; se o worker
+    morrer, a reserva expira após lease_seconds e a fatia volta a ser reservada por outro worker,
+    com o processed e o checkpoint gravados até então.
+    """
+
+    def __init__(
+        self,
+        repository: ShardRepository,
+        job: str,
+        handler: ShardHandler,
+        owner: str | None = None,
+        lease_seconds: float = 300.0,
+        heartbeat_seconds: float | None = 60.0,
+        poll_seconds: float = 30.0,
+        wait_for_others: bool = False,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if not job.strip():
+            raise ValueError("job não pode ser vazio.")
+        if lease_seconds <= 0:
+            raise ValueError("lease_seconds deve ser positivo.")
+        if heartbeat_seconds is not None and not 0 < heartbeat_seconds < lease_seconds:
+            raise ValueError("heartbeat_seconds deve ser positivo e menor que lease_seconds.")
+        if poll_seconds < 0:
+            raise ValueError("poll_seconds não pode ser negativo.")
+        self.repository = repository
+        self.job = job
+        self.handler = handler
+        self.owner = owner or default_owner()
+        self.lease_for = timedelta(seconds=lease_seconds)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.wait_for_others = wait_for_others
+        self._sleep = sleep
+
+    def run(self, max_shards: int | None = None) -> WorkerResult:
+        """
+        Reserva e processa fatias até não haver mais pendentes (ou até max_shards).
+
+        Com wait_for_others, continua consultando a fila enquanto houver fatias reservadas por
+        outros workers, para assumir as que expirarem.
+        """
+        result = WorkerResult()
+        handled = 0
+        while max_shards is None or handled < max_shards:
+            shard = self.repository.lease(self.job, self.owner, self.lease_for)
+            if shard is None:
+                if self.wait_for_others and self.repository.summary(self.job).leased:
+                    self._sleep(self.poll_seconds)
+                    continue
+                break
+            handled += 1
+            outcome = self._process(shard)
+            getattr(result, outcome).append(shard.key)
+        return result
+
+    def _process(self, shard: Shard) -> str:
+        """Executa o handler com heartbeats em paralelo e registra o desfecho da fatia."""
+        progress = ShardProgress(self.repository, shard, self.lease_for)
+        stop = threading.Event()
+        beater = None
+        if self.heartbeat_seconds is not None:
+            beater = threading.Thread(
+                target=self._keep_alive,
+                args=(progress, stop, self.heartbeat_seconds),
+                name=f"heartbeat-{shard.key}",
+                daemon=True,
+            )
+            beater.start()
+        try:
+            processed = self.handler(shard, progress)
+        except LeaseLostError:
+            return "lost"
+        except Exception as exc:
+            self.repository.fail(shard.job, shard.key, shard.owner, f"{type(exc).__name__}: {exc}")
+            return "failed"
+        finally:
+            stop.set()
+            if beater is not None:
+                beater.join()
+
+        if progress.lost:
+            return "lost"
+        final = processed if processed is not None else progress.processed
+        if not self.repository.complete(shard.job, shard.key, shard.owner, processed=final):
+            return "lost"
+        return "completed"
+
+    @staticmethod
+    def _keep_alive(progress: ShardProgress, stop: threading.Event, interval: float) -> None:
+        """Renova a reserva periodicamente até o handler terminar ou a reserva ser perdida."""
+        while not stop.wait(interval):
+            if not progress.beat():
+                return
@@ -0,0 +1,71 @@
+"""Testes para as fatias de jobs e os divisores de espaço de chaves."""
+
+from datetime import date
+
+import pytest
+
+from core.entities import (
+    ShardJobSummary,
+    ShardSpec,
+    split_date_range,
+    split_int_range,
+    split_values,
+)
+
+
+def test_split_int_range_covers_interval_without_overlap() -> None:
+    """Fatias são contíguas, a última é truncada em stop e as chaves ordenam numericamente."""
+    shards = split_int_range(0, 2500, 1000)
+
+    assert [dict(shard.params) for shard in shards] == [
+        {"start": 0, "stop": 1000},
+        {"start": 1000, "stop": 2000},
+        {"start": 2000, "stop": 2500},
+    ]
+    keys = [shard.key for shard in shards]
+    assert keys == sorted(keys)
+
+
+def test_split_values_groups_items() -> None:
+    """Valores em branco são descartados e agrupados conforme per_shard."""
+    assert [shard.key for shard in split_values(["DETRAN", " ", "SISMIGRA"])] == [
+        "DETRAN",
+        "SISMIGRA",
+    ]
+    grouped = split_values(["a", "b", "c"], per_shard=2)
+    assert [shard.params["values"] for shard in grouped] == [["a", "b"], ["c"]]
+
+
+def test_split_date_range_uses_half_open_windows() -> None:
+    """Janelas terminam no início da seguinte e a última termina em stop."""
+    shards = split_date_range(date(2024, 1, 1), date(2024, 1, 10), days=4)
+
+    assert [(shard.params["start"], shard.params["stop"]) for shard in shards] == [
+        ("2024-01-01", "2024-01-05"),
+        ("2024-01-05", "2024-01-09"),
+        ("2024-01-09", "2024-01-10"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda: split_int_range(0, 10, 0),
+        lambda: split_int_range(10, 0, 5),
+        lambda: split_values([], 1),
+        lambda: split_date_range(date(2024, 1, 2), date(2024, 1, 1), 1),
+        lambda: ShardSpec(key=" "),
+    ],
+)
+def test_invalid_arguments_raise(call) -> None:
+    """Parâmetros inválidos devem gerar ValueError."""
+    with pytest.raises(ValueError):
+        call()
+
+
+def test_summary_totals() -> None:
+    """O job só termina quando não há fatias pendentes nem reservadas."""
+    summary = ShardJobSummary(job="j", pending=0, leased=1, done=3, failed=1)
+    assert summary.total == 5
+    assert not summary.finished
+    assert ShardJobSummary(job="j", done=2, failed=1).finished
@@ -257,3 +257,38 @@ def test_emit_alert_creates_entry(tmp_path: Path) -> None:
     assert result == 0
     log_file = Path(get_data_dir()) / "logs" / "alerts.log"
     assert "manual" in log_file.read_text(encoding="utf-8")
+
+
+def test_shard_commands_split_and_process_job(capsys: pytest.CaptureFixture[str]) -> None:
+    """shard-create divide o intervalo e shard-work executa o comando por fatia."""
+    create = ["shard-create", "--job", "cards", "--int-range", "0", "25", "--size", "10"]
+    assert run_cli(create) == 0
+    assert run_cli(create) == 0
+    assert "0 fatia(s) nova(s)" in capsys.readouterr().out
+
+    script = "import sys; print('MITRARR_PROGRESS', int(sys.argv[2]) - int(sys.argv[1]))"
+    result = run_cli(
+        ["shard-work", "--job", "cards", "--", sys.executable, "-c", script, "{start}", "{stop}"]
+    )
+    assert result == 0
+    assert "3 concluída(s)" in capsys.readouterr().out
+
+    assert run_cli(["shard-status", "--job", "cards"]) == 0
+    out = capsys.readouterr().out
+    assert "3/3 concluída(s)" in out
+    assert "25 registro(s)" in out
+
+
+def test_shard_work_reports_failed_shards() -> None:
+    """Fatias que esgotam as tentativas fazem o worker e o status retornarem erro."""
+    assert run_cli(["shard-create", "--job", "listas", "--values", "A", "B"]) == 0
+    result = run_cli(
+        ["shard-work", "--job", "listas", "--", sys.executable, "-c", "raise SystemExit(1)"]
+    )
+    assert result == 1
+    assert run_cli(["shard-status", "--job", "listas"]) == 1
+
+
+def test_shard_status_unknown_job() -> None:
+    """Job inexistente retorna erro."""
+    assert run_cli(["shard-status", "--job", "nao-existe"]) == 1
@@ -0,0 +1,147 @@
+"""Testes para a tabela de fatias em SQLite."""
+
+import threading
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from core.entities import split_int_range
+from infra.jobs import SqliteShardRepository
+
+LEASE = timedelta(minutes=5)
+
+
+class FrozenClock:
+    """Permite controlar o tempo retornado nas chamadas."""
+
+    def __init__(self, start: datetime) -> None:
+        self._current = start
+
+    def tick(self, delta: timedelta) -> None:
+        self._current += delta
+
+    def __call__(self) -> datetime:
+        return self._current
+
+
+@pytest.fixture()
+def clock() -> FrozenClock:
+    return FrozenClock(datetime(2025, 1, 1, tzinfo=UTC))
+
+
+@pytest.fixture()
+def repo(tmp_path: Path, clock: FrozenClock) -> SqliteShardRepository:
+    repository = SqliteShardRepository(tmp_path / "shards.sqlite3", clock=clock, max_attempts=2)
+    repository.create_job("cards", split_int_range(0, 30, 10))
+    return repository
+
+
+def test_create_job_is_idempotent(repo: SqliteShardRepository) -> None:
+    """Recriar o job não duplica fatias e acrescenta só as novas."""
+    assert repo.create_job("cards", split_int_range(0, 30, 10)) == 0
+    assert repo.create_job("cards", split_int_range(0, 40, 10)) == 1
+    assert repo.summary("cards").pending == 4
+
+
+def test_lease_hands_out_each_shard_once(repo: SqliteShardRepository) -> None:
+    """Fatias reservadas não são entregues a outro worker enquanto a reserva vale."""
+    first = repo.lease("cards", "host-a", LEASE)
+    second = repo.lease("cards", "host-b", LEASE)
+    third = repo.lease("cards", "host-a", LEASE)
+
+    assert [first.key, second.key, third.key] == ["00-10", "10-20", "20-30"]
+    assert first.params == {"start": 0, "stop": 10}
+    assert repo.lease("cards", "host-c", LEASE) is None
+    assert repo.summary("cards").leased == 3
+
+
+def test_expired_lease_resumes_from_checkpoint(
+    repo: SqliteShardRepository, clock: FrozenClock
+) -> None:
+    """Quando o worker morre, outro assume a fatia com o progresso gravado."""
+    shard = repo.lease("cards", "host-a", LEASE)
+    assert repo.heartbeat("cards", shard.key, "host-a", LEASE, processed=4, checkpoint="3")
+
+    clock.tick(LEASE + timedelta(seconds=1))
+    retaken = repo.lease("cards", "host-b", LEASE)
+
+    assert retaken.key == shard.key
+    assert (retaken.attempts, retaken.processed, retaken.checkpoint) == (2, 4, "3")
+    assert not repo.heartbeat("cards", shard.key, "host-a", LEASE)
+    assert not repo.complete("cards", shard.key, "host-a")
+    assert repo.complete("cards", shard.key, "host-b", processed=10)
+
+
+def test_heartbeat_keeps_lease_alive(repo: SqliteShardRepository, clock: FrozenClock) -> None:
+    """Renovações periódicas impedem que a fatia seja reservada de novo."""
+    shard = repo.lease("cards", "host-a", LEASE)
+    for _ in range(3):
+        clock.tick(timedelta(minutes=4))
+        assert repo.heartbeat("cards", shard.key, "host-a", LEASE)
+    leased = [repo.lease("cards", "host-b", LEASE) for _ in range(3)]
+    assert shard.key not in [item.key for item in leased if item]
+
+
+def test_fail_requeues_until_attempts_run_out(repo: SqliteShardRepository) -> None:
+    """Falhas devolvem a fatia à fila até max_attempts; depois ela fica como failed."""
+    shard = repo.lease("cards", "host-a", LEASE)
+    assert repo.fail("cards", shard.key, "host-a", "boom")
+    assert repo.summary("cards").pending == 3
+
+    again = repo.lease("cards", "host-a", LEASE)
+    assert again.key == shard.key
+    assert repo.fail("cards", shard.key, "host-a", "boom")
+
+    summary = repo.summary("cards")
+    assert (summary.pending, summary.failed) == (2, 1)
+
+
+def test_expired_lease_on_last_attempt_is_marked_failed(
+    repo: SqliteShardRepository, clock: FrozenClock
+) -> None:
+    """Uma fatia que derruba todos os workers não volta para a fila indefinidamente."""
+    key = repo.lease("cards", "host-a", LEASE).key
+    clock.tick(LEASE * 2)
+    assert repo.lease("cards", "host-b", LEASE).key == key
+    clock.tick(LEASE * 2)
+
+    assert repo.lease("cards", "host-c", LEASE).key != key
+    assert repo.summary("cards").failed == 1
+
+
+def test_summary_sums_processed(repo: SqliteShardRepository) -> None:
+    """A soma de processed cobre todas as fatias do job."""
+    for owner in ("a", "b"):
+        shard = repo.lease("cards", owner, LEASE)
+        repo.complete("cards", shard.key, owner, processed=10)
+
+    summary = repo.summary("cards")
+    assert (summary.done, summary.pending, summary.processed) == (2, 1, 20)
+    assert repo.summary("outro").total == 0
+
+
+def test_concurrent_connections_never_share_a_shard(tmp_path: Path) -> None:
+    """Workers com conexões próprias (como processos distintos) recebem fatias distintas."""
+    path = tmp_path / "shards.sqlite3"
+    SqliteShardRepository(path).create_job("rg", split_int_range(0, 2000, 10))
+    leased: list[str] = []
+    lock = threading.Lock()
+
+    def work(owner: str) -> None:
+        repository = SqliteShardRepository(path)
+        while (shard := repository.lease("rg", owner, LEASE)) is not None:
+            with lock:
+                leased.append(shard.key)
+            repository.complete("rg", shard.key, owner)
+        repository.close()
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(leased) == 200
+    assert len(set(leased)) == 200
+    assert SqliteShardRepository(path).summary("rg").done == 200
@@ -0,0 +1,177 @@
+"""Testes para o worker de fatias e o handler de comandos."""
+
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+from core.entities import Shard, split_int_range, split_values
+from infra.jobs import (
+    CommandShardHandler,
+    LeaseLostError,
+    ShardProgress,
+    ShardWorker,
+    SqliteShardRepository,
+    format_command,
+    parse_progress,
+)
+
+
+@pytest.fixture()
+def repo(tmp_path: Path) -> SqliteShardRepository:
+    repository = SqliteShardRepository(tmp_path / "shards.sqlite3", max_attempts=2)
+    repository.create_job("cards", split_int_range(0, 40, 10))
+    return repository
+
+
+def test_worker_processes_all_shards(repo: SqliteShardRepository) -> None:
+    """O handler recebe cada fatia uma vez e o retorno vira o processed."""
+    seen = []
+
+    def handler(shard: Shard, progress: ShardProgress) -> int:
+        seen.append((shard.params["start"], shard.params["stop"]))
+        return shard.params["stop"] - shard.params["start"]
+
+    result = ShardWorker(repo, "cards", handler, owner="w1", heartbeat_seconds=None).run()
+
+    assert seen == [(0, 10), (10, 20), (20, 30), (30, 40)]
+    assert result.success and len(result.completed) == 4
+    summary = repo.summary("cards")
+    assert summary.finished and summary.processed == 40
+
+
+def test_worker_records_failures_and_retries(repo: SqliteShardRepository) -> None:
+    """Exceções do handler devolvem a fatia à fila até esgotar as tentativas."""
+    calls = []
+
+    def handler(shard: Shard, progress: ShardProgress) -> None:
+        calls.append(shard.key)
+        if shard.params["start"] == 10:
+            raise RuntimeError("falha")
+
+    result = ShardWorker(repo, "cards", handler, owner="w1", heartbeat_seconds=None).run()
+
+    assert calls.count("10-20") == 2
+    assert not result.success
+    summary = repo.summary("cards")
+    assert (summary.done, summary.failed) == (3, 1)
+
+
+def test_progress_report_persists_checkpoint(repo: SqliteShardRepository) -> None:
+    """report grava o progresso e renova a reserva a cada chamada."""
+
+    def handler(shard: Shard, progress: ShardProgress) -> None:
+        for ident in range(shard.params["start"], shard.params["stop"]):
+            progress.report(processed=ident - shard.params["start"] + 1, checkpoint=str(ident))
+
+    ShardWorker(repo, "cards", handler, owner="w1", heartbeat_seconds=None).run(max_shards=1)
+
+    assert repo.summary("cards").processed == 10
+
+
+def test_heartbeat_thread_renews_lease(tmp_path: Path) -> None:
+    """Com a thread de heartbeat, handlers mais longos que a reserva não perdem a fatia."""
+    repository = SqliteShardRepository(tmp_path / "shards.sqlite3")
+    repository.create_job("lento", split_values(["a"]))
+    other = SqliteShardRepository(tmp_path / "shards.sqlite3")
+    stolen = []
+
+    def handler(shard: Shard, progress: ShardProgress) -> None:
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            stolen.append(other.lease("lento", "intruso", timedelta(seconds=1)))
+            time.sleep(0.1)
+
+    worker = ShardWorker(repository, "lento", handler, lease_seconds=0.5, heartbeat_seconds=0.1)
+    result = worker.run()
+
+    assert result.completed == ["a"]
+    assert not any(stolen)
+
+
+def test_lost_lease_is_not_completed(repo: SqliteShardRepository) -> None:
+    """Se outro worker assumiu a fatia, o primeiro não a marca como concluída."""
+
+    def handler(shard: Shard, progress: ShardProgress) -> None:
+        repo.fail(shard.job, shard.key, shard.owner, "reserva tomada")
+        progress.report(processed=1)
+
+    result = ShardWorker(repo, "cards", handler, owner="w1", heartbeat_seconds=None).run(
+        max_shards=1
+    )
+
+    assert result.lost == ["00-10"]
+    assert repo.summary("cards").done == 0
+
+
+def test_wait_for_others_polls_until_leases_finish(repo: SqliteShardRepository) -> None:
+    """Com wait_for_others, o worker espera e assume fatias liberadas por outros."""
+    held = repo.lease("cards", "outro", timedelta(minutes=5))
+    sleeps = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        repo.fail("cards", held.key, "outro", "worker caiu")
+
+    worker = ShardWorker(
+        repo,
+        "cards",
+        lambda shard, progress: None,
+        owner="w1",
+        heartbeat_seconds=None,
+        poll_seconds=5,
+        wait_for_others=True,
+        sleep=sleep,
+    )
+    result = worker.run()
+
+    assert sleeps == [5]
+    assert sorted(result.completed) == ["00-10", "10-20", "20-30", "30-40"]
+
+
+def test_worker_validates_arguments(repo: SqliteShardRepository) -> None:
+    """Heartbeat precisa ser menor que a validade da reserva."""
+    with pytest.raises(ValueError):
+        ShardWorker(repo, "cards", lambda s, p: None, lease_seconds=10, heartbeat_seconds=10)
+    with pytest.raises(ValueError):
+        ShardWorker(repo, " ", lambda s, p: None)
+
+
+def test_format_command_and_parse_progress() -> None:
+    """Campos da fatia são substituídos e linhas de progresso reconhecidas."""
+    shard = Shard(job="j", key="k", params={"values": ["a", "b"]}, owner="o", attempts=1)
+    assert format_command(["x", "--listas={values}", "{key}"], shard) == ["x", "--listas=a,b", "k"]
+    with pytest.raises(ValueError):
+        format_command(["{start}"], shard)
+    assert parse_progress("MITRARR_PROGRESS 12 card-99\n") == (12, "card-99")
+    assert parse_progress("MITRARR_PROGRESS 3") == (3, None)
+    assert parse_progress("qualquer saída") is None
+
+
+def test_command_handler_reports_progress(repo: SqliteShardRepository) -> None:
+    """O comando recebe a fatia pelos argumentos e reporta o progresso pelo stdout."""
+    script = (
+        "import os, sys; print('MITRARR_PROGRESS', "
+        "int(sys.argv[2]) - int(sys.argv[1]), os.environ['MITRARR_SHARD_KEY'])"
+    )
+    handler = CommandShardHandler([sys.executable, "-c", script, "{start}", "{stop}"])
+
+    result = ShardWorker(repo, "cards", handler, owner="w1", heartbeat_seconds=None).run()
+
+    assert len(result.completed) == 4
+    assert repo.summary("cards").processed == 40
+
+
+def test_command_handler_raises_on_failure(repo: SqliteShardRepository) -> None:
+    """Código de saída diferente de zero é tratado como falha da fatia."""
+    handler = CommandShardHandler([sys.executable, "-c", "raise SystemExit(3)"])
+    shard = repo.lease("cards", "w1", timedelta(minutes=5))
+    progress = ShardProgress(repo, shard, timedelta(minutes=5))
+
+    with pytest.raises(RuntimeError):
+        handler(shard, progress)
+    with pytest.raises(LeaseLostError):
+        repo.complete("cards", shard.key, "w1")
+        progress.report(processed=1)